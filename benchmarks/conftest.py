@@ -0,0 +1,36 @@
+import pytest
+from t2ia_collection.synthetic import *
+
+# ======================================================================================================================
+# CHARGES SYNTHÉTIQUES
+# ======================================================================================================================
+# Cartes réalistes et reproductibles (cf. synthetic) : textes imprimés et manuscrits, tampons, timbres, avec des
+# villes et mots-clés répétés comme dans les vraies collections.
+
+N_POSTCARDS = 500
+SEED = 0
+
+
+@pytest.fixture(scope='session')
+def generator() -> CollectionGenerator:
+    return CollectionGenerator(SEED)
+
+
+@pytest.fixture(scope='session')
+def collection(generator) -> CardCollection:
+    return generator.collection(N_POSTCARDS)
+
+
+@pytest.fixture(scope='session')
+def collection_dict(collection) -> dict:
+    return collection.to_dict()
+
+
+@pytest.fixture(scope='session')
+def detections(collection) -> List[Detection]:
+    return [det for postcard in collection for det in postcard.annotations.detections]
+
+
+@pytest.fixture(scope='session')
+def img_size(generator) -> Tuple[int, int]:
+    return generator.config.img_size
@@ -0,0 +1,37 @@
+import pytest
+from t2ia_collection.synthetic import *
+
+pytest.importorskip("pytest_benchmark")
+
+# ======================================================================================================================
+# BENCHMARKS collection.py
+# ======================================================================================================================
+
+def test_from_dict(benchmark, collection_dict):
+    """chargement d'une collection (validation par lots)"""
+    res = benchmark(CardCollection.from_dict, collection_dict)
+    assert len(res) == len(collection_dict)
+
+
+def test_to_dict(benchmark, collection):
+    benchmark(collection.to_dict)
+
+
+@pytest.mark.parametrize("method, value", [('filter_by_town', 'reims'), ('filter_by_region', 'bretagne'),
+                                           ('filter_by_tags', ['gare']), ('filter_by_keywords', ['port'])])
+def test_filters(benchmark, collection, method, value):
+    """filtres de la collection"""
+    res = benchmark(getattr(collection, method), value)
+    assert 0 < len(res) < len(collection)
+
+
+def test_changes(benchmark, collection):
+    """recherche des cartes modifiées depuis la dernière sauvegarde"""
+    collection.mark_clean()
+    benchmark(collection.changes)
+
+
+def test_generate(benchmark, generator):
+    """génération de cartes synthétiques"""
+    res = benchmark(lambda: list(generator.iter_postcards(100)))
+    assert len(res) == 100
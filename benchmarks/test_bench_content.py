@@ -0,0 +1,52 @@
+import pytest
+from t2ia_collection.content import *
+
+pytest.importorskip("pytest_benchmark")
+
+# ======================================================================================================================
+# BENCHMARKS content.py
+# ======================================================================================================================
+
+@pytest.fixture(scope='module')
+def texts(detections):
+    return [det.content for det in detections if isinstance(det.content, Text)]
+
+
+@pytest.fixture(scope='module')
+def datestamp_dicts(detections):
+    return [det.content.to_dict() for det in detections if isinstance(det.content, DateStamp)]
+
+
+def test_keyword_pipeline(benchmark, texts):
+    """word_list -> lemmatize -> set_keywords sur tous les textes"""
+    ref_keywords = {'église', 'mairie', 'gare', 'port'}
+
+    def run():
+        return [text.set_keywords(ref_keywords, warn=False) for text in texts]
+    res = benchmark(run)
+    assert len(res) == len(texts)
+
+
+def test_text_round_trip(benchmark, texts):
+    """to_json_object / from_json_object des textes"""
+    res = benchmark(lambda: [Content.from_json_object(text.to_json_object()) for text in texts])
+    assert res == texts
+
+
+def test_datestamp_parsing(benchmark, datestamp_dicts):
+    """instanciation des DateStamp (énumérations, dates) depuis leurs dictionnaires"""
+    res = benchmark(lambda: [DateStamp.from_dict(d) for d in datestamp_dicts])
+    assert len(res) == len(datestamp_dicts)
+
+
+def test_text_rotate(benchmark, texts):
+    """rotation des orientations de texte"""
+    benchmark(lambda: [text.rotate(90) for text in texts])
+
+
+@pytest.mark.parametrize("thetas", [[0, 90, 180, 270, '90', None], [89.9999, -90.0001, 450.0]], ids=['exact', 'near'])
+def test_orientation_from_input(benchmark, thetas):
+    """normalisation d'angles"""
+    thetas = thetas * 1000
+    res = benchmark(Orientation.quarter_turns, thetas)
+    assert len(res) == len(thetas)
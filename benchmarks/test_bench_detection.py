@@ -0,0 +1,61 @@
+import pytest
+from t2ia_collection.detection import *
+
+pytest.importorskip("pytest_benchmark")
+
+# ======================================================================================================================
+# BENCHMARKS detection.py
+# ======================================================================================================================
+
+@pytest.fixture(scope='module')
+def bboxes(detections):
+    return [det.bbox for det in detections]
+
+
+@pytest.fixture(scope='module')
+def detection_dicts(detections):
+    return [det.to_dict() for det in detections]
+
+
+@pytest.mark.parametrize("coord_format", list(CoordFormat), ids=str)
+def test_to_coords(benchmark, bboxes, img_size, coord_format):
+    """conversion des bbox dans chaque format de coordonnées"""
+    size = None if coord_format.is_normalized() else img_size
+    res = benchmark(lambda: [bbox.to_coords(coord_format, size) for bbox in bboxes])
+    assert len(res) == len(bboxes)
+
+
+@pytest.mark.parametrize("coord_format", list(CoordFormat), ids=str)
+def test_from_coords(benchmark, bboxes, img_size, coord_format):
+    """création des bbox depuis chaque format de coordonnées, objet par objet"""
+    size = None if coord_format.is_normalized() else img_size
+    coords = [bbox.to_coords(coord_format, size) for bbox in bboxes]
+    res = benchmark(lambda: [BoundingBox.from_coords(c, coord_format, size) for c in coords])
+    assert len(res) == len(bboxes)
+
+
+@pytest.mark.parametrize("coord_format", list(CoordFormat), ids=str)
+def test_array_from_coords(benchmark, bboxes, img_size, coord_format):
+    """création d'un BoundingBoxArray depuis chaque format de coordonnées, en un lot"""
+    size = None if coord_format.is_normalized() else img_size
+    coords = [bbox.to_coords(coord_format, size) for bbox in bboxes]
+    res = benchmark(BoundingBoxArray.from_coords, coords, coord_format, size)
+    assert len(res) == len(bboxes)
+
+
+def test_detection_round_trip(benchmark, detection_dicts):
+    """Detection.from_dict(Detection.to_dict())"""
+    res = benchmark(lambda: [Detection.from_dict(d).to_dict() for d in detection_dicts])
+    assert res == detection_dicts
+
+
+def test_detection_rotate(benchmark, detections):
+    """rotation des détections (bbox et orientation des textes)"""
+    benchmark(lambda: [det.rotate(90) for det in detections])
+
+
+def test_array_rotate(benchmark, bboxes):
+    """rotation d'un BoundingBoxArray, un angle par bbox"""
+    array_bboxes = BoundingBoxArray.from_bboxes(bboxes)
+    codes = Orientation.quarter_turns([90 * (i % 4) for i in range(len(bboxes))])
+    benchmark(array_bboxes.rotate, codes)
@@ -1,8 +1,30 @@
 __all__ = [
-    "content", "detection", "postcard", "collection"
+    "content", "detection", "postcard", "interning", "validation", "collection", "parallel", "ingestion", "export", "interchange", "spatial", "reading", "evaluation", "extraction", "cache", "profiling", "synthetic", "sharding", "database", "geocoding", "deduplication", "consensus", "calibration", "terms", "thumbnails", "rendering"
 ]
 
 from . import content
 from . import detection
 from . import postcard
-from . import collection
\ No newline at end of file
+from . import interning
+from . import validation
+from . import collection
+from . import parallel
+from . import ingestion
+from . import export
+from . import interchange
+from . import spatial
+from . import reading
+from . import evaluation
+from . import extraction
+from . import cache
+from . import profiling
+from . import synthetic
+from . import sharding
+from . import database
+from . import geocoding
+from . import deduplication
+from . import consensus
+from . import calibration
+from . import terms
+from . import thumbnails
+from . import rendering
\ No newline at end of file
@@ -0,0 +1,209 @@
+from typing import List, Dict, Tuple, Iterable, Any
+from pathlib import Path
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from t2ia_collection.extraction import *
+
+# ======================================================================================================================
+# CACHE de résultats adressé par contenu
+# ======================================================================================================================
+# Clé d'un résultat : hash(hash des octets de l'image + bbox + classe de contenu + nom et version de l'extracteur).
+# Une carte dont l'image et les bbox n'ont pas changé retrouve donc ses résultats, et changer la version d'un
+# extracteur invalide naturellement ses anciens résultats.
+
+def file_hash(file_path: str | Path, chunk_size: int = 1 << 20) -> str:
+    """Hash des octets d'un fichier"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, 'rb') as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def result_key(image_hash: str, bbox: BoundingBox, content_cls: str, extractor: str, version: str,
+               precision: int = 6) -> str:
+    """Clé d'un résultat d'extraction"""
+    coords = ",".join(f"{coord:.{precision}f}" for coord in bbox.xywhn())
+    return hashlib.blake2b(f"{image_hash}|{coords}|{content_cls}|{extractor}|{version}".encode('utf-8'),
+                           digest_size=16).hexdigest()
+
+
+class ResultCache:
+    """
+    Cache persistant de résultats (dict json) dans un fichier SQLite. La taille totale des valeurs est bornée par
+    max_bytes : au-delà, les résultats les moins récemment utilisés sont supprimés. Le cache peut être utilisé depuis
+    plusieurs threads (cf. CachedBackend) : les accès à la connexion sont sérialisés par un verrou.
+    """
+
+    def __init__(self, file_path: str | Path, max_bytes: int = 1 << 30):
+        self.file_path = str(file_path)
+        self.max_bytes = max_bytes
+        self.connection = sqlite3.connect(self.file_path, check_same_thread=False)
+        self._lock = threading.RLock()
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS results ("
+                                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                                "last_access REAL NOT NULL)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS results_last_access ON results (last_access)")
+        self.connection.commit()
+        self.size = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self.connection.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return self.connection.execute("SELECT 1 FROM results WHERE key = ?", (key,)).fetchone() is not None
+
+    def __enter__(self) -> "ResultCache":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        with self._lock:
+            self.connection.close()
+
+    # lecture / écriture :
+    # --------------------
+    def get_many(self, keys: Iterable[str]) -> Dict[str, dict]:
+        """Résultats présents dans le cache pour les clés données (et mise à jour de leur date d'utilisation)"""
+        with self._lock:
+            keys = list(keys)
+            res = {}
+            for start in range(0, len(keys), 500):  # limite du nombre de paramètres d'une requête SQLite
+                chunk = keys[start:start + 500]
+                rows = self.connection.execute(
+                    f"SELECT key, value FROM results WHERE key IN ({','.join('?' * len(chunk))})", chunk).fetchall()
+                res.update((key, json.loads(value)) for key, value in rows)
+            if res:
+                now = time.time()
+                self.connection.executemany("UPDATE results SET last_access = ? WHERE key = ?",
+                                            [(now, key) for key in res])
+                self.connection.commit()
+            self.hits += len(res)
+            self.misses += len(keys) - len(res)
+            return res
+
+    def get(self, key: str) -> dict | None:
+        """Résultat associé à la clé, ou None"""
+        return self.get_many([key]).get(key)
+
+    def put_many(self, items: Dict[str, dict]):
+        """Ajoute (ou remplace) des résultats, puis fait de la place si besoin"""
+        with self._lock:
+            now = time.time()
+            rows = []
+            for key, value in items.items():
+                text = json.dumps(value, ensure_ascii=False)
+                rows.append((key, text, len(text.encode('utf-8')), now))
+            keys = [row[0] for row in rows]
+            for start in range(0, len(keys), 500):  # taille des valeurs remplacées
+                chunk = keys[start:start + 500]
+                self.size -= self.connection.execute(
+                    f"SELECT COALESCE(SUM(size), 0) FROM results WHERE key IN ({','.join('?' * len(chunk))})",
+                    chunk).fetchone()[0]
+            self.connection.executemany("INSERT OR REPLACE INTO results (key, value, size, last_access) "
+                                        "VALUES (?, ?, ?, ?)", rows)
+            self.size += sum(row[2] for row in rows)
+            self.evict()
+            self.connection.commit()
+
+    def put(self, key: str, value: dict):
+        """Ajoute (ou remplace) un résultat"""
+        self.put_many({key: value})
+
+    def evict(self):
+        """Supprime les résultats les moins récemment utilisés tant que la taille dépasse max_bytes"""
+        with self._lock:
+            while self.size > self.max_bytes:
+                rows = self.connection.execute(
+                    "SELECT key, size FROM results ORDER BY last_access LIMIT 256").fetchall()
+                if not rows:
+                    self.size = 0
+                    break
+                removed = []
+                for key, size in rows:
+                    removed.append((key,))
+                    self.size -= size
+                    if self.size <= self.max_bytes:
+                        break
+                self.connection.executemany("DELETE FROM results WHERE key = ?", removed)
+
+    def clear(self):
+        """Vide le cache"""
+        with self._lock:
+            self.connection.execute("DELETE FROM results")
+            self.connection.commit()
+            self.size = 0
+
+
+# ======================================================================================================================
+# BACKEND avec cache
+# ======================================================================================================================
+
+class CachedBackend(ExtractorBackend):
+    """
+    Enveloppe un backend d'extraction : seules les détections absentes du cache sont envoyées au backend, et ses
+    résultats sont ajoutés au cache. Le hash de chaque image n'est calculé qu'une fois tant que le fichier n'est pas
+    modifié (taille et date de modification). Les lectures de fichiers et les accès au cache d'extract() sont faits
+    dans un thread, pour ne pas bloquer la boucle d'événements.
+    """
+
+    def __init__(self, backend: ExtractorBackend, cache: ResultCache, name: str | None = None):
+        self.backend = backend
+        self.cache = cache
+        self.name = name or type(backend).__name__
+        self.version = backend.version
+        self._image_hashes: Dict[Tuple[str, int, int], str] = {}
+        # résultats trouvés par to_extract(), retenus jusqu'à extract() : ils pourraient être évincés entre-temps,
+        # alors que le recadrage de leurs détections n'a pas été chargé
+        self._pinned: Dict[str, dict] = {}
+
+    def image_hash(self, postcard: Postcard) -> str:
+        """Hash des octets de l'image de la carte, mémorisé"""
+        stat = os.stat(postcard.path)
+        memo_key = (postcard.path, stat.st_size, stat.st_mtime_ns)
+        if memo_key not in self._image_hashes:
+            self._image_hashes[memo_key] = file_hash(postcard.path)
+        return self._image_hashes[memo_key]
+
+    def key(self, item: ExtractionItem) -> str:
+        """Clé du résultat d'une détection"""
+        det = item.detection
+        return result_key(self.image_hash(item.postcard), det.bbox, det.get_content_cls(), self.name, self.version)
+
+    def to_extract(self, items: List[ExtractionItem]) -> List[ExtractionItem]:
+        """Seules les détections absentes du cache ont besoin de leur recadrage"""
+        keyed = [(self.key(item), item) for item in self.backend.to_extract(items)]
+        cached = self.cache.get_many(key for key, _ in keyed)
+        self._pinned.update(cached)
+        return [item for key, item in keyed if key not in cached]
+
+    def _cached(self, keys: List[str]) -> Dict[str, dict]:
+        res = {key: self._pinned[key] for key in keys if key in self._pinned}
+        res.update(self.cache.get_many(key for key in keys if key not in res))
+        return res
+
+    async def extract(self, items: List[ExtractionItem]) -> List[dict]:
+        keys = await asyncio.to_thread(lambda: [self.key(item) for item in items])  # hash des images
+        cached = await asyncio.to_thread(self._cached, keys)
+        missing = [i for i, key in enumerate(keys) if key not in cached]
+        if missing:
+            results = await self.backend.extract([items[i] for i in missing])
+            if len(results) != len(missing):
+                raise ValueError(f"backend returned {len(results)} results for {len(missing)} items")
+            new = {keys[i]: result for i, result in zip(missing, results)}
+            await asyncio.to_thread(self.cache.put_many, new)
+            cached.update(new)
+        for key in keys:  # lot traité : les résultats retenus ne sont plus utiles
+            self._pinned.pop(key, None)
+        return [cached[key] for key in keys]
@@ -0,0 +1,316 @@
+from typing import List, Dict, Tuple, Iterable, Iterator, Sequence
+from abc import ABC, abstractmethod
+from array import array
+from pathlib import Path
+import bisect
+import json
+import math
+from t2ia_collection.evaluation import *
+
+# ======================================================================================================================
+# DONNÉES de calibration
+# ======================================================================================================================
+# Une prédiction est correcte si elle est appariée à une annotation manuelle de même classe (cf. evaluation) : les
+# paires (confiance, correcte) de chaque classe servent à ajuster un calibrateur, qui transforme les confiances brutes
+# en probabilités d'être correctes. Seules les cartes ayant au moins une annotation manuelle sont utilisées (sur les
+# autres, toutes les prédictions compteraient comme fausses).
+# Les confiances des contenus extraits (Content.confidence : OCR, lecture des tampons...) sont calibrées de la même
+# façon, avec leurs propres calibrateurs : le contenu d'une prédiction appariée à une annotation manuelle dont le
+# contenu est lui aussi manuel est correct s'il lui est identique (hors confiance et mots-clés, qui en sont déduits).
+
+CalibrationData = Dict[str, Tuple[array, bytearray, int]]  # {classe: (confiances, correctes, nombre d'annotations)}
+DETECTIONS, CONTENTS = 'detections', 'contents'  # confiances calibrées : Detection.confidence ou Content.confidence
+_IGNORED_FIELDS = ('is_manual', 'confidence', 'keywords')
+
+
+def calibration_data(postcards: Iterable[Postcard], iou_threshold: float = 0.5,
+                     workers: int | None = None) -> CalibrationData:
+    """Confiances et correction des prédictions des cartes annotées, par classe"""
+    annotated = (postcard for postcard in postcards if any(det.is_manual for det in postcard.annotations.detections))
+    result = evaluate(annotated, iou_thresholds=(iou_threshold,), workers=workers)
+    return {cls: (result.confidences.get(cls, array('d')),
+                  result.true_positives[cls][0] if cls in result.true_positives else bytearray(),
+                  result.n_gt.get(cls, 0))
+            for cls in result.classes()}
+
+
+def is_extracted(content: Content) -> bool:
+    """Vérifie si le contenu a été extrait automatiquement (avec une confiance)"""
+    return content.is_manual is False and content.confidence is not None
+
+
+def _content_fields(content: Content) -> dict:
+    return {key: value for key, value in content.to_dict().items() if key not in _IGNORED_FIELDS}
+
+
+def content_calibration_data(postcards: Iterable[Postcard], iou_threshold: float = 0.5) -> CalibrationData:
+    """
+    Confiances et correction des contenus extraits des prédictions appariées à une annotation manuelle dont le contenu
+    est manuel, par classe (cf. evaluation.match_detections()) ; le nombre d'annotations est celui des contenus
+    corrects, si bien que le rappel des balayages est la part des contenus corrects conservés
+    """
+    res: Dict[str, Tuple[array, bytearray]] = {}
+    for postcard in postcards:
+        for pred, gt in match_detections(postcard, iou_threshold):
+            if gt is not None and gt.content.is_manual and is_extracted(pred.content):
+                confidences, labels = res.setdefault(pred.get_content_cls(), (array('d'), bytearray()))
+                confidences.append(pred.content.confidence)
+                labels.append(_content_fields(pred.content) == _content_fields(gt.content))
+    return {cls: (confidences, labels, sum(labels)) for cls, (confidences, labels) in res.items()}
+
+
+def _calibrated(postcards: Iterable[Postcard], target: str) -> Iterator[Tuple[str, Detection | Content]]:
+    """(classe, objet) des confiances à calibrer : prédictions (DETECTIONS) ou contenus extraits (CONTENTS)"""
+    if target not in (DETECTIONS, CONTENTS):
+        raise ValueError(f"unknown calibration target: {target}")
+    for postcard in postcards:
+        for det in postcard.annotations.detections:
+            if target == DETECTIONS and not det.is_manual:
+                yield det.get_content_cls(), det
+            elif target == CONTENTS and is_extracted(det.content):
+                yield det.get_content_cls(), det.content
+
+
+def confidence_columns(postcards: Iterable[Postcard], target: str = DETECTIONS) -> Tuple[List[str], array]:
+    """
+    Colonnes (classes, confiances) des prédictions (ou des contenus extraits, selon target) des cartes, dans l'ordre
+    des cartes et des détections
+    """
+    classes, confidences = [], array('d')
+    for cls, item in _calibrated(postcards, target):
+        classes.append(cls)
+        confidences.append(item.confidence)
+    return classes, confidences
+
+
+# ======================================================================================================================
+# CALIBRATEURS
+# ======================================================================================================================
+
+class Calibrator(ABC):
+    """Classe abstraite pour les calibrateurs de confiances"""
+    method: str = ""
+
+    @abstractmethod
+    def fit(self, confidences: Sequence[float], labels: Sequence[int]) -> "Calibrator":
+        """Ajuste le calibrateur sur des confiances et leurs étiquettes (1 si correcte)"""
+        pass
+
+    @abstractmethod
+    def __call__(self, confidence: float) -> float:
+        """Confiance calibrée"""
+        pass
+
+    def transform(self, confidences: Iterable[float]) -> array:
+        """Colonne de confiances calibrées"""
+        return array('d', map(self, confidences))
+
+    @abstractmethod
+    def to_dict(self) -> dict:
+        pass
+
+    @staticmethod
+    def from_dict(data: dict) -> "Calibrator":
+        """Permet d'instancier le calibrateur à partir d'un dictionnaire, selon sa méthode"""
+        for cls in (IsotonicCalibrator, TemperatureCalibrator):
+            if cls.method == data['method']:
+                return cls._from_dict(data)
+        raise ValueError(f"unknown calibration method: {data['method']}")
+
+
+class IsotonicCalibrator(Calibrator):
+    """Régression isotonique (algorithme pool adjacent violators) : fonction en escalier croissante"""
+    method = "isotonic"
+
+    def __init__(self, thresholds: Sequence[float] = (), values: Sequence[float] = ()):
+        self.thresholds = array('d', thresholds)  # borne supérieure des confiances de chaque palier
+        self.values = array('d', values)
+
+    def fit(self, confidences: Sequence[float], labels: Sequence[int]) -> "IsotonicCalibrator":
+        blocks = []  # paliers : [somme des étiquettes, effectif, confiance maximale]
+        for i in sorted(range(len(confidences)), key=lambda i: confidences[i]):
+            blocks.append([float(labels[i]), 1, confidences[i]])
+            while len(blocks) > 1 and blocks[-2][0] * blocks[-1][1] >= blocks[-1][0] * blocks[-2][1]:
+                total, weight, upper = blocks.pop()
+                blocks[-1][0] += total
+                blocks[-1][1] += weight
+                blocks[-1][2] = upper
+        self.thresholds = array('d', [upper for _, _, upper in blocks])
+        self.values = array('d', [total / weight for total, weight, _ in blocks])
+        return self
+
+    def __call__(self, confidence: float) -> float:
+        if not self.values:
+            return confidence
+        return self.values[min(bisect.bisect_left(self.thresholds, confidence), len(self.values) - 1)]
+
+    def to_dict(self) -> dict:
+        return {'method': self.method, 'thresholds': list(self.thresholds), 'values': list(self.values)}
+
+    @staticmethod
+    def _from_dict(data: dict) -> "IsotonicCalibrator":
+        return IsotonicCalibrator(data['thresholds'], data['values'])
+
+
+class TemperatureCalibrator(Calibrator):
+    """Mise à l'échelle de température : sigmoïde(logit(confiance) / température)"""
+    method = "temperature"
+    EPSILON = 1e-6
+
+    def __init__(self, temperature: float = 1.):
+        self.temperature = temperature
+
+    @classmethod
+    def _logit(cls, confidence: float) -> float:
+        confidence = min(1 - cls.EPSILON, max(cls.EPSILON, confidence))
+        return math.log(confidence / (1 - confidence))
+
+    @staticmethod
+    def _nll(inverse_temperature: float, logits: List[float], labels: Sequence[int]) -> float:
+        """Log-vraisemblance négative (convexe en l'inverse de la température)"""
+        res = 0.
+        for logit, label in zip(logits, labels):
+            z = inverse_temperature * logit
+            # log(1 + exp(-z)) pour une étiquette 1, log(1 + exp(z)) pour 0, calculés de façon stable
+            z = z if label else -z
+            res += math.log1p(math.exp(-z)) if z > 0 else -z + math.log1p(math.exp(z))
+        return res
+
+    def fit(self, confidences: Sequence[float], labels: Sequence[int]) -> "TemperatureCalibrator":
+        logits = [self._logit(confidence) for confidence in confidences]
+        # recherche par section dorée de l'inverse de la température, sur une échelle logarithmique
+        low, high = math.log(1e-2), math.log(1e2)
+        ratio = (math.sqrt(5) - 1) / 2
+        for _ in range(60):
+            a, b = high - ratio * (high - low), low + ratio * (high - low)
+            if self._nll(math.exp(a), logits, labels) < self._nll(math.exp(b), logits, labels):
+                high = b
+            else:
+                low = a
+        self.temperature = 1 / math.exp((low + high) / 2)
+        return self
+
+    def __call__(self, confidence: float) -> float:
+        return 1 / (1 + math.exp(-self._logit(confidence) / self.temperature))
+
+    def to_dict(self) -> dict:
+        return {'method': self.method, 'temperature': self.temperature}
+
+    @staticmethod
+    def _from_dict(data: dict) -> "TemperatureCalibrator":
+        return TemperatureCalibrator(data['temperature'])
+
+
+# ======================================================================================================================
+# CALIBRATION par classe
+# ======================================================================================================================
+
+class Calibration:
+    """
+    Calibrateurs par classe de contenu ; les confiances des classes sans calibrateur sont inchangées. Les confiances
+    des détections et celles des contenus extraits ont chacune leur calibration (ajustée sur calibration_data() ou
+    content_calibration_data(), et appliquée avec target=DETECTIONS ou CONTENTS).
+    """
+
+    def __init__(self, calibrators: Dict[str, Calibrator] | None = None):
+        self.calibrators = calibrators if calibrators is not None else {}
+
+    @staticmethod
+    def fit(data: CalibrationData, method: str = IsotonicCalibrator.method, min_samples: int = 20) -> "Calibration":
+        """Ajuste un calibrateur par classe ayant au moins min_samples prédictions (cf. calibration_data())"""
+        calibrator_cls = {cls.method: cls for cls in (IsotonicCalibrator, TemperatureCalibrator)}.get(method)
+        if calibrator_cls is None:
+            raise ValueError(f"unknown calibration method: {method}")
+        return Calibration({cls: calibrator_cls().fit(confidences, labels)
+                            for cls, (confidences, labels, _) in data.items() if len(confidences) >= min_samples})
+
+    def transform(self, classes: Sequence[str], confidences: Sequence[float]) -> array:
+        """Colonne de confiances calibrées, à partir des colonnes (classes, confiances)"""
+        res = array('d', confidences)
+        for i, (cls, confidence) in enumerate(zip(classes, confidences)):
+            calibrator = self.calibrators.get(cls)
+            if calibrator is not None:
+                res[i] = calibrator(confidence)
+        return res
+
+    def apply(self, collection: CardCollection, inplace: bool = False, target: str = DETECTIONS):
+        """
+        Remplace les confiances des prédictions (ou des contenus extraits, selon target) de la collection par leurs
+        valeurs calibrées
+        """
+        res = collection if inplace else CardCollection({name: postcard.copy()
+                                                         for name, postcard in collection.postcards.items()})
+        calibrated = iter(self.transform(*confidence_columns(res, target)))
+        for _, item in _calibrated(res, target):
+            item.confidence = next(calibrated)
+            item.mark_modified()
+        return None if inplace else res
+
+    # pour exporter/importer :
+    # ------------------------
+    def to_dict(self) -> dict:
+        return {cls: calibrator.to_dict() for cls, calibrator in self.calibrators.items()}
+
+    @staticmethod
+    def from_dict(data: dict) -> "Calibration":
+        return Calibration({cls: Calibrator.from_dict(calibrator) for cls, calibrator in data.items()})
+
+    def save(self, file_path: str | Path):
+        with open(file_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f)
+
+    @staticmethod
+    def load(file_path: str | Path) -> "Calibration":
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return Calibration.from_dict(json.load(f))
+
+
+# ======================================================================================================================
+# BALAYAGE des seuils
+# ======================================================================================================================
+
+class ThresholdSweep:
+    """
+    Compromis précision/rappel d'une classe en fonction du seuil de confiance. Les confiances sont triées une fois et
+    les vrais positifs cumulés : la précision et le rappel à un seuil quelconque s'obtiennent ensuite par dichotomie.
+    """
+
+    def __init__(self, confidences: Sequence[float], labels: Sequence[int], n_gt: int):
+        order = sorted(range(len(confidences)), key=lambda i: confidences[i])
+        self.confidences = array('d', [confidences[i] for i in order])  # croissantes
+        self.n_gt = n_gt
+        # vrais positifs parmi les prédictions d'indice >= i (confiance >= self.confidences[i])
+        self.cum_tp = array('q', bytes(8 * (len(order) + 1)))
+        for k in range(len(order) - 1, -1, -1):
+            self.cum_tp[k] = self.cum_tp[k + 1] + bool(labels[order[k]])
+
+    @staticmethod
+    def from_data(data: CalibrationData) -> Dict[str, "ThresholdSweep"]:
+        """Balayages par classe (cf. calibration_data())"""
+        return {cls: ThresholdSweep(confidences, labels, n_gt) for cls, (confidences, labels, n_gt) in data.items()}
+
+    def at(self, threshold: float) -> Tuple[float, float, int]:
+        """(précision, rappel, nombre de prédictions conservées) au seuil (confiance >= seuil)"""
+        start = bisect.bisect_left(self.confidences, threshold)
+        kept = len(self.confidences) - start
+        tp = self.cum_tp[start]
+        return (tp / kept if kept else 1.), (tp / self.n_gt if self.n_gt else 0.), kept
+
+    def sweep(self, thresholds: Iterable[float] | None = None) -> List[Tuple[float, float, float, float, int]]:
+        """(seuil, précision, rappel, F1, conservées) pour chaque seuil (par défaut 0, 0.01, ..., 1)"""
+        thresholds = thresholds if thresholds is not None else (i / 100 for i in range(101))
+        res = []
+        for threshold in thresholds:
+            precision, recall, kept = self.at(threshold)
+            f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.
+            res.append((threshold, precision, recall, f1, kept))
+        return res
+
+    def best_threshold(self, min_precision: float | None = None) -> float:
+        """Seuil maximisant le F1, ou le rappel sous contrainte de précision minimale, parmi les confiances observées"""
+        best, best_score = 1., -1.
+        for threshold, precision, recall, f1, kept in self.sweep(sorted(set(self.confidences))):
+            score = f1 if min_precision is None else (recall if precision >= min_precision else -1.)
+            if score > best_score:
+                best, best_score = threshold, score
+        return best
@@ -1,5 +1,236 @@
 from dataclasses import dataclass, field
-from typing import List, Dict, Tuple, Optional
+from typing import List, Dict, Tuple, Optional, Iterator, Iterable, Callable
 import json
+import math
 from pathlib import Path
 
+from abc import ABC, abstractmethod
+from enum import StrEnum
+from t2ia_collection.validation import *
+
+# ======================================================================================================================
+# COLLECTION Abstract Class
+# ======================================================================================================================
+
+class Collection(ABC):
+    """Classe abstraite pour les collections"""
+
+    @property
+    @abstractmethod
+    def items(self) -> dict:
+        """Dictionnaire des éléments de la collection"""
+        pass
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def __contains__(self, key) -> bool:
+        return key in self.items
+
+    def __getitem__(self, key):
+        return self.items[key]
+
+    def __iter__(self) -> Iterator:
+        """iteration sur les éléments de la collection"""
+        return iter(self.items.values())
+
+    @abstractmethod
+    def save(self, file_path: str | Path):
+        """Sauvegarde la collection"""
+        pass
+
+    @classmethod
+    @abstractmethod
+    def load(cls, file_path: str | Path) -> "Collection":
+        """Charge une collection"""
+        pass
+
+    @abstractmethod
+    def filter(self, criteria: Callable) -> "Collection":
+        """Renvoie une nouvelle collection avec les éléments vérifiant le critère"""
+        pass
+
+
+# ======================================================================================================================
+# CARD COLLECTION
+# ======================================================================================================================
+
+class ChangeType(StrEnum):
+    """Enumération des modifications d'une carte depuis la dernière sauvegarde"""
+    ADDED = 'added'
+    UPDATED = 'updated'
+    REMOVED = 'removed'
+
+    def __repr__(self) -> str:
+        return str(self.value)
+
+
+@dataclass
+class CardCollection(Collection):
+    """
+    Collection de cartes postales indexées par leur nom. Les cartes modifiées depuis la dernière sauvegarde sont
+    connues par changes() : ajouts et suppressions sont journalisés par la collection, et les modifications des cartes
+    sont repérées par leur compteur de version (Postcard.version), comparé à celui de la dernière sauvegarde.
+    """
+    postcards: Dict[str, Postcard] = field(default_factory=dict)
+    _changes: Dict[str, ChangeType] = field(default_factory=dict, repr=False, compare=False)  # journal
+    _saved_versions: Dict[str, int] = field(default_factory=dict, repr=False, compare=False)  # à la sauvegarde
+
+    def __post_init__(self):
+        for name in self.postcards:
+            self._log(name)
+
+    @property
+    def items(self) -> Dict[str, Postcard]:
+        return self.postcards
+
+    def add(self, postcard: Postcard, merge: bool = False):
+        """Ajoute une carte à la collection. Si une carte du même nom existe déjà, ses détections sont complétées
+        par celles de la nouvelle carte si merge, sinon elle est remplacée."""
+        if merge and postcard.name in self.postcards:
+            self.postcards[postcard.name].annotations.detections.extend(postcard.annotations.detections)
+        else:
+            self.postcards[postcard.name] = postcard
+        self._log(postcard.name)
+
+    def update(self, postcards: Iterable[Postcard], merge: bool = False):
+        """Ajoute plusieurs cartes à la collection"""
+        for postcard in postcards:
+            self.add(postcard, merge=merge)
+
+    def remove(self, name: str) -> Postcard:
+        """Retire une carte de la collection et la renvoie"""
+        res = self.postcards.pop(name)
+        self._log(name, removed=True)
+        return res
+
+    # Le suivi des modifications :
+    # ----------------------------
+    def _log(self, name: str, removed: bool = False):
+        """Journalise l'ajout, le remplacement ou la suppression d'une carte"""
+        if name in self._saved_versions:
+            self._changes[name] = ChangeType.REMOVED if removed else ChangeType.UPDATED
+        elif removed:
+            self._changes.pop(name, None)  # ajoutée puis retirée depuis la sauvegarde : rien à faire
+        else:
+            self._changes[name] = ChangeType.ADDED
+
+    def changes(self) -> Dict[str, ChangeType]:
+        """Cartes ajoutées, modifiées ou retirées depuis la dernière sauvegarde (ou le dernier mark_clean())"""
+        res = dict(self._changes)
+        for name, postcard in self.postcards.items():
+            if name not in res and self._saved_versions.get(name) != postcard.version:
+                res[name] = ChangeType.UPDATED
+        return res
+
+    def changed(self) -> "CardCollection":
+        """Cartes ajoutées ou modifiées depuis la dernière sauvegarde (sans copie des cartes)"""
+        changes = self.changes()
+        return self.filter(lambda postcard: postcard.name in changes)
+
+    def isdirty(self) -> bool:
+        """Vérifie si la collection a été modifiée depuis la dernière sauvegarde"""
+        return bool(self.changes())
+
+    def mark_clean(self):
+        """Considère l'état courant comme sauvegardé"""
+        self._changes.clear()
+        self._saved_versions = {name: postcard.version for name, postcard in self.postcards.items()}
+
+    # pour exporter/importer :
+    # ------------------------
+    def to_dict(self, full: bool = True) -> dict:
+        """Renvoie un dictionnaire {nom: carte}"""
+        return {name: postcard.to_dict(full=full) for name, postcard in self.postcards.items()}
+
+    @staticmethod
+    def from_dict(data: dict) -> "CardCollection":
+        """Permet d'instancier la classe à partir d'un dictionnaire ; les détections de toutes les cartes sont validées
+        en un seul lot (cf. validation.BatchValidator) et toutes les erreurs sont signalées ensemble"""
+        return CardCollection(BatchValidator(check_bboxes=False).build_postcards(data))
+
+    def save(self, file_path: str | Path, full: bool = True):
+        """Sauvegarde la collection au format json"""
+        with open(file_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(full=full), f, ensure_ascii=False)
+        self.mark_clean()
+
+    @classmethod
+    def load(cls, file_path: str | Path) -> "CardCollection":
+        """Charge une collection depuis un fichier json"""
+        with open(file_path, 'r', encoding='utf-8') as f:
+            res = cls.from_dict(json.load(f))
+        res.mark_clean()
+        return res
+
+    def save_annotations(self, full: bool = True, only_changed: bool = True) -> List[str]:
+        """Sauvegarde les annotations de chaque carte à côté de son image (cf. Postcard.save_annotations), seulement
+        pour les cartes ajoutées ou modifiées depuis la dernière sauvegarde si only_changed. Renvoie les noms des
+        cartes sauvegardées."""
+        postcards = self.changed() if only_changed else self
+        for postcard in postcards:
+            postcard.save_annotations(full=full)
+        self.mark_clean()
+        return [postcard.name for postcard in postcards]
+
+    # Les filtres :
+    # -------------
+    def filter(self, criteria: Callable[[Postcard], bool]) -> "CardCollection":
+        """Renvoie une nouvelle collection (sans copie des cartes) avec les cartes vérifiant le critère"""
+        return CardCollection({name: postcard for name, postcard in self.postcards.items() if criteria(postcard)})
+
+    def filter_by_tags(self, tags: Iterable[str]) -> "CardCollection":
+        """Cartes possédant au moins un des tags"""
+        tags = set(tags)
+        return self.filter(lambda postcard: not tags.isdisjoint(postcard.annotations.tags))
+
+    def filter_by_keywords(self, keywords: Iterable[str]) -> "CardCollection":
+        """Cartes possédant au moins un des mots-clés (de la carte ou de ses textes)"""
+        keywords = set(keywords)
+        return self.filter(lambda postcard: not keywords.isdisjoint(postcard.annotations.get_keywords()))
+
+    def _filter_by_location(self, attribute: str, value: str) -> "CardCollection":
+        """Cartes dont l'attribut de localisation correspond à la valeur (sans tenir compte de la casse)"""
+        value = value.casefold()
+        matches: Dict[str, bool] = {}  # une comparaison par valeur distincte (valeurs partagées, cf. interning)
+
+        def criteria(postcard: Postcard) -> bool:
+            location_value = getattr(postcard.annotations.location, attribute) or ""
+            if location_value not in matches:
+                matches[location_value] = location_value.casefold() == value
+            return matches[location_value]
+        return self.filter(criteria)
+
+    def filter_by_town(self, town: str) -> "CardCollection":
+        """Cartes d'une ville"""
+        return self._filter_by_location('town', town)
+
+    def filter_by_department(self, department: str) -> "CardCollection":
+        """Cartes d'un département"""
+        return self._filter_by_location('department', department)
+
+    def filter_by_region(self, region: str) -> "CardCollection":
+        """Cartes d'une région"""
+        return self._filter_by_location('region', region)
+
+    def filter_by_distance(self, gps: Tuple[float, float], radius: float, index=None) -> "CardCollection":
+        """Cartes localisées à moins de radius km du point (latitude, longitude). Avec un index géographique sur les
+        cartes (cf. spatial.GeoIndex), seules les cartes proches sont examinées."""
+        if index is not None:
+            names = {name for _, name in index.within_radius(gps, radius)}
+            return self.filter(lambda postcard: postcard.name in names)
+
+        def criteria(postcard: Postcard) -> bool:
+            distance = postcard.annotations.location.distance(gps)  # None sans coordonnées, 0. au point lui-même
+            return distance is not None and distance <= radius
+        return self.filter(criteria)
+
+    def filter_by_area(self, lat_min: float, lon_min: float, lat_max: float, lon_max: float,
+                       index=None) -> "CardCollection":
+        """Cartes localisées dans un rectangle de coordonnées (lon_min > lon_max s'il traverse l'antiméridien),
+        éventuellement à l'aide d'un index géographique (cf. spatial.GeoIndex)"""
+        if index is not None:
+            names = set(index.within_area(lat_min, lon_min, lat_max, lon_max))
+            return self.filter(lambda postcard: postcard.name in names)
+        return self.filter(lambda postcard: postcard.annotations.location.gps is not None and
+                           in_area(postcard.annotations.location.gps, lat_min, lon_min, lat_max, lon_max))
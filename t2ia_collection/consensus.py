@@ -0,0 +1,126 @@
+from typing import List, Dict, Tuple, Iterable, Iterator, Sequence
+from t2ia_collection.collection import *
+from t2ia_collection.parallel import chunks, bounded_map
+
+# ======================================================================================================================
+# FUSION des détections
+# ======================================================================================================================
+# Plusieurs jeux de détections d'une même carte (annotations manuelles, sorties de plusieurs versions d'un détecteur)
+# sont fusionnés en un seul. Les annotations manuelles font autorité : elles sont conservées telles quelles et les
+# prédictions qui les recouvrent sont écartées. Les prédictions restantes sont regroupées par IoU, toutes classes
+# confondues, autour de la plus confiante de chaque groupe ; chaque groupe donne une détection dont la bbox est la
+# moyenne des bbox pondérée par les confiances (weighted box fusion) et dont la classe de contenu est votée.
+
+def _confidence(det: Detection, weight: float = 1.) -> float:
+    return weight * (det.confidence if det.confidence is not None else 1.)
+
+
+def fuse_detections(detection_sets: Sequence[Sequence[Detection]], iou_threshold: float = 0.55,
+                    weights: Sequence[float] | None = None, skip_threshold: float = 0.) -> List[Detection]:
+    """
+    Fusionne plusieurs jeux de détections d'une même carte : annotations manuelles d'abord (dans leur ordre), puis
+    détections fusionnées par confiance décroissante. La confiance d'une détection fusionnée est la moyenne des
+    confiances de son groupe, pondérée par la part des jeux de prédictions qui y contribuent. weights pondère les jeux
+    (par ex. selon la fiabilité de chaque détecteur) ; les prédictions de confiance inférieure à skip_threshold sont
+    ignorées.
+    """
+    weights = list(weights) if weights is not None else [1.] * len(detection_sets)
+    if len(weights) != len(detection_sets):
+        raise ValueError("weights and detection_sets must have the same length")
+    manual, preds = [], []  # prédictions : (confiance pondérée, indice du jeu, détection)
+    for source, (detections, weight) in enumerate(zip(detection_sets, weights)):
+        for det in detections:
+            if det.is_manual:
+                manual.append(det)
+            elif _confidence(det) >= skip_threshold:
+                preds.append((_confidence(det, weight), source, det))
+    preds.sort(key=lambda item: -item[0])
+    res = [det.copy() for det in manual]
+    if not preds:
+        return res
+    n_sources = len({source for _, source, _ in preds})
+
+    # IoU des prédictions entre elles et avec les annotations manuelles, calculées en une fois
+    bboxes = BoundingBoxArray.from_bboxes(det.bbox for _, _, det in preds)
+    iou = bboxes.iou(bboxes)
+    manual_iou = bboxes.iou(BoundingBoxArray.from_bboxes(det.bbox for det in manual)) if manual else None
+
+    assigned = bytearray(len(preds))
+    for i in range(len(preds)):
+        if assigned[i]:
+            continue
+        if manual_iou is not None and max(manual_iou[i]) >= iou_threshold:
+            assigned[i] = True  # couverte par une annotation manuelle
+            continue
+        cluster = [j for j in range(i, len(preds)) if not assigned[j] and iou[i][j] >= iou_threshold and
+                   (manual_iou is None or max(manual_iou[j]) < iou_threshold)]
+        for j in cluster:
+            assigned[j] = True
+        res.append(_fuse_cluster([preds[j] for j in cluster], n_sources))
+    return res
+
+
+def _fuse_cluster(cluster: List[Tuple[float, int, Detection]], n_sources: int) -> Detection:
+    """Détection issue d'un groupe de prédictions (triées par confiance décroissante)"""
+    total = sum(confidence for confidence, _, _ in cluster)
+    coords = [0.] * 4
+    votes: Dict[str, float] = {}
+    for confidence, _, det in cluster:
+        for k, coord in enumerate(det.bbox.xyxyn()):
+            coords[k] += confidence * coord
+        votes[det.get_content_cls()] = votes.get(det.get_content_cls(), 0.) + confidence
+    coords = [coord / total for coord in coords] if total > 0 else list(cluster[0][2].bbox.xyxyn())
+    content_cls = max(votes, key=lambda cls: votes[cls])  # à égalité, la classe la plus confiante (vue en premier)
+    best = next(det for _, _, det in cluster if det.get_content_cls() == content_cls)
+    n_contributing = len({source for _, source, _ in cluster})
+    confidence = total / len(cluster) * min(n_contributing, n_sources) / n_sources
+    return Detection(bbox=BoundingBox.from_coords(coords, CoordFormat.XYXYN),
+                     is_manual=False,
+                     confidence=min(1., confidence),
+                     content=best.content.copy())
+
+
+# ======================================================================================================================
+# FUSION des collections
+# ======================================================================================================================
+
+def merge_postcards(postcards: Sequence[Postcard], iou_threshold: float = 0.55,
+                    weights: Sequence[float] | None = None, skip_threshold: float = 0.) -> Postcard:
+    """Fusionne plusieurs versions d'une même carte : les annotations de la première version (localisation, tags...)
+    sont conservées, avec les détections fusionnées de toutes les versions"""
+    res = postcards[0].copy()
+    res.annotations.set_detections(fuse_detections([postcard.annotations.detections for postcard in postcards],
+                                                   iou_threshold, weights, skip_threshold), inplace=True)
+    return res
+
+
+def _merge_chunk(chunk: List[Tuple[List[Postcard], List[float]]], iou_threshold: float,
+                 skip_threshold: float) -> List[Postcard]:
+    """Fusion d'un lot de cartes (exécutée dans un processus de travail)"""
+    return [merge_postcards(postcards, iou_threshold, weights, skip_threshold) for postcards, weights in chunk]
+
+
+def merge_collections(collections: Sequence[CardCollection], iou_threshold: float = 0.55,
+                      weights: Sequence[float] | None = None, skip_threshold: float = 0.,
+                      workers: int | None = None, chunk_size: int = 256) -> CardCollection:
+    """
+    Fusionne plusieurs collections (une par annotateur ou par détecteur) carte par carte, dans l'ordre de la première
+    collection puis des cartes absentes de celle-ci. Les cartes sont fusionnées par lots dans un pool de processus
+    (workers=0 pour fusionner dans le processus courant).
+    """
+    weights = list(weights) if weights is not None else [1.] * len(collections)
+    if len(weights) != len(collections):
+        raise ValueError("weights and collections must have the same length")
+    names = list(dict.fromkeys(name for collection in collections for name in collection.postcards))
+
+    def items() -> Iterator[Tuple[List[Postcard], List[float]]]:
+        for name in names:
+            present = [(collection[name], weight) for collection, weight in zip(collections, weights)
+                       if name in collection]
+            yield [postcard for postcard, _ in present], [weight for _, weight in present]
+
+    res = CardCollection()
+    for merged in bounded_map(_merge_chunk, chunks(items(), chunk_size), iou_threshold, skip_threshold,
+                              workers=workers):
+        res.update(merged)
+    return res
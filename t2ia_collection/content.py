@@ -1,7 +1,8 @@
 from abc import ABC, abstractmethod
 from dataclasses import dataclass, field
 from collections.abc import Sequence
-from typing import List, Iterator, Set, Callable, LiteralString, SupportsIndex
+from typing import List, Dict, Iterator, Iterable, Set, Callable, LiteralString, SupportsIndex, Any
+from array import array
 from enum import StrEnum, IntEnum
 from copy import deepcopy
 import re
@@ -18,6 +19,8 @@ class Content(ABC):
     """Classe abstraite pour toutes les autres formes de contenu text et marque postales"""
     is_manual: bool | None = None
     confidence: float | None = None
+    # compteur de modifications (cf. CardCollection.changes()), ignoré par les comparaisons :
+    _version: int = field(default=0, repr=False, compare=False, kw_only=True)
 
     def __post_init__(self):
         """Vérification de la présence d'un score de confiance si contenu non annoté manuellement"""
@@ -35,6 +38,17 @@ class Content(ABC):
         """retourne une copie de l'instance"""
         return deepcopy(self)
 
+    # Le suivi des modifications :
+    # ----------------------------
+    @property
+    def version(self) -> int:
+        """Nombre de modifications du contenu"""
+        return self._version
+
+    def mark_modified(self):
+        """Signale une modification du contenu (appelé par les méthodes qui le modifient)"""
+        self._version += 1
+
     # Les tests :
     # -----------
     def isprocessed(self) -> bool:
@@ -53,7 +67,8 @@ class Content(ABC):
 
     def _to_full_dict(self) -> dict:
         """Renvoie un dictionnaire avec la totalité du contenu de la classe, sauf les attributs privés ou protégés"""
-        return self.__dict__
+        # une copie : les sous-classes la modifient, et les attributs privés (dont _version) ne sont pas exportés
+        return {key: value for key, value in self.__dict__.items() if key[0] != "_"}
 
     @classmethod
     def from_dict(cls, data: dict) -> "Content":
@@ -123,6 +138,7 @@ class Content(ABC):
         res.confidence = confidence
 
         res.__post_init__()  # pour les vérifs
+        res.mark_modified()
         return None if inplace else res
 
 
@@ -142,24 +158,62 @@ class Orientation(IntEnum):
         return str(self.value)
 
     @staticmethod
-    def from_input(theta: int | float | str | None) -> "Orientation":
-        """Orientation à partir d'un input correspondant à un angle multiple de 90°"""
+    def quarter_turn(theta: int | float | str | None) -> int:
+        """Nombre de quarts de tour (0 à 3) d'un angle multiple de 90°, à ORIENTATION_ATOL près (les angles issus des
+        modèles de redressement, comme 89.9999, sont ramenés au multiple le plus proche)"""
         # si theta est None == 0
         if theta is None:
-            theta = Orientation.ZERO
-        # Test de la validité de l'angle
+            return 0
         try:
-            # normalisation de l'angle
-            theta = float(theta) % 360
-            round(theta / 90) * 90 % 360
-            theta = Orientation(theta)
-        except Exception as e:
-            if type(e) is ValueError:
-                raise ValueError(f"theta must be an angle in degrees, multiple of 90°")
-            elif type(e) is TypeError:
-                raise TypeError(f"theta must be a int, str, float, None or {Orientation.__module__}.{Orientation.__name__}")
+            theta = float(theta)
+        except ValueError:
+            raise ValueError(f"theta must be an angle in degrees, multiple of 90°")
+        except TypeError:
+            raise TypeError(f"theta must be a int, str, float, None or {Orientation.__module__}.{Orientation.__name__}")
+        if not math.isfinite(theta):
+            raise ValueError(f"theta must be an angle in degrees, multiple of 90°")
+        quarter = round(theta / 90)
+        if abs(theta - 90 * quarter) > ORIENTATION_ATOL:
+            raise ValueError(f"theta must be an angle in degrees, multiple of 90°")
+        return quarter % 4
 
-        return Orientation(theta)
+    @staticmethod
+    def from_input(theta: int | float | str | None) -> "Orientation":
+        """Orientation à partir d'un input correspondant à un angle multiple de 90°. Les inputs déjà rencontrés sont
+        résolus par une table."""
+        if isinstance(theta, Orientation):
+            return theta
+        try:
+            return _ORIENTATION_TABLE[theta]
+        except KeyError:
+            res = _QUARTER_TURNS[Orientation.quarter_turn(theta)]
+            if len(_ORIENTATION_TABLE) < _ORIENTATION_TABLE_SIZE:
+                _ORIENTATION_TABLE[theta] = res
+            return res
+        except TypeError:  # input non hashable
+            return _QUARTER_TURNS[Orientation.quarter_turn(theta)]
+
+    @staticmethod
+    def from_inputs(thetas: Iterable[int | float | str | None]) -> List["Orientation"]:
+        """Orientations d'un lot d'angles"""
+        return [Orientation.from_input(theta) for theta in thetas]
+
+    @staticmethod
+    def quarter_turns(thetas: Iterable[int | float | str | None]) -> array:
+        """Colonne des nombres de quarts de tour (codes 0 à 3, cf. quarter_turn()) d'un lot d'angles"""
+        return array('b', (Orientation.from_input(theta).value // 90 for theta in thetas))
+
+    @staticmethod
+    def from_quarter_turns(codes: Iterable[int]) -> List["Orientation"]:
+        """Orientations à partir d'une colonne de quarts de tour"""
+        return [_QUARTER_TURNS[code % 4] for code in codes]
+
+
+ORIENTATION_ATOL = 1e-3  # tolérance en degrés autour des multiples de 90°
+_QUARTER_TURNS = tuple(Orientation)  # orientation par nombre de quarts de tour
+# table des inputs déjà rencontrés (bornée, les angles flottants pouvant être tous différents) :
+_ORIENTATION_TABLE: Dict[Any, Orientation] = {None: Orientation.ZERO}
+_ORIENTATION_TABLE_SIZE = 1 << 16
 
 
 @dataclass
@@ -220,6 +274,7 @@ class Text(Content):
 
         # nouvelle orientation
         res.orientation = Orientation.from_input(res.orientation.value - theta.value)
+        res.mark_modified()
 
         return None if inplace else res
 
@@ -251,9 +306,7 @@ class Text(Content):
         else:
             ocr_result = preprocessing(res.ocr_result)  # TODO : voir comment se débarrasser des caractères spéciaux
         # découpage
-        res._word_list = ocr_result.split(sep=sep, maxsplit=maxsplit)
-
-        res.__post_init__()  # pour les vérifs
+        res._word_list = ocr_result.split(sep=sep, maxsplit=maxsplit)  # pas de vérifs : seul _word_list est modifié
         return  None if inplace else res
 
     def lemmatize(self, lemmatizer: Callable | None = None, preprocessing: Callable | None = None,
@@ -275,8 +328,7 @@ class Text(Content):
             res._lemmas = [word.lower() for word in res._word_list]
         else:
             res._lemmas = lemmatizer(res._word_list)  # TODO : implémenter la lemmatisation
-
-        res.__post_init__()  # pour les vérifs
+        # pas de vérifs : seul _lemmas est modifié
         return  None if inplace else res
 
     def set_keywords(self, ref_keywords: Set[str] | None = None, lemmatizer: Callable | None = None,
@@ -294,9 +346,8 @@ class Text(Content):
         # lemmatisation
         if ref_keywords is None:
             ref_keywords = set()
-        res.keywords = ref_keywords & set(res._lemmas)
-
-        res.__post_init__()  # pour les vérifs
+        res.keywords = ref_keywords & set(res._lemmas)  # toujours un set, pas de vérifs à refaire
+        res.mark_modified()
         return  None if inplace else res
 
 
@@ -315,6 +366,7 @@ class PrintedText(Text):
         """Permet de spécifier si un text correspond à l'éditeur ou non"""
         res = self if inplace else self.copy()
         res.is_editor = is_editor
+        res.mark_modified()
         return None if inplace else res
 
 
@@ -469,6 +521,7 @@ class DateStamp(Postmark):
                 res.__dict__[key] = kwargs[key]
 
         res.__post_init__()  # pour les vérifs
+        res.mark_modified()
         return None if inplace else res
 
 
@@ -494,4 +547,5 @@ class OtherMark(Postmark):
         """Permet de spécifier si un text correspond à l'éditeur ou non"""
         res = self if inplace else self.copy()
         res.is_editor = is_editor
+        res.mark_modified()
         return None if inplace else res
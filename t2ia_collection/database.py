@@ -0,0 +1,330 @@
+from typing import List, Dict, Tuple, Iterable, Iterator, Callable, Any
+from pathlib import Path
+import json
+import sqlite3
+from t2ia_collection.collection import *
+
+# ======================================================================================================================
+# SCHÉMA
+# ======================================================================================================================
+# Stockage d'une collection dans une base SQLite normalisée : une table par niveau du modèle (localisations partagées,
+# cartes, tags, mots-clés, détections), avec les index des filtres de CardCollection. Les écritures se font par lots
+# (executemany dans une transaction) sur une connexion réutilisée, et la base est en mode WAL : des lecteurs d'autres
+# processus peuvent la lire pendant une écriture.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS locations (
+    id INTEGER PRIMARY KEY,
+    town TEXT, department TEXT, region TEXT, latitude REAL, longitude REAL,
+    -- valeurs sans casse (str.casefold(), qui gère les accents contrairement à COLLATE NOCASE) pour les filtres
+    town_key TEXT, department_key TEXT, region_key TEXT
+);
+CREATE INDEX IF NOT EXISTS locations_town ON locations (town_key);
+CREATE INDEX IF NOT EXISTS locations_department ON locations (department_key);
+CREATE INDEX IF NOT EXISTS locations_region ON locations (region_key);
+CREATE INDEX IF NOT EXISTS locations_gps ON locations (latitude, longitude);
+
+CREATE TABLE IF NOT EXISTS postcards (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    path TEXT NOT NULL,
+    width INTEGER, height INTEGER,
+    rotation INTEGER NOT NULL,
+    location_id INTEGER NOT NULL REFERENCES locations (id)
+);
+CREATE INDEX IF NOT EXISTS postcards_location ON postcards (location_id);
+
+CREATE TABLE IF NOT EXISTS tags (
+    postcard_id INTEGER NOT NULL REFERENCES postcards (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    tag TEXT NOT NULL,
+    PRIMARY KEY (postcard_id, position)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS tags_tag ON tags (tag);
+
+-- mots-clés de la carte (own = 1) et de ses textes (own = 0), cf. Annotations.get_keywords()
+CREATE TABLE IF NOT EXISTS keywords (
+    postcard_id INTEGER NOT NULL REFERENCES postcards (id) ON DELETE CASCADE,
+    keyword TEXT NOT NULL,
+    own INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    PRIMARY KEY (postcard_id, keyword)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS keywords_keyword ON keywords (keyword);
+
+CREATE TABLE IF NOT EXISTS detections (
+    postcard_id INTEGER NOT NULL REFERENCES postcards (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    x REAL NOT NULL, y REAL NOT NULL, w REAL NOT NULL, h REAL NOT NULL,
+    is_manual INTEGER NOT NULL,
+    confidence REAL,
+    content_cls TEXT NOT NULL,
+    content TEXT,
+    PRIMARY KEY (postcard_id, position)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS detections_content_cls ON detections (content_cls);
+"""
+
+
+# ======================================================================================================================
+# COLLECTION SQLite
+# ======================================================================================================================
+
+class SQLiteCollection(Collection):
+    """
+    Collection de cartes postales stockée dans une base SQLite. Les cartes sont reconstruites à la lecture, par lots
+    (cf. validation.BatchValidator) : les filtres sont des requêtes indexées qui renvoient des itérateurs paresseux, et
+    les cartes modifiées doivent être réécrites par add() / upsert().
+    """
+
+    # batch_size : 500 pour rester sous la limite du nombre de paramètres d'une requête
+    def __init__(self, file_path: str | Path = ":memory:", batch_size: int = 500):
+        self.file_path = str(file_path)
+        self.batch_size = batch_size
+        self.connection = sqlite3.connect(self.file_path)
+        self.connection.execute("PRAGMA foreign_keys=ON")
+        if self.file_path != ":memory:":
+            self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(SCHEMA)
+        self.connection.commit()
+        self._validator = BatchValidator(check_bboxes=False)  # chaînes partagées entre les lectures
+        self._location_ids: Dict[tuple, int] = {}
+
+    def __len__(self) -> int:
+        return self.connection.execute("SELECT COUNT(*) FROM postcards").fetchone()[0]
+
+    def __contains__(self, name) -> bool:
+        return self.connection.execute("SELECT 1 FROM postcards WHERE name = ?", (name,)).fetchone() is not None
+
+    def __getitem__(self, name: str) -> Postcard:
+        res = next(self._select("WHERE p.name = ?", (name,)), None)
+        if res is None:
+            raise KeyError(name)
+        return res
+
+    def __iter__(self) -> Iterator[Postcard]:
+        """iteration paresseuse sur les cartes, dans l'ordre d'insertion"""
+        return self._select()
+
+    def __enter__(self) -> "SQLiteCollection":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    @property
+    def items(self) -> Dict[str, Postcard]:
+        """Toutes les cartes, chargées en mémoire"""
+        return {postcard.name: postcard for postcard in self}
+
+    def names(self) -> List[str]:
+        return [name for name, in self.connection.execute("SELECT name FROM postcards ORDER BY id")]
+
+    # écriture :
+    # ----------
+    def _location_id(self, location: Location) -> int:
+        """Identifiant de la localisation, insérée si besoin"""
+        key = (location.town, location.department, location.region,
+               *(location.gps if location.gps is not None else (None, None)))
+        if key not in self._location_ids:
+            row = self.connection.execute(
+                "SELECT id FROM locations WHERE town IS ? AND department IS ? AND region IS ? AND latitude IS ? "
+                "AND longitude IS ?", key).fetchone()
+            if row is None:
+                casefolded = tuple(value.casefold() if value is not None else None for value in key[:3])
+                row = (self.connection.execute(
+                    "INSERT INTO locations (town, department, region, latitude, longitude, town_key, department_key, "
+                    "region_key) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", key + casefolded).lastrowid,)
+            self._location_ids[key] = row[0]
+        return self._location_ids[key]
+
+    def _upsert_batch(self, postcards: List[Postcard], full: bool):
+        connection = self.connection
+        rows = []
+        for postcard in postcards:
+            width, height = postcard.img_size if postcard.img_size is not None else (None, None)
+            rows.append((postcard.name, postcard.path, width, height, postcard.annotations.rotation.value,
+                         self._location_id(postcard.annotations.location)))
+        connection.executemany(
+            "INSERT INTO postcards (name, path, width, height, rotation, location_id) VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (name) DO UPDATE SET path = excluded.path, width = excluded.width, "
+            "height = excluded.height, rotation = excluded.rotation, location_id = excluded.location_id", rows)
+        names = [postcard.name for postcard in postcards]
+        ids = dict(connection.execute(
+            f"SELECT name, id FROM postcards WHERE name IN ({','.join('?' * len(names))})", names).fetchall())
+        id_params = [(ids[name],) for name in names]
+        for table in ('tags', 'keywords', 'detections'):
+            connection.executemany(f"DELETE FROM {table} WHERE postcard_id = ?", id_params)
+
+        tags, keywords, detections = [], [], []
+        for postcard in postcards:
+            postcard_id, annotations = ids[postcard.name], postcard.annotations
+            tags.extend((postcard_id, i, tag) for i, tag in enumerate(annotations.tags))
+            own = {keyword: i for i, keyword in enumerate(annotations.keywords)}
+            keywords.extend((postcard_id, keyword, keyword in own, own.get(keyword, -1))
+                            for keyword in annotations.get_keywords())
+            for i, det in enumerate(annotations.detections):
+                x, y, w, h = det.bbox.xywhn()
+                content = det.to_dict(full=full)['content']
+                detections.append((postcard_id, i, x, y, w, h, det.is_manual, det.confidence, det.get_content_cls(),
+                                   json.dumps(content, ensure_ascii=False) if content is not None else None))
+        connection.executemany("INSERT INTO tags (postcard_id, position, tag) VALUES (?, ?, ?)", tags)
+        connection.executemany("INSERT INTO keywords (postcard_id, keyword, own, position) VALUES (?, ?, ?, ?)",
+                               keywords)
+        connection.executemany("INSERT INTO detections (postcard_id, position, x, y, w, h, is_manual, confidence, "
+                               "content_cls, content) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", detections)
+
+    def upsert(self, postcards: Iterable[Postcard], full: bool = True) -> int:
+        """Insère ou remplace des cartes, par lots de batch_size cartes (une transaction par lot) ; renvoie le nombre
+        de cartes écrites"""
+        batch, n = {}, 0
+        for postcard in postcards:
+            batch[postcard.name] = postcard  # la dernière version d'une carte l'emporte
+            if len(batch) >= self.batch_size:
+                n += self._commit_batch(list(batch.values()), full)
+                batch = {}
+        if batch:
+            n += self._commit_batch(list(batch.values()), full)
+        return n
+
+    def _commit_batch(self, postcards: List[Postcard], full: bool) -> int:
+        """Écrit un lot dans une transaction"""
+        try:
+            with self.connection:
+                self._upsert_batch(postcards, full)
+        except BaseException:
+            self._location_ids.clear()  # les localisations insérées ont été annulées
+            raise
+        return len(postcards)
+
+    def add(self, postcard: Postcard):
+        """Ajoute (ou remplace) une carte"""
+        self.upsert([postcard])
+
+    def remove(self, name: str):
+        """Retire une carte de la collection"""
+        with self.connection:
+            if self.connection.execute("DELETE FROM postcards WHERE name = ?", (name,)).rowcount == 0:
+                raise KeyError(name)
+
+    # lecture :
+    # ---------
+    def _build(self, rows: List[tuple]) -> List[Postcard]:
+        """Cartes à partir de lignes de la table postcards (jointe à locations)"""
+        ids = [row[0] for row in rows]
+        placeholders = ','.join('?' * len(ids))
+        tags: Dict[int, List[str]] = {postcard_id: [] for postcard_id in ids}
+        for postcard_id, tag in self.connection.execute(
+                f"SELECT postcard_id, tag FROM tags WHERE postcard_id IN ({placeholders}) "
+                f"ORDER BY postcard_id, position", ids):
+            tags[postcard_id].append(tag)
+        keywords: Dict[int, List[str]] = {postcard_id: [] for postcard_id in ids}
+        for postcard_id, keyword in self.connection.execute(
+                f"SELECT postcard_id, keyword FROM keywords WHERE postcard_id IN ({placeholders}) AND own "
+                f"ORDER BY postcard_id, position", ids):
+            keywords[postcard_id].append(keyword)
+        detections: Dict[int, List[dict]] = {postcard_id: [] for postcard_id in ids}
+        for postcard_id, x, y, w, h, is_manual, confidence, content in self.connection.execute(
+                f"SELECT postcard_id, x, y, w, h, is_manual, confidence, content FROM detections "
+                f"WHERE postcard_id IN ({placeholders}) ORDER BY postcard_id, position", ids):
+            detections[postcard_id].append({'bbox': {'x': x, 'y': y, 'w': w, 'h': h},
+                                            'is_manual': bool(is_manual),
+                                            'confidence': confidence,
+                                            'content': json.loads(content) if content is not None else None})
+        data = {}
+        for postcard_id, name, path, width, height, rotation, town, department, region, latitude, longitude in rows:
+            data[name] = {'path': path,
+                          'name': name,
+                          'annotations': {'location': {'town': town, 'department': department, 'region': region,
+                                                       'gps': [latitude, longitude] if latitude is not None else None},
+                                          'tags': tags[postcard_id],
+                                          'keywords': keywords[postcard_id],
+                                          'detections': detections[postcard_id],
+                                          'rotation': rotation},
+                          'img_size': [width, height] if width is not None else None}
+        return list(self._validator.build_postcards(data).values())
+
+    def _select(self, where: str = "", params: Iterable[Any] = ()) -> Iterator[Postcard]:
+        """Cartes vérifiant la clause WHERE (sur postcards p et locations l), reconstruites par lots"""
+        cursor = self.connection.execute(
+            f"SELECT p.id, p.name, p.path, p.width, p.height, p.rotation, "
+            f"l.town, l.department, l.region, l.latitude, l.longitude "
+            f"FROM postcards p JOIN locations l ON l.id = p.location_id {where} ORDER BY p.id", tuple(params))
+        while rows := cursor.fetchmany(self.batch_size):
+            yield from self._build(rows)
+
+    # pour exporter/importer :
+    # ------------------------
+    @classmethod
+    def from_collection(cls, collection: Iterable[Postcard], file_path: str | Path = ":memory:",
+                        full: bool = True) -> "SQLiteCollection":
+        """Base à partir d'une collection (ou de n'importe quel itérable de cartes)"""
+        res = cls(file_path)
+        res.upsert(collection, full=full)
+        return res
+
+    def to_collection(self) -> CardCollection:
+        """Collection en mémoire de toutes les cartes"""
+        res = CardCollection(self.items)
+        res.mark_clean()
+        return res
+
+    def save(self, file_path: str | Path):
+        """Sauvegarde une copie cohérente de la base (sauvegarde à chaud de SQLite)"""
+        with sqlite3.connect(str(file_path)) as target:
+            self.connection.backup(target)
+        target.close()
+
+    @classmethod
+    def load(cls, file_path: str | Path) -> "SQLiteCollection":
+        """Ouvre une base existante"""
+        if not Path(file_path).exists():
+            raise FileNotFoundError(file_path)
+        return cls(file_path)
+
+    # Les filtres :
+    # -------------
+    def filter(self, criteria: Callable[[Postcard], bool]) -> CardCollection:
+        """Renvoie une collection en mémoire avec les cartes vérifiant le critère (évalué en Python)"""
+        return CardCollection({postcard.name: postcard for postcard in self if criteria(postcard)})
+
+    def filter_by_tags(self, tags: Iterable[str]) -> Iterator[Postcard]:
+        """Cartes possédant au moins un des tags"""
+        tags = list(set(tags))
+        return self._select(f"WHERE p.id IN (SELECT postcard_id FROM tags WHERE tag IN ({','.join('?' * len(tags))}))",
+                            tags)
+
+    def filter_by_keywords(self, keywords: Iterable[str]) -> Iterator[Postcard]:
+        """Cartes possédant au moins un des mots-clés (de la carte ou de ses textes)"""
+        keywords = list(set(keywords))
+        return self._select(f"WHERE p.id IN (SELECT postcard_id FROM keywords "
+                            f"WHERE keyword IN ({','.join('?' * len(keywords))}))", keywords)
+
+    def _filter_by_location(self, attribute: str, value: str) -> Iterator[Postcard]:
+        """Cartes dont l'attribut de localisation correspond à la valeur (sans tenir compte de la casse)"""
+        return self._select(f"WHERE l.{attribute}_key = ?", (value.casefold(),))
+
+    def filter_by_town(self, town: str) -> Iterator[Postcard]:
+        """Cartes d'une ville"""
+        return self._filter_by_location('town', town)
+
+    def filter_by_department(self, department: str) -> Iterator[Postcard]:
+        """Cartes d'un département"""
+        return self._filter_by_location('department', department)
+
+    def filter_by_region(self, region: str) -> Iterator[Postcard]:
+        """Cartes d'une région"""
+        return self._filter_by_location('region', region)
+
+    def filter_by_gps(self, lat_min: float, lon_min: float, lat_max: float, lon_max: float) -> Iterator[Postcard]:
+        """Cartes localisées dans un rectangle de coordonnées gps, dans l'ordre des arguments de
+        CardCollection.filter_by_area() (lon_min > lon_max s'il traverse l'antiméridien)"""
+        longitude = "l.longitude BETWEEN ? AND ?" if lon_min <= lon_max else "(l.longitude >= ? OR l.longitude <= ?)"
+        return self._select(f"WHERE l.latitude BETWEEN ? AND ? AND {longitude}", (lat_min, lat_max, lon_min, lon_max))
+
+    def filter_by_content(self, content_cls: str) -> Iterator[Postcard]:
+        """Cartes ayant au moins une détection de la classe de contenu"""
+        return self._select("WHERE p.id IN (SELECT postcard_id FROM detections WHERE content_cls = ?)", (content_cls,))
@@ -0,0 +1,251 @@
+from dataclasses import dataclass, field
+from typing import List, Dict, Tuple, Iterable, Iterator
+from array import array
+import hashlib
+import operator
+import re
+from t2ia_collection.collection import *
+
+# ======================================================================================================================
+# EMPREINTES
+# ======================================================================================================================
+# Une carte est résumée par trois ensembles de jetons : la disposition de ses détections (classe et bbox quantifiée sur
+# une grille, dans le sens de lecture), les shingles (n-grammes de caractères) de ses textes imprimés, et les champs de
+# ses tampons datés. Chaque ensemble est réduit à une signature MinHash (hachage à une permutation, densifié par
+# rotation) : la proportion de valeurs égales entre deux signatures estime l'indice de Jaccard des deux ensembles.
+
+EMPTY = 0xFFFFFFFF  # case vide d'une signature (avant densification)
+COMPONENTS = ('layout', 'text', 'stamps')
+DEFAULT_WEIGHTS = {'layout': 0.3, 'text': 0.5, 'stamps': 0.2}
+
+_NON_ALNUM = re.compile(r'[\W_]+')
+
+
+def _hash64(token: str) -> int:
+    """Hash stable (indépendant du processus) d'un jeton"""
+    return int.from_bytes(hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def minhash(tokens: Iterable[str], num_perm: int = 32) -> array | None:
+    """Signature MinHash (num_perm valeurs de 32 bits) d'un ensemble de jetons, None s'il est vide"""
+    res = array('I', [EMPTY]) * num_perm
+    empty = True
+    for token in set(tokens):
+        h = _hash64(token)
+        position, value = h % num_perm, h >> 32
+        if value < res[position]:
+            res[position] = value
+        empty = False
+    if empty:
+        return None
+    # densification : une case vide reprend la valeur de la suivante non vide, marquée par la distance parcourue
+    bins = res.tolist()
+    for position in range(num_perm):
+        if bins[position] == EMPTY:
+            step = 1
+            while bins[(position + step) % num_perm] == EMPTY:
+                step += 1
+            res[position] = (bins[(position + step) % num_perm] ^ (step * 0x9E3779B1)) & 0xFFFFFFFF
+    return res
+
+
+def jaccard(signature1: array, signature2: array) -> float:
+    """Indice de Jaccard estimé à partir de deux signatures MinHash"""
+    return sum(map(operator.eq, signature1, signature2)) / len(signature1)
+
+
+@dataclass
+class Fingerprint:
+    """Signatures MinHash d'une carte, None pour une composante sans jeton"""
+    layout: array | None = None
+    text: array | None = None
+    stamps: array | None = None
+    sizes: Dict[str, int] = field(default_factory=dict, compare=False)  # nombre de jetons distincts par composante
+
+
+# ======================================================================================================================
+# RECHERCHE DE DOUBLONS
+# ======================================================================================================================
+
+class DuplicateFinder:
+    """
+    Recherche des quasi-doublons (réimpressions, numérisations multiples) d'une collection. Les paires candidates sont
+    trouvées par hachage sensible à la localité : chaque signature est découpée en bandes de rows_per_band valeurs, et
+    deux cartes partageant une bande de leurs textes (ou de leur disposition, à défaut de texte) sont comparées. Les
+    composantes de moins de min_tokens jetons ne sont pas indexées, et les seaux de plus de max_bucket_size cartes
+    (mises en page très communes) sont redécoupés selon les bandes suivantes de la signature, ce qui borne le nombre
+    de comparaisons ; les seaux encore trop grands une fois toutes les bandes utilisées (signatures identiques,
+    comme les cartes très réimprimées) ne sont comparés que de proche en proche, ce qui suffit à les regrouper, et
+    sont listés dans chained_buckets.
+    """
+
+    def __init__(self, threshold: float = 0.8, num_perm: int = 32, rows_per_band: int = 4, grid_size: int = 8,
+                 shingle_size: int = 5, weights: Dict[str, float] | None = None, min_tokens: int = 3,
+                 max_bucket_size: int = 100):
+        if num_perm % rows_per_band:
+            raise ValueError("num_perm must be a multiple of rows_per_band")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.rows_per_band = rows_per_band
+        self.grid_size = grid_size
+        self.shingle_size = shingle_size
+        self.weights = weights if weights is not None else dict(DEFAULT_WEIGHTS)
+        self.min_tokens = min_tokens
+        self.max_bucket_size = max_bucket_size
+        self.names: List[str] = []
+        self.fingerprints: List[Fingerprint] = []
+        self.buckets: Dict[tuple, List[int]] = {}
+        self.chained_buckets: List[List[str]] = []  # noms des cartes des seaux indivisibles (cf. candidate_pairs())
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    # jetons :
+    # --------
+    def layout_tokens(self, postcard: Postcard) -> Iterator[str]:
+        """Classe et bbox quantifiée des détections, dans le sens de lecture de la carte"""
+        grid, rotation = self.grid_size, postcard.annotations.rotation
+        for det in postcard.annotations.detections:
+            bbox = det.bbox.rotate(rotation) if rotation != Orientation.ZERO else det.bbox
+            x, y, w, h = (min(grid - 1, int(coord * grid)) for coord in bbox.xywhn())
+            yield f"{det.get_content_cls()}|{x}|{y}|{w}|{h}"
+
+    def text_tokens(self, postcard: Postcard) -> Iterator[str]:
+        """Shingles des textes imprimés normalisés"""
+        texts = sorted(_NON_ALNUM.sub(' ', det.content.ocr_result.casefold()).strip()
+                       for det in postcard.annotations.detections if isinstance(det.content, PrintedText))
+        text = " ".join(text for text in texts if text)
+        if 0 < len(text) <= self.shingle_size:
+            yield text
+        for i in range(len(text) - self.shingle_size + 1):
+            yield text[i:i + self.shingle_size]
+
+    @staticmethod
+    def stamp_tokens(postcard: Postcard) -> Iterator[str]:
+        """Champs renseignés des tampons datés"""
+        for det in postcard.annotations.detections:
+            if isinstance(det.content, DateStamp):
+                content = det.content
+                if content.date.date_str.strip("X-T:"):
+                    yield f"date|{content.date.date_str}"
+                if content.postal_agency:
+                    yield f"agency|{content.postal_agency.casefold()}"
+                if content.department:
+                    yield f"department|{content.department.casefold()}"
+
+    def fingerprint(self, postcard: Postcard) -> Fingerprint:
+        tokens = {'layout': set(self.layout_tokens(postcard)),
+                  'text': set(self.text_tokens(postcard)),
+                  'stamps': set(self.stamp_tokens(postcard))}
+        return Fingerprint(**{component: minhash(tokens[component], self.num_perm) for component in COMPONENTS},
+                           sizes={component: len(tokens[component]) for component in COMPONENTS})
+
+    # index :
+    # -------
+    def add(self, postcard: Postcard):
+        """Ajoute une carte à l'index"""
+        card_id = len(self.names)
+        fingerprint = self.fingerprint(postcard)
+        self.names.append(postcard.name)
+        self.fingerprints.append(fingerprint)
+        # les textes sont indexés, la disposition (moins discriminante) seulement à défaut de texte, et les tampons
+        # (peu de jetons, très répétés) ne servent qu'au score
+        component = 'text' if fingerprint.sizes['text'] >= self.min_tokens else 'layout'
+        if fingerprint.sizes[component] < self.min_tokens:  # trop peu de jetons : seaux énormes et peu sûrs
+            return
+        signature, rows = getattr(fingerprint, component), self.rows_per_band
+        for band in range(0, self.num_perm, rows):
+            self.buckets.setdefault((component, band, signature[band:band + rows].tobytes()), []).append(card_id)
+
+    def update(self, postcards: Iterable[Postcard]):
+        for postcard in postcards:
+            self.add(postcard)
+
+    def similarity(self, fingerprint1: Fingerprint, fingerprint2: Fingerprint) -> float:
+        """Moyenne pondérée des indices de Jaccard des composantes (une composante absente des deux cartes est
+        ignorée, absente d'une seule elle compte pour 0)"""
+        total, weights = 0., 0.
+        for component in COMPONENTS:
+            signature1, signature2 = getattr(fingerprint1, component), getattr(fingerprint2, component)
+            if signature1 is None and signature2 is None:
+                continue
+            weights += self.weights[component]
+            if signature1 is not None and signature2 is not None:
+                total += self.weights[component] * jaccard(signature1, signature2)
+        return total / weights if weights else 0.
+
+    def _split_bucket(self, component: str, band: int, card_ids: List[int]) -> Iterator[Tuple[List[int], bool]]:
+        """
+        Découpe un seau (s'il est trop grand) selon les bandes suivantes de la signature, jusqu'à des seaux d'au plus
+        max_bucket_size cartes : (cartes, indivisible), indivisible pour ceux qui restent trop grands une fois toutes
+        les bandes utilisées
+        """
+        rows = self.rows_per_band
+        bands = list(range(0, self.num_perm, rows))
+        others = bands[bands.index(band) + 1:] + bands[:bands.index(band)]
+        stack = [(card_ids, 0)]
+        while stack:
+            card_ids, depth = stack.pop()
+            if len(card_ids) <= self.max_bucket_size or depth == len(others):
+                yield card_ids, len(card_ids) > self.max_bucket_size
+            else:
+                buckets = {}
+                for card_id in card_ids:
+                    signature = getattr(self.fingerprints[card_id], component)
+                    buckets.setdefault(signature[others[depth]:others[depth] + rows].tobytes(), []).append(card_id)
+                stack.extend((sub_ids, depth + 1) for sub_ids in buckets.values() if len(sub_ids) > 1)
+
+    def candidate_pairs(self) -> set:
+        """
+        Paires (i, j), i < j, de cartes partageant au moins un seau (ou un sous-seau des seaux trop grands) ; les
+        cartes d'un seau indivisible (mêmes bandes partout) ne sont appariées qu'à la suivante, en O(n)
+        """
+        res, chained = set(), {}
+        for (component, band, _), card_ids in self.buckets.items():
+            if len(card_ids) < 2:
+                continue
+            for sub_ids, indivisible in self._split_bucket(component, band, card_ids):
+                if indivisible:
+                    chained[tuple(sub_ids)] = None  # le même seau est retrouvé à partir de chaque bande
+                    res.update(zip(sub_ids, sub_ids[1:]))
+                    continue
+                for k, i in enumerate(sub_ids):
+                    for j in sub_ids[k + 1:]:
+                        res.add((i, j))
+        self.chained_buckets = [[self.names[card_id] for card_id in card_ids] for card_ids in chained]
+        return res
+
+    def pairs(self) -> List[Tuple[str, str, float]]:
+        """Paires de quasi-doublons (nom, nom, similarité) au-dessus du seuil, par similarité décroissante"""
+        res = []
+        for i, j in self.candidate_pairs():
+            score = self.similarity(self.fingerprints[i], self.fingerprints[j])
+            if score >= self.threshold:
+                res.append((score, i, j))
+        res.sort(key=lambda item: (-item[0], item[1], item[2]))
+        return [(self.names[i], self.names[j], score) for score, i, j in res]
+
+    def groups(self) -> List[List[str]]:
+        """Groupes de quasi-doublons (composantes connexes des paires), triés"""
+        parents = {}
+
+        def find(name: str) -> str:
+            while parents.setdefault(name, name) != name:
+                parents[name] = parents[parents[name]]
+                name = parents[name]
+            return name
+        for name1, name2, _ in self.pairs():
+            root1, root2 = find(name1), find(name2)
+            if root1 != root2:
+                parents[max(root1, root2)] = min(root1, root2)
+        groups: Dict[str, List[str]] = {}
+        for name in parents:
+            groups.setdefault(find(name), []).append(name)
+        return sorted(sorted(group) for group in groups.values())
+
+
+def find_duplicates(collection: Iterable[Postcard], threshold: float = 0.8, **kwargs) -> List[List[str]]:
+    """Groupes de quasi-doublons d'une collection (cf. DuplicateFinder)"""
+    finder = DuplicateFinder(threshold, **kwargs)
+    finder.update(collection)
+    return finder.groups()
@@ -1,9 +1,10 @@
 from abc import ABC, abstractmethod
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from collections.abc import Sequence
-from typing import Iterator, Tuple, Optional, Dict
+from typing import Iterator, Iterable, Tuple, Optional, Dict, List
 from enum import StrEnum
 from copy import deepcopy
+from array import array
 import math
 from t2ia_collection.content import *
 import importlib.util  # pour détecter si d'autres librairies sont installées
@@ -33,6 +34,15 @@ class CoordFormat(StrEnum):
         return self.value[-1] == 'n'
 
 
+# (cosinus, sinus) exacts de -theta pour chaque orientation, cf. BoundingBox.rotate()
+_ROTATION_TRIGO = {
+    Orientation.ZERO: (1, 0),
+    Orientation.NINETY: (0, -1),
+    Orientation.ONE_EIGHTY: (-1, 0),
+    Orientation.TWO_SEVENTY: (0, 1),
+}
+
+
 @dataclass
 class BoundingBox:
     """
@@ -92,15 +102,11 @@ class BoundingBox:
         # Test de la validité de l'angle
         if not isinstance(theta, Orientation):
             theta = Orientation.from_input(theta)
-        # Angle négatif en radians pour matcher PIL.Image.rotate()
-        theta_radians = - theta.value * math.pi / 180
-        # Angle négatif pour matcher PIL.Image.rotate() :
         # Translation vers l'origine
         x_trans = self.x - cx
         y_trans = self.y - cy
-        # Rotation
-        cos_theta = math.cos(theta_radians)
-        sin_theta = math.sin(theta_radians) # Angle négatif pour matcher PIL.Image.rotate()
+        # Rotation (cosinus et sinus exacts de l'angle négatif, pour matcher PIL.Image.rotate())
+        cos_theta, sin_theta = _ROTATION_TRIGO[theta]
         x_rot = x_trans * cos_theta - y_trans * sin_theta
         y_rot = x_trans * sin_theta + y_trans * cos_theta
         w_rot = self.w * cos_theta ** 2 + self.h * sin_theta ** 2
@@ -254,6 +260,195 @@ class BoundingBox:
         return res
 
 
+# Tableau de BoundingBox
+# ----------------------
+
+class BoundingBoxArray(Sequence):
+    """
+    Tableau de BoundingBox stocké en colonnes (array.array de doubles) avec les coordonnées [x, y, w, h] normalisées.
+    Permet de construire, valider et convertir des lots de bbox en une seule passe sans passer par un objet BoundingBox
+    par ligne."""
+
+    def __init__(self, x: Iterable[float] = (), y: Iterable[float] = (), w: Iterable[float] = (),
+                 h: Iterable[float] = ()):
+        self.x = array('d', x)
+        self.y = array('d', y)
+        self.w = array('d', w)
+        self.h = array('d', h)
+        if not len(self.x) == len(self.y) == len(self.w) == len(self.h):
+            raise ValueError("x, y, w and h must have the same length")
+
+    def __len__(self) -> int:
+        return len(self.x)
+
+    def __getitem__(self, index: int | slice) -> "BoundingBox | BoundingBoxArray":
+        if isinstance(index, slice):
+            return BoundingBoxArray(self.x[index], self.y[index], self.w[index], self.h[index])
+        return BoundingBox(self.x[index], self.y[index], self.w[index], self.h[index])
+
+    def __iter__(self) -> Iterator[BoundingBox]:
+        return map(BoundingBox, self.x, self.y, self.w, self.h)
+
+    def __eq__(self, other: "BoundingBoxArray") -> bool:
+        if not isinstance(other, BoundingBoxArray) or len(self) != len(other):
+            return False
+        return all(a == b for a, b in zip(self, other))
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(n={len(self)})"
+
+    def copy(self) -> "BoundingBoxArray":
+        """retourne une copie de l'instance"""
+        return self[:]
+
+    def append(self, bbox: BoundingBox):
+        """Ajoute une BoundingBox à la fin du tableau"""
+        self.x.append(bbox.x)
+        self.y.append(bbox.y)
+        self.w.append(bbox.w)
+        self.h.append(bbox.h)
+
+    def extend(self, bboxes: Iterable[BoundingBox]):
+        """Ajoute plusieurs BoundingBox à la fin du tableau"""
+        for bbox in bboxes:
+            self.append(bbox)
+
+    # Les tests :
+    # -----------
+    def isvalid(self, atol=1e-9) -> List[bool]:
+        """Vérifie pour chaque bbox si ses coordonnées sont valides (cf. BoundingBox.isvalid())"""
+        return [(w / 2 - atol <= x <= 1 - w / 2 + atol) and (h / 2 - atol <= y <= 1 - h / 2 + atol)
+                for x, y, w, h in zip(self.x, self.y, self.w, self.h)]
+
+    # Les rotations :
+    # ---------------
+    def rotate(self, theta: Orientation | int | float | str | Iterable | None = Orientation.NINETY,
+               inplace: bool = False):
+        """
+        Rotation des bbox (cf. BoundingBox.rotate()) d'un même angle, ou d'un angle par bbox (séquence d'angles ou
+        colonne de quarts de tour, cf. Orientation.quarter_turns()).
+        """
+        res = self if inplace else self.copy()
+        if isinstance(theta, (Orientation, int, float, str)) or theta is None:
+            codes = array('b', [Orientation.from_input(theta).value // 90]) * len(res)
+        else:
+            codes = theta if isinstance(theta, array) and theta.typecode == 'b' else Orientation.quarter_turns(theta)
+            if len(codes) != len(res):
+                raise ValueError(f"expected {len(res)} angles, got {len(codes)}")
+        trigo = [_ROTATION_TRIGO[orientation] for orientation in Orientation]  # par quart de tour
+        for i, code in enumerate(codes):
+            if code % 4:
+                cos_theta, sin_theta = trigo[code % 4]
+                x_trans, y_trans, w, h = res.x[i] - 0.5, res.y[i] - 0.5, res.w[i], res.h[i]
+                res.x[i] = x_trans * cos_theta - y_trans * sin_theta + 0.5
+                res.y[i] = x_trans * sin_theta + y_trans * cos_theta + 0.5
+                res.w[i] = w * cos_theta ** 2 + h * sin_theta ** 2
+                res.h[i] = w * sin_theta ** 2 + h * cos_theta ** 2
+        return None if inplace else res
+
+    # Les différentes coordonnées :
+    # -----------------------------
+    def xywhn(self) -> Tuple[array, array, array, array]:
+        """Colonnes des coordonnées normalisées avec point central, largeur et hauteur des bbox"""
+        return self.x, self.y, self.w, self.h
+
+    def xyxyn(self) -> Tuple[array, array, array, array]:
+        """Colonnes des coordonnées [x_min, y_min, x_max, y_max] normalisées (cf. BoundingBox.xyxyn())"""
+        x_min = array('d', [max(x - w/2, 0) for x, w in zip(self.x, self.w)])
+        y_min = array('d', [max(y - h/2, 0) for y, h in zip(self.y, self.h)])
+        x_max = array('d', [min(x + w/2, 1) for x, w in zip(self.x, self.w)])
+        y_max = array('d', [min(y + h/2, 1) for y, h in zip(self.y, self.h)])
+        return x_min, y_min, x_max, y_max
+
+    def areas(self) -> array:
+        """Aires normalisées des bbox (dans l'image)"""
+        x_min, y_min, x_max, y_max = self.xyxyn()
+        return array('d', [(x1 - x0) * (y1 - y0) for x0, y0, x1, y1 in zip(x_min, y_min, x_max, y_max)])
+
+    def iou(self, other: "BoundingBoxArray") -> List[array]:
+        """Matrice des IoU (intersection over union) entre les bbox de self (lignes) et celles de other (colonnes)"""
+        a_x_min, a_y_min, a_x_max, a_y_max = self.xyxyn()
+        b_x_min, b_y_min, b_x_max, b_y_max = other.xyxyn()
+        a_areas, b_areas = self.areas(), other.areas()
+        b_columns = list(zip(b_x_min, b_y_min, b_x_max, b_y_max, b_areas))
+        res = []
+        for x0, y0, x1, y1, area in zip(a_x_min, a_y_min, a_x_max, a_y_max, a_areas):
+            row = array('d', bytes(8 * len(b_columns)))
+            for j, (bx0, by0, bx1, by1, b_area) in enumerate(b_columns):
+                inter_w = min(x1, bx1) - max(x0, bx0)
+                inter_h = min(y1, by1) - max(y0, by0)
+                if inter_w > 0 and inter_h > 0:
+                    inter = inter_w * inter_h
+                    row[j] = inter / (area + b_area - inter)
+            res.append(row)
+        return res
+
+    # pour exporter/importer :
+    # ------------------------
+    def to_bboxes(self) -> List[BoundingBox]:
+        """Renvoie la liste des objets BoundingBox"""
+        return list(self)
+
+    @staticmethod
+    def from_bboxes(bboxes: Iterable[BoundingBox]) -> "BoundingBoxArray":
+        """Permet d'instancier un BoundingBoxArray à partir de BoundingBox"""
+        res = BoundingBoxArray()
+        res.extend(bboxes)
+        return res
+
+    @staticmethod
+    def from_coords(
+            coords: Iterable[Sequence[float]],
+            coord_format: CoordFormat | str = CoordFormat.XYWHN,
+            img_size: Optional[Tuple[float, float]] = None) -> "BoundingBoxArray":
+        """Version par lot de BoundingBox.from_coords() : le format et la taille d'image ne sont vérifiés qu'une fois,
+        et toutes les bbox invalides sont signalées dans une seule erreur."""
+        # test format de coordonnées
+        if isinstance(coord_format, str):
+            try:
+                coord_format = CoordFormat(coord_format)
+            except ValueError:
+                raise ValueError(f"coord_format must be one of : {[e.value for e in CoordFormat]}")
+
+        # coordonnées normalisées ou non
+        if coord_format.is_normalized():
+            img_w, img_h = (1, 1)  # pas de modification
+        elif img_size is not None:
+            img_w, img_h = img_size
+        else:
+            raise ValueError(f"If the coordinates are not normalized (one of : "
+                             f"{[e.value for e in CoordFormat if e.is_normalized()]}), you must specify an img_size.")
+
+        res = BoundingBoxArray()
+        is_xywh, is_xyxy = 'xywh' in coord_format, 'xyxy' in coord_format
+        for i, row in enumerate(coords):
+            if len(row) != 4:
+                raise ValueError(f"coords must have 4 coordinates, got {len(row)} at index {i}")
+            # format de coordonnées
+            if is_xywh:
+                x, y, w, h = row
+            else:
+                if is_xyxy:
+                    x_min, y_min, x_max, y_max = row
+                else:
+                    x_min, x_max, y_min, y_max = row
+                w = x_max - x_min
+                h = y_max - y_min
+                x = x_min + w/2
+                y = y_min + h/2
+            # normalisation
+            res.x.append(x / img_w)
+            res.y.append(y / img_h)
+            res.w.append(w / img_w)
+            res.h.append(h / img_h)
+
+        invalid = [i for i, valid in enumerate(res.isvalid()) if not valid]
+        if invalid:
+            raise ValueError(f"The coordinates at indices {invalid} are invalid, the bboxes are outside the image.")
+
+        return res
+
+
 # ======================================================================================================================
 # DETECTIONS
 # ======================================================================================================================
@@ -265,6 +460,8 @@ class Detection:
     is_manual: bool = True
     confidence: float | None = None
     content: Content | None = None
+    # compteur de modifications de la bbox (cf. CardCollection.changes()), ignoré par les comparaisons :
+    _version: int = field(default=0, repr=False, compare=False, kw_only=True)
 
     def __post_init__(self):
         """Vérification de la présence d'un score de confiance si contenu non annoté manuellement"""
@@ -277,6 +474,17 @@ class Detection:
         """retourne une copie de l'instance"""
         return deepcopy(self)
 
+    # Le suivi des modifications :
+    # ----------------------------
+    @property
+    def version(self) -> int:
+        """Nombre de modifications de la détection et de son contenu"""
+        return self._version + self.content.version
+
+    def mark_modified(self):
+        """Signale une modification de la détection (appelé par les méthodes qui la modifient)"""
+        self._version += 1
+
     # Les tests :
     # -----------
     def isempty(self) -> bool:
@@ -310,6 +518,7 @@ class Detection:
         """
         res = self if inplace else self.copy()
         res.bbox.rotate(theta, inplace=True)
+        res.mark_modified()
         if isinstance(res.content, Text):  # car seuls les Text ont une orientation
             res.content.rotate(theta, inplace=True)
         return None if inplace else res
@@ -0,0 +1,233 @@
+from dataclasses import dataclass, field
+from typing import List, Dict, Tuple, Iterable
+from array import array
+from t2ia_collection.collection import *
+from t2ia_collection.parallel import chunks, bounded_map
+
+# ======================================================================================================================
+# ÉVALUATION des prédictions par rapport aux annotations manuelles
+# ======================================================================================================================
+# Dans une carte, les détections manuelles (is_manual) sont la vérité terrain et les autres sont les prédictions d'un
+# modèle (avec une confiance). Les prédictions sont appariées aux annotations de même classe de contenu par ordre de
+# confiance décroissante, à la meilleure IoU encore libre au-dessus du seuil (comme pour COCO).
+
+BACKGROUND = "background"  # classe des prédictions sans annotation et des annotations sans prédiction
+DEFAULT_IOU_THRESHOLDS = tuple(round(0.5 + 0.05 * i, 2) for i in range(10))  # 0.5:0.95, comme COCO
+
+# données d'une carte : (classes, coordonnées xywhn) des annotations, puis (classes, confiances, coordonnées) des
+# prédictions ; uniquement des types simples pour être envoyées aux processus de travail
+CardBoxes = Tuple[List[str], List[Tuple[float, ...]], List[str], List[float], List[Tuple[float, ...]]]
+
+
+def card_boxes(postcard: Postcard) -> CardBoxes:
+    """Sépare les annotations manuelles et les prédictions d'une carte"""
+    gt_classes, gt_coords, pred_classes, pred_confidences, pred_coords = [], [], [], [], []
+    for det in postcard.annotations.detections:
+        if det.is_manual:
+            gt_classes.append(det.get_content_cls())
+            gt_coords.append(det.bbox.xywhn())
+        else:
+            pred_classes.append(det.get_content_cls())
+            pred_confidences.append(det.confidence)
+            pred_coords.append(det.bbox.xywhn())
+    return gt_classes, gt_coords, pred_classes, pred_confidences, pred_coords
+
+
+def _bbox_array(coords: List[Tuple[float, ...]]) -> BoundingBoxArray:
+    return BoundingBoxArray(*zip(*coords)) if coords else BoundingBoxArray()
+
+
+def _greedy_match(iou: List[array], order: List[int], threshold: float) -> List[int]:
+    """Appariement glouton : chaque prédiction (dans l'ordre donné) prend l'annotation libre de meilleure IoU au-dessus
+    du seuil. Renvoie l'indice de l'annotation appariée par prédiction, ou -1."""
+    res = [-1] * len(iou)
+    taken = set()
+    for i in order:
+        best, best_iou = -1, 0.
+        for j, value in enumerate(iou[i]):
+            if value >= threshold and (best < 0 or value > best_iou) and j not in taken:
+                best, best_iou = j, value
+        if best >= 0:
+            taken.add(best)
+            res[i] = best
+    return res
+
+
+def match_detections(postcard: Postcard, iou_threshold: float = 0.5) -> List[Tuple[Detection, Detection | None]]:
+    """
+    Appariement des prédictions d'une carte à ses annotations manuelles, comme pour l'évaluation (par classe, par
+    confiance décroissante) : (prédiction, annotation appariée ou None) pour chaque prédiction
+    """
+    gts = [det for det in postcard.annotations.detections if det.is_manual]
+    preds = sorted((det for det in postcard.annotations.detections if not det.is_manual),
+                   key=lambda det: -det.confidence)
+    iou = _bbox_array([det.bbox.xywhn() for det in preds]).iou(_bbox_array([det.bbox.xywhn() for det in gts]))
+    res = []
+    for cls in dict.fromkeys(det.get_content_cls() for det in preds):
+        pred_ids = [i for i, det in enumerate(preds) if det.get_content_cls() == cls]
+        gt_ids = [j for j, det in enumerate(gts) if det.get_content_cls() == cls]
+        sub_iou = [array('d', [iou[i][j] for j in gt_ids]) for i in pred_ids]
+        for i, match in zip(pred_ids, _greedy_match(sub_iou, list(range(len(pred_ids))), iou_threshold)):
+            res.append((preds[i], gts[gt_ids[match]] if match >= 0 else None))
+    return res
+
+
+@dataclass
+class _Partial:
+    """Résultats partiels (sur un lot de cartes), à fusionner"""
+    confidences: Dict[str, array] = field(default_factory=dict)  # {classe: confiances des prédictions}
+    true_positives: Dict[str, List[bytearray]] = field(default_factory=dict)  # {classe: [vrai positif par seuil]}
+    n_gt: Dict[str, int] = field(default_factory=dict)
+    confusion: Dict[Tuple[str, str], int] = field(default_factory=dict)  # {(classe annotée, classe prédite): nombre}
+
+    def merge(self, other: "_Partial"):
+        for cls, confidences in other.confidences.items():
+            if cls not in self.confidences:
+                self.confidences[cls] = array('d')
+                self.true_positives[cls] = [bytearray() for _ in other.true_positives[cls]]
+            self.confidences[cls].extend(confidences)
+            for tps, other_tps in zip(self.true_positives[cls], other.true_positives[cls]):
+                tps.extend(other_tps)
+        for cls, n in other.n_gt.items():
+            self.n_gt[cls] = self.n_gt.get(cls, 0) + n
+        for key, n in other.confusion.items():
+            self.confusion[key] = self.confusion.get(key, 0) + n
+
+
+def _evaluate_cards(cards: List[CardBoxes], iou_thresholds: Tuple[float, ...], confusion_iou: float) -> _Partial:
+    """Évaluation d'un lot de cartes (exécutée dans un processus de travail)"""
+    res = _Partial()
+    for gt_classes, gt_coords, pred_classes, pred_confidences, pred_coords in cards:
+        iou = _bbox_array(pred_coords).iou(_bbox_array(gt_coords))
+        order = sorted(range(len(pred_classes)), key=lambda i: -pred_confidences[i])
+
+        for cls in gt_classes:
+            res.n_gt[cls] = res.n_gt.get(cls, 0) + 1
+
+        # appariement par classe, pour chaque seuil d'IoU
+        for cls in set(pred_classes):
+            preds = [i for i in order if pred_classes[i] == cls]
+            gts = [j for j, gt_cls in enumerate(gt_classes) if gt_cls == cls]
+            sub_iou = [array('d', [iou[i][j] for j in gts]) for i in preds]
+            if cls not in res.confidences:
+                res.confidences[cls] = array('d')
+                res.true_positives[cls] = [bytearray() for _ in iou_thresholds]
+            res.confidences[cls].extend(pred_confidences[i] for i in preds)
+            for tps, threshold in zip(res.true_positives[cls], iou_thresholds):
+                tps.extend(match >= 0 for match in _greedy_match(sub_iou, list(range(len(preds))), threshold))
+
+        # confusion entre classes : appariement toutes classes confondues
+        matches = _greedy_match(iou, order, confusion_iou)
+        matched_gts = set()
+        for i, j in enumerate(matches):
+            key = (gt_classes[j] if j >= 0 else BACKGROUND, pred_classes[i])
+            res.confusion[key] = res.confusion.get(key, 0) + 1
+            matched_gts.add(j)
+        for j, gt_cls in enumerate(gt_classes):
+            if j not in matched_gts:
+                res.confusion[(gt_cls, BACKGROUND)] = res.confusion.get((gt_cls, BACKGROUND), 0) + 1
+    return res
+
+
+# ======================================================================================================================
+# RÉSULTATS
+# ======================================================================================================================
+
+@dataclass
+class EvaluationResult:
+    """Résultats d'une évaluation : courbes précision/rappel, AP et mAP par seuil d'IoU, matrice de confusion"""
+    iou_thresholds: Tuple[float, ...]
+    confidences: Dict[str, array]
+    true_positives: Dict[str, List[bytearray]]
+    n_gt: Dict[str, int]
+    confusion: Dict[Tuple[str, str], int]
+
+    def classes(self) -> List[str]:
+        """Classes annotées ou prédites"""
+        return sorted(self.n_gt.keys() | self.confidences.keys())
+
+    def _threshold_index(self, iou_threshold: float) -> int:
+        for i, threshold in enumerate(self.iou_thresholds):
+            if abs(threshold - iou_threshold) < 1e-9:
+                return i
+        raise ValueError(f"iou_threshold must be one of : {list(self.iou_thresholds)}")
+
+    def pr_curve(self, cls: str, iou_threshold: float = 0.5) -> Tuple[List[float], List[float], List[float]]:
+        """Courbe précision/rappel d'une classe : (précisions, rappels, confiances) par confiance décroissante"""
+        confidences = self.confidences.get(cls, array('d'))
+        tps = self.true_positives[cls][self._threshold_index(iou_threshold)] if cls in self.true_positives else []
+        n_gt = self.n_gt.get(cls, 0)
+        precisions, recalls, sorted_confidences = [], [], []
+        tp = fp = 0
+        for i in sorted(range(len(confidences)), key=lambda i: -confidences[i]):
+            if tps[i]:
+                tp += 1
+            else:
+                fp += 1
+            precisions.append(tp / (tp + fp))
+            recalls.append(tp / n_gt if n_gt else 0.)
+            sorted_confidences.append(confidences[i])
+        return precisions, recalls, sorted_confidences
+
+    def average_precision(self, cls: str, iou_threshold: float = 0.5) -> float:
+        """AP d'une classe : aire sous la courbe précision/rappel interpolée (enveloppe décroissante)"""
+        if not self.n_gt.get(cls):
+            return float('nan')
+        precisions, recalls, _ = self.pr_curve(cls, iou_threshold)
+        # enveloppe : précision maximale atteignable à rappel supérieur
+        for i in range(len(precisions) - 2, -1, -1):
+            precisions[i] = max(precisions[i], precisions[i + 1])
+        res, previous_recall = 0., 0.
+        for precision, recall in zip(precisions, recalls):
+            res += (recall - previous_recall) * precision
+            previous_recall = recall
+        return res
+
+    def map(self, iou_threshold: float | None = None) -> float:
+        """mAP sur les classes annotées, à un seuil d'IoU, ou moyenné sur tous les seuils si non spécifié"""
+        thresholds = self.iou_thresholds if iou_threshold is None else [iou_threshold]
+        classes = [cls for cls in self.classes() if self.n_gt.get(cls)]
+        if not classes:
+            return float('nan')
+        aps = [self.average_precision(cls, threshold) for threshold in thresholds for cls in classes]
+        return sum(aps) / len(aps)
+
+    def confusion_matrix(self) -> Tuple[List[str], List[List[int]]]:
+        """Matrice de confusion : (classes, lignes = classe annotée, colonnes = classe prédite), avec le fond en
+        dernier"""
+        labels = self.classes() + [BACKGROUND]
+        index = {label: i for i, label in enumerate(labels)}
+        matrix = [[0] * len(labels) for _ in labels]
+        for (gt_cls, pred_cls), n in self.confusion.items():
+            matrix[index[gt_cls]][index[pred_cls]] += n
+        return labels, matrix
+
+    def summary(self) -> dict:
+        """Résumé : AP par classe et par seuil, mAP"""
+        return {'map': self.map(),
+                **{f"map@{threshold}": self.map(threshold) for threshold in self.iou_thresholds},
+                'ap': {cls: {threshold: self.average_precision(cls, threshold) for threshold in self.iou_thresholds}
+                       for cls in self.classes()},
+                'n_gt': dict(self.n_gt)}
+
+
+# ======================================================================================================================
+# ÉVALUATION d'une collection
+# ======================================================================================================================
+
+def evaluate(postcards: CardCollection | Iterable[Postcard],
+             iou_thresholds: Iterable[float] = DEFAULT_IOU_THRESHOLDS,
+             confusion_iou: float = 0.5,
+             workers: int | None = None,
+             chunk_size: int = 512) -> EvaluationResult:
+    """
+    Évalue les prédictions des cartes par rapport à leurs annotations manuelles. Les cartes sont évaluées par lots
+    dans un pool de processus (workers=0 pour évaluer dans le processus courant), puis les résultats sont fusionnés.
+    """
+    iou_thresholds = tuple(iou_thresholds)
+    res = _Partial()
+    cards = (card_boxes(postcard) for postcard in postcards)
+    for partial in bounded_map(_evaluate_cards, chunks(cards, chunk_size), iou_thresholds, confusion_iou,
+                               workers=workers):
+        res.merge(partial)
+    return EvaluationResult(iou_thresholds, res.confidences, res.true_positives, res.n_gt, res.confusion)
@@ -0,0 +1,186 @@
+from dataclasses import dataclass, field
+from typing import List, Dict, Iterable
+from pathlib import Path
+import hashlib
+import json
+import os
+from t2ia_collection.collection import *
+
+# ======================================================================================================================
+# EXPORT YOLO incrémental
+# ======================================================================================================================
+# Un jeu d'entraînement YOLO contient un fichier de labels par image ("class x y w h" en xywhn) et la liste des classes.
+# Pour l'export incrémental, le hash du contenu de chaque fichier de labels est conservé dans un manifeste : seuls les
+# fichiers dont le contenu a changé depuis le dernier export sont réécrits.
+
+MANIFEST_NAME = ".t2ia_yolo_manifest.json"
+MANIFEST_VERSION = 1
+
+
+@dataclass
+class ExportReport:
+    """Compte-rendu d'un export"""
+    n_written: int = 0
+    n_unchanged: int = 0
+    n_removed: int = 0
+    full_rebuild: bool = False
+
+
+class YoloExporter:
+    """
+    Export d'une CardCollection au format YOLO dans un dossier : labels/<nom>.txt, classes.txt et le manifeste des
+    hash. Les identifiants de classe sont stables d'un export à l'autre (les nouvelles classes sont ajoutées à la fin).
+    """
+
+    def __init__(self, output_dir: str | Path, class_names: List[str] | None = None, manual_only: bool = False,
+                 with_confidence: bool = False, link_images: bool = False, precision: int = 6):
+        self.output_dir = Path(output_dir)
+        self.labels_dir = self.output_dir / "labels"
+        self.images_dir = self.output_dir / "images"
+        self.class_names = list(class_names) if class_names is not None else None
+        self.manual_only = manual_only
+        self.with_confidence = with_confidence
+        self.link_images = link_images
+        self.precision = precision
+
+    # manifeste :
+    # -----------
+    def _options(self) -> dict:
+        """Options ayant un impact sur le contenu des fichiers : si elles changent, tout est réécrit"""
+        return {'manual_only': self.manual_only, 'with_confidence': self.with_confidence, 'precision': self.precision}
+
+    def load_manifest(self) -> dict:
+        """Charge le manifeste du dernier export, ou un manifeste vide"""
+        manifest_path = self.output_dir / MANIFEST_NAME
+        if manifest_path.exists():
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            if manifest.get('version') == MANIFEST_VERSION:
+                return manifest
+        return {'version': MANIFEST_VERSION, 'options': None, 'classes': [], 'hashes': {}, 'images': {}}
+
+    def _save_manifest(self, manifest: dict):
+        """Écriture atomique du manifeste (un export interrompu laisse l'ancien manifeste intact)"""
+        tmp_path = self.output_dir / (MANIFEST_NAME + ".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.replace(tmp_path, self.output_dir / MANIFEST_NAME)
+
+    # contenu des fichiers :
+    # ----------------------
+    def build_class_map(self, collection: CardCollection, previous: List[str]) -> List[str]:
+        """Liste des classes : celle donnée, sinon celles du dernier export complétées des classes de la collection"""
+        if self.class_names is not None:
+            return self.class_names
+        res = list(previous)
+        known = set(res)
+        for postcard in collection:
+            for det in postcard.annotations.detections:
+                cls_name = det.get_content_cls()
+                if cls_name not in known:
+                    known.add(cls_name)
+                    res.append(cls_name)
+        return res
+
+    def label_lines(self, postcard: Postcard, class_ids: Dict[str, int]) -> str:
+        """Contenu du fichier de labels d'une carte"""
+        fmt = f"{{:.{self.precision}f}}"
+        lines = []
+        for det in postcard.annotations.detections:
+            if self.manual_only and not det.is_manual:
+                continue
+            class_id = class_ids.get(det.get_content_cls())
+            if class_id is None:  # classe exclue de la liste donnée
+                continue
+            values = [str(class_id)] + [fmt.format(coord) for coord in det.bbox.xywhn()]
+            if self.with_confidence and det.confidence is not None:
+                values.append(fmt.format(det.confidence))
+            lines.append(" ".join(values))
+        return "\n".join(lines) + "\n" if lines else ""
+
+    @staticmethod
+    def content_hash(text: str) -> str:
+        """Hash du contenu d'un fichier de labels"""
+        return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+    # export :
+    # --------
+    def export(self, collection: CardCollection) -> ExportReport:
+        """Exporte la collection, en ne réécrivant que les fichiers de labels modifiés depuis le dernier export"""
+        self.labels_dir.mkdir(parents=True, exist_ok=True)
+        if self.link_images:
+            self.images_dir.mkdir(parents=True, exist_ok=True)
+
+        manifest = self.load_manifest()
+        report = ExportReport()
+        classes = self.build_class_map(collection, manifest['classes'])
+        # si les options ou les identifiants existants changent, tous les fichiers sont à réécrire (les cartes du
+        # dernier export restent connues, pour supprimer les fichiers de celles retirées de la collection)
+        old_hashes = manifest['hashes']
+        unchanged_hashes = old_hashes
+        if manifest['options'] != self._options() or classes[:len(manifest['classes'])] != manifest['classes']:
+            unchanged_hashes = {}
+            report.full_rebuild = True
+        class_ids = {name: class_id for class_id, name in enumerate(classes)}
+        old_images = manifest.get('images', {})  # nom -> extension du lien vers l'image
+        new_hashes, new_images = {}, {}
+
+        for postcard in collection:
+            text = self.label_lines(postcard, class_ids)
+            digest = self.content_hash(text)
+            label_path = self.labels_dir / f"{postcard.name}.txt"
+            if unchanged_hashes.get(postcard.name) == digest and label_path.exists():
+                report.n_unchanged += 1
+            else:
+                with open(label_path, 'w', encoding='utf-8') as f:
+                    f.write(text)
+                report.n_written += 1
+            new_hashes[postcard.name] = digest
+            if self.link_images:
+                new_images[postcard.name] = self._link_image(postcard)
+                if old_images.get(postcard.name, new_images[postcard.name]) != new_images[postcard.name]:
+                    self._unlink_image(postcard.name, old_images[postcard.name])  # image d'une autre extension
+
+        # suppression des fichiers des cartes retirées de la collection
+        for name in old_hashes.keys() - new_hashes.keys():
+            (self.labels_dir / f"{name}.txt").unlink(missing_ok=True)
+            if self.link_images:
+                self._unlink_image(name, old_images.get(name))
+            report.n_removed += 1
+
+        with open(self.output_dir / "classes.txt", 'w', encoding='utf-8') as f:
+            f.write("".join(f"{name}\n" for name in classes))
+        manifest.update({'options': self._options(), 'classes': classes, 'hashes': new_hashes, 'images': new_images})
+        self._save_manifest(manifest)
+        return report
+
+    def _link_image(self, postcard: Postcard) -> str:
+        """
+        Lien symbolique vers l'image de la carte (la convention YOLO associe images/x.jpg à labels/x.txt) ; renvoie
+        l'extension du lien
+        """
+        image_path = Path(postcard.path)
+        link_path = self.images_dir / f"{postcard.name}{image_path.suffix}"
+        if not link_path.is_symlink():
+            link_path.symlink_to(image_path.resolve())
+        return image_path.suffix
+
+    def _unlink_image(self, name: str, suffix: str | None):
+        """Supprime le lien vers l'image d'une carte (à défaut d'extension connue, les liens de même nom exact)"""
+        if suffix is not None:
+            (self.images_dir / f"{name}{suffix}").unlink(missing_ok=True)
+            return
+        for entry in os.scandir(self.images_dir):
+            if Path(entry.name).stem == name:
+                os.unlink(entry.path)
+
+
+def export_yolo(collection: CardCollection, output_dir: str | Path, **kwargs) -> ExportReport:
+    """Raccourci pour YoloExporter(output_dir, **kwargs).export(collection)"""
+    return YoloExporter(output_dir, **kwargs).export(collection)
+
+
+def read_class_names(file_path: str | Path) -> List[str]:
+    """Lit un fichier classes.txt (un nom de classe par ligne), utilisable par ingestion.YoloIngestor"""
+    with open(file_path, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip()]
@@ -0,0 +1,221 @@
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import List, Dict, Tuple, Iterable, Iterator, Callable, Any
+import asyncio
+import inspect
+from t2ia_collection.collection import *
+
+# ======================================================================================================================
+# BACKENDS d'extraction
+# ======================================================================================================================
+# Un backend extrait le contenu d'un lot de détections (OCR pour les Text, LLM pour les DateStamp...) et renvoie, pour
+# chaque détection, les arguments à passer à Detection.process_content(), par exemple :
+#   - Text : {'ocr_result': "...", 'orientation': 90, 'confidence': 0.8}
+#   - DateStamp : {'datestamp_dict': {'postal_agency': "...", 'date': "...", ...}}
+
+@dataclass
+class ExtractionItem:
+    """Détection à traiter, avec sa carte et le recadrage de l'image correspondant à sa bbox"""
+    postcard: Postcard
+    index: int  # indice de la détection dans la carte
+    crop: Any = None
+
+    @property
+    def detection(self) -> Detection:
+        return self.postcard.annotations.detections[self.index]
+
+
+class ExtractorBackend(ABC):
+    """Classe abstraite pour les backends d'extraction asynchrones"""
+    version: str = "0"  # à changer quand les résultats du backend changent (cf. cache)
+
+    @abstractmethod
+    async def extract(self, items: List[ExtractionItem]) -> List[dict]:
+        """Renvoie les arguments de process_content() pour chaque détection du lot, dans le même ordre"""
+        pass
+
+    def to_extract(self, items: List[ExtractionItem]) -> List[ExtractionItem]:
+        """Détections du lot dont le recadrage sera utilisé (toutes par défaut, cf. cache.CachedBackend)"""
+        return items
+
+
+class FunctionBackend(ExtractorBackend):
+    """Backend à partir d'une fonction (synchrone ou coroutine) items -> résultats, utile pour les tests et les
+    modèles locaux ; les fonctions synchrones sont exécutées dans un thread pour ne pas bloquer la boucle"""
+
+    def __init__(self, function: Callable[[List[ExtractionItem]], Any], version: str = "0"):
+        self.function = function
+        self.version = version
+
+    async def extract(self, items: List[ExtractionItem]) -> List[dict]:
+        if inspect.iscoroutinefunction(self.function):
+            return await self.function(items)
+        return await asyncio.to_thread(self.function, items)
+
+
+def load_crop(postcard: Postcard, detection: Detection, images: Dict[str, Any] | None = None):
+    """Recadrage PIL de l'image sur la bbox de la détection ; images sert de cache d'images ouvertes par chemin"""
+    images = images if images is not None else {}
+    if postcard.path not in images:
+        images[postcard.path] = postcard.load_image()
+    image = images[postcard.path]
+    return image.crop(detection.bbox.xyxy(image.size))
+
+
+# ======================================================================================================================
+# ORDONNANCEUR
+# ======================================================================================================================
+
+class RateLimiter:
+    """Limite le nombre d'appels par seconde (espacement minimal entre deux appels)"""
+
+    def __init__(self, rate: float | None = None):
+        self.interval = 1 / rate if rate else 0.
+        self._next = 0.
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            delay = self._next - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._next = max(self._next, loop.time()) + self.interval
+
+
+@dataclass
+class ExtractionReport:
+    """Compte-rendu d'une extraction"""
+    n_processed: int = 0
+    n_failed: int = 0
+    n_batches: int = 0
+    n_retries: int = 0
+    errors: Dict[Tuple[str, int], str] = field(default_factory=dict)  # {(nom de la carte, indice): message}
+
+
+class ExtractionScheduler:
+    """
+    Ordonnanceur asynchrone de l'extraction de contenu : les détections non traitées (not isprocessed()) sont
+    regroupées par classe de contenu en lots envoyés au backend de leur classe (ou d'une classe mère, par ex. 'Text'
+    pour PrintedText), avec au plus max_concurrency lots en cours, au plus rate lots par seconde et max_retries
+    nouvelles tentatives par lot (délai exponentiel). Les résultats sont écrits avec process_content(inplace=True).
+    """
+
+    def __init__(self,
+                 backends: Dict[str, ExtractorBackend],
+                 batch_size: int = 16,
+                 max_concurrency: int = 4,
+                 max_retries: int = 3,
+                 retry_delay: float = 0.5,
+                 rate: float | None = None,
+                 crop_loader: Callable[[Postcard, Detection, Dict[str, Any]], Any] | None = load_crop):
+        self.backends = backends
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.rate = rate
+        self.crop_loader = crop_loader
+
+    def backend_for(self, content: Content) -> Tuple[str, ExtractorBackend] | None:
+        """Backend de la classe de contenu ou de sa plus proche classe mère"""
+        for cls in type(content).__mro__:
+            if cls.__name__ in self.backends:
+                return cls.__name__, self.backends[cls.__name__]
+        return None
+
+    # préparation :
+    # -------------
+    def gather(self, postcards: CardCollection | Iterable[Postcard]) -> Dict[str, List[ExtractionItem]]:
+        """Détections non traitées ayant un backend, par classe de contenu"""
+        res = {}
+        for postcard in postcards:
+            for i, det in enumerate(postcard.annotations.detections):
+                if det.isprocessed() or self.backend_for(det.content) is None:
+                    continue
+                res.setdefault(det.get_content_cls(), []).append(ExtractionItem(postcard, i))
+        return res
+
+    def batches(self, items: Dict[str, List[ExtractionItem]]) -> Iterator[Tuple[str, List[ExtractionItem]]]:
+        """Lots de batch_size détections de même classe, dans l'ordre des cartes (chaque image n'est ouverte qu'une fois
+        par lot)"""
+        for content_cls, cls_items in items.items():
+            for start in range(0, len(cls_items), self.batch_size):
+                yield content_cls, cls_items[start:start + self.batch_size]
+
+    def _load_crops(self, batch: List[ExtractionItem], to_load: List[ExtractionItem]) -> Dict[int, str]:
+        """Charge les recadrages des détections to_load du lot ; renvoie les erreurs (image illisible...) par position
+        dans le lot"""
+        positions = {id(item): i for i, item in enumerate(batch)}
+        images, errors = {}, {}
+        for item in to_load:
+            try:
+                item.crop = self.crop_loader(item.postcard, item.detection, images)
+            except Exception as e:
+                errors[positions[id(item)]] = f"{type(e).__name__}: {e}"
+        return errors
+
+    # exécution :
+    # -----------
+    async def _run_batch(self, batch: List[ExtractionItem], backend: ExtractorBackend, semaphore: asyncio.Semaphore,
+                         limiter: RateLimiter, report: ExtractionReport):
+        async with semaphore:
+            if self.crop_loader is not None:
+                try:  # dans un thread : le backend peut lire des fichiers ou une base (cf. cache)
+                    to_load = await asyncio.to_thread(backend.to_extract, batch)
+                except Exception:  # par ex. image absente : chaque détection est chargée pour isoler les erreurs
+                    to_load = batch
+                errors = await asyncio.to_thread(self._load_crops, batch, to_load)
+                if errors:  # les détections sans recadrage sont écartées du lot
+                    for i, message in errors.items():
+                        report.errors[(batch[i].postcard.name, batch[i].index)] = message
+                    report.n_failed += len(errors)
+                    batch = [item for i, item in enumerate(batch) if i not in errors]
+                    if not batch:
+                        return
+            for attempt in range(self.max_retries + 1):
+                await limiter.wait()
+                try:
+                    results = await backend.extract(batch)
+                    if len(results) != len(batch):
+                        raise ValueError(f"backend returned {len(results)} results for {len(batch)} items")
+                    break
+                except Exception as e:
+                    if attempt == self.max_retries:
+                        for item in batch:
+                            item.crop = None
+                            report.errors[(item.postcard.name, item.index)] = f"{type(e).__name__}: {e}"
+                        report.n_failed += len(batch)
+                        return
+                    report.n_retries += 1
+                    await asyncio.sleep(self.retry_delay * 2 ** attempt)
+            for item, result in zip(batch, results):
+                item.crop = None  # les recadrages ne sont plus utiles une fois le lot traité
+                backup = item.detection.content.copy()  # contenu non traité, petit à copier
+                try:
+                    item.detection.process_content(inplace=True, **result)
+                except (ValueError, TypeError) as e:  # résultat invalide pour la classe de contenu
+                    item.detection.content = backup  # pas de contenu à moitié modifié
+                    report.errors[(item.postcard.name, item.index)] = f"{type(e).__name__}: {e}"
+                    report.n_failed += 1
+                else:
+                    report.n_processed += 1
+            report.n_batches += 1
+
+    async def run(self, postcards: CardCollection | Iterable[Postcard]) -> ExtractionReport:
+        """Extrait le contenu de toutes les détections non traitées des cartes"""
+        report = ExtractionReport()
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        limiter = RateLimiter(self.rate)
+        tasks = []
+        for content_cls, batch in self.batches(self.gather(postcards)):
+            _, backend = self.backend_for(batch[0].detection.content)
+            tasks.append(self._run_batch(batch, backend, semaphore, limiter, report))
+        await asyncio.gather(*tasks)
+        return report
+
+    def run_sync(self, postcards: CardCollection | Iterable[Postcard]) -> ExtractionReport:
+        """Version synchrone de run()"""
+        return asyncio.run(self.run(postcards))
@@ -0,0 +1,317 @@
+from dataclasses import dataclass, field
+from typing import List, Dict, Tuple, Iterable, Iterator
+from collections import Counter
+from pathlib import Path
+import csv
+import re
+import unicodedata
+from t2ia_collection.collection import *
+
+# ======================================================================================================================
+# NORMALISATION des noms de lieux
+# ======================================================================================================================
+# Les noms lus par l'OCR (« ST-MALO », « Epernay », « CHARLEVILLE - La place ») et ceux du gazetier sont comparés sous
+# une forme normalisée : sans accents ni casse, ponctuation remplacée par des espaces et abréviations développées.
+
+ABBREVIATIONS = {'st': 'saint', 'ste': 'sainte', 's': 'sur'}
+
+_NON_ALNUM = re.compile(r'[^0-9a-z]+')
+
+
+def normalize_place(name: str | None) -> str:
+    """Forme normalisée d'un nom de lieu"""
+    if not name:
+        return ""
+    name = unicodedata.normalize('NFKD', name.casefold())
+    name = _NON_ALNUM.sub(' ', "".join(char for char in name if not unicodedata.combining(char)))
+    return " ".join(ABBREVIATIONS.get(token, token) for token in name.split())
+
+
+# ======================================================================================================================
+# TRIE
+# ======================================================================================================================
+
+class PlaceTrie:
+    """
+    Trie de caractères sur des noms normalisés, associant à chaque nom une liste de valeurs. La recherche approchée
+    parcourt le trie en calculant une ligne de la matrice de Levenshtein par nœud : les branches dont la ligne dépasse
+    la distance maximale sont abandonnées.
+    """
+
+    _END = ""  # clé des valeurs d'un nœud (aucun caractère n'est vide)
+
+    def __init__(self):
+        self.root: dict = {}
+        self.max_tokens = 0  # nombre maximal de mots d'un nom
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self._values())
+
+    def _values(self) -> Iterator[list]:
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            for char, child in node.items():
+                if char == self._END:
+                    yield child
+                else:
+                    stack.append(child)
+
+    def insert(self, name: str, value):
+        node = self.root
+        for char in name:
+            node = node.setdefault(char, {})
+        values = node.setdefault(self._END, [])
+        if value not in values:
+            values.append(value)
+        self.max_tokens = max(self.max_tokens, len(name.split()))
+
+    def get(self, name: str) -> list:
+        """Valeurs associées exactement au nom"""
+        node = self.root
+        for char in name:
+            node = node.get(char)
+            if node is None:
+                return []
+        return node.get(self._END, [])
+
+    def search(self, name: str, max_distance: int = 1) -> List[Tuple[int, object]]:
+        """Valeurs des noms à une distance de Levenshtein d'au plus max_distance, sous la forme (distance, valeur)
+        triées par distance"""
+        best = {}
+        first_row = list(range(len(name) + 1))
+        if first_row[-1] <= max_distance:
+            for value in self.root.get(self._END, []):
+                best[value] = first_row[-1]
+        stack = [(child, char, first_row) for char, child in self.root.items() if char != self._END]
+        while stack:
+            node, char, previous = stack.pop()
+            row = [previous[0] + 1]
+            for j in range(1, len(name) + 1):
+                row.append(min(row[j - 1] + 1, previous[j] + 1, previous[j - 1] + (name[j - 1] != char)))
+            if row[-1] <= max_distance and self._END in node:
+                for value in node[self._END]:
+                    if row[-1] < best.get(value, max_distance + 1):
+                        best[value] = row[-1]
+            if min(row) <= max_distance:
+                stack.extend((child, next_char, row) for next_char, child in node.items() if next_char != self._END)
+        return sorted(((distance, value) for value, distance in best.items()), key=lambda item: item[0])
+
+
+# ======================================================================================================================
+# GAZETIER
+# ======================================================================================================================
+
+@dataclass
+class Place:
+    """Lieu du gazetier"""
+    town: str
+    department: str | None = None
+    region: str | None = None
+    gps: Tuple[float, float] | None = None
+    aliases: List[str] = field(default_factory=list)  # autres noms (anciens noms, bureaux de poste...)
+
+    def to_location(self) -> Location:
+        return Location(town=self.town, department=self.department, region=self.region, gps=self.gps)
+
+
+class Gazetteer:
+    """Liste de lieux indexée par noms de villes (et alias) et par noms de départements"""
+
+    def __init__(self, places: Iterable[Place] = ()):
+        self.places: List[Place] = []
+        self.towns = PlaceTrie()  # nom normalisé -> indices des lieux
+        self.departments = PlaceTrie()  # nom normalisé -> nom du département
+        self.regions: Dict[str, str | None] = {}  # département -> région
+        for place in places:
+            self.add(place)
+
+    def __len__(self) -> int:
+        return len(self.places)
+
+    def add(self, place: Place):
+        place_id = len(self.places)
+        self.places.append(place)
+        for name in (place.town, *place.aliases):
+            if normalize_place(name):
+                self.towns.insert(normalize_place(name), place_id)
+        if place.department:
+            self.departments.insert(normalize_place(place.department), place.department)
+            self.regions.setdefault(place.department, place.region)
+
+    @staticmethod
+    def load(file_path: str | Path, delimiter: str = ",") -> "Gazetteer":
+        """
+        Charge un gazetier au format csv, avec une ligne d'en-tête et les colonnes town, department, region et,
+        facultatives, latitude, longitude et aliases (séparés par des |)
+        """
+        res = Gazetteer()
+        with open(file_path, 'r', encoding='utf-8', newline='') as f:
+            for row in csv.DictReader(f, delimiter=delimiter):
+                latitude, longitude = row.get('latitude'), row.get('longitude')
+                res.add(Place(town=row['town'],
+                              department=row.get('department') or None,
+                              region=row.get('region') or None,
+                              gps=(float(latitude), float(longitude)) if latitude and longitude else None,
+                              aliases=[alias for alias in (row.get('aliases') or "").split("|") if alias]))
+        return res
+
+
+# ======================================================================================================================
+# RÉSOLUTION
+# ======================================================================================================================
+
+# poids des indices de localisation d'une carte
+AGENCY_WEIGHT = 2.  # bureau de poste d'un tampon daté
+TEXT_WEIGHT = 1.  # nom de lieu dans un texte imprimé
+DEPARTMENT_WEIGHT = 1.5  # bonus d'un lieu du département d'un tampon daté
+
+
+class LocationResolver:
+    """
+    Résolution des localisations des cartes à partir des bureaux de poste et départements des tampons datés et des
+    noms de lieux des textes imprimés, par vote pondéré sur les lieux du gazetier. Les correspondances sont mémorisées
+    par chaîne : les bureaux de poste et légendes, très répétés, ne sont cherchés qu'une fois.
+    """
+
+    def __init__(self, gazetteer: Gazetteer, max_distance: int = 1, min_fuzzy_length: int = 5,
+                 cache_size: int = 1 << 16):
+        self.gazetteer = gazetteer
+        self.max_distance = max_distance
+        self.min_fuzzy_length = min_fuzzy_length  # mots plus courts : correspondance exacte seulement
+        self.cache_size = cache_size
+        self._names: Dict[str, Tuple[Tuple[int, int], ...]] = {}  # par nom normalisé
+        self._texts: Dict[str | None, Tuple[Tuple[int, int], ...]] = {}  # par texte brut
+        self._departments: Dict[str | None, str | None] = {}  # par nom brut
+        self.conflicts: List[str] = []  # cartes non complétées : lieu trouvé en désaccord avec leur localisation
+
+    def clear_cache(self):
+        self._names.clear()
+        self._texts.clear()
+        self._departments.clear()
+
+    def _memo(self, cache: dict, key: str | None, compute):
+        if key not in cache:
+            if len(cache) >= self.cache_size:
+                cache.clear()
+            cache[key] = compute(key)
+        return cache[key]
+
+    # correspondances :
+    # -----------------
+    def _lookup(self, trie: PlaceTrie, name: str) -> list:
+        """Correspondance exacte, ou approchée pour les noms assez longs"""
+        exact = trie.get(name)
+        if exact:
+            return [(0, value) for value in exact]
+        if len(name) >= self.min_fuzzy_length and self.max_distance > 0:
+            return trie.search(name, self.max_distance)
+        return []
+
+    def _match_normalized(self, key: str) -> Tuple[Tuple[int, int], ...]:
+        """Lieux correspondant à un nom normalisé (mémorisé par nom : partagé entre tampons et textes)"""
+        return self._memo(self._names, key,
+                          lambda key: tuple(self._lookup(self.gazetteer.towns, key)) if key else ())
+
+    def match_name(self, name: str | None) -> Tuple[Tuple[int, int], ...]:
+        """Lieux correspondant à un nom (bureau de poste...), sous la forme (distance, indice du lieu)"""
+        return self._match_normalized(normalize_place(name))
+
+    def match_department(self, name: str | None) -> str | None:
+        """Département correspondant à un nom"""
+        def compute(name: str | None) -> str | None:
+            key = normalize_place(name)
+            matches = self._lookup(self.gazetteer.departments, key) if key else []
+            return matches[0][1] if matches else None
+        return self._memo(self._departments, name, compute)
+
+    def scan_text(self, text: str | None) -> Tuple[Tuple[int, int], ...]:
+        """Lieux cités dans un texte : plus longues suites de mots correspondant à un nom du gazetier"""
+        def compute(text: str | None) -> Tuple[Tuple[int, int], ...]:
+            tokens, res, i = normalize_place(text).split(), {}, 0
+            while i < len(tokens):
+                for n in range(min(self.gazetteer.towns.max_tokens, len(tokens) - i), 0, -1):
+                    # les noms de plusieurs mots doivent être exacts, les mots seuls peuvent être approchés
+                    if n == 1:
+                        matches = self._match_normalized(tokens[i])
+                    else:
+                        matches = [(0, place_id) for place_id in self.gazetteer.towns.get(" ".join(tokens[i:i + n]))]
+                    if matches:
+                        for distance, place_id in matches:
+                            res[place_id] = min(distance, res.get(place_id, distance))
+                        i += n - 1
+                        break
+                i += 1
+            return tuple((distance, place_id) for place_id, distance in res.items())
+        return self._memo(self._texts, text, compute)
+
+    # résolution :
+    # ------------
+    def scores(self, postcard: Postcard) -> Tuple[Dict[int, float], Counter]:
+        """Scores des lieux candidats et départements des tampons d'une carte"""
+        scores: Dict[int, float] = {}
+        departments = Counter()
+        for det in postcard.annotations.detections:
+            content = det.content
+            if isinstance(content, DateStamp):
+                department = self.match_department(content.department)
+                if department is not None:
+                    departments[department] += 1
+                for distance, place_id in self.match_name(content.postal_agency):
+                    scores[place_id] = scores.get(place_id, 0.) + AGENCY_WEIGHT / (1 + distance)
+            elif isinstance(content, PrintedText):
+                for distance, place_id in self.scan_text(content.ocr_result):
+                    scores[place_id] = scores.get(place_id, 0.) + TEXT_WEIGHT / (1 + distance)
+        places = self.gazetteer.places
+        for place_id in scores:
+            if places[place_id].department in departments:
+                scores[place_id] += DEPARTMENT_WEIGHT
+        return scores, departments
+
+    def resolve(self, postcard: Postcard) -> Location | None:
+        """Localisation la plus probable d'une carte (le département seul si aucune ville ne correspond), None si
+        aucun indice"""
+        scores, departments = self.scores(postcard)
+        if scores:
+            place_id = max(scores, key=lambda i: (scores[i], -i))
+            return self.gazetteer.places[place_id].to_location()
+        if departments:
+            department = departments.most_common(1)[0][0]
+            return Location(department=department, region=self.gazetteer.regions.get(department))
+        return None
+
+    @staticmethod
+    def agrees(current: Location, resolved: Location) -> bool:
+        """Vérifie que la ville, le département et la région renseignés des deux localisations concordent"""
+        return all(a is None or b is None or normalize_place(a) == normalize_place(b)
+                   for a, b in ((current.town, resolved.town), (current.department, resolved.department),
+                                (current.region, resolved.region)))
+
+    def resolve_postcard(self, postcard: Postcard, overwrite: bool = False) -> bool:
+        """
+        Complète (ou remplace si overwrite) la localisation d'une carte ; renvoie True si elle a été modifiée. Sans
+        overwrite, les champs manquants ne sont complétés que si le lieu trouvé concorde avec les champs renseignés
+        (sinon, une ville d'un autre département pourrait être ajoutée) : la carte est alors ajoutée à conflicts.
+        """
+        resolved = self.resolve(postcard)
+        if resolved is None:
+            return False
+        current = postcard.annotations.location
+        if overwrite:
+            location = resolved
+        elif not self.agrees(current, resolved):
+            self.conflicts.append(postcard.name)
+            return False
+        else:
+            location = Location(**{name: value if value is not None else getattr(resolved, name)
+                                    for name, value in current.__dict__.items()})
+        if location == current:
+            return False
+        postcard.annotations.set_location(location, inplace=True)
+        return True
+
+    def resolve_collection(self, collection: Iterable[Postcard], overwrite: bool = False) -> int:
+        """Complète les localisations des cartes ; renvoie le nombre de cartes modifiées (cartes en désaccord dans
+        conflicts)"""
+        self.conflicts = []
+        return sum(self.resolve_postcard(postcard, overwrite=overwrite) for postcard in collection)
@@ -0,0 +1,189 @@
+from dataclasses import dataclass, field
+from collections.abc import Sequence
+from typing import List, Dict, Tuple, Iterator, Iterable, Callable
+from pathlib import Path
+import os
+from t2ia_collection.collection import *
+from t2ia_collection.parallel import chunks, bounded_map, default_workers
+
+# ======================================================================================================================
+# PARSING des fichiers YOLO
+# ======================================================================================================================
+# Un fichier de sortie YOLO contient une ligne par détection : "class x y w h [conf]" en coordonnées xywhn.
+# Les lignes sans confiance sont des annotations manuelles, celles avec une confiance des prédictions.
+
+# résultat du parsing d'un fichier : (chemin, ids de classe, coordonnées xywhn, confiances)
+ParsedYoloFile = Tuple[str, List[int], List[Tuple[float, float, float, float]], List[float | None]]
+
+
+def parse_yolo_file(file_path: str | Path) -> ParsedYoloFile:
+    """Lit un fichier txt au format YOLO et renvoie ses colonnes sous forme de types simples (picklables à peu de frais
+    pour être renvoyés par un processus de travail)"""
+    class_ids, coords, confidences = [], [], []
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, start=1):
+            values = line.split()
+            if not values:  # lignes vides
+                continue
+            if len(values) not in (5, 6):
+                raise ValueError(f"{file_path}:{line_number}: expected 'class x y w h [conf]', got {line.strip()!r}")
+            try:
+                class_ids.append(int(values[0]))
+                coords.append(tuple(float(el) for el in values[1:5]))
+                confidences.append(float(values[5]) if len(values) == 6 else None)
+            except ValueError:
+                raise ValueError(f"{file_path}:{line_number}: invalid value in {line.strip()!r}")
+    return str(file_path), class_ids, coords, confidences
+
+
+def _parse_yolo_chunk(file_paths: List[str], strict: bool) -> List[ParsedYoloFile | Tuple[str, str]]:
+    """Parse un lot de fichiers dans un processus de travail. Si non strict, les erreurs sont renvoyées sous la forme
+    (chemin, message) au lieu d'être levées."""
+    res = []
+    for file_path in file_paths:
+        try:
+            res.append(parse_yolo_file(file_path))
+        except (ValueError, OSError) as e:
+            if strict:
+                raise
+            res.append((file_path, str(e)))
+    return res
+
+
+# ======================================================================================================================
+# INGESTION dans une CardCollection
+# ======================================================================================================================
+
+@dataclass
+class IngestionReport:
+    """Compte-rendu (et progression) d'une ingestion"""
+    n_files: int = 0
+    n_detections: int = 0
+    errors: Dict[str, str] = field(default_factory=dict)  # {chemin: message} des fichiers ignorés
+
+
+class YoloIngestor:
+    """
+    Ingestion des fichiers de sortie YOLO d'une arborescence dans une CardCollection. Les fichiers sont parsés par lots
+    dans un pool de processus ; au plus max_pending lots sont en vol à la fois (back-pressure), et les résultats sont
+    ajoutés à la collection au fil de l'eau, dans l'ordre de parcours de l'arborescence.
+    """
+
+    def __init__(self,
+                 class_names: Sequence[str] | Dict[int, str],
+                 image_suffix: str = ".jpg",
+                 workers: int | None = None,
+                 chunk_size: int = 64,
+                 max_pending: int | None = None,
+                 strict: bool = True,
+                 progress: Callable[[IngestionReport], None] | None = None):
+        # correspondance id de classe YOLO -> sous-classe de Content (vérifiée une seule fois)
+        if not isinstance(class_names, dict):
+            class_names = dict(enumerate(class_names))
+        self.content_types = {
+            class_id: type(Content.create_instance(content_class=name)) for class_id, name in class_names.items()
+        }
+        self.image_suffix = image_suffix
+        self.workers = default_workers(workers)  # 0 : parsing dans le processus courant
+        self.chunk_size = chunk_size
+        self.max_pending = max_pending if max_pending is not None else 2 * max(self.workers, 1)
+        self.strict = strict
+        self.progress = progress
+
+    # parcours et parsing :
+    # ---------------------
+    @staticmethod
+    def iter_label_files(root: str | Path, suffix: str = ".txt") -> Iterator[str]:
+        """Parcourt l'arborescence de manière paresseuse et déterministe (ordre alphabétique)"""
+        for dir_path, dir_names, file_names in os.walk(root):
+            dir_names.sort()
+            for file_name in sorted(file_names):
+                if file_name.endswith(suffix):
+                    yield os.path.join(dir_path, file_name)
+
+    def _iter_chunks(self, root: str | Path) -> Iterator[List[str]]:
+        """Découpe le parcours de l'arborescence en lots de chunk_size fichiers"""
+        return chunks(self.iter_label_files(root), self.chunk_size)
+
+    def iter_parsed(self, root: str | Path) -> Iterator[ParsedYoloFile | Tuple[str, str]]:
+        """Parse les fichiers de l'arborescence, en parallèle si workers > 0, dans l'ordre du parcours"""
+        for results in bounded_map(_parse_yolo_chunk, self._iter_chunks(root), self.strict,
+                                   workers=self.workers, max_pending=self.max_pending):
+            yield from results
+
+    # construction des objets :
+    # -------------------------
+    def image_path(self, label_path: str | Path) -> Path:
+        """Chemin de l'image correspondant à un fichier de labels (convention YOLO : .../labels/x.txt ->
+        .../images/x.jpg)"""
+        parts = list(Path(label_path).with_suffix(self.image_suffix).parts)
+        if 'labels' in parts:
+            index = len(parts) - 1 - parts[::-1].index('labels')  # dernier dossier 'labels'
+            parts[index] = 'images'
+        return Path(*parts)
+
+    def build_detections(self, parsed: ParsedYoloFile) -> List[Detection]:
+        """Construit les détections d'un fichier parsé, avec la construction par lot des bbox"""
+        file_path, class_ids, coords, confidences = parsed
+        try:
+            bboxes = BoundingBoxArray.from_coords(coords, CoordFormat.XYWHN)
+            content_types = [self.content_types[class_id] for class_id in class_ids]
+        except KeyError as e:
+            raise ValueError(f"{file_path}: unknown class id {e.args[0]}")
+        except ValueError as e:
+            raise ValueError(f"{file_path}: {e}")
+        return [Detection(bbox, is_manual=confidence is None, confidence=confidence, content=content_type())
+                for bbox, content_type, confidence in zip(bboxes, content_types, confidences)]
+
+    def build_postcard(self, parsed: ParsedYoloFile) -> Postcard:
+        """Construit la carte (sans charger l'image) à partir d'un fichier parsé"""
+        return Postcard(path=str(self.image_path(parsed[0])),
+                        annotations=Annotations(detections=self.build_detections(parsed)))
+
+    # ingestion :
+    # -----------
+    @staticmethod
+    def detection_key(detection: Detection) -> tuple:
+        """Identité d'une détection pour la fusion : classe, bbox et confiance"""
+        return detection.get_content_cls(), detection.bbox.xywhn(), detection.confidence
+
+    def _new_detections(self, collection: CardCollection, postcard: Postcard) -> List[Detection]:
+        """Détections de la carte absentes de la carte du même nom déjà dans la collection"""
+        if postcard.name not in collection:
+            return postcard.annotations.detections
+        known = {self.detection_key(det) for det in collection[postcard.name].annotations.detections}
+        return [det for det in postcard.annotations.detections if self.detection_key(det) not in known]
+
+    def ingest(self, collection: CardCollection, root: str | Path, merge: bool = True) -> IngestionReport:
+        """Ajoute à la collection une carte par fichier de labels de l'arborescence. Si merge, les détections d'une
+        carte déjà présente sont complétées par celles qu'elle n'a pas déjà (même classe, bbox et confiance) : ingérer
+        deux fois la même arborescence ne duplique pas les détections. Sinon, la carte est remplacée."""
+        report = IngestionReport()
+        for parsed in self.iter_parsed(root):
+            report.n_files += 1
+            if len(parsed) == 2:  # erreur de parsing, en mode non strict
+                report.errors[parsed[0]] = parsed[1]
+            else:
+                try:
+                    postcard = self.build_postcard(parsed)
+                except ValueError as e:
+                    if self.strict:
+                        raise
+                    report.errors[parsed[0]] = str(e)
+                else:
+                    if merge:
+                        postcard.annotations.detections = self._new_detections(collection, postcard)
+                    if not (merge and postcard.name in collection and not postcard.annotations.detections):
+                        collection.add(postcard, merge=merge)  # carte inchangée : pas journalisée comme modifiée
+                    report.n_detections += len(postcard.annotations)
+            if self.progress is not None and report.n_files % self.chunk_size == 0:
+                self.progress(report)
+        if self.progress is not None:
+            self.progress(report)
+        return report
+
+
+def ingest_yolo_dir(collection: CardCollection, root: str | Path, class_names: Sequence[str] | Dict[int, str],
+                    merge: bool = True, **kwargs) -> IngestionReport:
+    """Raccourci pour YoloIngestor(class_names, **kwargs).ingest(collection, root, merge)"""
+    return YoloIngestor(class_names, **kwargs).ingest(collection, root, merge=merge)
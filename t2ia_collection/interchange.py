@@ -0,0 +1,361 @@
+from dataclasses import fields
+from typing import List, Dict, Tuple, Iterator, Iterable, TextIO, Any
+from pathlib import Path
+from xml.etree.ElementTree import iterparse
+from xml.sax.saxutils import escape, quoteattr
+import json
+from t2ia_collection.collection import *
+
+# ======================================================================================================================
+# PARSEUR JSON INCRÉMENTAL
+# ======================================================================================================================
+
+class JsonStream:
+    """
+    Parseur JSON incrémental pour les fichiers de la forme {"clé": [élément, ...], ...} (COCO notamment) : les
+    éléments des tableaux de premier niveau sont décodés un par un avec json.JSONDecoder.raw_decode, le fichier étant
+    lu par blocs. La mémoire utilisée est bornée par la taille d'un bloc et celle du plus gros élément.
+    """
+
+    def __init__(self, f: TextIO, chunk_size: int = 1 << 16):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _read(self) -> bool:
+        """Lit un bloc supplémentaire (et oublie la partie déjà consommée du tampon)"""
+        if self.eof:
+            return False
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def _peek(self) -> str:
+        """Prochain caractère non blanc, sans le consommer ("" en fin de fichier)"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in " \t\n\r":
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._read():
+                return ""
+
+    def _expect(self, chars: str) -> str:
+        """Consomme le prochain caractère non blanc, qui doit être l'un de chars"""
+        char = self._peek()
+        if char == "" or char not in chars:
+            raise ValueError(f"invalid JSON: expected one of {chars!r}, got {char!r}")
+        self.pos += 1
+        return char
+
+    def decode_value(self) -> Any:
+        """Décode la prochaine valeur JSON complète, en lisant autant de blocs que nécessaire"""
+        self._peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self._read():
+                    raise
+                continue
+            # un nombre en fin de tampon peut être tronqué : on s'assure qu'il est complet
+            if end == len(self.buffer) and not self.eof and self._read():
+                continue
+            self.pos = end
+            return value
+
+    def iter_items(self, stream_keys: Iterable[str]) -> Iterator[Tuple[str, Any]]:
+        """Parcourt l'objet de premier niveau : renvoie (clé, élément) pour chaque élément des tableaux dont la clé
+        est dans stream_keys, et (clé, valeur) pour les autres clés"""
+        stream_keys = set(stream_keys)
+        self._expect("{")
+        if self._peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.decode_value()
+            self._expect(":")
+            if key in stream_keys and self._peek() == "[":
+                self.pos += 1
+                if self._peek() == "]":
+                    self.pos += 1
+                else:
+                    while True:
+                        yield key, self.decode_value()
+                        if self._expect(",]") == "]":
+                            break
+            else:
+                yield key, self.decode_value()
+            if self._expect(",}") == "}":
+                return
+
+
+# ======================================================================================================================
+# CONTENU
+# ======================================================================================================================
+
+class _ContentFactory:
+    """Création des contenus à partir du nom de classe et d'attributs externes : la classe et ses champs publics ne
+    sont résolus qu'une fois par nom, et les attributs inconnus de la classe (ajoutés par les outils d'annotation) sont
+    ignorés. Les chaînes répétitives des contenus sont partagées (cf. interning)."""
+
+    def __init__(self, pool: StringPool | None = None):
+        self._cache = {}
+        self.pool = pool if pool is not None else StringPool()
+
+    def __call__(self, content_class: str, attributes: dict | None = None) -> Content:
+        if content_class not in self._cache:
+            content_type = type(Content.create_instance(content_class=content_class))
+            self._cache[content_class] = (content_type,
+                                          {f.name for f in fields(content_type) if not f.name.startswith('_')})
+        content_type, names = self._cache[content_class]
+        if not attributes:
+            return content_type()
+        res = content_type.from_dict({key: value for key, value in attributes.items() if key in names})
+        intern_content(res, self.pool)
+        return res
+
+
+# ======================================================================================================================
+# COCO
+# ======================================================================================================================
+# Les bbox COCO sont au format [x_min, y_min, largeur, hauteur] en pixels : contrairement à CoordFormat.XYWH, le point
+# de référence est le coin haut-gauche, on passe donc par CoordFormat.XYXY.
+
+def _clip_xyxy(coords: Sequence[float], img_size: Tuple[float, float]) -> List[float]:
+    """Ramène des coordonnées xyxy dans l'image (les outils d'annotation débordent souvent de quelques pixels)"""
+    img_w, img_h = img_size
+    x_min, y_min, x_max, y_max = coords
+    return [min(max(x_min, 0), img_w), min(max(y_min, 0), img_h),
+            min(max(x_max, 0), img_w), min(max(y_max, 0), img_h)]
+
+
+def _coco_detection(annotation: dict, img_size: Tuple[int, int], category: str,
+                    content_factory: _ContentFactory) -> Detection:
+    """Construit une détection à partir d'une annotation COCO"""
+    x_min, y_min, w, h = annotation['bbox']
+    coords = _clip_xyxy([x_min, y_min, x_min + w, y_min + h], img_size)
+    score = annotation.get('score')  # présent dans les fichiers de résultats des modèles
+    return Detection(BoundingBox.from_coords(coords, CoordFormat.XYXY, img_size),
+                     is_manual=score is None,
+                     confidence=score,
+                     content=content_factory(category, annotation.get('attributes')))
+
+
+def iter_coco(file_path: str | Path,
+              category_map: Dict[str, str] | None = None,
+              chunk_size: int = 1 << 16) -> Iterator[Tuple[dict, Detection]]:
+    """
+    Lecture en flux d'un fichier COCO : renvoie (image, détection) pour chaque annotation, où image est le dict COCO
+    de l'image. Seules les images et les catégories sont gardées en mémoire ; si les annotations précèdent les images
+    ou les catégories dans le fichier, une seconde passe est faite. category_map permet de renommer les catégories
+    COCO en noms de sous-classes de Content.
+    """
+    category_map = category_map or {}
+    images, categories = {}, {}
+    content_factory = _ContentFactory()
+
+    def detection(item):
+        image = images[item['image_id']]
+        return image, _coco_detection(item, (image['width'], image['height']), categories[item['category_id']],
+                                      content_factory)
+
+    # première passe : les annotations lues avant la fin des tableaux images et categories sont ignorées
+    finished, last_key, skipped = set(), None, False
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for key, item in JsonStream(f, chunk_size).iter_items(['images', 'annotations', 'categories']):
+            if key != last_key:  # le tableau précédent est terminé
+                finished.add(last_key)
+                last_key = key
+            if key == 'images':
+                images[item['id']] = item
+            elif key == 'categories':
+                categories[item['id']] = category_map.get(item['name'], item['name'])
+            elif key == 'annotations':
+                if {'images', 'categories'} <= finished:
+                    yield detection(item)
+                else:
+                    skipped = True
+    if not skipped:
+        return
+
+    # seconde passe : uniquement les annotations ignorées
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for key, item in JsonStream(f, chunk_size).iter_items(['annotations']):
+            if key == 'annotations':
+                yield detection(item)
+
+
+def _get_postcard(collection: CardCollection, file_name: str, img_size: Tuple[int, int],
+                  image_root: str | Path | None) -> Postcard:
+    """Renvoie la carte correspondant à l'image, créée et ajoutée à la collection si besoin"""
+    name = Path(file_name).stem
+    if name not in collection:
+        path = Path(image_root) / file_name if image_root is not None else Path(file_name)
+        collection.add(Postcard(path, name=name, img_size=img_size))
+    return collection[name]
+
+
+def import_coco(collection: CardCollection, file_path: str | Path, image_root: str | Path | None = None,
+                category_map: Dict[str, str] | None = None) -> int:
+    """Ajoute les annotations d'un fichier COCO à la collection, en flux. Renvoie le nombre de détections ajoutées."""
+    n_detections = 0
+    for image, detection in iter_coco(file_path, category_map=category_map):
+        postcard = _get_postcard(collection, image['file_name'], (image['width'], image['height']), image_root)
+        postcard.annotations.detections.append(detection)
+        n_detections += 1
+    return n_detections
+
+
+def _class_names(collection: CardCollection, class_names: List[str] | None) -> List[str]:
+    """Liste des classes à exporter : celle donnée, sinon celles présentes dans la collection par ordre d'apparition"""
+    if class_names is not None:
+        return list(class_names)
+    res = {}
+    for postcard in collection:
+        for det in postcard.annotations.detections:
+            res.setdefault(det.get_content_cls(), None)
+    return list(res)
+
+
+def export_coco(collection: CardCollection, file_path: str | Path, class_names: List[str] | None = None,
+                with_attributes: bool = True):
+    """
+    Écrit la collection au format COCO, image par image sans construire le document en mémoire. Les catégories sont
+    les noms des sous-classes de Content ; le contenu des détections est écrit dans le champ 'attributes' et la
+    confiance des prédictions dans 'score'. La taille des images doit être connue (cf. Postcard.get_img_size()).
+    """
+    class_names = _class_names(collection, class_names)
+    category_ids = {name: category_id for category_id, name in enumerate(class_names, start=1)}
+    dumps = json.JSONEncoder(ensure_ascii=False).encode
+    with open(file_path, 'w', encoding='utf-8') as f:
+        f.write('{"categories": ')
+        f.write(dumps([{'id': category_id, 'name': name, 'supercategory': ''}
+                       for name, category_id in category_ids.items()]))
+        f.write(',\n"images": [')
+        for image_id, postcard in enumerate(collection, start=1):
+            img_w, img_h = postcard.get_img_size()
+            f.write(("\n" if image_id == 1 else ",\n") + dumps(
+                {'id': image_id, 'file_name': Path(postcard.path).name, 'width': img_w, 'height': img_h}))
+        f.write('],\n"annotations": [')
+        annotation_id = 0
+        for image_id, postcard in enumerate(collection, start=1):
+            img_w, img_h = postcard.get_img_size()
+            for det in postcard.annotations.detections:
+                category_id = category_ids.get(det.get_content_cls())
+                if category_id is None:
+                    continue
+                x_min, y_min, x_max, y_max = det.bbox.xyxyn()
+                annotation = {'id': annotation_id + 1, 'image_id': image_id, 'category_id': category_id,
+                              'bbox': [x_min * img_w, y_min * img_h, (x_max - x_min) * img_w, (y_max - y_min) * img_h],
+                              'area': (x_max - x_min) * img_w * (y_max - y_min) * img_h,
+                              'iscrowd': 0}
+                if not det.is_manual:
+                    annotation['score'] = det.confidence
+                if with_attributes and not det.isempty():
+                    annotation['attributes'] = det.content.to_dict()
+                f.write(("\n" if annotation_id == 0 else ",\n") + dumps(annotation))
+                annotation_id += 1
+        f.write(']}\n')
+
+
+# ======================================================================================================================
+# CVAT
+# ======================================================================================================================
+# Format "CVAT for images 1.1" : une balise <image> par image contenant des <box> en pixels (xtl, ytl, xbr, ybr), soit
+# CoordFormat.XYXY. Le contenu des détections est stocké dans des balises <attribute> dont les valeurs sont encodées en
+# json (les valeurs saisies à la main qui ne sont pas du json valide sont gardées telles quelles). La confiance des
+# prédictions est stockée dans l'attribut réservé 'score'.
+
+CVAT_SCORE_ATTRIBUTE = "score"
+
+
+def _cvat_value(value: str) -> Any:
+    """Décode la valeur d'un attribut CVAT"""
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+
+def iter_cvat(file_path: str | Path) -> Iterator[Tuple[dict, List[Detection]]]:
+    """
+    Lecture en flux d'un fichier CVAT XML avec iterparse : renvoie (attributs de l'image, détections) image par
+    image. Chaque balise <image> est libérée une fois traitée, la mémoire reste donc bornée quelle que soit la taille
+    du fichier.
+    """
+    content_factory = _ContentFactory()
+    context = iterparse(file_path, events=('start', 'end'))
+    _, root = next(context)
+    for event, elem in context:
+        if event != 'end' or elem.tag != 'image':
+            continue
+        img_size = (float(elem.get('width')), float(elem.get('height')))
+        detections = []
+        for box in elem.iter('box'):
+            attributes = {attribute.get('name'): _cvat_value(attribute.text or "")
+                          for attribute in box.iter('attribute')}
+            score = attributes.pop(CVAT_SCORE_ATTRIBUTE, None)
+            coords = _clip_xyxy([float(box.get(coord)) for coord in ('xtl', 'ytl', 'xbr', 'ybr')], img_size)
+            detections.append(Detection(BoundingBox.from_coords(coords, CoordFormat.XYXY, img_size),
+                                        is_manual=box.get('source', 'manual') == 'manual' or score is None,
+                                        confidence=score,
+                                        content=content_factory(box.get('label'), attributes)))
+        image = dict(elem.attrib)
+        elem.clear()
+        root.clear()  # libère les images déjà traitées
+        yield image, detections
+
+
+def import_cvat(collection: CardCollection, file_path: str | Path, image_root: str | Path | None = None) -> int:
+    """Ajoute les images et annotations d'un fichier CVAT XML à la collection, en flux. Renvoie le nombre de
+    détections ajoutées."""
+    n_detections = 0
+    for image, detections in iter_cvat(file_path):
+        img_size = (int(float(image['width'])), int(float(image['height'])))
+        _get_postcard(collection, image['name'], img_size, image_root).annotations.detections.extend(detections)
+        n_detections += len(detections)
+    return n_detections
+
+
+def export_cvat(collection: CardCollection, file_path: str | Path, class_names: List[str] | None = None,
+                with_attributes: bool = True):
+    """Écrit la collection au format CVAT XML, image par image. La taille des images doit être connue (cf.
+    Postcard.get_img_size())."""
+    class_names = _class_names(collection, class_names)
+    known = set(class_names)
+    with open(file_path, 'w', encoding='utf-8') as f:
+        f.write('<?xml version="1.0" encoding="utf-8"?>\n<annotations>\n  <version>1.1</version>\n')
+        f.write('  <meta>\n    <task>\n      <labels>\n')
+        for name in class_names:
+            f.write(f'        <label>\n          <name>{escape(name)}</name>\n          <type>rectangle</type>\n'
+                    f'        </label>\n')
+        f.write('      </labels>\n    </task>\n  </meta>\n')
+        for image_id, postcard in enumerate(collection):
+            img_w, img_h = postcard.get_img_size()
+            f.write(f'  <image id="{image_id}" name={quoteattr(Path(postcard.path).name)} '
+                    f'width="{img_w}" height="{img_h}">\n')
+            for det in postcard.annotations.detections:
+                if det.get_content_cls() not in known:
+                    continue
+                x_min, y_min, x_max, y_max = det.bbox.xyxyn()
+                f.write(f'    <box label={quoteattr(det.get_content_cls())} '
+                        f'source="{"manual" if det.is_manual else "auto"}" occluded="0" '
+                        f'xtl="{x_min * img_w}" ytl="{y_min * img_h}" xbr="{x_max * img_w}" ybr="{y_max * img_h}" '
+                        f'z_order="0">\n')
+                attributes = det.content.to_dict() if with_attributes and not det.isempty() else {}
+                if not det.is_manual:
+                    attributes[CVAT_SCORE_ATTRIBUTE] = det.confidence
+                for name, value in attributes.items():
+                    f.write(f'      <attribute name={quoteattr(name)}>'
+                            f'{escape(json.dumps(value, ensure_ascii=False))}</attribute>\n')
+                f.write('    </box>\n')
+            f.write('  </image>\n')
+        f.write('</annotations>\n')
@@ -0,0 +1,116 @@
+from typing import List, Dict, Tuple, Iterable, Any
+from array import array
+from t2ia_collection.postcard import *
+
+# ======================================================================================================================
+# POOL de chaînes
+# ======================================================================================================================
+# Sur des millions de détections, les bureaux de poste, départements, pays, mots-clés... se répètent : après un
+# chargement json, chaque occurrence est pourtant une chaîne distincte. Un StringPool partage une seule chaîne par
+# valeur (moins de mémoire, hash calculé une fois, égalités résolues par identité) et associe à chaque valeur un code
+# entier pour les formats en colonnes.
+
+class StringPool:
+    """Pool de chaînes partagées, avec un code entier (catégorie) par valeur"""
+
+    def __init__(self, values: Iterable[str] = ()):
+        self.values: List[str] = []
+        self._codes: Dict[str, int] = {}
+        for value in values:
+            self.code(value)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __contains__(self, value) -> bool:
+        return value in self._codes
+
+    def code(self, value: str) -> int:
+        """Code de la valeur, ajoutée au pool si besoin"""
+        res = self._codes.get(value)
+        if res is None:
+            res = self._codes[value] = len(self.values)
+            self.values.append(value)
+        return res
+
+    def intern(self, value: Any) -> Any:
+        """Chaîne partagée égale à la valeur (les valeurs qui ne sont pas des str sont renvoyées telles quelles)"""
+        if type(value) is not str:
+            return value
+        return self.values[self.code(value)]
+
+    def intern_all(self, values: Iterable[Any]) -> List[Any]:
+        return [self.intern(value) for value in values]
+
+    # colonnes catégorielles :
+    # ------------------------
+    def encode(self, values: Iterable[str | None]) -> array:
+        """Colonne de codes des valeurs (-1 pour None)"""
+        return array('l', (-1 if value is None else self.code(value) for value in values))
+
+    def decode(self, codes: Iterable[int]) -> List[str | None]:
+        """Valeurs à partir d'une colonne de codes"""
+        values = self.values
+        return [None if code < 0 else values[code] for code in codes]
+
+
+# ======================================================================================================================
+# CHAMPS partagés
+# ======================================================================================================================
+
+# champs répétitifs des contenus, par classe (les sous-classes héritent des champs de leurs classes mères)
+INTERNED_FIELDS: Dict[str, Tuple[str, ...]] = {
+    'Text': ('keywords',),
+    'DateStamp': ('postal_agency', 'department', 'collection'),
+    'PostageStamp': ('country', 'color'),
+}
+_FIELDS_BY_CLASS: Dict[type, Tuple[str, ...]] = {}
+
+
+def interned_fields(content_cls: type) -> Tuple[str, ...]:
+    """Champs partagés d'une classe de contenu"""
+    if content_cls not in _FIELDS_BY_CLASS:
+        _FIELDS_BY_CLASS[content_cls] = tuple(name for cls in content_cls.__mro__
+                                              for name in INTERNED_FIELDS.get(cls.__name__, ()))
+    return _FIELDS_BY_CLASS[content_cls]
+
+
+def intern_value(value: Any, pool: StringPool) -> Any:
+    """Chaîne, ou ensemble / liste de chaînes, partagés"""
+    if isinstance(value, set):
+        return {pool.intern(item) for item in value}
+    if isinstance(value, list):
+        return pool.intern_all(value)
+    return pool.intern(value)
+
+
+def intern_content_dict(content_cls: type, content_dict: dict, pool: StringPool):
+    """Partage, en place, les champs répétitifs d'un dictionnaire de contenu"""
+    for name in interned_fields(content_cls):
+        if name in content_dict:
+            content_dict[name] = intern_value(content_dict[name], pool)
+
+
+def intern_content(content: Content, pool: StringPool):
+    """Partage, en place, les champs répétitifs d'un contenu"""
+    intern_content_dict(type(content), content.__dict__, pool)
+
+
+def intern_postcard(postcard: Postcard, pool: StringPool):
+    """Partage, en place, la localisation, les tags, les mots-clés et les contenus d'une carte"""
+    annotations = postcard.annotations
+    location = annotations.location
+    location.town, location.department, location.region = pool.intern_all(
+        (location.town, location.department, location.region))
+    annotations.tags = pool.intern_all(annotations.tags)
+    annotations.keywords = pool.intern_all(annotations.keywords)
+    for det in annotations.detections:
+        intern_content(det.content, pool)
+
+
+def intern_collection(postcards: Iterable[Postcard], pool: StringPool | None = None) -> StringPool:
+    """Partage, en place, les chaînes répétitives de toutes les cartes ; renvoie le pool utilisé"""
+    pool = pool if pool is not None else StringPool()
+    for postcard in postcards:
+        intern_postcard(postcard, pool)
+    return pool
@@ -0,0 +1,52 @@
+from typing import Iterable, Iterator, Callable, Any
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+import os
+
+# ======================================================================================================================
+# TRAITEMENTS PARALLÈLES par lots
+# ======================================================================================================================
+# Les traitements lourds (ingestion, évaluation, rendu...) découpent leurs entrées en lots, exécutés dans un pool de
+# processus. Les lots sont soumis au fil de l'eau avec back-pressure : au plus max_pending lots sont en vol à la fois,
+# si bien que les entrées ne sont pas toutes extraites ni les résultats tous accumulés d'un coup. Les fonctions
+# exécutées dans le pool (et leurs arguments) doivent être picklables.
+
+
+def chunks(items: Iterable, chunk_size: int) -> Iterator[list]:
+    """Découpe un itérable, de manière paresseuse, en listes de chunk_size éléments (la dernière peut être plus courte)"""
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def default_workers(workers: int | None) -> int:
+    """Nombre de processus de travail : par défaut, le nombre de processeurs"""
+    return (os.cpu_count() or 1) if workers is None else workers
+
+
+def bounded_map(function: Callable[..., Any], items: Iterable, *args, workers: int | None = None,
+                max_pending: int | None = None) -> Iterator[Any]:
+    """
+    Résultats de function(item, *args) pour chaque élément (en général un lot, cf. chunks()), dans l'ordre des
+    éléments. Les appels sont exécutés dans un pool de workers processus (dans le processus courant si workers=0), au
+    plus max_pending à la fois (par défaut 2 * workers).
+    """
+    workers = default_workers(workers)
+    if workers == 0:
+        for item in items:
+            yield function(item, *args)
+        return
+    max_pending = max_pending if max_pending is not None else 2 * workers
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for item in items:
+            if len(pending) >= max_pending:  # back-pressure : on attend le plus ancien appel avant d'en soumettre un
+                yield pending.popleft().result()
+            pending.append(executor.submit(function, item, *args))
+        while pending:
+            yield pending.popleft().result()
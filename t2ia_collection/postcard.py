@@ -1,6 +1,364 @@
-from abc import ABC, abstractmethod
-from typing import Dict, List, Tuple, Optional
+from dataclasses import dataclass, field
+from typing import List, Dict, Tuple, Optional, Set, Iterator, Iterable
+from copy import deepcopy
 import json
 from pathlib import Path
+from t2ia_collection.detection import *
+import importlib.util  # pour détecter si d'autres librairies sont installées
+import math
 
+# ======================================================================================================================
+# LOCATION
+# ======================================================================================================================
 
+EARTH_RADIUS_KM = 6371.0088  # rayon moyen de la Terre
+
+
+def haversine(gps1: Tuple[float, float], gps2: Tuple[float, float]) -> float:
+    """Distance du grand cercle, en km, entre deux points (latitude, longitude) en degrés"""
+    lat1, lon1, lat2, lon2 = map(math.radians, (*gps1, *gps2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1., math.sqrt(a)))
+
+
+def in_area(gps: Tuple[float, float], lat_min: float, lon_min: float, lat_max: float, lon_max: float) -> bool:
+    """Vérifie si un point est dans un rectangle de coordonnées (lon_min > lon_max s'il traverse l'antiméridien)"""
+    lat, lon = gps
+    if not lat_min <= lat <= lat_max:
+        return False
+    return lon_min <= lon <= lon_max if lon_min <= lon_max else (lon >= lon_min or lon <= lon_max)
+
+
+@dataclass
+class Location:
+    """Classe pour la localisation d'une carte postale"""
+    town: str | None = None
+    department: str | None = None
+    region: str | None = None
+    gps: Tuple[float, float] | None = None  # (latitude, longitude) en degrés
+
+    def __post_init__(self):
+        if self.gps is not None:
+            if len(self.gps) != 2:
+                raise ValueError(f"gps must be a (latitude, longitude) pair, got {self.gps}")
+            self.gps = (float(self.gps[0]), float(self.gps[1]))  # les json renvoient des listes
+
+    def copy(self) -> "Location":
+        """retourne une copie de l'instance"""
+        return deepcopy(self)
+
+    # Les tests :
+    # -----------
+    def isempty(self) -> bool:
+        """Vérifie si la localisation est vide"""
+        return self == Location()
+
+    # Les distances :
+    # ---------------
+    def distance(self, other: "Location | Tuple[float, float]") -> float | None:
+        """Distance en km à une autre localisation ou à un point (latitude, longitude), None si inconnue"""
+        gps = other.gps if isinstance(other, Location) else other
+        if self.gps is None or gps is None:
+            return None
+        return haversine(self.gps, gps)
+
+    # pour exporter/importer :
+    # ------------------------
+    def to_dict(self) -> dict:
+        """Renvoie un dictionnaire avec le contenu de la classe"""
+        return {'town': self.town,
+                'department': self.department,
+                'region': self.region,
+                'gps': list(self.gps) if self.gps is not None else None}
+
+    @staticmethod
+    def from_dict(data: dict | None) -> "Location":
+        """Permet d'instancier la classe à partir d'un dictionnaire"""
+        return Location() if data is None else Location(**data)
+
+
+# ======================================================================================================================
+# ANNOTATIONS
+# ======================================================================================================================
+# Les compteurs de version des annotations et des cartes sont monotones : chacun retient l'état de ses enfants (les
+# détections, ou les annotations) lors de sa dernière lecture, et s'incrémente dès que cet état a changé (enfant
+# ajouté, retiré, remplacé ou modifié). Une somme des versions des enfants pourrait au contraire revenir à une valeur
+# déjà sauvegardée, par exemple en retirant une détection qui vient d'être modifiée.
+
+def _children_state(children: Iterable) -> tuple:
+    """État (enfant, version) des enfants d'un objet versionné"""
+    return tuple((child, child.version) for child in children)
+
+
+def _same_state(old: tuple, new: tuple) -> bool:
+    return len(old) == len(new) and all(a is b and version_a == version_b
+                                        for (a, version_a), (b, version_b) in zip(old, new))
+
+
+@dataclass
+class Annotations:
+    """Classe pour les annotations d'une carte postale : localisation, tags, mots-clés et détections"""
+    location: Location = field(default_factory=Location)
+    tags: List[str] = field(default_factory=list)
+    keywords: List[str] = field(default_factory=list)
+    detections: List[Detection] = field(default_factory=list)
+    # angle par lequel l'image doit être rotatée pour être dans le bon sens :
+    rotation: Orientation | int | float | str | None = 0
+    # compteur de modifications (cf. CardCollection.changes()), ignoré par les comparaisons :
+    _version: int = field(default=0, repr=False, compare=False, kw_only=True)
+    _children: tuple | None = field(default=None, init=False, repr=False, compare=False)  # état des détections
+
+    def __post_init__(self):
+        if not isinstance(self.rotation, Orientation):
+            self.rotation = Orientation.from_input(self.rotation)
+        self._children = _children_state(self.detections)
+
+    def __len__(self) -> int:
+        return len(self.detections)
+
+    def __iter__(self) -> Iterator[Detection]:
+        """iteration sur les détections"""
+        return iter(self.detections)
+
+    def copy(self) -> "Annotations":
+        """retourne une copie de l'instance"""
+        return deepcopy(self)
+
+    @property
+    def version(self) -> int:
+        """Compteur monotone des modifications des annotations et de leurs détections (ajout, retrait, modification)"""
+        children = _children_state(self.detections)
+        if self._children is not None and not _same_state(self._children, children):
+            self._version += 1
+        self._children = children
+        return self._version
+
+    def mark_modified(self):
+        """Signale une modification des annotations (appelé par les méthodes qui les modifient)"""
+        self._version += 1
+
+    def get_keywords(self) -> Set[str]:
+        """Retourne les mots-clés de la carte ainsi que ceux des textes détectés"""
+        res = set(self.keywords)
+        for det in self.detections:
+            if isinstance(det.content, Text):
+                res |= det.content.get_keywords()
+        return res
+
+    # Les modifications :
+    # -------------------
+    def set_location(self, location: Location | None = None, inplace: bool = False):
+        """Permet de spécifier la localisation de la carte"""
+        res = self if inplace else self.copy()
+        res.location = location if location is not None else Location()
+        res.mark_modified()
+        return None if inplace else res
+
+    def set_detections(self, detections: List[Detection] | None = None, inplace: bool = False):
+        """Permet de spécifier les détections de la carte"""
+        res = self if inplace else self.copy()
+        res.detections = list(detections) if detections is not None else []
+        res.mark_modified()
+        return None if inplace else res
+
+    def set_tags(self, tags: List[str] | None = None, inplace: bool = False):
+        """Permet de spécifier les tags de la carte"""
+        res = self if inplace else self.copy()
+        res.tags = list(tags) if tags is not None else []
+        res.mark_modified()
+        return None if inplace else res
+
+    def set_keywords(self, keywords: List[str] | None = None, inplace: bool = False):
+        """Permet de spécifier les mots-clés de la carte"""
+        res = self if inplace else self.copy()
+        res.keywords = list(keywords) if keywords is not None else []
+        res.mark_modified()
+        return None if inplace else res
+
+    # pour exporter/importer :
+    # ------------------------
+    def to_dict(self, full: bool = True) -> dict:
+        """Renvoie un dictionnaire avec le contenu de la classe"""
+        return {'location': self.location.to_dict(),
+                'tags': list(self.tags),
+                'keywords': list(self.keywords),
+                'detections': [det.to_dict(full=full) for det in self.detections],
+                'rotation': self.rotation.value}
+
+    @staticmethod
+    def from_dict(data: dict | None) -> "Annotations":
+        """Permet d'instancier la classe à partir d'un dictionnaire"""
+        if data is None:
+            return Annotations()
+        return Annotations(location=Location.from_dict(data.get('location')),
+                           tags=data.get('tags', []),
+                           keywords=data.get('keywords', []),
+                           detections=[Detection.from_dict(det) for det in data.get('detections', [])],
+                           rotation=data.get('rotation', 0))
+
+
+# ======================================================================================================================
+# POSTCARD
+# ======================================================================================================================
+
+# couleurs des bbox par classe de contenu (les autres classes ont une couleur dérivée de leur nom)
+CLASS_COLORS: Dict[str, Tuple[int, int, int]] = {
+    'Content': (128, 128, 128),
+    'Text': (31, 119, 180),
+    'PrintedText': (31, 119, 180),
+    'HandwrittenText': (255, 127, 14),
+    'SceneText': (44, 160, 44),
+    'Postmark': (148, 103, 189),
+    'DateStamp': (214, 39, 40),
+    'PostageStamp': (140, 86, 75),
+    'OtherMark': (227, 119, 194),
+}
+
+
+def class_color(content_cls: str) -> Tuple[int, int, int]:
+    """Couleur (r, g, b) des bbox d'une classe de contenu, stable d'une exécution à l'autre"""
+    if content_cls in CLASS_COLORS:
+        return CLASS_COLORS[content_cls]
+    h = sum(ord(char) * 31 ** i for i, char in enumerate(content_cls)) & 0xFFFFFF
+    return (h >> 16) & 0xFF, (h >> 8) & 0xFF, h & 0xFF
+
+
+def bbox_label(detection: Detection) -> str:
+    """Étiquette d'une bbox : classe du contenu, et confiance pour une prédiction"""
+    if detection.is_manual or detection.confidence is None:
+        return detection.get_content_cls()
+    return f"{detection.get_content_cls()} {detection.confidence:.2f}"
+
+
+@dataclass
+class Postcard:
+    """Classe pour une carte postale : le chemin de son image et ses annotations"""
+    path: str
+    name: str | None = None
+    annotations: Annotations = field(default_factory=Annotations)
+    img_size: Tuple[int, int] | None = None  # (largeur, hauteur) de l'image, si connue
+    # compteur de modifications (cf. CardCollection.changes()), ignoré par les comparaisons :
+    _version: int = field(default=0, repr=False, compare=False, kw_only=True)
+    _children: tuple | None = field(default=None, init=False, repr=False, compare=False)  # état des annotations
+
+    def __post_init__(self):
+        self.path = str(self.path)
+        if self.name is None:
+            self.name = Path(self.path).stem  # par défaut le nom du fichier sans extension
+        if self.img_size is not None:
+            self.img_size = (int(self.img_size[0]), int(self.img_size[1]))  # les json renvoient des listes
+        self._children = _children_state([self.annotations])
+
+    def copy(self) -> "Postcard":
+        """retourne une copie de l'instance"""
+        return deepcopy(self)
+
+    @property
+    def version(self) -> int:
+        """Compteur monotone des modifications de la carte, de ses annotations et de ses détections"""
+        children = _children_state([self.annotations])
+        if self._children is not None and not _same_state(self._children, children):
+            self._version += 1
+        self._children = children
+        return self._version
+
+    def mark_modified(self):
+        """Signale une modification de la carte (appelé par les méthodes qui la modifient)"""
+        self._version += 1
+
+    # Les annotations :
+    # -----------------
+    def get_annotations(self) -> Annotations:
+        """Retourne les annotations de la carte"""
+        return self.annotations
+
+    def set_annotations(self, annotations: Annotations | None = None, inplace: bool = False):
+        """Permet de spécifier les annotations de la carte"""
+        res = self if inplace else self.copy()
+        res.annotations = annotations if annotations is not None else Annotations()
+        res.mark_modified()
+        return None if inplace else res
+
+    def annotations_path(self) -> Path:
+        """Chemin par défaut du fichier d'annotations : à côté de l'image, avec l'extension .json"""
+        return Path(self.path).with_suffix('.json')
+
+    def save_annotations(self, file_path: str | Path | None = None, full: bool = True):
+        """Sauvegarde les annotations au format json"""
+        file_path = Path(file_path) if file_path is not None else self.annotations_path()
+        with open(file_path, 'w', encoding='utf-8') as f:
+            json.dump(self.annotations.to_dict(full=full), f, ensure_ascii=False)
+
+    def load_annotations(self, file_path: str | Path | None = None, inplace: bool = False):
+        """Charge les annotations depuis un fichier json"""
+        res = self if inplace else self.copy()
+        file_path = Path(file_path) if file_path is not None else self.annotations_path()
+        with open(file_path, 'r', encoding='utf-8') as f:
+            res.annotations = Annotations.from_dict(json.load(f))
+        res.mark_modified()
+        return None if inplace else res
+
+    # L'image :
+    # ---------
+    def load_image(self):
+        """Charge l'image de la carte avec PIL"""
+        if importlib.util.find_spec("PIL") is not None:
+            from PIL import Image
+            return Image.open(self.path)
+        raise NotImplementedError("PIL library is not installed, use 'pip install pillow'")
+
+    def get_img_size(self) -> Tuple[int, int]:
+        """Retourne la taille (largeur, hauteur) de l'image, lue dans l'entête du fichier si elle n'est pas connue"""
+        if self.img_size is None:
+            with self.load_image() as img:  # PIL ne décode pas les pixels pour lire la taille
+                self.img_size = img.size
+        return self.img_size
+
+    def draw_bboxes(self, image=None, width: int = 2, labels: bool = True,
+                    colors: Dict[str, Tuple[int, int, int]] | None = None):
+        """
+        Dessine les bbox des détections sur l'image de la carte (chargée si non fournie, par ex. réduite au préalable :
+        les coordonnées étant normalisées, elles s'adaptent à sa taille), en un seul passage sur une copie RGB de
+        l'image. Les bbox sont colorées selon la classe de leur contenu et étiquetées avec la confiance des prédictions.
+        """
+        if importlib.util.find_spec("PIL") is None:
+            raise NotImplementedError("PIL library is not installed, use 'pip install pillow'")
+        from PIL import ImageDraw
+        image = (image if image is not None else self.load_image()).convert("RGB")  # convert() renvoie une copie
+        colors = colors if colors is not None else {}
+        draw = ImageDraw.Draw(image)
+        for det in self.annotations.detections:
+            color = colors.get(det.get_content_cls()) or class_color(det.get_content_cls())
+            x_min, y_min, x_max, y_max = det.bbox.xyxy(image.size)
+            draw.rectangle((x_min, y_min, x_max, y_max), outline=color, width=width)
+            if labels:
+                label = bbox_label(det)
+                left, top, right, bottom = draw.textbbox((0, 0), label)
+                # au-dessus de la bbox, ou à l'intérieur si elle touche le haut de l'image
+                y_text = y_min - (bottom - top) - 2 if y_min >= bottom - top + 2 else y_min
+                draw.rectangle((x_min, y_text, x_min + right - left + 2, y_text + bottom - top + 2), fill=color)
+                draw.text((x_min + 1 - left, y_text + 1 - top), label, fill=(255, 255, 255))
+        return image
+
+    def rotate_image(self, angle: Orientation | int | float | str | None = None):
+        """Charge l'image et la tourne selon l'angle donné, ou selon la rotation des annotations si non spécifié"""
+        angle = self.annotations.rotation if angle is None else Orientation.from_input(angle)
+        # PIL.Image.rotate() tourne dans le sens anti-horaire, comme BoundingBox.rotate()
+        return self.load_image().rotate(angle.value, expand=True)
+
+    # pour exporter/importer :
+    # ------------------------
+    def to_dict(self, full: bool = True) -> dict:
+        """Renvoie un dictionnaire avec le contenu de la classe"""
+        return {'path': self.path,
+                'name': self.name,
+                'annotations': self.annotations.to_dict(full=full),
+                'img_size': list(self.img_size) if self.img_size is not None else None}
+
+    @staticmethod
+    def from_dict(data: dict) -> "Postcard":
+        """Permet d'instancier la classe à partir d'un dictionnaire"""
+        return Postcard(path=data['path'],
+                        name=data.get('name'),
+                        annotations=Annotations.from_dict(data.get('annotations')),
+                        img_size=data.get('img_size'))
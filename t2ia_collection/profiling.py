@@ -0,0 +1,229 @@
+from dataclasses import dataclass, field
+from typing import List, Dict, Tuple, Iterable, Iterator, Callable, Any
+from contextlib import contextmanager
+import bisect
+import functools
+import time
+from t2ia_collection.collection import *
+
+# ======================================================================================================================
+# MESURES
+# ======================================================================================================================
+# Instrumentation optionnelle : un Profiler activé remplace les points d'entrée instrumentés (process_content,
+# word_list, lemmatize, set_keywords, rotate, (dé)sérialisation...) par des versions chronométrées, et les restaure à sa
+# désactivation. Désactivé, il n'y a donc aucun surcoût. Les durées mesurées sont inclusives (un appel à
+# Text.process_content compte aussi dans Content.process_content qu'il appelle). Seul le processus courant est mesuré.
+
+DEFAULT_BUCKETS = (1e-6, 5e-6, 1e-5, 5e-5, 1e-4, 5e-4, 1e-3, 5e-3, 1e-2, 5e-2, 0.1, 0.5, 1., 5., 10.)  # en secondes
+
+
+@dataclass
+class Timing:
+    """Compteurs et histogramme des durées (en secondes) des appels d'un point d'entrée"""
+    buckets: Tuple[float, ...] = DEFAULT_BUCKETS
+    calls: int = 0
+    errors: int = 0
+    total: float = 0.
+    min: float = float('inf')
+    max: float = 0.
+    bucket_counts: List[int] = field(default_factory=list)  # non cumulés, le dernier pour +Inf
+
+    def __post_init__(self):
+        if not self.bucket_counts:
+            self.bucket_counts = [0] * (len(self.buckets) + 1)
+
+    def observe(self, seconds: float, error: bool = False):
+        """Enregistre un appel"""
+        self.calls += 1
+        self.errors += error
+        self.total += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+        self.bucket_counts[bisect.bisect_left(self.buckets, seconds)] += 1
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.calls if self.calls else 0.
+
+    def quantile(self, q: float) -> float:
+        """Quantile estimé à partir de l'histogramme (borne supérieure du seau atteint)"""
+        target, count = q * self.calls, 0
+        for bound, n in zip(self.buckets + (self.max,), self.bucket_counts):
+            count += n
+            if count >= target and count:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self) -> dict:
+        """Renvoie un dictionnaire avec le contenu de la classe"""
+        return {'calls': self.calls,
+                'errors': self.errors,
+                'total': self.total,
+                'mean': self.mean,
+                'min': self.min if self.calls else 0.,
+                'max': self.max,
+                'p50': self.quantile(0.5),
+                'p99': self.quantile(0.99),
+                'buckets': dict(zip([*self.buckets, float('inf')], self.bucket_counts))}
+
+
+# ======================================================================================================================
+# PROFILER
+# ======================================================================================================================
+
+# points d'entrée instrumentés par défaut, recherchés dans les classes du modèle et toutes leurs sous-classes
+DEFAULT_METHODS = ('process_content', 'word_list', 'lemmatize', 'set_keywords', 'rotate', 'from_coords', 'to_coords',
+                   'to_dict', 'from_dict', 'to_json_object', 'from_json_object', 'save', 'load',
+                   'build_detections', 'build_postcards')
+DEFAULT_CLASSES = (Content, BoundingBox, BoundingBoxArray, Detection, Location, Annotations, Postcard, CardCollection,
+                   BatchValidator)
+
+_active: "Profiler | None" = None  # un seul profiler actif à la fois
+
+
+def _all_subclasses(cls: type) -> List[type]:
+    res, stack = [], [cls]
+    while stack:
+        cls = stack.pop()
+        res.append(cls)
+        stack.extend(cls.__subclasses__())
+    return res
+
+
+class Profiler:
+    """
+    Profiler des étapes du pipeline : compteurs d'appels et d'erreurs et histogrammes des durées par point d'entrée
+    ('Classe.méthode'), exportables en dictionnaire (report()) ou au format texte de Prometheus (to_prometheus()).
+    S'utilise comme gestionnaire de contexte, ou avec enable() / disable().
+    """
+
+    def __init__(self, methods: Iterable[str] = DEFAULT_METHODS, classes: Iterable[type] = DEFAULT_CLASSES,
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.methods = tuple(methods)
+        self.classes = tuple(classes)
+        self.buckets = tuple(buckets)
+        self.timings: Dict[str, Timing] = {}
+        self._originals: List[Tuple[type, str, Any]] = []
+
+    def __enter__(self) -> "Profiler":
+        self.enable()
+        return self
+
+    def __exit__(self, *args):
+        self.disable()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self._originals)
+
+    def timing(self, name: str) -> Timing:
+        """Mesures d'un point d'entrée (créées si besoin)"""
+        if name not in self.timings:
+            self.timings[name] = Timing(self.buckets)
+        return self.timings[name]
+
+    def reset(self):
+        """Remet les mesures à zéro"""
+        self.timings.clear()
+
+    # instrumentation :
+    # -----------------
+    def instrument(self, function: Callable, name: str | None = None) -> Callable:
+        """Version chronométrée d'une fonction (par ex. un lemmatiseur passé à Text.lemmatize())"""
+        timing = self.timing(name or function.__qualname__)
+        perf_counter = time.perf_counter
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = perf_counter()
+            try:
+                res = function(*args, **kwargs)
+            except BaseException:
+                timing.observe(perf_counter() - start, error=True)
+                raise
+            timing.observe(perf_counter() - start)
+            return res
+        return wrapper
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[Timing]:
+        """Chronomètre un bloc de code : with profiler.stage('ocr'): ..."""
+        timing = self.timing(name)
+        start = time.perf_counter()
+        try:
+            yield timing
+        except BaseException:
+            timing.observe(time.perf_counter() - start, error=True)
+            raise
+        timing.observe(time.perf_counter() - start)
+
+    def enable(self):
+        """Remplace les points d'entrée par leurs versions chronométrées"""
+        global _active
+        if self.enabled:
+            return
+        if _active is not None:
+            raise RuntimeError("another Profiler is already enabled")
+        for base in self.classes:
+            for cls in _all_subclasses(base):
+                for name in self.methods:
+                    if name not in cls.__dict__:  # seules les méthodes définies par la classe elle-même
+                        continue
+                    original = cls.__dict__[name]
+                    label = f"{cls.__name__}.{name}"
+                    if isinstance(original, classmethod):
+                        wrapped = classmethod(self.instrument(original.__func__, label))
+                    elif isinstance(original, staticmethod):
+                        wrapped = staticmethod(self.instrument(original.__func__, label))
+                    elif callable(original):
+                        wrapped = self.instrument(original, label)
+                    else:
+                        continue
+                    self._originals.append((cls, name, original))
+                    setattr(cls, name, wrapped)
+        _active = self
+
+    def disable(self):
+        """Restaure les points d'entrée d'origine (les mesures sont conservées)"""
+        global _active
+        for cls, name, original in reversed(self._originals):
+            setattr(cls, name, original)
+        self._originals.clear()
+        if _active is self:
+            _active = None
+
+    # export :
+    # --------
+    def report(self, min_calls: int = 1) -> Dict[str, dict]:
+        """Mesures par point d'entrée, par durée totale décroissante"""
+        timings = sorted(((name, timing) for name, timing in self.timings.items() if timing.calls >= min_calls),
+                         key=lambda item: -item[1].total)
+        return {name: timing.to_dict() for name, timing in timings}
+
+    def to_prometheus(self, prefix: str = "t2ia") -> str:
+        """Mesures au format texte d'exposition de Prometheus"""
+        timings = sorted(self.timings.items())
+        lines = [f"# HELP {prefix}_calls_total Number of calls per pipeline entry point.",
+                 f"# TYPE {prefix}_calls_total counter"]
+        lines += [f'{prefix}_calls_total{{method="{name}"}} {timing.calls}' for name, timing in timings]
+        lines += [f"# HELP {prefix}_errors_total Number of calls that raised an exception.",
+                  f"# TYPE {prefix}_errors_total counter"]
+        lines += [f'{prefix}_errors_total{{method="{name}"}} {timing.errors}' for name, timing in timings]
+        lines += [f"# HELP {prefix}_duration_seconds Duration of calls per pipeline entry point.",
+                  f"# TYPE {prefix}_duration_seconds histogram"]
+        for name, timing in timings:
+            cumulative = 0
+            for bound, n in zip([*map(repr, timing.buckets), "+Inf"], timing.bucket_counts):
+                cumulative += n
+                lines.append(f'{prefix}_duration_seconds_bucket{{method="{name}",le="{bound}"}} {cumulative}')
+            lines.append(f'{prefix}_duration_seconds_sum{{method="{name}"}} {timing.total!r}')
+            lines.append(f'{prefix}_duration_seconds_count{{method="{name}"}} {timing.calls}')
+        return "\n".join(lines) + "\n"
+
+
+@contextmanager
+def profile(**kwargs) -> Iterator[Profiler]:
+    """Profile le bloc de code : with profile() as profiler: ... ; print(profiler.to_prometheus())"""
+    profiler = Profiler(**kwargs)
+    with profiler:
+        yield profiler
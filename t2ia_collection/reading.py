@@ -0,0 +1,181 @@
+from dataclasses import dataclass, field
+from typing import List, Tuple, Dict, Iterable
+from t2ia_collection.collection import *
+
+# ======================================================================================================================
+# LIGNES et BLOCS de texte
+# ======================================================================================================================
+# Les détections de texte sont regroupées dans le repère du texte redressé : chaque bbox est tournée selon
+# l'orientation du texte (l'angle par lequel l'image doit être tournée pour que le texte soit dans le bon sens).
+# Le regroupement se fait par balayages après des tris, en O(N log N) :
+#   1. balayage vertical sur les centres : les bbox alignées forment des rangées,
+#   2. dans chaque rangée triée en x, un écart horizontal trop grand sépare deux lignes (colonnes côte à côte),
+#   3. balayage vertical sur les lignes : une ligne rejoint le bloc ouvert juste au-dessus qui la recouvre en x.
+
+
+def _union(boxes: Iterable[Tuple[float, float, float, float]]) -> Tuple[float, float, float, float]:
+    """Union de coordonnées xyxyn"""
+    x_min, y_min, x_max, y_max = zip(*boxes)
+    return min(x_min), min(y_min), max(x_max), max(y_max)
+
+
+@dataclass
+class TextLine:
+    """Ligne de texte : détections de gauche à droite dans le repère redressé"""
+    detections: List[Detection]
+    box: Tuple[float, float, float, float]  # xyxyn dans le repère redressé
+
+    def __str__(self) -> str:
+        return self.text()
+
+    @property
+    def height(self) -> float:
+        return self.box[3] - self.box[1]
+
+    def text(self, sep: str = " ") -> str:
+        """Texte OCR de la ligne"""
+        return sep.join(det.content.ocr_result.strip() for det in self.detections if det.content.ocr_result.strip())
+
+
+@dataclass
+class TextBlock:
+    """Bloc de texte (message, adresse, légende...) : lignes de haut en bas dans le repère redressé"""
+    lines: List[TextLine]
+    orientation: Orientation
+    content_cls: str | None = None  # classe de contenu commune, si regroupement par classe
+    box: Tuple[float, float, float, float] = field(init=False)  # xyxyn dans le repère redressé
+
+    def __post_init__(self):
+        self.box = _union(line.box for line in self.lines)
+
+    def __str__(self) -> str:
+        return self.text()
+
+    @property
+    def detections(self) -> List[Detection]:
+        """Détections du bloc dans l'ordre de lecture"""
+        return [det for line in self.lines for det in line.detections]
+
+    def text(self, sep: str = " ", line_sep: str = "\n") -> str:
+        """Texte OCR fusionné du bloc"""
+        return line_sep.join(text for text in (line.text(sep) for line in self.lines) if text)
+
+    def bbox(self) -> BoundingBox:
+        """BoundingBox englobant le bloc, dans le repère de l'image"""
+        return BoundingBox.from_coords(_union(det.bbox.xyxyn() for det in self.detections), CoordFormat.XYXYN)
+
+
+# ======================================================================================================================
+# MOTEUR de regroupement
+# ======================================================================================================================
+
+class ReadingOrder:
+    """
+    Regroupe les détections de texte d'une carte en lignes puis en blocs, et les ordonne dans l'ordre de lecture.
+    Les tolérances sont exprimées en hauteurs de ligne :
+        - line_tolerance : écart vertical maximal entre le centre d'une bbox et celui de la rangée,
+        - max_word_gap : écart horizontal maximal entre deux bbox d'une même ligne,
+        - max_line_gap : interligne maximal entre deux lignes d'un même bloc.
+    """
+
+    def __init__(self, line_tolerance: float = 0.5, max_word_gap: float = 1.5, max_line_gap: float = 1.0,
+                 by_class: bool = True):
+        self.line_tolerance = line_tolerance
+        self.max_word_gap = max_word_gap
+        self.max_line_gap = max_line_gap
+        self.by_class = by_class
+
+    @staticmethod
+    def upright_box(det: Detection) -> Tuple[float, float, float, float]:
+        """Coordonnées xyxyn de la bbox dans le repère où le texte est redressé"""
+        if det.content.orientation is Orientation.ZERO:
+            return det.bbox.xyxyn()
+        return det.bbox.rotate(det.content.orientation).xyxyn()
+
+    # étapes :
+    # --------
+    def lines(self, detections: List[Detection]) -> List[TextLine]:
+        """Regroupe en lignes des détections de même orientation (étapes 1 et 2)"""
+        boxes = sorted(((self.upright_box(det), det) for det in detections),
+                       key=lambda item: (item[0][1] + item[0][3]) / 2)
+        # 1. rangées : balayage sur le centre vertical, comparé au centre et à la hauteur moyens de la rangée
+        rows, row, row_center, row_height = [], [], 0., 0.
+        for box, det in boxes:
+            center, height = (box[1] + box[3]) / 2, box[3] - box[1]
+            if row and abs(center - row_center) <= self.line_tolerance * max(row_height, height):
+                row.append((box, det))
+                row_center += (center - row_center) / len(row)
+                row_height += (height - row_height) / len(row)
+            else:
+                if row:
+                    rows.append(row)
+                row, row_center, row_height = [(box, det)], center, height
+        if row:
+            rows.append(row)
+
+        # 2. lignes : coupure des rangées aux grands écarts horizontaux
+        res = []
+        for row in rows:
+            row.sort(key=lambda item: item[0][0])
+            current, x_end, height = [], 0., 0.
+            for box, det in row:
+                box_height = box[3] - box[1]
+                if current and box[0] - x_end > self.max_word_gap * max(height, box_height):
+                    res.append(TextLine([d for _, d in current], _union(b for b, _ in current)))
+                    current = []
+                if current:
+                    x_end, height = max(x_end, box[2]), max(height, box_height)
+                else:
+                    x_end, height = box[2], box_height
+                current.append((box, det))
+            res.append(TextLine([d for _, d in current], _union(b for b, _ in current)))
+        return res
+
+    def blocks(self, lines: List[TextLine], orientation: Orientation, content_cls: str | None = None) -> List[TextBlock]:
+        """Regroupe des lignes en blocs (étape 3)"""
+        lines = sorted(lines, key=lambda line: (line.box[1], line.box[0]))
+        closed, active = [], []  # blocs : listes de lignes, la dernière ligne sert de référence
+        for line in lines:
+            # les blocs trop éloignés au-dessus ne peuvent plus rien recevoir : ils sont fermés
+            still_active = []
+            for block in active:
+                last = block[-1]
+                if line.box[1] - last.box[3] > self.max_line_gap * max(last.height, line.height):
+                    closed.append(block)
+                else:
+                    still_active.append(block)
+            active = still_active
+            # la ligne rejoint le bloc actif le plus bas qui la recouvre horizontalement
+            candidates = [block for block in active if block[-1].box[0] <= line.box[2] and line.box[0] <= block[-1].box[2]]
+            if candidates:
+                max(candidates, key=lambda block: block[-1].box[3]).append(line)
+            else:
+                active.append([line])
+        closed.extend(active)
+        return [TextBlock(block, orientation, content_cls) for block in closed]
+
+    # regroupement :
+    # --------------
+    def group(self, detections: Iterable[Detection], processed_only: bool = False) -> List[TextBlock]:
+        """Blocs de texte des détections, dans l'ordre de lecture (de haut en bas puis de gauche à droite dans le
+        repère redressé, les orientations dans l'ordre croissant)"""
+        groups: Dict[Tuple[Orientation, str | None], List[Detection]] = {}
+        for det in detections:
+            if not isinstance(det.content, Text) or (processed_only and not det.isprocessed()):
+                continue
+            key = (det.content.orientation, det.get_content_cls() if self.by_class else None)
+            groups.setdefault(key, []).append(det)
+
+        res = []
+        for (orientation, content_cls), dets in groups.items():
+            res.extend(self.blocks(self.lines(dets), orientation, content_cls))
+        res.sort(key=lambda block: (block.orientation.value, block.box[1], block.box[0]))
+        return res
+
+    def group_postcard(self, postcard: Postcard, processed_only: bool = False) -> List[TextBlock]:
+        """Blocs de texte d'une carte"""
+        return self.group(postcard.annotations.detections, processed_only)
+
+    def texts(self, postcard: Postcard, sep: str = " ", line_sep: str = "\n") -> List[str]:
+        """Textes OCR fusionnés par bloc, dans l'ordre de lecture"""
+        return [block.text(sep, line_sep) for block in self.group_postcard(postcard, processed_only=True)]
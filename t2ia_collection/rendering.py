@@ -0,0 +1,58 @@
+from typing import List, Dict, Tuple, Iterable
+from pathlib import Path
+from t2ia_collection.collection import *
+from t2ia_collection.parallel import chunks, bounded_map
+
+# ======================================================================================================================
+# APERÇUS annotés
+# ======================================================================================================================
+# Aperçus des cartes avec leurs détections (cf. Postcard.draw_bboxes()), pour le contrôle qualité de collections
+# entières. Chaque carte est chargée, éventuellement réduite, dessinée et écrite sur disque par un processus de
+# travail, qui ne renvoie que le chemin de l'aperçu : seules les images des lots en cours sont en mémoire.
+
+EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'WEBP': 'webp'}
+
+
+def preview_path(postcard: Postcard, output_dir: str | Path, image_format: str = "JPEG") -> Path:
+    """Chemin de l'aperçu d'une carte"""
+    image_format = image_format.upper()
+    return Path(output_dir) / f"{postcard.name}.{EXTENSIONS.get(image_format, image_format.lower())}"
+
+
+def render_postcard(postcard: Postcard, output_dir: str | Path, max_size: int | None = 1024,
+                    image_format: str = "JPEG", quality: int = 85, overwrite: bool = False, **kwargs) -> Path:
+    """
+    Écrit l'aperçu annoté d'une carte (réduit pour tenir dans max_size x max_size pixels, sauf si None) et renvoie son
+    chemin ; les autres arguments sont passés à Postcard.draw_bboxes()
+    """
+    file_path = preview_path(postcard, output_dir, image_format)
+    if file_path.exists() and not overwrite:
+        return file_path
+    with postcard.load_image() as image:
+        if max_size is not None:
+            image.draft("RGB", (max_size, max_size))  # décodage JPEG directement à taille réduite
+            image.thumbnail((max_size, max_size))  # réduit en place, avant de dessiner
+        preview = postcard.draw_bboxes(image, **kwargs)
+    preview.save(file_path, image_format.upper(), quality=quality)
+    return file_path
+
+
+def _render_chunk(postcards: List[Postcard], output_dir: str, options: dict) -> List[Path]:
+    """Rendu d'un lot de cartes (exécuté dans un processus de travail)"""
+    return [render_postcard(postcard, output_dir, **options) for postcard in postcards]
+
+
+def render_collection(collection: Iterable[Postcard], output_dir: str | Path, max_size: int | None = 1024,
+                      image_format: str = "JPEG", quality: int = 85, overwrite: bool = False,
+                      workers: int | None = None, chunk_size: int = 16, **kwargs) -> List[Path]:
+    """
+    Écrit les aperçus annotés des cartes d'une collection dans output_dir, par lots dans un pool de processus
+    (workers=0 pour les écrire dans le processus courant), et renvoie leurs chemins dans l'ordre des cartes. Les
+    aperçus déjà présents ne sont pas recalculés, sauf si overwrite.
+    """
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+    options = dict(max_size=max_size, image_format=image_format, quality=quality, overwrite=overwrite, **kwargs)
+    res = []
+    for paths in bounded_map(_render_chunk, chunks(collection, chunk_size), str(output_dir), options, workers=workers):
+        res.extend(paths)
+    return res
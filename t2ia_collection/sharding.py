@@ -0,0 +1,278 @@
+from typing import List, Dict, Tuple, Iterable, Iterator, Callable, Any
+from collections import Counter
+from enum import StrEnum
+from pathlib import Path
+from copy import deepcopy
+import hashlib
+import json
+import os
+import re
+from t2ia_collection.collection import *
+from t2ia_collection.parallel import bounded_map, default_workers
+
+# ======================================================================================================================
+# PARTITIONNEMENT
+# ======================================================================================================================
+# Une collection partitionnée est un dossier contenant un manifeste et un fichier par partition (shard). Chaque shard
+# est au format JSON Lines (une carte par ligne, cf. Postcard.to_dict()) : les ajouts se font en fin de fichier sans
+# relire le shard, et si une carte apparaît plusieurs fois, la dernière ligne l'emporte (compact() réécrit les shards
+# sans les doublons). Quand la clé d'une carte change (partition par département), une pierre tombale ({"name": ...,
+# "removed": true}) est ajoutée dans son ancien shard, qui ne la contient alors plus. Les traitements map / filter /
+# reduce sont exécutés shard par shard dans un pool de processus : seul un shard à la fois est chargé par processus.
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+TOMBSTONE = "removed"
+
+
+class Partition(StrEnum):
+    """Enumération des schémas de partitionnement"""
+    DEPARTMENT = 'department'  # un shard par département
+    HASH = 'hash'  # n_shards shards, selon un hash du nom de la carte
+
+    def __repr__(self) -> str:
+        return str(self.value)
+
+
+def _slug(value: str | None) -> str:
+    """Nom de fichier sûr pour une clé de partition"""
+    if not value:
+        return "_unknown"
+    return re.sub(r'[^\w]+', '-', value.casefold()).strip('-') or "_unknown"
+
+
+def _read_shard(file_path: str | Path) -> Dict[str, dict]:
+    """Dictionnaires des cartes d'un shard : la dernière occurrence l'emporte, une pierre tombale retire la carte"""
+    res = {}
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                data = json.loads(line)
+                if data.get(TOMBSTONE):
+                    res.pop(data['name'], None)
+                else:
+                    res[data['name']] = data
+    return res
+
+
+def _load_shard(file_path: str | Path) -> CardCollection:
+    res = CardCollection.from_dict(_read_shard(file_path))
+    res.mark_clean()
+    return res
+
+
+# traitements exécutés dans les processus de travail (doivent être picklables) :
+def _map_shard(file_path: str, function: Callable[[Postcard], Any]) -> List[Any]:
+    return [function(postcard) for postcard in _load_shard(file_path)]
+
+
+def _filter_shard(file_path: str, predicate: Callable[[Postcard], bool]) -> List[Postcard]:
+    return [postcard for postcard in _load_shard(file_path) if predicate(postcard)]
+
+
+def _reduce_shard(file_path: str, function: Callable[[Any, Postcard], Any], initial: Any) -> Any:
+    res = deepcopy(initial)
+    for postcard in _load_shard(file_path):
+        res = function(res, postcard)
+    return res
+
+
+# ======================================================================================================================
+# COLLECTION PARTITIONNÉE
+# ======================================================================================================================
+
+class ShardedCollection:
+    """
+    Collection de cartes partitionnée sur disque, par département ou par hash du nom des cartes. Le schéma de
+    partitionnement est fixé à la création du dossier et relu dans son manifeste ensuite.
+    """
+
+    def __init__(self, directory: str | Path, partition: Partition | str = Partition.HASH, n_shards: int = 16,
+                 workers: int | None = None):
+        self.directory = Path(directory)
+        self.workers = default_workers(workers)
+        self._index: Dict[str, str] | None = None  # nom -> clé du shard, construit à la première écriture
+        manifest_path = self.directory / MANIFEST_NAME
+        if manifest_path.exists():
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            if manifest.get('version') != MANIFEST_VERSION:
+                raise ValueError(f"unsupported manifest version: {manifest.get('version')}")
+            self.partition = Partition(manifest['partition'])
+            self.n_shards = manifest['n_shards']
+        else:
+            self.partition = Partition(partition)
+            self.n_shards = n_shards
+            if self.partition is Partition.HASH and n_shards < 1:
+                raise ValueError("n_shards must be positive")
+            self.directory.mkdir(parents=True, exist_ok=True)
+            with open(manifest_path, 'w', encoding='utf-8') as f:
+                json.dump({'version': MANIFEST_VERSION, 'partition': self.partition.value,
+                           'n_shards': self.n_shards}, f)
+
+    def __iter__(self) -> Iterator[Postcard]:
+        """iteration sur les cartes, shard par shard"""
+        for key in self.shards():
+            yield from self.load_shard(key)
+
+    def __len__(self) -> int:
+        return sum(len(_read_shard(self.shard_path(key))) for key in self.shards())
+
+    # partitions :
+    # ------------
+    def shard_key(self, postcard: Postcard) -> str:
+        """Clé du shard d'une carte"""
+        if self.partition is Partition.DEPARTMENT:
+            return _slug(postcard.annotations.location.department)
+        return self._hash_key(postcard.name)
+
+    def _hash_key(self, name: str) -> str:
+        digest = hashlib.blake2b(name.encode('utf-8'), digest_size=8).digest()
+        return f"{int.from_bytes(digest, 'big') % self.n_shards:04d}"
+
+    def _data_key(self, data: dict) -> str:
+        """Clé du shard d'une carte, à partir de son dictionnaire (cf. Postcard.to_dict())"""
+        if self.partition is Partition.DEPARTMENT:
+            return _slug(data['annotations']['location']['department'])
+        return self._hash_key(data['name'])
+
+    def shard_path(self, key: str) -> Path:
+        return self.directory / f"shard-{key}.jsonl"
+
+    def shards(self) -> List[str]:
+        """Clés des shards existants, triées"""
+        return sorted(path.stem[len("shard-"):] for path in self.directory.glob("shard-*.jsonl"))
+
+    def load_shard(self, key: str) -> CardCollection:
+        """Cartes d'un shard"""
+        return _load_shard(self.shard_path(key))
+
+    # écriture :
+    # ----------
+    def _shard_index(self) -> Dict[str, str]:
+        """Shard de chaque carte (lu une fois sur le disque, puis tenu à jour par add())"""
+        if self._index is None:
+            self._index = {name: key for key in self.shards() for name in _read_shard(self.shard_path(key))}
+        return self._index
+
+    def add(self, postcards: Iterable[Postcard], full: bool = True) -> int:
+        """
+        Ajoute (ou remplace) des cartes, en fin de leur shard ; renvoie le nombre de cartes écrites. Une carte dont le
+        département a changé est retirée de son ancien shard par une pierre tombale.
+        """
+        # en partition par hash, la clé ne dépend que du nom : une carte ne change jamais de shard
+        index = self._shard_index() if self.partition is Partition.DEPARTMENT else None
+        files, n = {}, 0
+
+        def write(key: str, data: dict):
+            if key not in files:
+                files[key] = open(self.shard_path(key), 'a', encoding='utf-8')
+            files[key].write(json.dumps(data, ensure_ascii=False) + "\n")
+
+        try:
+            for postcard in postcards:
+                key = self.shard_key(postcard)
+                if index is not None:
+                    previous = index.get(postcard.name)
+                    if previous is not None and previous != key:
+                        write(previous, {'name': postcard.name, TOMBSTONE: True})
+                    index[postcard.name] = key
+                write(key, postcard.to_dict(full=full))
+                n += 1
+        finally:
+            for f in files.values():
+                f.close()
+        return n
+
+    def compact(self):
+        """
+        Réécrit les shards sans les anciennes versions des cartes remplacées ni les pierres tombales. Une carte
+        présente dans plusieurs shards (écrite par une autre instance dont l'index n'était pas à jour) n'est conservée
+        que dans un seul : celui de sa clé, et à défaut le dernier shard modifié.
+        """
+        keys = sorted(self.shards(), key=lambda key: self.shard_path(key).stat().st_mtime_ns)
+        kept, in_place = {}, set()  # nom -> shard conservé ; noms conservés dans le shard de leur clé
+        for key in keys:
+            for name, data in _read_shard(self.shard_path(key)).items():
+                if self._data_key(data) == key:
+                    kept[name] = key
+                    in_place.add(name)
+                elif name not in in_place:
+                    kept[name] = key
+        for key in keys:
+            path = self.shard_path(key)
+            data = [postcard for name, postcard in _read_shard(path).items() if kept[name] == key]
+            if not data:
+                path.unlink()
+                continue
+            tmp_path = path.with_suffix(".tmp")
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for postcard in data:
+                    f.write(json.dumps(postcard, ensure_ascii=False) + "\n")
+            os.replace(tmp_path, path)
+        self._index = kept
+
+    @classmethod
+    def from_collection(cls, collection: Iterable[Postcard], directory: str | Path,
+                        partition: Partition | str = Partition.HASH, n_shards: int = 16,
+                        workers: int | None = None) -> "ShardedCollection":
+        """Partitionne une collection (ou n'importe quel itérable de cartes) dans un dossier"""
+        res = cls(directory, partition, n_shards, workers)
+        res.add(collection)
+        return res
+
+    # traitements parallèles :
+    # ------------------------
+    def _run(self, task: Callable, *args) -> Iterator[Any]:
+        """Exécute la tâche sur chaque shard, dans un pool de processus (ou dans le processus courant si workers=0),
+        et renvoie les résultats dans l'ordre des shards"""
+        paths = [str(self.shard_path(key)) for key in self.shards()]
+        return bounded_map(task, paths, *args, workers=self.workers)
+
+    def map(self, function: Callable[[Postcard], Any]) -> Iterator[Any]:
+        """Résultats de la fonction (picklable) sur chaque carte, shard par shard"""
+        for results in self._run(_map_shard, function):
+            yield from results
+
+    def filter(self, predicate: Callable[[Postcard], bool]) -> Iterator[Postcard]:
+        """Cartes vérifiant le prédicat (picklable), shard par shard"""
+        for results in self._run(_filter_shard, predicate):
+            yield from results
+
+    def reduce(self, function: Callable[[Any, Postcard], Any], initial: Any,
+               combine: Callable[[Any, Any], Any] | None = None) -> Any:
+        """
+        Agrégation : chaque shard est réduit par function(accumulateur, carte) à partir d'une copie de initial, puis
+        les résultats partiels sont combinés par combine(résultat, partiel) (par défaut, l'addition, adaptée aux
+        Counter et aux nombres).
+        """
+        combine = combine if combine is not None else (lambda a, b: a + b)
+        res = deepcopy(initial)
+        for partial in self._run(_reduce_shard, function, initial):
+            res = combine(res, partial)
+        return res
+
+
+# ======================================================================================================================
+# AGRÉGATIONS usuelles
+# ======================================================================================================================
+# À utiliser avec ShardedCollection.reduce(function, Counter()).
+
+def count_keywords(counts: Counter, postcard: Postcard) -> Counter:
+    """Nombre de cartes par mot-clé (de la carte ou de ses textes)"""
+    counts.update(postcard.annotations.get_keywords())
+    return counts
+
+
+def count_classes(counts: Counter, postcard: Postcard) -> Counter:
+    """Nombre de détections par classe de contenu"""
+    counts.update(det.get_content_cls() for det in postcard.annotations.detections)
+    return counts
+
+
+def count_years(counts: Counter, postcard: Postcard) -> Counter:
+    """Histogramme des années des tampons datés"""
+    for det in postcard.annotations.detections:
+        if isinstance(det.content, DateStamp) and det.content.date.date_str[:4].isdigit():
+            counts[int(det.content.date.date_str[:4])] += 1
+    return counts
@@ -0,0 +1,343 @@
+from collections.abc import Sequence
+from typing import List, Tuple, Dict, Iterable, Hashable, Any
+from enum import StrEnum
+from array import array
+import heapq
+import math
+from t2ia_collection.collection import *
+
+# ======================================================================================================================
+# RÉGIONS et PRÉDICATS
+# ======================================================================================================================
+
+class SpatialPredicate(StrEnum):
+    """Enumération des relations entre une bbox et la région requêtée"""
+    INTERSECTS = 'intersects'  # la bbox intersecte la région
+    WITHIN = 'within'  # la bbox est incluse dans la région
+    CONTAINS = 'contains'  # la bbox contient la région
+
+    def __repr__(self) -> str:
+        return str(self.value)
+
+
+# Régions usuelles en coordonnées xyxyn (la zone du timbre est en haut à droite)
+QUADRANTS = {
+    'top_left': (0., 0., .5, .5),
+    'top_right': (.5, 0., 1., .5),
+    'bottom_left': (0., .5, .5, 1.),
+    'bottom_right': (.5, .5, 1., 1.),
+}
+
+
+def _as_region(region: BoundingBox | Sequence[float]) -> Tuple[float, float, float, float]:
+    """Région xyxyn à partir d'une BoundingBox, de coordonnées xyxyn ou d'un point (x, y)"""
+    if isinstance(region, BoundingBox):
+        return region.xyxyn()
+    if len(region) == 2:
+        x, y = region
+        return x, y, x, y
+    if len(region) == 4:
+        return tuple(region)
+    raise ValueError(f"region must be a BoundingBox, a point (x, y) or xyxyn coordinates, got {region}")
+
+
+# ======================================================================================================================
+# INDEX SPATIAL
+# ======================================================================================================================
+
+class SpatialIndex:
+    """
+    Index spatial à grille uniforme sur les coordonnées xyxyn des bbox, construit sur un BoundingBoxArray. Chaque bbox
+    est référencée dans les cellules qu'elle recouvre ; les requêtes ne testent que les bbox des cellules concernées.
+    Les clés associées aux bbox (indices des détections, (nom de carte, indice), ...) sont renvoyées par les requêtes.
+    """
+
+    def __init__(self, bboxes: BoundingBoxArray | None = None, keys: Sequence[Hashable] | None = None,
+                 grid_size: int | None = None):
+        bboxes = bboxes if bboxes is not None else BoundingBoxArray()
+        self.keys = list(keys) if keys is not None else list(range(len(bboxes)))
+        if len(self.keys) != len(bboxes):
+            raise ValueError("keys and bboxes must have the same length")
+        # environ 4 bbox par cellule, avec une grille limitée à 256 x 256
+        self.grid_size = grid_size or min(256, max(1, math.isqrt(len(bboxes) // 4)))
+        self.x_min, self.y_min, self.x_max, self.y_max = bboxes.xyxyn()
+        self.cells: Dict[Tuple[int, int], List[int]] = {}
+        for i in range(len(bboxes)):
+            self._insert_id(i)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    # construction :
+    # --------------
+    def _cell(self, value: float) -> int:
+        """Indice de cellule d'une coordonnée normalisée"""
+        return min(self.grid_size - 1, max(0, int(value * self.grid_size)))
+
+    def _cell_range(self, x_min: float, y_min: float, x_max: float, y_max: float) -> Iterator[Tuple[int, int]]:
+        """Cellules recouvertes par une région"""
+        for i in range(self._cell(x_min), self._cell(x_max) + 1):
+            for j in range(self._cell(y_min), self._cell(y_max) + 1):
+                yield i, j
+
+    def _insert_id(self, i: int):
+        for cell in self._cell_range(self.x_min[i], self.y_min[i], self.x_max[i], self.y_max[i]):
+            self.cells.setdefault(cell, []).append(i)
+
+    def insert(self, bbox: BoundingBox, key: Hashable | None = None):
+        """Ajoute une bbox à l'index (la taille de la grille n'est pas modifiée)"""
+        x_min, y_min, x_max, y_max = bbox.xyxyn()
+        self.x_min.append(x_min)
+        self.y_min.append(y_min)
+        self.x_max.append(x_max)
+        self.y_max.append(y_max)
+        self.keys.append(len(self.keys) if key is None else key)
+        self._insert_id(len(self.keys) - 1)
+
+    @staticmethod
+    def from_detections(detections: Iterable[Detection], keys: Sequence[Hashable] | None = None,
+                        grid_size: int | None = None) -> "SpatialIndex":
+        """Index des détections (par défaut, les clés sont les indices des détections)"""
+        return SpatialIndex(BoundingBoxArray.from_bboxes(det.bbox for det in detections), keys, grid_size)
+
+    @staticmethod
+    def from_postcard(postcard: Postcard, grid_size: int | None = None) -> "SpatialIndex":
+        """Index des détections d'une carte, les clés sont les indices des détections"""
+        return SpatialIndex.from_detections(postcard.annotations.detections, grid_size=grid_size)
+
+    @staticmethod
+    def from_collection(collection: CardCollection, grid_size: int | None = None) -> "SpatialIndex":
+        """Chargement en masse des détections de toutes les cartes, les clés sont (nom de la carte, indice)"""
+        bboxes, keys = BoundingBoxArray(), []
+        for postcard in collection:
+            for i, det in enumerate(postcard.annotations.detections):
+                bboxes.append(det.bbox)
+                keys.append((postcard.name, i))
+        return SpatialIndex(bboxes, keys, grid_size)
+
+    # requêtes :
+    # ----------
+    def _candidates(self, x_min: float, y_min: float, x_max: float, y_max: float) -> set:
+        res = set()
+        for cell in self._cell_range(x_min, y_min, x_max, y_max):
+            res.update(self.cells.get(cell, ()))
+        return res
+
+    def query_ids(self, region: BoundingBox | Sequence[float],
+                  predicate: SpatialPredicate | str = SpatialPredicate.INTERSECTS) -> List[int]:
+        """Identifiants internes (positions) des bbox vérifiant le prédicat avec la région, triés"""
+        predicate = SpatialPredicate(predicate)
+        r_x_min, r_y_min, r_x_max, r_y_max = _as_region(region)
+        x_min, y_min, x_max, y_max = self.x_min, self.y_min, self.x_max, self.y_max
+        if predicate is SpatialPredicate.INTERSECTS:
+            test = lambda i: x_min[i] <= r_x_max and r_x_min <= x_max[i] and y_min[i] <= r_y_max and r_y_min <= y_max[i]
+        elif predicate is SpatialPredicate.WITHIN:
+            test = lambda i: r_x_min <= x_min[i] and x_max[i] <= r_x_max and r_y_min <= y_min[i] and y_max[i] <= r_y_max
+        else:
+            test = lambda i: x_min[i] <= r_x_min and r_x_max <= x_max[i] and y_min[i] <= r_y_min and r_y_max <= y_max[i]
+        return sorted(i for i in self._candidates(r_x_min, r_y_min, r_x_max, r_y_max) if test(i))
+
+    def query(self, region: BoundingBox | Sequence[float],
+              predicate: SpatialPredicate | str = SpatialPredicate.INTERSECTS) -> List[Hashable]:
+        """Clés des bbox vérifiant le prédicat avec la région (BoundingBox, xyxyn ou point (x, y))"""
+        return [self.keys[i] for i in self.query_ids(region, predicate)]
+
+    def containing(self, x: float, y: float) -> List[Hashable]:
+        """Clés des bbox contenant le point (x, y)"""
+        return self.query((x, y), SpatialPredicate.CONTAINS)
+
+    def _distance(self, i: int, region: Tuple[float, float, float, float]) -> float:
+        """Distance euclidienne entre la bbox i et la région (nulle si elles se recouvrent)"""
+        r_x_min, r_y_min, r_x_max, r_y_max = region
+        dx = max(0., self.x_min[i] - r_x_max, r_x_min - self.x_max[i])
+        dy = max(0., self.y_min[i] - r_y_max, r_y_min - self.y_max[i])
+        return math.hypot(dx, dy)
+
+    def _ring_cells(self, i_min: int, j_min: int, i_max: int, j_max: int, ring: int) -> Iterator[Tuple[int, int]]:
+        """Cellules de la grille sur le pourtour du rectangle de cellules élargi de ring"""
+        last = self.grid_size - 1
+        if ring == 0:
+            for i in range(i_min, i_max + 1):
+                for j in range(j_min, j_max + 1):
+                    yield i, j
+            return
+        top, bottom, left, right = j_min - ring, j_max + ring, i_min - ring, i_max + ring
+        for i in range(max(left, 0), min(right, last) + 1):
+            if top >= 0:
+                yield i, top
+            if bottom <= last:
+                yield i, bottom
+        for j in range(max(top + 1, 0), min(bottom - 1, last) + 1):
+            if left >= 0:
+                yield left, j
+            if right <= last:
+                yield right, j
+
+    def nearest(self, region: BoundingBox | Sequence[float], k: int = 1,
+                exclude: Iterable[Hashable] = ()) -> List[Tuple[float, Hashable]]:
+        """
+        Les k bbox les plus proches de la région (BoundingBox, xyxyn ou point (x, y)), sous la forme (distance, clé)
+        triées par distance croissante. Les cellules sont parcourues par anneaux autour de la région, jusqu'à ce que
+        les anneaux restants soient plus loin que la k-ième bbox trouvée.
+        """
+        if k <= 0:
+            return []
+        region = _as_region(region)
+        exclude = set(exclude)
+        i_min, j_min = self._cell(region[0]), self._cell(region[1])
+        i_max, j_max = self._cell(region[2]), self._cell(region[3])
+        cell_width = 1 / self.grid_size
+        best, seen = [], set()  # tas max des k meilleurs : (-distance, -id)
+        for ring in range(self.grid_size + 1):
+            for cell in self._ring_cells(i_min, j_min, i_max, j_max, ring):
+                for bbox_id in self.cells.get(cell, ()):
+                    if bbox_id in seen or self.keys[bbox_id] in exclude:
+                        continue
+                    seen.add(bbox_id)
+                    item = (-self._distance(bbox_id, region), -bbox_id)
+                    if len(best) < k:
+                        heapq.heappush(best, item)
+                    elif item > best[0]:
+                        heapq.heapreplace(best, item)
+            # les cellules hors des anneaux parcourus sont au moins à ring * cell_width de la région
+            if len(best) == k and -best[0][0] <= ring * cell_width:
+                break
+        return [(-distance, self.keys[-bbox_id]) for distance, bbox_id in sorted(best, reverse=True)]
+
+
+# ======================================================================================================================
+# INDEX GÉOGRAPHIQUE
+# ======================================================================================================================
+
+class GeoIndex:
+    """
+    Index géographique des localisations des cartes : grille régulière en degrés (latitude, longitude), dont seules les
+    cellules occupées sont stockées. Les requêtes par rayon ne testent (par la distance du grand cercle, cf.
+    postcard.haversine) que les points des cellules recouvrant la calotte sphérique requêtée. Les clés sont par défaut
+    les noms des cartes ; une clé réinsérée est déplacée.
+    """
+
+    def __init__(self, cell_size: float = 0.25):
+        if not 0 < cell_size <= 180:
+            raise ValueError(f"cell_size must be in ]0, 180] degrees, got {cell_size}")
+        self.cell_size = cell_size
+        self.n_lon_cells = math.ceil(360 / cell_size)
+        self.lat, self.lon = array('d'), array('d')
+        self.keys: List[Hashable] = []
+        self.cells: Dict[Tuple[int, int], List[int]] = {}
+        self._ids: Dict[Hashable, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._ids
+
+    # construction :
+    # --------------
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return math.floor(lat / self.cell_size), math.floor(lon / self.cell_size) % self.n_lon_cells
+
+    def insert(self, key: Hashable, gps: Tuple[float, float]):
+        """Ajoute (ou déplace) un point (latitude, longitude) en degrés"""
+        lat, lon = float(gps[0]), float(gps[1])
+        if not (-90 <= lat <= 90 and math.isfinite(lon)):
+            raise ValueError(f"invalid gps coordinates: {gps}")
+        if not -180 <= lon < 180:
+            lon = (lon + 180) % 360 - 180
+        if key in self._ids:
+            self.remove(key)
+        self._ids[key] = len(self.keys)
+        self.keys.append(key)
+        self.lat.append(lat)
+        self.lon.append(lon)
+        self.cells.setdefault(self._cell(lat, lon), []).append(self._ids[key])
+
+    def remove(self, key: Hashable):
+        """Retire un point de l'index"""
+        point_id = self._ids.pop(key)
+        cell = self._cell(self.lat[point_id], self.lon[point_id])
+        self.cells[cell].remove(point_id)
+        if not self.cells[cell]:
+            del self.cells[cell]
+
+    @staticmethod
+    def from_collection(collection: Iterable[Postcard], cell_size: float = 0.25) -> "GeoIndex":
+        """Index des cartes localisées par leurs coordonnées gps, les clés sont les noms des cartes"""
+        res = GeoIndex(cell_size)
+        for postcard in collection:
+            if postcard.annotations.location.gps is not None:
+                res.insert(postcard.name, postcard.annotations.location.gps)
+        return res
+
+    # requêtes :
+    # ----------
+    def _cells_in(self, lat_min: float, lat_max: float, lon_cells: Iterable[int] | None) -> Iterator[List[int]]:
+        """Points des cellules occupées dans la bande de latitudes et parmi les colonnes de longitude données (toutes
+        si None)"""
+        i_min, i_max = math.floor(lat_min / self.cell_size), math.floor(lat_max / self.cell_size)
+        lon_cells = set(lon_cells) if lon_cells is not None else None
+        n_cells = (i_max - i_min + 1) * (len(lon_cells) if lon_cells is not None else self.n_lon_cells)
+        if n_cells > len(self.cells):  # moins de cellules occupées que de cellules à parcourir
+            for (i, j), point_ids in self.cells.items():
+                if i_min <= i <= i_max and (lon_cells is None or j in lon_cells):
+                    yield point_ids
+            return
+        for i in range(i_min, i_max + 1):
+            for j in (lon_cells if lon_cells is not None else range(self.n_lon_cells)):
+                if (i, j) in self.cells:
+                    yield self.cells[i, j]
+
+    def _lon_cells(self, lon_min: float, lon_max: float) -> Iterator[int] | None:
+        """Colonnes de longitude couvrant [lon_min, lon_max] (éventuellement au-delà de ±180°)"""
+        j_min, j_max = math.floor(lon_min / self.cell_size), math.floor(lon_max / self.cell_size)
+        if j_max - j_min + 1 >= self.n_lon_cells:
+            return None
+        return (j % self.n_lon_cells for j in range(j_min, j_max + 1))
+
+    def within_radius(self, gps: Tuple[float, float], radius: float) -> List[Tuple[float, Hashable]]:
+        """Points à moins de radius km du point (latitude, longitude), sous la forme (distance, clé) triés par distance
+        croissante"""
+        lat, lon = gps
+        angle = radius / EARTH_RADIUS_KM
+        d_lat = math.degrees(angle)
+        lat_min, lat_max = max(-90., lat - d_lat), min(90., lat + d_lat)
+        lon_cells = None
+        if lat_min > -90 and lat_max < 90 and math.sin(angle) < math.cos(math.radians(lat)):
+            # écart maximal en longitude des points de la calotte
+            d_lon = math.degrees(math.asin(math.sin(angle) / math.cos(math.radians(lat))))
+            lon_cells = self._lon_cells(lon - d_lon, lon + d_lon)
+        res = []
+        for point_ids in self._cells_in(lat_min, lat_max, lon_cells):
+            for point_id in point_ids:
+                distance = haversine(gps, (self.lat[point_id], self.lon[point_id]))
+                if distance <= radius:
+                    res.append((distance, point_id))
+        return [(distance, self.keys[point_id]) for distance, point_id in sorted(res)]
+
+    def within_area(self, lat_min: float, lon_min: float, lat_max: float, lon_max: float) -> List[Hashable]:
+        """Clés des points dans un rectangle de coordonnées (lon_min > lon_max s'il traverse l'antiméridien), dans
+        l'ordre d'insertion"""
+        lon_cells = self._lon_cells(lon_min, lon_max if lon_min <= lon_max else lon_max + 360)
+        res = []
+        for point_ids in self._cells_in(lat_min, lat_max, lon_cells):
+            res.extend(point_id for point_id in point_ids
+                       if in_area((self.lat[point_id], self.lon[point_id]), lat_min, lon_min, lat_max, lon_max))
+        return [self.keys[point_id] for point_id in sorted(res)]
+
+    def nearest(self, gps: Tuple[float, float], k: int = 1,
+                exclude: Iterable[Hashable] = ()) -> List[Tuple[float, Hashable]]:
+        """
+        Les k points les plus proches du point (latitude, longitude), sous la forme (distance, clé) triés par distance
+        croissante. Le rayon de recherche est doublé jusqu'à contenir k points : la recherche par rayon étant exacte,
+        ce sont alors les k plus proches.
+        """
+        if k <= 0:
+            return []
+        exclude = set(exclude)
+        radius = self.cell_size * math.pi / 180 * EARTH_RADIUS_KM  # taille d'une cellule en latitude
+        while True:
+            res = [(distance, key) for distance, key in self.within_radius(gps, radius) if key not in exclude]
+            if len(res) >= k or radius >= math.pi * EARTH_RADIUS_KM:
+                return res[:k]
+            radius *= 2
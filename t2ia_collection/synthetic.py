@@ -0,0 +1,204 @@
+from dataclasses import dataclass, field
+from typing import List, Dict, Tuple, Iterable, Iterator
+from pathlib import Path
+import json
+import math
+import random
+from t2ia_collection.collection import *
+
+# ======================================================================================================================
+# PARAMÈTRES
+# ======================================================================================================================
+# Générateur de collections synthétiques pour les tests de charge. Chaque carte est tirée avec son propre générateur
+# aléatoire, initialisé à partir de (graine, indice de la carte) : n'importe quelle carte ou tranche de cartes est
+# reproductible indépendamment des autres, et les cartes sont produites une à une (mémoire constante) sous forme de
+# dictionnaires (cf. CardCollection.to_dict()), d'objets, ou directement écrites sur disque.
+
+TOWNS = [('Attigny', 'Ardennes', 'Grand Est'), ('Charleville', 'Ardennes', 'Grand Est'),
+         ('Reims', 'Marne', 'Grand Est'), ('Épernay', 'Marne', 'Grand Est'),
+         ('Nancy', 'Meurthe-et-Moselle', 'Grand Est'), ('Metz', 'Moselle', 'Grand Est'),
+         ('Brest', 'Finistère', 'Bretagne'), ('Quimper', 'Finistère', 'Bretagne'),
+         ('Rennes', 'Ille-et-Vilaine', 'Bretagne'), ('Lyon', 'Rhône', 'Auvergne-Rhône-Alpes'),
+         ('Paris', 'Paris', 'Île-de-France'), ('Lille', 'Nord', 'Hauts-de-France')]
+WORDS = ['église', 'mairie', 'place', 'gare', 'pont', 'rue', 'château', 'port', 'vue', 'générale', 'avenue', 'hôtel',
+         'monument', 'cathédrale', 'quai', 'marché', 'école', 'le', 'la', 'les', 'de', 'du', 'et', 'à', 'sur']
+MESSAGE_WORDS = ['cher', 'ami', 'bons', 'baisers', 'je', 'vous', 'embrasse', 'bien', 'arrivé', 'temps', 'beau', 'à',
+                 'bientôt', 'nous', 'sommes', 'en', 'bonne', 'santé', 'amitiés', 'votre']
+COLORS = ['rouge', 'vert', 'bleu', 'brun', 'violet', 'noir']
+
+
+@dataclass
+class SyntheticConfig:
+    """Distributions des collections synthétiques"""
+    mean_detections: float = 6.  # détections par carte (loi de Poisson, au moins une)
+    max_detections: int = 64
+    class_weights: Dict[str, float] = field(default_factory=lambda: {
+        'PrintedText': 0.45, 'HandwrittenText': 0.25, 'DateStamp': 0.12, 'PostageStamp': 0.12, 'OtherMark': 0.06})
+    mean_words: float = 6.  # longueur des textes OCR en mots (loi log-normale)
+    years: Tuple[int, int] = (1895, 1960)  # dates des tampons
+    manual_ratio: float = 0.2  # part des détections annotées manuellement
+    processed_ratio: float = 0.9  # part des contenus extraits
+    rotated_ratio: float = 0.1  # part des textes et des cartes non droits
+    img_size: Tuple[int, int] = (4646, 3028)
+
+
+# ======================================================================================================================
+# GÉNÉRATEUR
+# ======================================================================================================================
+
+class CollectionGenerator:
+    """Générateur reproductible de cartes synthétiques, sous forme de dictionnaires ou d'objets"""
+
+    def __init__(self, seed: int = 0, config: SyntheticConfig | None = None):
+        self.seed = seed
+        self.config = config if config is not None else SyntheticConfig()
+        self._classes = list(self.config.class_weights)
+        self._cum_weights = []
+        total = 0.
+        for weight in self.config.class_weights.values():
+            total += weight
+            self._cum_weights.append(total)
+        self._log_words = math.log(self.config.mean_words)
+
+    def rng(self, index: int) -> random.Random:
+        """
+        Générateur aléatoire de la carte d'indice donné, initialisé par la chaîne « graine:indice » (hachée par
+        random.Random) : les suites de deux graines ne se recouvrent pas, quel que soit le nombre de cartes
+        """
+        return random.Random(f"{self.seed}:{index}")
+
+    @staticmethod
+    def name(index: int) -> str:
+        return f"{index:08d}"
+
+    # tirages :
+    # ---------
+    def _poisson(self, rng: random.Random) -> int:
+        """Tirage de Poisson (méthode de Knuth, la moyenne étant petite)"""
+        limit, k, p = math.exp(-self.config.mean_detections), 0, rng.random()
+        while p > limit:
+            k += 1
+            p *= rng.random()
+        return min(max(k, 1), self.config.max_detections)
+
+    def _bbox(self, rng: random.Random) -> dict:
+        w, h = rng.uniform(0.02, 0.4), rng.uniform(0.02, 0.25)
+        # à distance des bords pour rester valide après arrondi aux pixels
+        return {'x': rng.uniform(w / 2 + 0.01, 0.99 - w / 2), 'y': rng.uniform(h / 2 + 0.01, 0.99 - h / 2),
+                'w': w, 'h': h}
+
+    def _text(self, rng: random.Random, words: List[str], prefix: str = "") -> Tuple[str, List[str]]:
+        n_words = max(1, round(rng.lognormvariate(self._log_words, 0.6)))
+        chosen = rng.choices(words, k=n_words)
+        return prefix + " ".join(chosen), sorted(set(chosen) & set(WORDS[:17]))
+
+    def _content(self, rng: random.Random, content_cls: str, town: Tuple[str, str, str]) -> dict | None:
+        config = self.config
+        if rng.random() >= config.processed_ratio:
+            return {content_cls: {}}  # contenu non extrait
+        is_manual = rng.random() < config.manual_ratio
+        confidence = None if is_manual else round(rng.betavariate(5, 2), 4)
+        if content_cls in ('PrintedText', 'HandwrittenText', 'SceneText', 'Text'):
+            if content_cls == 'HandwrittenText':
+                ocr_result, keywords = self._text(rng, MESSAGE_WORDS)
+            else:
+                ocr_result, keywords = self._text(rng, WORDS, prefix=f"{town[0].upper()} - ")
+            res = {'is_manual': is_manual, 'confidence': confidence, 'ocr_result': ocr_result, 'keywords': keywords,
+                   'orientation': rng.choice((90, 180, 270)) if rng.random() < config.rotated_ratio else 0}
+            if content_cls == 'PrintedText':
+                res['is_editor'] = rng.random() < 0.1
+        elif content_cls == 'DateStamp':
+            year, month, day = rng.randint(*config.years), rng.randint(1, 12), rng.randint(1, 28)
+            res = {'is_manual': is_manual,
+                   'postal_agency': town[0].upper(),
+                   'date': f"{year}-{month:02d}-{day:02d}TXX:XX" if rng.random() < 0.7 else f"XXXX-{month:02d}-{day:02d}TXX:XX",
+                   'department': town[1].upper(),
+                   'starred_hour': rng.random() < 0.05,
+                   'collection': f"{rng.randint(1, 6)}E" if rng.random() < 0.5 else None,
+                   'mark_type': rng.choice(list(DateStampType)).value,
+                   'quality': rng.choice(list(DateStampQuality)).value}
+        elif content_cls == 'PostageStamp':
+            res = {'is_manual': is_manual, 'confidence': confidence, 'country': 'France',
+                   'color': rng.choice(COLORS), 'price': rng.choice((0.05, 0.1, 0.15, 0.25))}
+        elif content_cls == 'OtherMark':
+            res = {'is_manual': is_manual, 'confidence': confidence, 'is_editor': rng.random() < 0.5}
+        else:
+            res = {'is_manual': is_manual, 'confidence': confidence}
+        return {content_cls: res}
+
+    # cartes :
+    # --------
+    def postcard_dict(self, index: int) -> dict:
+        """Dictionnaire de la carte d'indice donné (cf. Postcard.to_dict())"""
+        rng = self.rng(index)
+        town = rng.choice(TOWNS)
+        detections = []
+        for _ in range(self._poisson(rng)):
+            content_cls = rng.choices(self._classes, cum_weights=self._cum_weights)[0]
+            is_manual = rng.random() < self.config.manual_ratio
+            detections.append({'bbox': self._bbox(rng),
+                               'is_manual': is_manual,
+                               'confidence': None if is_manual else round(rng.uniform(0.25, 1.), 4),
+                               'content': self._content(rng, content_cls, town)})
+        name = self.name(index)
+        return {'path': f"{name}.jpg",
+                'name': name,
+                'annotations': {'location': {'town': town[0], 'department': town[1], 'region': town[2], 'gps': None},
+                                'tags': rng.sample(WORDS[:17], rng.randint(0, 3)),
+                                'keywords': [],
+                                'detections': detections,
+                                'rotation': 90 if rng.random() < self.config.rotated_ratio else 0},
+                'img_size': list(self.config.img_size)}
+
+    def iter_dicts(self, n_postcards: int, start: int = 0) -> Iterator[dict]:
+        """Dictionnaires des cartes start à start + n_postcards - 1"""
+        for index in range(start, start + n_postcards):
+            yield self.postcard_dict(index)
+
+    def iter_postcards(self, n_postcards: int, start: int = 0, chunk_size: int = 1024) -> Iterator[Postcard]:
+        """Cartes construites par lots, sans vérifications individuelles et avec chaînes partagées (cf. validation)"""
+        validator = BatchValidator(check_bboxes=False)
+        for chunk_start in range(start, start + n_postcards, chunk_size):
+            n = min(chunk_size, start + n_postcards - chunk_start)
+            yield from validator.build_postcards(
+                {d['name']: d for d in self.iter_dicts(n, chunk_start)}).values()
+
+    def collection(self, n_postcards: int, start: int = 0) -> CardCollection:
+        """Collection de n_postcards cartes"""
+        return CardCollection({postcard.name: postcard for postcard in self.iter_postcards(n_postcards, start)})
+
+    def n_postcards_for(self, n_detections: int) -> int:
+        """Nombre (approché) de cartes pour obtenir n_detections détections"""
+        return max(1, round(n_detections / self.config.mean_detections))
+
+    # écriture :
+    # ----------
+    def write_collection(self, file_path: str | Path, n_postcards: int, start: int = 0) -> int:
+        """Écrit directement, carte par carte, une collection au format de CardCollection.save() ; renvoie le nombre
+        de détections écrites"""
+        n_detections = 0
+        with open(file_path, 'w', encoding='utf-8') as f:
+            f.write("{")
+            for i, postcard in enumerate(self.iter_dicts(n_postcards, start)):
+                n_detections += len(postcard['annotations']['detections'])
+                f.write(f"{', ' if i else ''}{json.dumps(postcard['name'])}: ")
+                f.write(json.dumps(postcard, ensure_ascii=False))
+            f.write("}")
+        return n_detections
+
+    def write_annotations(self, directory: str | Path, n_postcards: int, start: int = 0) -> int:
+        """Écrit un fichier d'annotations par carte (cf. Postcard.save_annotations()) ; renvoie le nombre de
+        détections écrites"""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        n_detections = 0
+        for postcard in self.iter_dicts(n_postcards, start):
+            n_detections += len(postcard['annotations']['detections'])
+            with open(directory / f"{postcard['name']}.json", 'w', encoding='utf-8') as f:
+                json.dump(postcard['annotations'], f, ensure_ascii=False)
+        return n_detections
+
+
+def generate_collection(n_postcards: int, seed: int = 0, config: SyntheticConfig | None = None) -> CardCollection:
+    """Collection synthétique de n_postcards cartes"""
+    return CollectionGenerator(seed, config).collection(n_postcards)
@@ -0,0 +1,240 @@
+from typing import List, Dict, Tuple, Iterable, Iterator, Callable
+from collections import Counter
+from array import array
+import heapq
+import math
+import re
+from t2ia_collection.collection import *
+
+# ======================================================================================================================
+# TERMES des textes
+# ======================================================================================================================
+# Chaque carte est un document : le sac des termes de ses textes (lemmes, ou mots-clés). Les termes sont codés par le
+# vocabulaire (un StringPool) et les documents rangés dans une matrice creuse document-terme au format CSR : pour la
+# ligne i, les codes des termes sont indices[indptr[i]:indptr[i + 1]] (croissants) et leurs effectifs data[...].
+
+_PUNCTUATION = re.compile(r'[^\w\s]|_')
+LEMMAS, KEYWORDS = 'lemmas', 'keywords'
+
+
+def text_terms(text: Text, source: str = LEMMAS) -> List[str]:
+    """
+    Termes d'un texte : ses lemmes (à défaut, ses mots découpés comme par Text.word_list() puis mis en minuscules comme
+    par Text.lemmatize()) ou ses mots-clés
+    """
+    if source == KEYWORDS:
+        return sorted(text.keywords)
+    if text._lemmas is not None:
+        return text._lemmas
+    if text._word_list is not None:
+        return [word.lower() for word in text._word_list]
+    return _PUNCTUATION.sub(' ', text.ocr_result).lower().split()
+
+
+# regroupements usuels des cartes :
+# ---------------------------------
+def group_by_town(postcard: Postcard) -> str | None:
+    return postcard.annotations.location.town
+
+
+def group_by_department(postcard: Postcard) -> str | None:
+    return postcard.annotations.location.department
+
+
+def group_by_editor(postcard: Postcard) -> str | None:
+    """Texte du premier texte imprimé marqué comme éditeur"""
+    for det in postcard.annotations.detections:
+        if isinstance(det.content, PrintedText) and det.content.is_editor and det.content.ocr_result:
+            return det.content.ocr_result
+    return None
+
+
+# ======================================================================================================================
+# MATRICE document-terme
+# ======================================================================================================================
+
+class TermMatrix:
+    """
+    Matrice creuse (CSR) des effectifs des termes des textes de chaque carte, avec les fréquences documentaires des
+    termes et le groupe de chaque carte (ville, éditeur... selon group_by). La matrice est complétée au fil de l'eau
+    par add() : une carte déjà présente est remplacée (son ancienne ligne est désactivée, pas recopiée). Les lignes
+    désactivées sont retirées par compact(), appelée automatiquement dès qu'elles sont plus nombreuses que les actives.
+    """
+
+    def __init__(self, source: str = LEMMAS, group_by: Callable[[Postcard], str | None] | None = None,
+                 stopwords: Iterable[str] = (), min_length: int = 1):
+        if source not in (LEMMAS, KEYWORDS):
+            raise ValueError(f"unknown term source: {source}")
+        self.source = source
+        self.group_by = group_by
+        self.stopwords = set(stopwords)
+        self.min_length = min_length
+        self.vocabulary = StringPool()
+        self.groups = StringPool()
+        # CSR
+        self.indptr = array('q', [0])
+        self.indices = array('l')
+        self.data = array('l')
+        # lignes
+        self.names: List[str] = []
+        self.row_groups = array('l')  # code du groupe de chaque ligne, -1 sans groupe
+        self.active = bytearray()  # 0 pour une ligne remplacée
+        self.rows: Dict[str, int] = {}  # nom -> ligne active
+        self.document_frequency = array('q')  # nombre de lignes actives contenant chaque terme
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __contains__(self, name) -> bool:
+        return name in self.rows
+
+    # construction :
+    # --------------
+    def terms(self, postcard: Postcard) -> Counter:
+        """Effectifs des termes des textes d'une carte"""
+        res = Counter()
+        for det in postcard.annotations.detections:
+            if isinstance(det.content, Text):
+                res.update(term for term in text_terms(det.content, self.source)
+                           if len(term) >= self.min_length and term not in self.stopwords)
+        return res
+
+    def add(self, postcard: Postcard):
+        """Ajoute (ou remplace) la ligne d'une carte"""
+        if postcard.name in self.rows:
+            self._deactivate(self.rows.pop(postcard.name))
+        counts = sorted((self.vocabulary.code(term), count) for term, count in self.terms(postcard).items())
+        missing = len(self.vocabulary) - len(self.document_frequency)
+        if missing > 0:
+            self.document_frequency.extend(array('q', bytes(8 * missing)))
+        for term_id, count in counts:
+            self.indices.append(term_id)
+            self.data.append(count)
+            self.document_frequency[term_id] += 1
+        self.indptr.append(len(self.indices))
+        group = self.group_by(postcard) if self.group_by is not None else None
+        self.row_groups.append(-1 if group is None else self.groups.code(group))
+        self.rows[postcard.name] = len(self.names)
+        self.names.append(postcard.name)
+        self.active.append(1)
+        self._compact_if_sparse()
+
+    def update(self, postcards: Iterable[Postcard]):
+        for postcard in postcards:
+            self.add(postcard)
+
+    def remove(self, name: str):
+        """Retire la ligne d'une carte"""
+        self._deactivate(self.rows.pop(name))
+        self._compact_if_sparse()
+
+    def _deactivate(self, row: int):
+        self.active[row] = 0
+        for term_id in self.indices[self.indptr[row]:self.indptr[row + 1]]:
+            self.document_frequency[term_id] -= 1
+
+    def _compact_if_sparse(self):
+        if len(self.names) - len(self.rows) > len(self.rows):
+            self.compact()
+
+    def compact(self):
+        """Réécrit la matrice sans les lignes désactivées, en conservant l'ordre des lignes actives"""
+        indptr, indices, data = array('q', [0]), array('l'), array('l')
+        names, row_groups = [], array('l')
+        for row in self._active_rows():
+            start, end = self.indptr[row], self.indptr[row + 1]
+            indices.extend(self.indices[start:end])
+            data.extend(self.data[start:end])
+            indptr.append(len(indices))
+            names.append(self.names[row])
+            row_groups.append(self.row_groups[row])
+        self.indptr, self.indices, self.data = indptr, indices, data
+        self.names, self.row_groups = names, row_groups
+        self.active = bytearray(b'\x01' * len(names))
+        self.rows = {name: row for row, name in enumerate(names)}
+
+    @staticmethod
+    def from_collection(collection: Iterable[Postcard], **kwargs) -> "TermMatrix":
+        res = TermMatrix(**kwargs)
+        res.update(collection)
+        return res
+
+    def row(self, name: str) -> Dict[str, int]:
+        """Effectifs des termes d'une carte"""
+        row, terms = self.rows[name], self.vocabulary.values
+        start, end = self.indptr[row], self.indptr[row + 1]
+        return {terms[term_id]: count for term_id, count in zip(self.indices[start:end], self.data[start:end])}
+
+    def _active_rows(self) -> Iterator[int]:
+        return (row for row, active in enumerate(self.active) if active)
+
+    # statistiques :
+    # --------------
+    def idf(self) -> array:
+        """Fréquences documentaires inverses lissées des termes : log((1 + n) / (1 + df)) + 1"""
+        n = len(self.rows)
+        return array('d', [math.log((1 + n) / (1 + df)) + 1 for df in self.document_frequency])
+
+    def term_counts(self) -> array:
+        """Effectifs totaux des termes sur les lignes actives"""
+        res = array('q', bytes(8 * len(self.vocabulary)))
+        indices, data, indptr = self.indices, self.data, self.indptr
+        for row in self._active_rows():
+            for k in range(indptr[row], indptr[row + 1]):
+                res[indices[k]] += data[k]
+        return res
+
+    def tfidf(self, name: str) -> Dict[str, float]:
+        """Poids TF-IDF (normalisés L2) des termes d'une carte"""
+        idf = self.idf()
+        row, terms = self.rows[name], self.vocabulary.values
+        start, end = self.indptr[row], self.indptr[row + 1]
+        weights = [count * idf[term_id] for term_id, count in zip(self.indices[start:end], self.data[start:end])]
+        norm = math.sqrt(sum(weight * weight for weight in weights)) or 1.
+        return {terms[term_id]: weight / norm for term_id, weight in zip(self.indices[start:end], weights)}
+
+    def group_counts(self) -> Dict[str, Dict[int, int]]:
+        """Effectifs des termes (par code) de chaque groupe"""
+        res: Dict[int, Dict[int, int]] = {}
+        indices, data, indptr = self.indices, self.data, self.indptr
+        for row in self._active_rows():
+            group = self.row_groups[row]
+            if group < 0:
+                continue
+            counts = res.setdefault(group, {})
+            for k in range(indptr[row], indptr[row + 1]):
+                counts[indices[k]] = counts.get(indices[k], 0) + data[k]
+        return {self.groups.values[group]: counts for group, counts in res.items()}
+
+    def top_terms(self, k: int = 10) -> Dict[str, List[Tuple[str, float]]]:
+        """
+        Termes caractéristiques de chaque groupe : les k termes de plus fort TF-IDF, les effectifs d'un groupe étant
+        ceux de ses cartes cumulés et l'IDF calculée sur les cartes
+        """
+        idf, terms = self.idf(), self.vocabulary.values
+        res = {}
+        for group, counts in self.group_counts().items():
+            total = sum(counts.values())
+            best = heapq.nlargest(k, ((count / total * idf[term_id], terms[term_id])
+                                      for term_id, count in counts.items()), key=lambda item: item[0])
+            res[group] = [(term, score) for score, term in best]
+        return res
+
+    def cooccurrences(self, terms: Iterable[str] | None = None, min_count: int = 1) -> Dict[Tuple[str, str], int]:
+        """
+        Nombre de cartes où chaque paire de termes apparaît ensemble (paires triées), restreint aux paires contenant
+        un des termes donnés
+        """
+        selected = None
+        if terms is not None:
+            selected = {self.vocabulary.code(term) for term in terms if term in self.vocabulary}
+        counts = Counter()
+        indices, indptr = self.indices, self.indptr
+        for row in self._active_rows():
+            row_terms = indices[indptr[row]:indptr[row + 1]]
+            for a, i in enumerate(row_terms):
+                for j in row_terms[a + 1:]:
+                    if selected is None or i in selected or j in selected:
+                        counts[(i, j)] += 1
+        values = self.vocabulary.values
+        return {tuple(sorted((values[i], values[j]))): count for (i, j), count in counts.items() if count >= min_count}
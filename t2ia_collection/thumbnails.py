@@ -0,0 +1,200 @@
+from typing import List, Dict, Tuple, Iterable
+from pathlib import Path
+import json
+import math
+import os
+from t2ia_collection.cache import *
+from t2ia_collection.parallel import chunks, bounded_map
+
+# ======================================================================================================================
+# PYRAMIDE d'images
+# ======================================================================================================================
+# Le niveau 0 est l'image en pleine résolution (tournée selon la rotation des annotations) ; chaque niveau divise la
+# taille par deux, jusqu'au dernier qui tient dans une seule tuile (la vignette). Chaque niveau est découpé en tuiles
+# carrées de tile_size pixels (celles du bord droit et du bas sont plus petites). Les bbox étant normalisées, leurs
+# coordonnées à un niveau s'obtiennent directement à partir de xyxyn() et de la taille du niveau.
+
+def level_size(img_size: Tuple[int, int], level: int) -> Tuple[int, int]:
+    """Taille (largeur, hauteur) d'un niveau de la pyramide"""
+    scale = 1 << level
+    return max(1, math.ceil(img_size[0] / scale)), max(1, math.ceil(img_size[1] / scale))
+
+
+def pyramid_levels(img_size: Tuple[int, int], tile_size: int = 256) -> List[Tuple[int, int]]:
+    """Tailles des niveaux de la pyramide, du niveau 0 (pleine résolution) à la vignette"""
+    res = [level_size(img_size, 0)]
+    while max(res[-1]) > tile_size:
+        res.append(level_size(img_size, len(res)))
+    return res
+
+
+def tile_grid(size: Tuple[int, int], tile_size: int = 256) -> Tuple[int, int]:
+    """Nombre de tuiles (colonnes, lignes) d'un niveau"""
+    return math.ceil(size[0] / tile_size), math.ceil(size[1] / tile_size)
+
+
+def bbox_to_level(bbox: BoundingBox, size: Tuple[int, int]) -> Tuple[float, float, float, float]:
+    """Coordonnées [x_min, y_min, x_max, y_max] en pixels d'une bbox dans un niveau de taille size"""
+    x_min, y_min, x_max, y_max = bbox.xyxyn()
+    return x_min * size[0], y_min * size[1], x_max * size[0], y_max * size[1]
+
+
+def bbox_tiles(bbox: BoundingBox, size: Tuple[int, int], tile_size: int = 256) -> List[Tuple[int, int]]:
+    """Tuiles (colonne, ligne) d'un niveau de taille size recouvertes par une bbox"""
+    x_min, y_min, x_max, y_max = bbox_to_level(bbox, size)
+    n_cols, n_rows = tile_grid(size, tile_size)
+    cols = range(min(int(x_min // tile_size), n_cols - 1), min(math.ceil(x_max / tile_size), n_cols))
+    rows = range(min(int(y_min // tile_size), n_rows - 1), min(math.ceil(y_max / tile_size), n_rows))
+    return [(col, row) for row in rows for col in cols]
+
+
+def rotated_size(img_size: Tuple[int, int], rotation: Orientation) -> Tuple[int, int]:
+    """Taille de l'image après rotation (cf. Postcard.rotate_image())"""
+    return (img_size[1], img_size[0]) if rotation.value % 180 else tuple(img_size)
+
+
+# ======================================================================================================================
+# CACHE de tuiles
+# ======================================================================================================================
+
+class TileCache:
+    """
+    Cache sur disque des pyramides de tuiles des cartes, pour les interfaces de relecture : une carte et ses détections
+    s'affichent sans décoder l'image en pleine résolution. Une pyramide est identifiée par le hash des octets de
+    l'image et la rotation des annotations (une image modifiée ou tournée a une autre pyramide) ; elle est rangée dans
+    directory/<clé[:2]>/<clé>/ avec un fichier pyramid.json écrit en dernier, qui atteste qu'elle est complète.
+    """
+
+    METADATA = "pyramid.json"
+
+    def __init__(self, directory: str | Path, tile_size: int = 256, image_format: str = "JPEG", quality: int = 85):
+        self.directory = Path(directory)
+        self.tile_size = tile_size
+        self.image_format = image_format.upper()
+        self.quality = quality
+        self._hashes: Dict[Tuple[str, int, int], str] = {}  # (chemin, date de modification, taille) -> hash
+
+    @property
+    def extension(self) -> str:
+        return {'JPEG': 'jpg'}.get(self.image_format, self.image_format.lower())
+
+    # clés et chemins :
+    # -----------------
+    def image_hash(self, postcard: Postcard) -> str:
+        """Hash des octets de l'image, mémorisé tant que le fichier n'est pas modifié"""
+        stat = os.stat(postcard.path)
+        key = (postcard.path, stat.st_mtime_ns, stat.st_size)
+        if key not in self._hashes:
+            self._hashes[key] = file_hash(postcard.path)
+        return self._hashes[key]
+
+    def key(self, postcard: Postcard) -> str:
+        return f"{self.image_hash(postcard)}-{postcard.annotations.rotation.value}"
+
+    def pyramid_path(self, postcard: Postcard) -> Path:
+        key = self.key(postcard)
+        return self.directory / key[:2] / key
+
+    def tile_path(self, postcard: Postcard, level: int, col: int, row: int) -> Path:
+        return self.pyramid_path(postcard) / str(level) / f"{col}_{row}.{self.extension}"
+
+    # pyramides :
+    # -----------
+    def metadata(self, postcard: Postcard) -> dict | None:
+        """Description de la pyramide d'une carte (taille de l'image tournée, tailles des niveaux), None si absente"""
+        file_path = self.pyramid_path(postcard) / self.METADATA
+        if not file_path.exists():
+            return None
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def __contains__(self, postcard: Postcard) -> bool:
+        return (self.pyramid_path(postcard) / self.METADATA).exists()
+
+    def generate(self, postcard: Postcard, overwrite: bool = False) -> dict:
+        """
+        Génère la pyramide d'une carte (l'image n'est décodée qu'une fois) et renvoie sa description. Une pyramide
+        existante d'une autre taille de tuile ou d'un autre format est supprimée avant d'être régénérée.
+        """
+        if not overwrite:
+            metadata = self.metadata(postcard)
+            if metadata is not None and metadata['tile_size'] == self.tile_size and \
+                    metadata.get('image_format') == self.image_format:
+                return metadata
+        self.remove(postcard)  # pas de tuiles obsolètes mêlées aux nouvelles
+        directory = self.pyramid_path(postcard)
+        image = postcard.rotate_image()
+        if self.image_format == "JPEG" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        levels = pyramid_levels(image.size, self.tile_size)
+        for level, size in enumerate(levels):
+            if image.size != size:
+                image = image.resize(size)  # à partir du niveau précédent : chaque réduction est d'un facteur 2
+            (directory / str(level)).mkdir(parents=True, exist_ok=True)
+            n_cols, n_rows = tile_grid(size, self.tile_size)
+            for row in range(n_rows):
+                for col in range(n_cols):
+                    box = (col * self.tile_size, row * self.tile_size,
+                           min((col + 1) * self.tile_size, size[0]), min((row + 1) * self.tile_size, size[1]))
+                    image.crop(box).save(directory / str(level) / f"{col}_{row}.{self.extension}",
+                                         self.image_format, quality=self.quality)
+        metadata = {'img_size': list(levels[0]), 'tile_size': self.tile_size, 'image_format': self.image_format,
+                    'levels': [list(size) for size in levels]}
+        with open(directory / self.METADATA, 'w', encoding='utf-8') as f:
+            json.dump(metadata, f)
+        return metadata
+
+    def tile(self, postcard: Postcard, level: int, col: int, row: int) -> Path:
+        """Chemin d'une tuile, la pyramide étant générée si besoin"""
+        levels = self.generate(postcard)['levels']
+        n_cols, n_rows = tile_grid(levels[level], self.tile_size)
+        if not (0 <= col < n_cols and 0 <= row < n_rows):
+            raise IndexError(f"tile ({col}, {row}) is outside level {level} ({n_cols} x {n_rows} tiles)")
+        return self.tile_path(postcard, level, col, row)
+
+    def thumbnail(self, postcard: Postcard) -> Path:
+        """Chemin de la vignette (dernier niveau, une seule tuile)"""
+        levels = self.generate(postcard)['levels']
+        return self.tile_path(postcard, len(levels) - 1, 0, 0)
+
+    def overlay(self, postcard: Postcard, level: int = 0) -> List[Tuple[str, Tuple[float, float, float, float]]]:
+        """
+        Détections à superposer à un niveau : (classe de contenu, coordonnées xyxy en pixels du niveau), les bbox étant
+        tournées comme l'image. Utilise la pyramide si elle existe, sinon la taille de l'image (sans la décoder).
+        """
+        rotation = postcard.annotations.rotation
+        metadata = self.metadata(postcard)
+        img_size = metadata['img_size'] if metadata is not None else rotated_size(postcard.get_img_size(), rotation)
+        size = level_size(img_size, level)
+        return [(det.get_content_cls(),
+                 bbox_to_level(det.bbox.rotate(rotation) if rotation != Orientation.ZERO else det.bbox, size))
+                for det in postcard.annotations.detections]
+
+    def remove(self, postcard: Postcard):
+        """Supprime la pyramide d'une carte"""
+        directory = self.pyramid_path(postcard)
+        if not directory.exists():
+            return
+        (directory / self.METADATA).unlink(missing_ok=True)  # d'abord : la pyramide n'est plus considérée complète
+        for file_path in sorted(directory.rglob("*"), reverse=True):  # fichiers avant leurs dossiers
+            if file_path.is_dir():
+                file_path.rmdir()
+            else:
+                file_path.unlink()
+        directory.rmdir()
+
+
+def _generate_chunk(postcards: List[Postcard], cache: TileCache, overwrite: bool) -> int:
+    """Génération des pyramides d'un lot de cartes (exécutée dans un processus de travail)"""
+    for postcard in postcards:
+        cache.generate(postcard, overwrite=overwrite)
+    return len(postcards)
+
+
+def generate_pyramids(cache: TileCache, collection: Iterable[Postcard], overwrite: bool = False,
+                      workers: int | None = None, chunk_size: int = 16) -> int:
+    """
+    Génère les pyramides des cartes d'une collection par lots dans un pool de processus (workers=0 pour générer dans le
+    processus courant) ; renvoie le nombre de cartes traitées
+    """
+    return sum(bounded_map(_generate_chunk, chunks(collection, chunk_size), cache, overwrite, workers=workers))
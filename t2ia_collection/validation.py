@@ -0,0 +1,293 @@
+from dataclasses import dataclass, field, fields, MISSING
+from typing import List, Dict, Tuple, Sequence, Hashable, Callable, Any
+from array import array
+from t2ia_collection.interning import *
+
+# ======================================================================================================================
+# VALIDATION par lots
+# ======================================================================================================================
+# Au chargement en masse (collections json, imports), les vérifications des __post_init__ (cohérence confiance /
+# is_manual, orientations, énumérations des DateStamp...) sont faites colonne par colonne sur les données brutes, pour
+# toutes les détections à la fois, et toutes les erreurs sont signalées ensemble. Les objets construits à partir des
+# données validées et normalisées ne repassent pas par __init__ / __post_init__.
+
+@dataclass
+class ValidationReport:
+    """Erreurs trouvées lors de la validation d'un lot : (clé de la ligne, champ, message)"""
+    n_rows: int = 0
+    errors: List[Tuple[Hashable, str, str]] = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return len(self.errors)
+
+    def isvalid(self) -> bool:
+        """Vérifie si le lot ne contient aucune erreur"""
+        return not self.errors
+
+    def add(self, key: Hashable, field_name: str, message: str):
+        self.errors.append((key, field_name, message))
+
+    def invalid_rows(self) -> List[Hashable]:
+        """Clés des lignes invalides, dans l'ordre"""
+        return list(dict.fromkeys(key for key, _, _ in self.errors))
+
+    def raise_for_errors(self, max_errors: int = 20):
+        """Lève une ValueError listant les erreurs (les max_errors premières) s'il y en a"""
+        if not self.errors:
+            return
+        lines = [f"  {key!r} {field_name}: {message}" for key, field_name, message in self.errors[:max_errors]]
+        if len(self.errors) > max_errors:
+            lines.append(f"  ... and {len(self.errors) - max_errors} more")
+        raise ValueError(f"{len(self.errors)} invalid values in {len(self.invalid_rows())} of {self.n_rows} rows:\n"
+                         + "\n".join(lines))
+
+
+# construction sans vérifications :
+# ---------------------------------
+_FIELD_DEFAULTS: Dict[type, Tuple[Tuple[str, Any, Callable | None], ...]] = {}
+
+
+def _field_defaults(cls: type) -> Tuple[Tuple[str, Any, Callable | None], ...]:
+    """(nom, valeur par défaut, fabrique par défaut) des champs d'une dataclass, mis en cache"""
+    if cls not in _FIELD_DEFAULTS:
+        _FIELD_DEFAULTS[cls] = tuple((f.name, f.default, None if f.default_factory is MISSING else f.default_factory)
+                                     for f in fields(cls))
+    return _FIELD_DEFAULTS[cls]
+
+
+def build_unchecked(cls: type, values: dict):
+    """Instance d'une dataclass à partir de valeurs déjà validées et normalisées, sans appel à __init__ ni à
+    __post_init__ ; les champs absents prennent leur valeur par défaut"""
+    res = cls.__new__(cls)
+    attributes = res.__dict__
+    for name, default, factory in _field_defaults(cls):
+        if name in values:
+            attributes[name] = values[name]
+        elif factory is not None:
+            attributes[name] = factory()
+        elif default is not MISSING:
+            attributes[name] = default
+        else:
+            raise TypeError(f"{cls.__name__} missing required argument: '{name}'")
+    return res
+
+
+def content_classes() -> Dict[str, type]:
+    """Classes de contenu par nom (Content et toutes ses sous-classes)"""
+    res, stack = {}, [Content]
+    while stack:
+        cls = stack.pop()
+        res[cls.__name__] = cls
+        stack.extend(cls.__subclasses__())
+    return res
+
+
+# ======================================================================================================================
+# VALIDATEUR
+# ======================================================================================================================
+
+_CHECKED_FIELDS = {'is_manual', 'confidence', 'keywords', 'orientation', 'mark_type', 'quality', 'date'}
+
+
+class BatchValidator:
+    """
+    Validation et construction en masse de détections à partir de leurs dictionnaires (cf. Detection.to_dict()).
+    Les vérifications sont celles des __post_init__ de Detection et des contenus, plus la validité des bbox si
+    check_bboxes (non vérifiée à l'instanciation d'une BoundingBox). Les chaînes répétitives (cf. interning) des objets
+    construits sont partagées via pool.
+    """
+
+    def __init__(self, check_bboxes: bool = True, pool: StringPool | None = None):
+        self.check_bboxes = check_bboxes
+        self.pool = pool if pool is not None else StringPool()
+        self.content_classes = content_classes()
+        self._init_fields = {name: {f.name for f in fields(cls) if f.init}
+                             for name, cls in self.content_classes.items()}
+
+    # normalisation des colonnes :
+    # ----------------------------
+    @staticmethod
+    def orientation(value: Any) -> Orientation:
+        """Orientation d'une valeur brute (les valeurs déjà rencontrées sont résolues par la table de
+        Orientation.from_input())"""
+        return Orientation.from_input(value)
+
+    def _check_confidences(self, keys: Sequence[Hashable], is_manual: List, confidences: List, prefix: str,
+                           report: ValidationReport, reset: bool = False):
+        """Cohérence is_manual / confiance ; si reset, la confiance des contenus manuels ou non traités est effacée"""
+        for i, (manual, confidence) in enumerate(zip(is_manual, confidences)):
+            if manual is False and confidence is None:
+                report.add(keys[i], f"{prefix}confidence", "confidence must be set if not manually set")
+            elif reset and manual is not False:
+                confidences[i] = None
+
+    def _check_enum(self, keys: Sequence[Hashable], values: List, enum_cls: type, field_name: str,
+                    report: ValidationReport):
+        members = enum_cls._value2member_map_
+        for i, value in enumerate(values):
+            if isinstance(value, enum_cls):
+                continue
+            member = members.get(value) if isinstance(value, str) else None
+            if member is None:
+                report.add(keys[i], f"content.{field_name}",
+                           f"{field_name} must be one of : {[e.value for e in enum_cls]}, got {value!r}")
+            else:
+                values[i] = member
+
+    def _normalize_contents(self, cls: type, keys: List[Hashable], dicts: List[dict], report: ValidationReport):
+        """Validation et normalisation, en place, des dictionnaires de contenu d'une même classe"""
+        columns = {name: [d.get(name, default) for d in dicts] for name, default, factory in _field_defaults(cls)
+                   if name in _CHECKED_FIELDS}
+        if not issubclass(cls, DateStamp):  # les DateStamp n'ont pas de confiance (cf. DateStamp.__post_init__)
+            self._check_confidences(keys, columns['is_manual'], columns['confidence'], "content.", report, reset=True)
+        if issubclass(cls, Text):
+            keywords = columns['keywords']
+            for i, value in enumerate(keywords):
+                if not value:
+                    keywords[i] = set()
+                elif isinstance(value, list):
+                    keywords[i] = set(value)
+                elif not isinstance(value, set):
+                    report.add(keys[i], "content.keywords", "keywords must be a set or None")
+            orientations = columns['orientation']
+            for i, value in enumerate(orientations):
+                try:
+                    orientations[i] = self.orientation(value)
+                except (ValueError, TypeError) as e:
+                    report.add(keys[i], "content.orientation", str(e))
+        if issubclass(cls, DateStamp):
+            self._check_enum(keys, columns['mark_type'], DateStampType, 'mark_type', report)
+            self._check_enum(keys, columns['quality'], DateStampQuality, 'quality', report)
+            dates = columns['date']
+            for i, value in enumerate(dates):
+                if value is None or isinstance(value, str):
+                    dates[i] = DateISO8601(value)
+                elif not isinstance(value, DateISO8601):
+                    report.add(keys[i], "content.date", f"date must be an str or {DateISO8601.__name__}")
+        for name, values in columns.items():
+            for d, value in zip(dicts, values):
+                d[name] = value
+        for d in dicts:
+            intern_content_dict(cls, d, self.pool)
+
+    def _normalize(self, rows: Sequence[dict], keys: Sequence[Hashable] | None = None
+                   ) -> Tuple[List[tuple], ValidationReport]:
+        """Validation des dictionnaires de détections par passes sur les colonnes. Renvoie les lignes normalisées
+        (bbox, is_manual, confiance, classe de contenu, dict de contenu) et le rapport d'erreurs."""
+        keys = list(range(len(rows))) if keys is None else list(keys)
+        report = ValidationReport(n_rows=len(rows))
+
+        # 1. structure : champs présents et classes de contenu connues
+        bboxes, is_manual, confidences, contents = [], [], [], []
+        by_class: Dict[str, Tuple[List[Hashable], List[dict]]] = {}
+        for key, row in zip(keys, rows):
+            bbox = row.get('bbox')
+            if not isinstance(bbox, dict) or bbox.keys() != {'x', 'y', 'w', 'h'}:
+                report.add(key, "bbox", f"bbox must be a dict with keys x, y, w, h, got {bbox!r}")
+                bbox = {'x': 0., 'y': 0., 'w': 0., 'h': 0.}
+            bboxes.append(bbox)
+            is_manual.append(row.get('is_manual', True))
+            confidences.append(row.get('confidence'))
+            content = row.get('content')
+            if content is None:
+                content_cls, content_dict = 'Content', {}
+            elif not isinstance(content, dict) or len(content) != 1:
+                report.add(key, "content", "content must be a {class name: content dict} object or None")
+                content_cls, content_dict = 'Content', {}
+            else:
+                content_cls, content_dict = next(iter(content.items()))
+                content_dict = dict(content_dict or {})  # les données brutes ne sont pas modifiées
+                if content_cls not in self.content_classes:
+                    report.add(key, "content", f"Classe {content_cls} non trouvée")
+                    content_cls, content_dict = 'Content', {}
+                elif unknown := content_dict.keys() - self._init_fields[content_cls]:
+                    report.add(key, "content", f"unknown fields for {content_cls}: {sorted(unknown)}")
+                    content_dict = {k: v for k, v in content_dict.items() if k not in unknown}
+            contents.append((content_cls, content_dict))
+            cls_keys, cls_dicts = by_class.setdefault(content_cls, ([], []))
+            cls_keys.append(key)
+            cls_dicts.append(content_dict)
+
+        # 2. bbox : coordonnées numériques, puis validité en un seul passage sur les colonnes
+        columns = []
+        for coord in 'xywh':
+            column = array('d')
+            for key, bbox in zip(keys, bboxes):
+                try:
+                    column.append(bbox[coord])
+                except TypeError:
+                    report.add(key, f"bbox.{coord}", f"coordinate must be a number, got {bbox[coord]!r}")
+                    column.append(0.)
+            columns.append(column)
+        if self.check_bboxes:
+            for key, valid in zip(keys, BoundingBoxArray(*columns).isvalid()):
+                if not valid:
+                    report.add(key, "bbox", "bbox is not inside the image")
+
+        # 3. détections et contenus
+        self._check_confidences(keys, is_manual, confidences, "", report)
+        for content_cls, (cls_keys, cls_dicts) in by_class.items():
+            self._normalize_contents(self.content_classes[content_cls], cls_keys, cls_dicts, report)
+
+        normalized = [((x, y, w, h), manual, confidence, content_cls, content_dict)
+                      for x, y, w, h, manual, confidence, (content_cls, content_dict)
+                      in zip(*columns, is_manual, confidences, contents)]
+        return normalized, report
+
+    # API :
+    # -----
+    def validate_detections(self, rows: Sequence[dict], keys: Sequence[Hashable] | None = None) -> ValidationReport:
+        """Rapport de validation des dictionnaires de détections (les clés des lignes sont leurs indices par défaut)"""
+        return self._normalize(rows, keys)[1]
+
+    def build_detections(self, rows: Sequence[dict], keys: Sequence[Hashable] | None = None) -> List[Detection]:
+        """Détections à partir de leurs dictionnaires, validés en bloc : lève une ValueError listant toutes les erreurs,
+        sinon les objets sont construits sans vérifications individuelles"""
+        normalized, report = self._normalize(rows, keys)
+        report.raise_for_errors()
+        return self._build(normalized)
+
+    def build_postcards(self, data: Dict[str, dict]) -> Dict[str, Postcard]:
+        """Cartes à partir de leurs dictionnaires (cf. CardCollection.to_dict()) : les détections de toutes les cartes
+        sont validées en un seul lot, les erreurs sont repérées par (nom de la carte, indice de la détection)"""
+        rows, keys, rotations, report = [], [], {}, ValidationReport()
+        for name, postcard in data.items():
+            annotations = postcard.get('annotations') or {}
+            for i, det in enumerate(annotations.get('detections', [])):
+                rows.append(det)
+                keys.append((name, i))
+            try:
+                rotations[name] = self.orientation(annotations.get('rotation', 0))
+            except (ValueError, TypeError) as e:
+                report.add(name, "annotations.rotation", str(e))
+        normalized, det_report = self._normalize(rows, keys)
+        det_report.errors = report.errors + det_report.errors
+        det_report.raise_for_errors()
+
+        detections = iter(self._build(normalized))
+        res = {}
+        for name, postcard in data.items():
+            annotations = postcard.get('annotations') or {}
+            n_detections = len(annotations.get('detections', []))
+            location = Location.from_dict(annotations.get('location'))
+            location.town, location.department, location.region = self.pool.intern_all(
+                (location.town, location.department, location.region))
+            res[name] = Postcard(path=postcard['path'],
+                                 name=postcard.get('name'),
+                                 annotations=build_unchecked(Annotations, {
+                                     'location': location,
+                                     'tags': self.pool.intern_all(annotations.get('tags', [])),
+                                     'keywords': self.pool.intern_all(annotations.get('keywords', [])),
+                                     'detections': [next(detections) for _ in range(n_detections)],
+                                     'rotation': rotations[name]}),
+                                 img_size=postcard.get('img_size'))
+        return res
+
+    def _build(self, normalized: List[tuple]) -> List[Detection]:
+        """Détections à partir de lignes normalisées par la validation"""
+        res = []
+        for (x, y, w, h), manual, confidence, content_cls, content_dict in normalized:
+            content = build_unchecked(self.content_classes[content_cls], content_dict)
+            res.append(build_unchecked(Detection, {'bbox': BoundingBox(x, y, w, h), 'is_manual': manual,
+                                                   'confidence': confidence, 'content': content}))
+        return res
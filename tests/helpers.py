@@ -0,0 +1,12 @@
+from t2ia_collection.detection import *
+
+
+# ======================================================================================================================
+# FUNCTIONS partagées par les tests
+# ======================================================================================================================
+
+def det(x_min, y_min, x_max, y_max, content_class, confidence=None):
+    """détection manuelle (sans confiance) ou prédite à partir de coordonnées xyxyn"""
+    return Detection(BoundingBox.from_coords([x_min, y_min, x_max, y_max], 'xyxyn'),
+                     is_manual=confidence is None, confidence=confidence,
+                     content=Content.create_instance(content_class))
@@ -0,0 +1,137 @@
+import pytest
+from t2ia_collection.cache import *
+
+
+# ======================================================================================================================
+# FIXTURES
+# ======================================================================================================================
+
+@pytest.fixture
+def cache(tmp_path):
+    with ResultCache(tmp_path / 'cache.sqlite') as res:
+        yield res
+
+@pytest.fixture
+def collection(tmp_path):
+    res = CardCollection()
+    for i in range(3):
+        image_path = tmp_path / f"{i:04d}.jpg"
+        image_path.write_bytes(bytes([i]) * 100)  # octets factices : seul leur hash compte
+        res.add(Postcard(image_path, annotations=Annotations(detections=[
+            Detection(BoundingBox(0.5, 0.1, 0.4, 0.05), content=PrintedText()),
+            Detection(BoundingBox(0.5, 0.5, 0.4, 0.4), content=PrintedText()),
+        ])))
+    return res
+
+@pytest.fixture
+def fake_ocr():
+    """OCR factice qui compte les détections reçues"""
+    calls = []
+
+    def ocr(items):
+        calls.extend((item.postcard.name, item.index) for item in items)
+        return [{'ocr_result': f"{item.postcard.name}-{item.index}", 'confidence': 0.9} for item in items]
+    return FunctionBackend(ocr, version='1'), calls
+
+
+def reset(collection):
+    """remet les contenus à l'état non traité"""
+    for postcard in collection:
+        for det in postcard.annotations.detections:
+            det.content = PrintedText()
+
+
+# ======================================================================================================================
+# TESTS ResultCache
+# ======================================================================================================================
+
+class TestClassResultCache:
+    """tests for ResultCache Class"""
+
+    def test_get_put(self, cache, tmp_path):
+        """test storage and persistence of results"""
+        assert cache.get('a') is None
+        cache.put('a', {'ocr_result': 'Brest'})
+        cache.put_many({'b': {'x': 1}, 'a': {'ocr_result': 'Reims'}})
+        assert len(cache) == 2
+        assert cache.get('a') == {'ocr_result': 'Reims'}
+        assert cache.get_many(['a', 'b', 'c']) == {'a': {'ocr_result': 'Reims'}, 'b': {'x': 1}}
+        assert (cache.hits, cache.misses) == (3, 2)
+        size = cache.size
+        cache.close()
+        with ResultCache(tmp_path / 'cache.sqlite') as reopened:
+            assert reopened.get('b') == {'x': 1}
+            assert reopened.size == size
+
+    def test_eviction(self, tmp_path):
+        """test that least recently used results are evicted beyond max_bytes"""
+        with ResultCache(tmp_path / 'small.sqlite', max_bytes=50) as cache:
+            cache.put('a', {'v': 'x' * 10})
+            cache.put('b', {'v': 'y' * 10})
+            cache.get('a')  # 'a' devient plus récent que 'b'
+            cache.put('c', {'v': 'z' * 10})
+            assert 'a' in cache and 'c' in cache and 'b' not in cache
+            assert cache.size <= 50
+            cache.clear()
+            assert len(cache) == 0
+
+    def test_result_key(self):
+        """test that keys depend on every component"""
+        bbox = BoundingBox(0.5, 0.5, 0.2, 0.2)
+        key = result_key('h', bbox, 'PrintedText', 'ocr', '1')
+        assert key == result_key('h', bbox.copy(), 'PrintedText', 'ocr', '1')
+        assert key != result_key('h', bbox, 'PrintedText', 'ocr', '2')
+        assert key != result_key('h2', bbox, 'PrintedText', 'ocr', '1')
+        assert key != result_key('h', BoundingBox(0.5, 0.5, 0.2, 0.3), 'PrintedText', 'ocr', '1')
+
+
+# ======================================================================================================================
+# TESTS CachedBackend
+# ======================================================================================================================
+
+class TestClassCachedBackend:
+    """tests for CachedBackend Class"""
+
+    def test_incremental(self, collection, cache, fake_ocr, tmp_path):
+        """test that only new or modified detections reach the backend"""
+        backend, calls = fake_ocr
+        crops = []
+        scheduler = ExtractionScheduler({'Text': CachedBackend(backend, cache, name='ocr')},
+                                        crop_loader=lambda postcard, det, images: crops.append(postcard.name))
+        assert scheduler.run_sync(collection).n_processed == 6
+        assert len(calls) == 6
+        # second passage : tout vient du cache, sans recadrage
+        reset(collection)
+        calls.clear(), crops.clear()
+        assert scheduler.run_sync(collection).n_processed == 6
+        assert (calls, crops) == ([], [])
+        assert collection['0001'].annotations.detections[1].content.ocr_result == '0001-1'
+        # une bbox et une image modifiées
+        reset(collection)
+        collection['0000'].annotations.detections[0].bbox.w = 0.3
+        Path(collection['0002'].path).write_bytes(b'new scan')
+        scheduler.run_sync(collection)
+        assert sorted(calls) == [('0000', 0), ('0002', 0), ('0002', 1)]
+        assert sorted(crops) == ['0000', '0002', '0002']
+
+    def test_pinned(self, collection, cache, fake_ocr):
+        """test that results found by to_extract() survive an eviction before extract()"""
+        backend, calls = fake_ocr
+        cached_backend = CachedBackend(backend, cache)
+        ExtractionScheduler({'Text': cached_backend}, crop_loader=None).run_sync(collection)
+        items = [ExtractionItem(collection['0000'], i) for i in range(2)]
+        calls.clear()
+        assert cached_backend.to_extract(items) == []  # pas de recadrage à charger
+        cache.clear()  # évincés entre-temps
+        results = asyncio.run(cached_backend.extract(items))
+        assert [result['ocr_result'] for result in results] == ['0000-0', '0000-1']
+        assert calls == [] and cached_backend._pinned == {}
+
+    def test_version(self, collection, cache, fake_ocr):
+        """test that a new extractor version invalidates previous results"""
+        backend, calls = fake_ocr
+        ExtractionScheduler({'Text': CachedBackend(backend, cache)}, crop_loader=None).run_sync(collection)
+        reset(collection)
+        backend.version = '2'
+        ExtractionScheduler({'Text': CachedBackend(backend, cache)}, crop_loader=None).run_sync(collection)
+        assert len(calls) == 12
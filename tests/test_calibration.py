@@ -0,0 +1,205 @@
+import pytest
+import random
+from t2ia_collection.calibration import *
+from helpers import det
+
+
+# ======================================================================================================================
+# FIXTURES
+# ======================================================================================================================
+
+@pytest.fixture
+def collection():
+    return CardCollection({
+        '0001': Postcard('0001.jpg', annotations=Annotations(detections=[
+            det(0.6, 0.0, 1.0, 0.4, 'DateStamp'),
+            det(0.0, 0.0, 0.5, 0.1, 'PrintedText'),
+            det(0.6, 0.0, 1.0, 0.4, 'DateStamp', 0.9),  # vrai positif
+            det(0.0, 0.0, 0.45, 0.1, 'PrintedText', 0.8),  # vrai positif
+            det(0.2, 0.5, 0.4, 0.7, 'PrintedText', 0.3),  # faux positif
+        ])),
+        '0002': Postcard('0002.jpg', annotations=Annotations(detections=[
+            det(0.0, 0.5, 0.5, 1.0, 'HandwrittenText'),
+            det(0.0, 0.5, 0.5, 1.0, 'PrintedText', 0.7),  # mauvaise classe
+            det(0.6, 0.0, 1.0, 0.4, 'DateStamp', 0.6),  # faux positif
+        ])),
+        '0003': Postcard('0003.jpg', annotations=Annotations(detections=[  # non annotée : ignorée par la calibration
+            det(0.6, 0.0, 1.0, 0.4, 'DateStamp', 0.5),
+        ])),
+    })
+
+
+@pytest.fixture
+def texts():
+    """carte dont les textes prédits sont lus par OCR, et les textes annotés transcrits"""
+    def text(ocr_result, confidence=None):
+        return PrintedText(ocr_result=ocr_result, is_manual=confidence is None, confidence=confidence)
+    return Postcard('0001.jpg', annotations=Annotations(detections=[
+        Detection(BoundingBox(0.25, 0.1, 0.5, 0.2), is_manual=True, content=text("Reims")),
+        Detection(BoundingBox(0.25, 0.6, 0.5, 0.2), is_manual=True, content=text("Épernay")),
+        Detection(BoundingBox(0.25, 0.1, 0.5, 0.2), is_manual=False, confidence=0.9, content=text("Reims", 0.8)),
+        Detection(BoundingBox(0.25, 0.6, 0.5, 0.2), is_manual=False, confidence=0.8, content=text("Eperna", 0.4)),
+        Detection(BoundingBox(0.8, 0.9, 0.1, 0.1), is_manual=False, confidence=0.7,  # non appariée
+                  content=text("Vue", 0.2)),
+    ]))
+
+
+@pytest.fixture
+def overconfident():
+    """confiances trop tranchées : une prédiction de confiance c est correcte avec une probabilité
+    sigmoïde(logit(c) / 3)"""
+    rng = random.Random(0)
+    confidences = [rng.random() for _ in range(4000)]
+    labels = bytearray(rng.random() < 1 / (1 + ((1 - confidence) / confidence) ** (1 / 3))
+                       for confidence in confidences)
+    return confidences, labels
+
+
+# ======================================================================================================================
+# TESTS
+# ======================================================================================================================
+
+class TestCalibrationData:
+    """tests for calibration_data(), content_calibration_data() and confidence_columns()"""
+
+    def test_calibration_data(self, collection):
+        """test that only annotated cards are used"""
+        data = calibration_data(collection, workers=0)
+        confidences, labels, n_gt = data['PrintedText']
+        assert sorted(zip(confidences, labels)) == [(0.3, 0), (0.7, 0), (0.8, 1)]
+        assert n_gt == 1
+        assert sorted(data['DateStamp'][0]) == [0.6, 0.9]
+
+    def test_confidence_columns(self, collection):
+        """test the prediction columns"""
+        classes, confidences = confidence_columns(collection)
+        assert classes == ['DateStamp', 'PrintedText', 'PrintedText', 'PrintedText', 'DateStamp', 'DateStamp']
+        assert list(confidences) == [0.9, 0.8, 0.3, 0.7, 0.6, 0.5]
+        with pytest.raises(ValueError):
+            confidence_columns(collection, target='boxes')
+
+    def test_content_calibration_data(self, texts):
+        """test that extracted contents are labelled against manual transcriptions"""
+        confidences, labels, n_gt = content_calibration_data([texts])['PrintedText']
+        assert list(confidences) == [0.8, 0.4] and list(labels) == [1, 0] and n_gt == 1
+        assert confidence_columns([texts], CONTENTS) == (['PrintedText'] * 3, array('d', [0.8, 0.4, 0.2]))
+
+
+class TestCalibrators:
+    """tests for IsotonicCalibrator and TemperatureCalibrator"""
+
+    def test_isotonic(self):
+        """test the pool adjacent violators fit"""
+        calibrator = IsotonicCalibrator().fit([0.1, 0.2, 0.3, 0.4, 0.5], [0, 1, 0, 1, 1])
+        assert list(calibrator.values) == pytest.approx([0., 0.5, 1.])
+        assert list(calibrator.thresholds) == [0.1, 0.3, 0.5]
+        assert calibrator(0.05) == 0. and calibrator(0.25) == 0.5 and calibrator(0.9) == 1.
+        assert list(calibrator.transform([0.1, 0.4])) == [0., 1.]
+        assert IsotonicCalibrator()(0.3) == 0.3  # non ajusté
+
+    @pytest.mark.parametrize("calibrator_cls", [IsotonicCalibrator, TemperatureCalibrator])
+    def test_calibration_quality(self, overconfident, calibrator_cls):
+        """test that calibrated confidences match the observed accuracy"""
+        confidences, labels = overconfident
+        calibrator = calibrator_cls().fit(confidences, labels)
+        calibrated = calibrator.transform(confidences)
+        assert sum(calibrated) / len(calibrated) == pytest.approx(sum(labels) / len(labels), abs=0.03)
+        # la calibration est croissante
+        assert calibrator(0.2) <= calibrator(0.5) <= calibrator(0.9)
+        # et réduit les confiances élevées
+        assert calibrator(0.95) < 0.85
+
+    def test_temperature(self, overconfident):
+        """test the fitted temperature"""
+        calibrator = TemperatureCalibrator().fit(*overconfident)
+        assert calibrator.temperature == pytest.approx(3., abs=0.5)
+        assert TemperatureCalibrator(1.)(0.7) == pytest.approx(0.7)
+
+    @pytest.mark.parametrize("calibrator", [IsotonicCalibrator([0.5, 1.], [0.2, 0.8]), TemperatureCalibrator(2.)])
+    def test_dict(self, calibrator):
+        """test export and import of calibrators"""
+        res = Calibrator.from_dict(calibrator.to_dict())
+        assert type(res) is type(calibrator)
+        assert res(0.3) == calibrator(0.3)
+        with pytest.raises(ValueError):
+            Calibrator.from_dict({'method': 'platt'})
+
+
+class TestCalibration:
+    """tests for Calibration"""
+
+    def test_fit(self, collection):
+        """test per-class fitting and the minimum number of samples"""
+        data = calibration_data(collection, workers=0)
+        calibration = Calibration.fit(data, min_samples=3)
+        assert list(calibration.calibrators) == ['PrintedText']
+        assert isinstance(Calibration.fit(data, 'temperature', min_samples=1).calibrators['DateStamp'],
+                          TemperatureCalibrator)
+        with pytest.raises(ValueError):
+            Calibration.fit(data, 'platt')
+
+    def test_transform(self):
+        """test bulk transformation, classes without calibrator are unchanged"""
+        calibration = Calibration({'DateStamp': IsotonicCalibrator([0.5, 1.], [0.2, 0.8])})
+        res = calibration.transform(['DateStamp', 'PrintedText', 'DateStamp'], [0.4, 0.4, 0.9])
+        assert list(res) == [0.2, 0.4, 0.8]
+
+    @pytest.mark.parametrize("inplace", [False, True])
+    def test_apply(self, collection, inplace):
+        """test that predictions of the collection are calibrated"""
+        calibration = Calibration({'DateStamp': IsotonicCalibrator([0.7, 1.], [0.5, 1.])})
+        version = collection['0003'].version
+        res = calibration.apply(collection, inplace=inplace)
+        if inplace:
+            assert res is None
+            res = collection
+        else:
+            assert collection['0003'].annotations.detections[0].confidence == 0.5
+        assert [det.confidence for det in res['0001'].annotations.detections] == [None, None, 1., 0.8, 0.3]
+        assert res['0003'].annotations.detections[0].confidence == 0.5
+        assert res['0003'].version > version
+
+    def test_apply_contents(self, texts):
+        """test that content confidences have their own calibration"""
+        calibration = Calibration({'PrintedText': IsotonicCalibrator([0.5, 1.], [0., 1.])})
+        calibration.apply(CardCollection({texts.name: texts}), inplace=True, target=CONTENTS)
+        assert [det.content.confidence for det in texts.annotations.detections] == [None, None, 1., 0., 0.]
+        assert [det.confidence for det in texts.annotations.detections] == [None, None, 0.9, 0.8, 0.7]
+
+    def test_save_load(self, tmp_path):
+        """test JSON persistence"""
+        calibration = Calibration({'DateStamp': IsotonicCalibrator([0.5, 1.], [0.2, 0.8]),
+                                   'PrintedText': TemperatureCalibrator(1.5)})
+        calibration.save(tmp_path / "calibration.json")
+        res = Calibration.load(tmp_path / "calibration.json")
+        assert res.to_dict() == calibration.to_dict()
+
+
+class TestThresholdSweep:
+    """tests for ThresholdSweep"""
+
+    def test_at(self):
+        """test precision and recall at a threshold"""
+        sweep = ThresholdSweep([0.9, 0.3, 0.8, 0.6], bytearray([1, 0, 0, 1]), n_gt=3)
+        assert sweep.at(0.85) == (1., 1 / 3, 1)
+        assert sweep.at(0.6) == (2 / 3, 2 / 3, 3)
+        assert sweep.at(0.) == (0.5, 2 / 3, 4)
+        assert sweep.at(0.95) == (1., 0., 0)
+
+    def test_sweep(self, overconfident):
+        """test the sweep and the best thresholds"""
+        sweep = ThresholdSweep(*overconfident, n_gt=sum(overconfident[1]))
+        res = sweep.sweep()
+        assert len(res) == 101
+        assert res[0][2] == 1.  # rappel total au seuil 0
+        recalls = [recall for _, _, recall, _, _ in res]
+        assert recalls == sorted(recalls, reverse=True)
+        threshold = sweep.best_threshold(min_precision=0.8)
+        assert sweep.at(threshold)[0] >= 0.8
+        assert sweep.at(sweep.best_threshold())[2] > sweep.at(threshold)[2]
+
+    def test_from_data(self, collection):
+        """test sweeps built from calibration data"""
+        sweeps = ThresholdSweep.from_data(calibration_data(collection, workers=0))
+        assert sweeps['PrintedText'].at(0.75) == (1., 1., 1)
+        assert sweeps['HandwrittenText'].at(0.) == (1., 0., 0)
@@ -0,0 +1,112 @@
+import pytest
+from t2ia_collection.collection import *
+
+
+# ======================================================================================================================
+# FIXTURES
+# ======================================================================================================================
+
+@pytest.fixture
+def collection():
+    return CardCollection({
+        '0001': Postcard('0001.jpg', annotations=Annotations(
+            location=Location(town='Brest', department='Finistère', region='Bretagne'),
+            tags=['port'],
+            detections=[Detection(BoundingBox(0.5, 0.5, 0.2, 0.1),
+                                  content=PrintedText(True, ocr_result='Brest - Le port', keywords=['port']))])),
+        '0002': Postcard('0002.jpg', annotations=Annotations(
+            location=Location(town='Reims', department='Marne', region='Grand Est'),
+            tags=['cathédrale'],
+            keywords=['cathédrale'])),
+    })
+
+
+# ======================================================================================================================
+# TESTS CardCollection
+# ======================================================================================================================
+
+class TestClassCardCollection:
+    """tests for CardCollection Class"""
+
+    def test_mapping(self, collection):
+        """test container behaviour of CardCollection"""
+        assert len(collection) == 2
+        assert '0001' in collection
+        assert collection['0002'].name == '0002'
+        assert [postcard.name for postcard in collection] == ['0001', '0002']
+        assert collection.items is collection.postcards
+
+    def test_add(self, collection):
+        """test add() with and without merge"""
+        new_det = Detection(BoundingBox(0.2, 0.2, 0.1, 0.1), content=DateStamp())
+        collection.add(Postcard('0001.jpg', annotations=Annotations(detections=[new_det])), merge=True)
+        assert len(collection['0001'].annotations) == 2
+        collection.add(Postcard('0001.jpg'))
+        assert len(collection['0001'].annotations) == 0
+        assert collection.remove('0001').name == '0001'
+        assert len(collection) == 1
+
+    def test_save_load(self, collection, tmp_path):
+        """test saving and loading a CardCollection as json"""
+        file_path = tmp_path / 'collection.json'
+        collection.save(file_path)
+        assert CardCollection.load(file_path) == collection
+
+    def test_filters(self, collection):
+        """test filter_by_* methods"""
+        assert list(collection.filter(lambda postcard: len(postcard.annotations) > 0).postcards) == ['0001']
+        assert list(collection.filter_by_tags(['cathédrale', 'mairie']).postcards) == ['0002']
+        assert list(collection.filter_by_keywords(['port']).postcards) == ['0001']
+        assert list(collection.filter_by_town('brest').postcards) == ['0001']
+        assert list(collection.filter_by_department('Marne').postcards) == ['0002']
+        assert list(collection.filter_by_region('Bretagne').postcards) == ['0001']
+        assert len(collection.filter_by_region('Normandie')) == 0
+
+    def test_geo_filters(self, collection):
+        """test filter_by_distance and filter_by_area without index"""
+        collection['0001'].annotations.location.gps = (48.39, -4.49)  # Brest
+        collection['0002'].annotations.location.gps = (49.26, 4.03)  # Reims
+        assert list(collection.filter_by_distance((48.45, -4.42), 20).postcards) == ['0001']
+        assert len(collection.filter_by_distance((48.85, 2.35), 100)) == 0
+        assert list(collection.filter_by_distance((49.26, 4.03), 0).postcards) == ['0002']  # distance nulle
+        assert list(collection.filter_by_area(47, -6, 50, 5).postcards) == ['0001', '0002']
+        assert list(collection.filter_by_area(49, 0, 50, 5).postcards) == ['0002']
+
+    def test_changes(self, collection, tmp_path):
+        """test change tracking since the last save"""
+        assert collection.changes() == {'0001': ChangeType.ADDED, '0002': ChangeType.ADDED}
+        collection.save(tmp_path / 'collection.json')
+        assert not collection.isdirty()
+        collection['0001'].annotations.detections[0].rotate(90, inplace=True)
+        collection['0002'].annotations.set_tags(['reims'], inplace=True)
+        assert collection.changes() == {'0001': ChangeType.UPDATED, '0002': ChangeType.UPDATED}
+        collection.mark_clean()
+        collection.remove('0001')
+        collection.add(Postcard('0003.jpg'))
+        collection.add(Postcard('0004.jpg'))
+        collection.remove('0004')
+        assert collection.changes() == {'0001': ChangeType.REMOVED, '0003': ChangeType.ADDED}
+        assert list(collection.changed().postcards) == ['0003']
+        assert not CardCollection.load(tmp_path / 'collection.json').isdirty()
+
+    def test_changes_monotonic(self, collection):
+        """test that removing a modified detection is still a change"""
+        collection.mark_clean()
+        detection = collection['0001'].annotations.detections[0]
+        detection.rotate(90, inplace=True)
+        collection['0001'].annotations.detections.remove(detection)
+        assert collection.changes() == {'0001': ChangeType.UPDATED}
+        assert collection.isdirty()
+        collection.mark_clean()
+        collection['0001'].annotations.detections.append(detection)
+        assert collection.changes() == {'0001': ChangeType.UPDATED}
+
+    def test_save_annotations(self, collection, tmp_path):
+        """test that only modified postcards are saved"""
+        for postcard in collection:
+            postcard.path = str(tmp_path / Path(postcard.path).name)
+        assert collection.save_annotations() == ['0001', '0002']
+        assert collection.save_annotations() == []
+        collection['0002'].annotations.set_keywords(['reims'], inplace=True)
+        assert collection.save_annotations() == ['0002']
+        assert collection['0002'].load_annotations().annotations.keywords == ['reims']
@@ -0,0 +1,69 @@
+import pytest
+from t2ia_collection.consensus import *
+
+
+# ======================================================================================================================
+# FIXTURES
+# ======================================================================================================================
+
+def pred(x: float, y: float, confidence: float, content: Content | None = None, w: float = 0.2,
+         h: float = 0.1) -> Detection:
+    return Detection(BoundingBox(x, y, w, h), is_manual=False, confidence=confidence,
+                     content=content if content is not None else PrintedText())
+
+
+@pytest.fixture
+def detection_sets():
+    manual = [Detection(BoundingBox(0.8, 0.2, 0.15, 0.2), content=DateStamp(postal_agency='REIMS'))]
+    model_a = [pred(0.5, 0.5, 0.9), pred(0.8, 0.2, 0.8, DateStamp(), 0.15, 0.2), pred(0.2, 0.8, 0.3)]
+    model_b = [pred(0.51, 0.5, 0.6, HandwrittenText()), pred(0.81, 0.2, 0.7, PostageStamp(), 0.15, 0.2)]
+    model_c = [pred(0.52, 0.51, 0.3, HandwrittenText())]
+    return [manual, model_a, model_b, model_c]
+
+
+# ======================================================================================================================
+# TESTS
+# ======================================================================================================================
+
+class TestFuseDetections:
+    """tests for fuse_detections"""
+
+    def test_fusion(self, detection_sets):
+        """test manual authority, box fusion, class vote and confidence"""
+        res = fuse_detections(detection_sets)
+        assert [det.get_content_cls() for det in res] == ['DateStamp', 'PrintedText', 'PrintedText']
+        assert res[0] == detection_sets[0][0] and res[0] is not detection_sets[0][0]
+        fused = res[1]
+        assert not fused.is_manual
+        assert fused.bbox.x == pytest.approx((0.5 * 0.9 + 0.51 * 0.6 + 0.52 * 0.3) / 1.8)
+        assert fused.confidence == pytest.approx(0.6)  # 3 jeux de prédictions sur 3
+        assert res[2].confidence == pytest.approx(0.3 / 3)  # prédite par un seul jeu
+
+    def test_parameters(self, detection_sets):
+        """test source weights, skip threshold and IoU threshold"""
+        # le vote de classe bascule quand les modèles b et c pèsent plus
+        res = fuse_detections(detection_sets, weights=[1., 1., 2., 2.])
+        assert res[1].get_content_cls() == 'HandwrittenText'
+        assert len(fuse_detections(detection_sets, skip_threshold=0.5)) == 2
+        assert len(fuse_detections(detection_sets, iou_threshold=0.99)) == 6  # seule la bbox identique est couverte
+        assert fuse_detections([[], []]) == []
+        with pytest.raises(ValueError):
+            fuse_detections(detection_sets, weights=[1.])
+
+
+class TestMergeCollections:
+    """tests for merge_collections"""
+
+    @pytest.mark.parametrize("workers", [0, 2])
+    def test_merge(self, detection_sets, workers):
+        """test that collections are merged card by card"""
+        collections = []
+        for detections in detection_sets:
+            collections.append(CardCollection({'0001': Postcard('0001.jpg', annotations=Annotations(
+                location=Location(town='Reims'), detections=detections))}))
+        collections[2].add(Postcard('0002.jpg', annotations=Annotations(detections=[pred(0.5, 0.5, 0.4)])))
+        res = merge_collections(collections, workers=workers, chunk_size=1)
+        assert list(res.postcards) == ['0001', '0002']
+        assert res['0001'].annotations.location.town == 'Reims'
+        assert res['0001'].annotations.detections == fuse_detections(detection_sets)
+        assert res['0002'].annotations.detections[0].confidence == pytest.approx(0.4)
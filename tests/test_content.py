@@ -144,6 +144,35 @@ class TestClassContent:
 # ======================================================================================================================
 # TEXT Abstract Class & subclasses
 # ======================================================================================================================
+class TestClassOrientation:
+    """test for class Orientation"""
+
+    @pytest.mark.parametrize("theta, orientation", [(None, 0), (90, 90), ('180', 180), (-90, 270), (450.0, 90),
+                                                    (89.9999, 90), (-0.0001, 0), ('270.0004', 270),
+                                                    (Orientation.NINETY, 90)])
+    def test_from_input(self, theta, orientation):
+        """test normalization of angles, including near-multiples of 90°"""
+        assert Orientation.from_input(theta) is Orientation(orientation)
+        assert Orientation.from_input(theta) is Orientation(orientation)  # depuis la table
+
+    @pytest.mark.parametrize("theta, error", [(45, ValueError), (89.9, ValueError), ('lol', ValueError),
+                                              (float('nan'), ValueError), (float('inf'), ValueError),
+                                              ([0, 90], TypeError)])
+    def test_invalid(self, theta, error):
+        """test invalid angles"""
+        with pytest.raises(error):
+            Orientation.from_input(theta)
+
+    def test_batch(self):
+        """test batched conversion of angles"""
+        thetas = [0, 90.0001, '-90', None, 540]
+        codes = Orientation.quarter_turns(thetas)
+        assert list(codes) == [0, 1, 3, 0, 2]
+        assert Orientation.from_quarter_turns(codes) == Orientation.from_inputs(thetas) == [0, 90, 270, 0, 180]
+        with pytest.raises(ValueError):
+            Orientation.quarter_turns([0, 45])
+
+
 class TestClassText:
     """test for class Text"""
 
@@ -644,6 +673,16 @@ class TestContentCreateInstance:
         assert Text.from_dict(dict_pred_text).to_json_object() == {'Text': dict_pred_text}
         assert pred_text.to_json_object() == {'Text': dict_pred_text}
 
+    def test_to_json_object_private(self, dict_pred_text, datestamp_json):
+        """test that private attributes (change counter) are not serialized, nor the instance modified"""
+        for content in (PrintedText.from_dict(dict_pred_text), DateStamp.from_dict(datestamp_json)):
+            content.mark_modified()
+            for full in (True, False):
+                (cls_name, data), = content.to_json_object(full=full).items()
+                assert '_version' not in data
+                assert Content.from_json_object({cls_name: data}) == content
+            assert content.version == 1 and isinstance(content.__dict__.get('keywords', set()), set)
+
     def test_from_json_object(self, dict_pred_text, datestamp_json):
         assert Content.from_json_object({'Content': {'is_manual': None, 'confidence': None}}) == Content()
         assert DateStamp.from_json_object({'DateStamp': datestamp_json}) == DateStamp.from_dict(datestamp_json)
@@ -0,0 +1,82 @@
+import pytest
+from t2ia_collection.database import *
+from t2ia_collection.synthetic import CollectionGenerator
+
+
+# ======================================================================================================================
+# FIXTURES
+# ======================================================================================================================
+
+@pytest.fixture
+def collection():
+    res = CollectionGenerator(seed=3).collection(40)
+    res['00000000'].annotations.location.gps = (49.25, 4.03)
+    return res
+
+
+@pytest.fixture
+def database(collection, tmp_path):
+    res = SQLiteCollection.from_collection(collection, tmp_path / 'collection.db')
+    res.batch_size = 7  # plusieurs lots
+    yield res
+    res.close()
+
+
+def names(postcards) -> List[str]:
+    return sorted(postcard.name for postcard in postcards)
+
+
+# ======================================================================================================================
+# TESTS SQLiteCollection
+# ======================================================================================================================
+
+class TestClassSQLiteCollection:
+    """tests for SQLiteCollection Class"""
+
+    def test_roundtrip(self, collection, database):
+        """test that postcards are stored and rebuilt identically, in insertion order"""
+        assert len(database) == len(collection)
+        assert '00000003' in database and 'absent' not in database
+        assert database['00000003'] == collection['00000003']
+        assert [postcard.name for postcard in database] == list(collection.postcards)
+        assert database.to_collection() == collection
+        with pytest.raises(KeyError):
+            database['absent']
+
+    def test_upsert(self, collection, database):
+        """test that upserts replace postcards and their rows, and remove()"""
+        postcard = collection['00000001']
+        postcard.annotations.set_tags(['nouveau'], inplace=True)
+        postcard.annotations.detections = postcard.annotations.detections[:1]
+        assert database.upsert([collection['00000002'], postcard]) == 2
+        assert len(database) == len(collection)
+        assert database['00000001'] == postcard
+        database.remove('00000001')
+        assert '00000001' not in database
+        assert database.connection.execute("SELECT COUNT(*) FROM detections WHERE postcard_id NOT IN "
+                                           "(SELECT id FROM postcards)").fetchone()[0] == 0
+        with pytest.raises(KeyError):
+            database.remove('00000001')
+
+    def test_filters(self, collection, database):
+        """test that indexed filters match CardCollection filters"""
+        assert names(database.filter_by_tags(['église', 'gare'])) == \
+               names(collection.filter_by_tags(['église', 'gare']))
+        assert names(database.filter_by_keywords(['place'])) == names(collection.filter_by_keywords(['place']))
+        assert names(database.filter_by_town('épernay')) == names(collection.filter_by_town('épernay'))
+        assert names(database.filter_by_department('MARNE')) == names(collection.filter_by_department('MARNE'))
+        assert names(database.filter_by_region('bretagne')) == names(collection.filter_by_region('bretagne'))
+        assert names(database.filter_by_gps(49, 4, 50, 5)) == ['00000000']
+        assert names(database.filter_by_gps(47, -6, 50, 5)) == names(collection.filter_by_area(47, -6, 50, 5))
+        assert names(database.filter_by_content('DateStamp')) == names(collection.filter(
+            lambda p: any(det.get_content_cls() == 'DateStamp' for det in p.annotations.detections)))
+        assert names(database.filter(lambda p: p.annotations.rotation == 90)) == \
+               names(collection.filter(lambda p: p.annotations.rotation == 90))
+
+    def test_save_load(self, database, tmp_path):
+        """test backup and reopening of a database"""
+        database.save(tmp_path / 'backup.db')
+        with SQLiteCollection.load(tmp_path / 'backup.db') as backup:
+            assert backup.to_collection() == database.to_collection()
+        with pytest.raises(FileNotFoundError):
+            SQLiteCollection.load(tmp_path / 'absent.db')
@@ -0,0 +1,100 @@
+import pytest
+from t2ia_collection.deduplication import *
+from t2ia_collection.synthetic import CollectionGenerator
+
+
+# ======================================================================================================================
+# FIXTURES
+# ======================================================================================================================
+
+def rescan(postcard: Postcard, name: str) -> Postcard:
+    """Nouvelle numérisation d'une carte : bbox légèrement décalées, une erreur d'OCR"""
+    res = postcard.copy()
+    res.name, res.path = name, f"{name}.jpg"
+    for det in res.annotations.detections:
+        det.bbox = BoundingBox(det.bbox.x + 0.002, det.bbox.y - 0.001, det.bbox.w, det.bbox.h)
+        if isinstance(det.content, PrintedText) and det.content.ocr_result:
+            det.content.ocr_result = det.content.ocr_result[:-1] + "x"
+    return res
+
+
+@pytest.fixture
+def collection():
+    res = CollectionGenerator(seed=11).collection(200)
+    for name in ('00000003', '00000042', '00000150'):
+        res.add(rescan(res[name], f"{name}_bis"))
+    return res
+
+
+# ======================================================================================================================
+# TESTS
+# ======================================================================================================================
+
+def test_minhash():
+    """test that MinHash signatures estimate the Jaccard index"""
+    tokens1, tokens2 = {f"t{i}" for i in range(0, 300)}, {f"t{i}" for i in range(100, 400)}
+    estimate = jaccard(minhash(tokens1, 256), minhash(tokens2, 256))
+    assert estimate == pytest.approx(0.5, abs=0.1)
+    assert jaccard(minhash(tokens1), minhash(list(tokens1) * 2)) == 1.
+    assert minhash([]) is None
+    assert len(minhash(["a"], 16)) == 16
+
+
+class TestClassDuplicateFinder:
+    """tests for DuplicateFinder Class"""
+
+    def test_groups(self, collection):
+        """test that rescans are found and distinct cards are not grouped"""
+        groups = find_duplicates(collection, threshold=0.7)
+        assert [['00000003', '00000003_bis'], ['00000042', '00000042_bis'], ['00000150', '00000150_bis']] == \
+               [group for group in groups if any(name.endswith('_bis') for name in group)]
+        assert len(groups) == 3
+
+    def test_pairs(self, collection):
+        """test pair scores and that LSH avoids comparing all pairs"""
+        finder = DuplicateFinder(threshold=0.7)
+        finder.update(collection)
+        assert len(finder) == 203
+        assert len(finder.candidate_pairs()) < 203 * 202 / 2 / 4
+        name1, name2, score = finder.pairs()[0]
+        assert name2 == f"{name1}_bis" and 0.7 <= score <= 1.
+
+    def test_large_buckets(self, collection):
+        """test that oversized buckets are split by further bands, and identical signatures reported"""
+        finder = DuplicateFinder(threshold=0.7)
+        finder.update(collection)
+        pairs = finder.candidate_pairs()
+        finder.max_bucket_size = 2
+        split = finder.candidate_pairs()
+        assert split <= pairs and len(split) < len(pairs)
+        assert {(finder.names[i], finder.names[j]) for i, j in split} >= \
+               {(name, f"{name}_bis") for name in ('00000003', '00000042', '00000150')}
+        assert finder.chained_buckets == []
+        for name in ('copie1', 'copie2', 'copie3'):  # signatures identiques : seau indivisible
+            finder.add(rescan(collection['00000003'], name))
+        finder.candidate_pairs()
+        assert any({'copie1', 'copie2', 'copie3'} <= set(bucket) for bucket in finder.chained_buckets)
+
+    def test_many_copies(self, collection):
+        """test that more identical cards than max_bucket_size are still grouped, each bucket reported once"""
+        copies = [rescan(collection['00000042'], f"copie{i}") for i in range(6)]
+        finder = DuplicateFinder(threshold=0.7, max_bucket_size=4)
+        finder.update(copies)
+        assert finder.groups() == [[f"copie{i}" for i in range(6)]]
+        assert len(finder.candidate_pairs()) == 5
+        assert finder.chained_buckets == [[f"copie{i}" for i in range(6)]]
+
+    def test_fingerprint(self, collection):
+        """test fingerprint components and rotation invariance of the layout"""
+        finder = DuplicateFinder()
+        postcard = collection['00000003']
+        fingerprint = finder.fingerprint(postcard)
+        rotated = postcard.copy()
+        rotated.annotations.detections = [det.rotate(90) for det in postcard.annotations.detections]
+        rotated.annotations.rotation = Orientation.TWO_SEVENTY
+        assert finder.fingerprint(rotated).layout == fingerprint.layout
+        assert finder.similarity(fingerprint, fingerprint) == 1.
+        assert finder.similarity(Fingerprint(), Fingerprint()) == 0.
+        assert list(DuplicateFinder.stamp_tokens(Postcard('0001.jpg', annotations=Annotations(detections=[
+            Detection(BoundingBox(0.5, 0.5, 0.1, 0.1), content=DateStamp(postal_agency='REIMS'))])))) == \
+               ['agency|reims']
@@ -210,6 +210,63 @@ class TestCoordFromBbox:
         with pytest.raises(ValueError):
             bbox.to_coords(coord_format, img_size)
 
+class TestClassBoundingBoxArray:
+    """tests for BoundingBoxArray Class"""
+
+    def test_instantiation(self, bbox, invalid_bbox):
+        """test instantiation of BoundingBoxArray and conversion to BoundingBox"""
+        bboxes = BoundingBoxArray.from_bboxes([bbox, invalid_bbox])
+        assert len(bboxes) == 2
+        assert bboxes[0] == bbox
+        assert bboxes[1:][0] == invalid_bbox
+        assert bboxes.to_bboxes() == [bbox, invalid_bbox]
+        assert bboxes.isvalid() == [True, False]
+        assert bboxes.copy() == bboxes
+        with pytest.raises(ValueError):
+            BoundingBoxArray([0.5], [0.5], [0.1], [])
+
+    def test_from_coords(self, bbox, test_bboxes, test_img_size):
+        """test batched instantiation, equivalent to BoundingBox.from_coords()"""
+        for bbox_format in test_bboxes.keys():
+            bboxes = BoundingBoxArray.from_coords([test_bboxes[bbox_format]] * 3, bbox_format, test_img_size)
+            assert bboxes.to_bboxes() == [bbox] * 3
+
+    def test_xyxyn(self, bbox, test_bboxes):
+        """test column coordinates of BoundingBoxArray"""
+        columns = BoundingBoxArray.from_bboxes([bbox]).xyxyn()
+        assert isclose_float_sequences([column[0] for column in columns], test_bboxes['xyxyn'])
+
+    def test_iou(self):
+        """test IoU matrix between two BoundingBoxArray"""
+        a = BoundingBoxArray.from_coords([[0, 0, 0.5, 0.5], [0.5, 0.5, 1, 1]], 'xyxyn')
+        b = BoundingBoxArray.from_coords([[0, 0, 0.5, 0.5], [0.25, 0.25, 0.75, 0.75], [0.5, 0, 1, 0.5]], 'xyxyn')
+        iou = a.iou(b)
+        assert isclose_float_sequences(iou[0], [1, 1 / 7, 0])
+        assert isclose_float_sequences(iou[1], [0, 1 / 7, 0])
+        assert isclose_float_sequences(a.areas(), [0.25, 0.25])
+        assert BoundingBoxArray().iou(b) == []
+
+    def test_rotate(self, bbox):
+        """test rotation of BoundingBoxArray with one angle or one angle per bbox"""
+        bboxes = BoundingBoxArray.from_bboxes([bbox, bbox.rotate(90), bbox])
+        assert bboxes.rotate(90).to_bboxes() == [box.rotate(90) for box in bboxes]
+        assert bboxes.rotate([0, 270, 180]).to_bboxes() == [bbox, bbox, bbox.rotate(180)]
+        bboxes.rotate(Orientation.quarter_turns([90, 89.9999, '-270']), inplace=True)
+        assert bboxes.to_bboxes() == [bbox.rotate(90), bbox.rotate(180), bbox.rotate(90)]
+        with pytest.raises(ValueError):
+            bboxes.rotate([90])
+
+    @pytest.mark.parametrize("coords, coord_format, img_size", [([[56, 5, 452]], 'xywh', (1000, 1000)),
+                                                                ([[56, 5, 452, 4]], 'invalid_format', (1000, 1000)),
+                                                                ([[56, 5, 452, 4]], 'xyxy', None),
+                                                                ([[500, 500, 10, 10], [56, 5, 452, 4]], 'xywh',
+                                                                 (1000, 1000))])
+    def test_invalid(self, coords, coord_format, img_size):
+        """test if from_coords() call raises a ValueError with invalid entries"""
+        with pytest.raises(ValueError):
+            BoundingBoxArray.from_coords(coords, coord_format, img_size)
+
+
 # ======================================================================================================================
 # TESTS Detection
 # ======================================================================================================================
@@ -298,6 +355,19 @@ class TestClassDetection:
         datestamp_det_copy.rotate(180, inplace=True)
         assert datestamp_det_copy == datestamp_det.rotate(-180)
 
+    def test_version(self, text_det, datestamp_det, datestamp_json):
+        """test that modifications of Detection and its content increase its version"""
+        version = text_det.version
+        text_det.rotate(90, inplace=True)
+        assert text_det.version == version + 2  # bbox et orientation du texte
+        text_det.content.set_editor(True, inplace=True)
+        assert text_det.version == version + 3
+        assert text_det.rotate(90).version == version + 5  # la copie hérite du compteur
+        assert text_det.version == version + 3
+        version = datestamp_det.version
+        datestamp_det.process_content(inplace=True, datestamp_dict=datestamp_json)
+        assert datestamp_det.version == version + 1
+        assert datestamp_det == Detection.from_dict(datestamp_det.to_dict())  # le compteur n'est pas comparé
 
     def test_create_instance(self, bbox, empty_det, text_det, dict_text_det, dict_datestamp_det):
         """test of create_instance static method"""
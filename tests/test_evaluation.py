@@ -0,0 +1,79 @@
+import pytest
+import math
+from t2ia_collection.evaluation import *
+from helpers import det
+
+
+# ======================================================================================================================
+# FIXTURES
+# ======================================================================================================================
+
+@pytest.fixture
+def collection():
+    return CardCollection({
+        '0001': Postcard('0001.jpg', annotations=Annotations(detections=[
+            det(0.6, 0.0, 1.0, 0.4, 'DateStamp'),
+            det(0.0, 0.0, 0.5, 0.1, 'PrintedText'),
+            det(0.6, 0.0, 1.0, 0.4, 'DateStamp', 0.9),  # vrai positif
+            det(0.0, 0.0, 0.45, 0.1, 'PrintedText', 0.8),  # vrai positif à 0.5, pas à 0.95
+            det(0.2, 0.5, 0.4, 0.7, 'PrintedText', 0.3),  # faux positif
+        ])),
+        '0002': Postcard('0002.jpg', annotations=Annotations(detections=[
+            det(0.0, 0.5, 0.5, 1.0, 'HandwrittenText'),
+            det(0.0, 0.5, 0.5, 1.0, 'PrintedText', 0.7),  # mauvaise classe
+            det(0.6, 0.0, 1.0, 0.4, 'DateStamp', 0.6),  # faux positif
+        ])),
+    })
+
+
+# ======================================================================================================================
+# TESTS
+# ======================================================================================================================
+
+class TestEvaluate:
+    """tests for evaluate() and EvaluationResult"""
+
+    @pytest.mark.parametrize("workers", [0, 2])
+    def test_average_precision(self, collection, workers):
+        """test AP and mAP, sequentially and with a process pool"""
+        res = evaluate(collection, iou_thresholds=(0.5, 0.95), workers=workers, chunk_size=1)
+        assert res.n_gt == {'DateStamp': 1, 'PrintedText': 1, 'HandwrittenText': 1}
+        assert res.average_precision('DateStamp', 0.5) == pytest.approx(1.)
+        assert res.average_precision('PrintedText', 0.5) == pytest.approx(1.)
+        assert res.average_precision('PrintedText', 0.95) == pytest.approx(0.)
+        assert res.average_precision('HandwrittenText', 0.5) == pytest.approx(0.)
+        assert res.map(0.5) == pytest.approx(2 / 3)
+        assert res.map() == pytest.approx((2 / 3 + 1 / 3) / 2)
+        with pytest.raises(ValueError):
+            res.map(0.75)
+
+    def test_pr_curve(self, collection):
+        """test precision/recall curve ordering by confidence"""
+        precisions, recalls, confidences = evaluate(collection, workers=0).pr_curve('PrintedText')
+        assert confidences == [0.8, 0.7, 0.3]
+        assert precisions == pytest.approx([1., 0.5, 1 / 3])
+        assert recalls == pytest.approx([1., 1., 1.])
+
+    def test_confusion(self, collection):
+        """test confusion between content classes"""
+        labels, matrix = evaluate(collection, workers=0).confusion_matrix()
+        assert labels == ['DateStamp', 'HandwrittenText', 'PrintedText', BACKGROUND]
+        assert matrix[labels.index('HandwrittenText')][labels.index('PrintedText')] == 1
+        assert matrix[labels.index('DateStamp')][labels.index('DateStamp')] == 1
+        assert matrix[labels.index(BACKGROUND)][labels.index('DateStamp')] == 1
+        assert matrix[labels.index(BACKGROUND)][labels.index('PrintedText')] == 1
+
+    def test_match_detections(self, collection):
+        """test that each prediction gets the annotation it is matched to for the evaluation"""
+        matches = match_detections(collection['0001'])
+        detections = collection['0001'].annotations.detections
+        assert [(pred.confidence, gt) for pred, gt in matches] == \
+               [(0.9, detections[0]), (0.8, detections[1]), (0.3, None)]
+        assert match_detections(collection['0001'], iou_threshold=0.95)[1][1] is None
+        assert [gt for _, gt in match_detections(collection['0002'])] == [None, None]
+
+    def test_empty(self):
+        """test evaluation without any annotation"""
+        res = evaluate(CardCollection(), workers=0)
+        assert math.isnan(res.map())
+        assert res.summary()['n_gt'] == {}
@@ -0,0 +1,90 @@
+import pytest
+from t2ia_collection.export import *
+from t2ia_collection.ingestion import parse_yolo_file
+
+
+# ======================================================================================================================
+# FIXTURES
+# ======================================================================================================================
+
+@pytest.fixture
+def collection():
+    return CardCollection({
+        '0001': Postcard('0001.jpg', annotations=Annotations(detections=[
+            Detection(BoundingBox(0.5, 0.1, 0.4, 0.05), content=PrintedText(True, ocr_result='Brest')),
+            Detection(BoundingBox(0.8, 0.2, 0.15, 0.2), is_manual=False, confidence=0.88, content=DateStamp()),
+        ])),
+        '0002': Postcard('0002.jpg', annotations=Annotations(detections=[
+            Detection(BoundingBox(0.9, 0.1, 0.1, 0.1), content=PostageStamp(True, country='France')),
+        ])),
+    })
+
+
+# ======================================================================================================================
+# TESTS YoloExporter
+# ======================================================================================================================
+
+class TestClassYoloExporter:
+    """tests for YoloExporter Class"""
+
+    def test_export(self, collection, tmp_path):
+        """test first export: label files, classes and manifest"""
+        report = export_yolo(collection, tmp_path)
+        assert (report.n_written, report.n_unchanged, report.full_rebuild) == (2, 0, True)
+        assert read_class_names(tmp_path / 'classes.txt') == ['PrintedText', 'DateStamp', 'PostageStamp']
+        _, class_ids, coords, confidences = parse_yolo_file(tmp_path / 'labels' / '0001.txt')
+        assert class_ids == [0, 1]
+        assert coords == [(0.5, 0.1, 0.4, 0.05), (0.8, 0.2, 0.15, 0.2)]
+        assert confidences == [None, None]
+        assert (tmp_path / MANIFEST_NAME).exists()
+
+    def test_incremental(self, collection, tmp_path):
+        """test that only modified postcards are rewritten"""
+        export_yolo(collection, tmp_path)
+        report = export_yolo(collection, tmp_path)
+        assert (report.n_written, report.n_unchanged, report.full_rebuild) == (0, 2, False)
+        # modification d'une carte, ajout d'une classe et suppression d'une carte
+        collection['0001'].annotations.detections[0].bbox.x = 0.45
+        collection.add(Postcard('0003.jpg', annotations=Annotations(detections=[
+            Detection(BoundingBox(0.5, 0.5, 0.5, 0.5), content=HandwrittenText())])))
+        collection.remove('0002')
+        report = export_yolo(collection, tmp_path)
+        assert (report.n_written, report.n_unchanged, report.n_removed) == (2, 0, 1)
+        assert not report.full_rebuild  # les identifiants existants sont conservés
+        assert read_class_names(tmp_path / 'classes.txt')[-1] == 'HandwrittenText'
+        assert not (tmp_path / 'labels' / '0002.txt').exists()
+        # un fichier supprimé à la main est réécrit
+        (tmp_path / 'labels' / '0003.txt').unlink()
+        assert export_yolo(collection, tmp_path).n_written == 1
+
+    def test_rebuild_removes(self, collection, tmp_path):
+        """test that cards removed from the collection are deleted on a full rebuild too"""
+        export_yolo(collection, tmp_path)
+        collection.remove('0002')
+        report = export_yolo(collection, tmp_path, manual_only=True)
+        assert report.full_rebuild and report.n_removed == 1
+        assert not (tmp_path / 'labels' / '0002.txt').exists()
+
+    def test_image_links(self, tmp_path):
+        """test that only the exact link of a removed card is deleted"""
+        for name in ('a.jpg', 'a.b.jpg', '[a].png'):
+            (tmp_path / name).write_bytes(b"image")
+        collection = CardCollection({postcard.name: postcard for postcard in [
+            Postcard(tmp_path / 'a.jpg'), Postcard(tmp_path / 'a.b.jpg'), Postcard(tmp_path / '[a].png')]})
+        output_dir = tmp_path / 'dataset'
+        export_yolo(collection, output_dir, link_images=True)
+        assert sorted(path.name for path in (output_dir / 'images').iterdir()) == ['[a].png', 'a.b.jpg', 'a.jpg']
+        collection.remove('a')
+        collection.remove('[a]')
+        assert export_yolo(collection, output_dir, link_images=True).n_removed == 2
+        assert [path.name for path in (output_dir / 'images').iterdir()] == ['a.b.jpg']
+
+    def test_options(self, collection, tmp_path):
+        """test manual_only, with_confidence, class_names and rebuild when options change"""
+        export_yolo(collection, tmp_path)
+        report = export_yolo(collection, tmp_path, manual_only=True)
+        assert report.full_rebuild
+        assert parse_yolo_file(tmp_path / 'labels' / '0001.txt')[1] == [0]
+        export_yolo(collection, tmp_path, with_confidence=True, class_names=['DateStamp'])
+        assert parse_yolo_file(tmp_path / 'labels' / '0001.txt')[1:] == ([0], [(0.8, 0.2, 0.15, 0.2)], [0.88])
+        assert (tmp_path / 'labels' / '0002.txt').read_text() == ""
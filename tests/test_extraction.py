@@ -0,0 +1,128 @@
+import pytest
+from t2ia_collection.extraction import *
+
+
+# ======================================================================================================================
+# FIXTURES
+# ======================================================================================================================
+
+@pytest.fixture
+def collection():
+    return CardCollection({
+        f"{i:04d}": Postcard(f"{i:04d}.jpg", annotations=Annotations(detections=[
+            Detection(BoundingBox(0.5, 0.1, 0.4, 0.05), content=PrintedText()),
+            Detection(BoundingBox(0.5, 0.5, 0.4, 0.4), content=HandwrittenText()),
+            Detection(BoundingBox(0.8, 0.2, 0.15, 0.2), content=DateStamp()),
+            Detection(BoundingBox(0.9, 0.1, 0.1, 0.1), content=PostageStamp()),  # pas de backend
+            Detection(BoundingBox(0.2, 0.2, 0.1, 0.1), content=PrintedText(True, ocr_result='déjà traité')),
+        ])) for i in range(5)
+    })
+
+@pytest.fixture
+def fake_ocr():
+    """OCR factice : renvoie le nom de la carte et l'indice de la détection"""
+    calls = []
+
+    async def ocr(items):
+        calls.append(len(items))
+        return [{'ocr_result': f"{item.postcard.name}-{item.index}", 'orientation': 0, 'confidence': 0.9}
+                for item in items]
+    return FunctionBackend(ocr, version='ocr-1'), calls
+
+@pytest.fixture
+def fake_datestamp():
+    """extraction factice des tampons (fonction synchrone)"""
+    return FunctionBackend(lambda items: [{'datestamp_dict': {'postal_agency': 'BREST', 'quality': 'good'}}
+                                          for _ in items])
+
+
+# ======================================================================================================================
+# TESTS ExtractionScheduler
+# ======================================================================================================================
+
+class TestClassExtractionScheduler:
+    """tests for ExtractionScheduler Class"""
+
+    def test_gather(self, collection, fake_ocr):
+        """test gathering of unprocessed detections with a backend, resolved through parent classes"""
+        scheduler = ExtractionScheduler({'Text': fake_ocr[0]}, crop_loader=None)
+        items = scheduler.gather(collection)
+        assert sorted(items) == ['HandwrittenText', 'PrintedText']
+        assert [item.index for item in items['PrintedText']] == [0] * 5
+        assert [len(batch) for _, batch in ExtractionScheduler({'Text': fake_ocr[0]}, batch_size=2).batches(items)] \
+               == [2, 2, 1, 2, 2, 1]
+
+    def test_run(self, collection, fake_ocr, fake_datestamp):
+        """test extraction and write back with process_content(inplace=True)"""
+        backend, calls = fake_ocr
+        scheduler = ExtractionScheduler({'Text': backend, 'DateStamp': fake_datestamp}, batch_size=4,
+                                        max_concurrency=2, crop_loader=None)
+        report = scheduler.run_sync(collection)
+        assert (report.n_processed, report.n_failed, report.n_batches) == (15, 0, 6)
+        assert sorted(calls) == [1, 1, 4, 4]
+        dets = collection['0003'].annotations.detections
+        assert dets[0].content == PrintedText(False, 0.9, ocr_result='0003-0')
+        assert dets[2].content.postal_agency == 'BREST'
+        assert dets[2].content.quality == DateStampQuality.GOOD
+        assert not dets[3].isprocessed()
+        assert dets[4].content.ocr_result == 'déjà traité'
+        # tout est traité : rien à refaire
+        assert scheduler.run_sync(collection).n_batches == 0
+
+    def test_retries(self, collection):
+        """test retries with backoff and failures after max_retries"""
+        attempts = {'n': 0}
+
+        async def flaky(items):
+            attempts['n'] += 1
+            if attempts['n'] % 2:
+                raise ConnectionError("service unavailable")
+            return [{'ocr_result': 'ok', 'confidence': 0.5} for _ in items]
+
+        report = ExtractionScheduler({'PrintedText': FunctionBackend(flaky)}, batch_size=5, max_retries=1,
+                                     retry_delay=0, crop_loader=None).run_sync(collection)
+        assert (report.n_processed, report.n_retries) == (5, 1)
+
+        async def broken(items):
+            raise ConnectionError("service unavailable")
+
+        report = ExtractionScheduler({'HandwrittenText': FunctionBackend(broken)}, max_retries=2, retry_delay=0,
+                                     crop_loader=None).run_sync(collection)
+        assert (report.n_processed, report.n_failed, report.n_retries) == (0, 5, 2)
+        assert report.errors[('0000', 1)] == "ConnectionError: service unavailable"
+        assert not collection['0000'].annotations.detections[1].isprocessed()
+
+    def test_invalid_results(self, collection):
+        """test that invalid results are reported per detection"""
+        backend = FunctionBackend(lambda items: [{'datestamp_dict': {'quality': 'excellent'}} for _ in items])
+        report = ExtractionScheduler({'DateStamp': backend}, crop_loader=None).run_sync(collection)
+        assert (report.n_processed, report.n_failed) == (0, 5)
+        assert collection['0000'].annotations.detections[2].content == DateStamp()
+
+    def test_crops_and_rate(self, collection, fake_ocr):
+        """test custom crop loader and rate limiting"""
+        seen = []
+
+        async def ocr(items):
+            seen.extend(item.crop for item in items)
+            return [{'ocr_result': 'x', 'confidence': 0.5} for _ in items]
+
+        scheduler = ExtractionScheduler({'PrintedText': FunctionBackend(ocr)}, batch_size=1, rate=1000,
+                                        crop_loader=lambda postcard, det, images: det.bbox.xyxy((100, 100)))
+        assert scheduler.run_sync(collection).n_processed == 5
+        assert seen == [(30, 8, 70, 12)] * 5
+
+    def test_crop_errors(self, collection, fake_ocr):
+        """test that unreadable images are reported without aborting the run"""
+        backend, calls = fake_ocr
+
+        def crop_loader(postcard, det, images):
+            if postcard.name == '0001':
+                raise OSError("cannot identify image file")
+            return det.bbox.xyxy((100, 100))
+
+        report = ExtractionScheduler({'Text': backend}, batch_size=4, crop_loader=crop_loader).run_sync(collection)
+        assert (report.n_processed, report.n_failed) == (8, 2)
+        assert report.errors[('0001', 0)] == "OSError: cannot identify image file"
+        assert not collection['0001'].annotations.detections[0].isprocessed()
+        assert collection['0002'].annotations.detections[1].isprocessed()
@@ -0,0 +1,118 @@
+import pytest
+from t2ia_collection.geocoding import *
+
+
+# ======================================================================================================================
+# FIXTURES
+# ======================================================================================================================
+
+@pytest.fixture
+def gazetteer(tmp_path):
+    file_path = tmp_path / 'gazetteer.csv'
+    file_path.write_text("town,department,region,latitude,longitude,aliases\n"
+                         "Attigny,Ardennes,Grand Est,49.478,4.578,\n"
+                         "Attigny,Vosges,Grand Est,48.06,6.02,\n"
+                         "Charleville-Mézières,Ardennes,Grand Est,49.77,4.72,Charleville|Mézières\n"
+                         "Épernay,Marne,Grand Est,49.04,3.96,\n"
+                         "Saint-Malo,Ille-et-Vilaine,Bretagne,48.65,-2.02,\n"
+                         "Brest,Finistère,Bretagne,48.39,-4.49,\n", encoding='utf-8')
+    return Gazetteer.load(file_path)
+
+
+@pytest.fixture
+def resolver(gazetteer):
+    return LocationResolver(gazetteer)
+
+
+def postcard(*contents, location: Location | None = None, name: str = '0001') -> Postcard:
+    return Postcard(f'{name}.jpg', annotations=Annotations(
+        location=location or Location(),
+        detections=[Detection(BoundingBox(0.5, 0.5, 0.2, 0.1), content=content) for content in contents]))
+
+
+# ======================================================================================================================
+# TESTS
+# ======================================================================================================================
+
+def test_normalize_place():
+    """test normalization of place names"""
+    assert normalize_place("ST-MALO") == normalize_place("Saint Malo") == "saint malo"
+    assert normalize_place("Épernay (Marne)") == "epernay marne"
+    assert normalize_place(None) == ""
+
+
+class TestClassPlaceTrie:
+    """tests for PlaceTrie Class"""
+
+    def test_search(self):
+        """test exact and approximate lookups against a brute force Levenshtein distance"""
+        trie = PlaceTrie()
+        names = ["brest", "bresse", "reims", "rennes", "epernay", "saint malo"]
+        for i, name in enumerate(names):
+            trie.insert(name, i)
+        assert len(trie) == 6 and trie.max_tokens == 2
+        assert trie.get("reims") == [2] and trie.get("rei") == []
+        assert sorted(trie.search("breste", 1)) == [(1, 0), (1, 1)]
+        assert trie.search("sant malo", 1) == [(1, 5)]
+        assert trie.search("renms", 2) == [(1, 2), (2, 3)]
+        assert trie.search("xyz", 1) == []
+
+
+class TestClassLocationResolver:
+    """tests for LocationResolver Class"""
+
+    def test_gazetteer(self, gazetteer):
+        """test loading of the gazetteer"""
+        assert len(gazetteer) == 6
+        assert gazetteer.places[0].gps == (49.478, 4.578)
+        assert gazetteer.towns.get("charleville") == [2]
+        assert gazetteer.regions['Finistère'] == 'Bretagne'
+
+    def test_matches(self, resolver):
+        """test memoized name, department and text matches"""
+        assert resolver.match_name("ATTIGNY") == ((0, 0), (0, 1))
+        assert resolver.match_name("EPERNAI") == ((1, 3),)  # erreur d'OCR
+        assert resolver.match_name("REIMS") == ()
+        assert resolver.match_department("ARDENNES") == 'Ardennes'
+        assert resolver.match_department("FINISTERE") == 'Finistère'
+        assert {place_id for _, place_id in resolver.scan_text("ST-MALO - La Plage et le Fort")} == {4}
+        assert resolver.scan_text("CHARLEVILLE - La place Ducale") == ((0, 2),)
+        assert "attigny" in resolver._names
+
+    def test_resolve(self, resolver):
+        """test resolution from date stamps and printed texts"""
+        # le département du tampon départage les deux Attigny
+        card = postcard(DateStamp(postal_agency="ATTIGNY", department="VOSGES"))
+        assert resolver.resolve(card) == Location('Attigny', 'Vosges', 'Grand Est', (48.06, 6.02))
+        card = postcard(PrintedText(ocr_result="BREST - Le port"), DateStamp(postal_agency="BRESTE"))
+        assert resolver.resolve(card).town == 'Brest'
+        assert resolver.resolve(postcard(DateStamp(department="MARNE"))) == Location(department='Marne',
+                                                                                     region='Grand Est')
+        assert resolver.resolve(postcard(PrintedText(ocr_result="Bons baisers"))) is None
+
+    def test_resolve_collection(self, resolver):
+        """test that only missing fields are filled, unless overwrite"""
+        collection = CardCollection({
+            '0001': postcard(PrintedText(ocr_result="ÉPERNAY - Avenue de Champagne")),
+            '0002': postcard(PrintedText(ocr_result="Brest"), location=Location(department='Finistère'), name='0002'),
+            '0003': postcard(HandwrittenText(ocr_result="Brest"), name='0003'),
+        })
+        assert resolver.resolve_collection(collection) == 2
+        assert collection['0001'].annotations.location.town == 'Épernay'
+        assert collection['0002'].annotations.location == Location('Brest', 'Finistère', 'Bretagne', (48.39, -4.49))
+        assert collection['0003'].annotations.location.isempty()
+        assert collection['0001'].version > 0
+        assert resolver.resolve_collection(collection) == 0 and resolver.conflicts == []
+
+    def test_resolve_conflicts(self, resolver):
+        """test that a match disagreeing with the known fields is skipped and reported, unless overwrite"""
+        collection = CardCollection({
+            '0001': postcard(PrintedText(ocr_result="Brest"), location=Location(town='Lambézellec')),
+            '0002': postcard(PrintedText(ocr_result="Saint-Malo"), location=Location(department='Finistère'),
+                             name='0002'),
+        })
+        assert resolver.resolve_collection(collection) == 0
+        assert resolver.conflicts == ['0001', '0002']
+        assert collection['0002'].annotations.location == Location(department='Finistère')
+        assert resolver.resolve_collection(collection, overwrite=True) == 2
+        assert collection['0001'].annotations.location.town == 'Brest' and resolver.conflicts == []
@@ -0,0 +1,112 @@
+import pytest
+from t2ia_collection.ingestion import *
+
+
+# ======================================================================================================================
+# FIXTURES
+# ======================================================================================================================
+
+@pytest.fixture
+def class_names():
+    return ['PrintedText', 'HandwrittenText', 'DateStamp', 'PostageStamp']
+
+@pytest.fixture
+def yolo_dir(tmp_path):
+    """arborescence de sorties YOLO : 2 fichiers de prédictions et 1 fichier d'annotations manuelles"""
+    (tmp_path / 'marne' / 'labels').mkdir(parents=True)
+    (tmp_path / 'ardennes' / 'labels').mkdir(parents=True)
+    (tmp_path / 'marne' / 'labels' / '0001.txt').write_text("0 0.5 0.1 0.4 0.05 0.91\n"
+                                                            "2 0.8 0.2 0.15 0.2 0.88\n")
+    (tmp_path / 'marne' / 'labels' / '0002.txt').write_text("\n3 0.9 0.1 0.1 0.1 0.42\n")
+    (tmp_path / 'ardennes' / 'labels' / '0003.txt').write_text("1 0.5 0.5 0.5 0.5\n")
+    return tmp_path
+
+
+# ======================================================================================================================
+# TESTS parsing
+# ======================================================================================================================
+
+class TestParseYoloFile:
+    """tests for parse_yolo_file()"""
+
+    def test_parse(self, yolo_dir):
+        """test parsing of prediction and manual files"""
+        file_path, class_ids, coords, confidences = parse_yolo_file(yolo_dir / 'marne' / 'labels' / '0001.txt')
+        assert class_ids == [0, 2]
+        assert coords == [(0.5, 0.1, 0.4, 0.05), (0.8, 0.2, 0.15, 0.2)]
+        assert confidences == [0.91, 0.88]
+        assert parse_yolo_file(yolo_dir / 'ardennes' / 'labels' / '0003.txt')[3] == [None]
+
+    @pytest.mark.parametrize("line", ["0 0.5 0.5", "0 0.5 0.5 0.1 0.1 0.9 2", "a 0.5 0.5 0.1 0.1"])
+    def test_invalid(self, tmp_path, line):
+        """test if parse_yolo_file() raises a ValueError with malformed lines"""
+        (tmp_path / 'bad.txt').write_text(line)
+        with pytest.raises(ValueError):
+            parse_yolo_file(tmp_path / 'bad.txt')
+
+
+# ======================================================================================================================
+# TESTS YoloIngestor
+# ======================================================================================================================
+
+class TestClassYoloIngestor:
+    """tests for YoloIngestor Class"""
+
+    def test_invalid_class_names(self):
+        """test that unknown content classes are rejected before ingestion"""
+        with pytest.raises(ValueError):
+            YoloIngestor(['PrintedText', 'Stamp'])
+
+    def test_image_path(self, class_names):
+        """test label path -> image path convention"""
+        assert YoloIngestor(class_names).image_path('data/labels/a/0001.txt') == Path('data/images/a/0001.jpg')
+        assert YoloIngestor(class_names, image_suffix='.png').image_path('0001.txt') == Path('0001.png')
+
+    @pytest.mark.parametrize("workers", [0, 2])
+    def test_ingest(self, yolo_dir, class_names, workers):
+        """test ingestion of a directory tree, sequential and with a process pool"""
+        progress = []
+        collection = CardCollection()
+        report = YoloIngestor(class_names, workers=workers, chunk_size=1, max_pending=1,
+                              progress=lambda r: progress.append(r.n_files)).ingest(collection, yolo_dir)
+        assert (report.n_files, report.n_detections, report.errors) == (3, 4, {})
+        assert list(collection.postcards) == ['0003', '0001', '0002']  # ordre du parcours
+        assert progress[-1] == 3
+        dets = collection['0001'].annotations.detections
+        assert [det.get_content_cls() for det in dets] == ['PrintedText', 'DateStamp']
+        assert dets[0] == Detection(BoundingBox(0.5, 0.1, 0.4, 0.05), is_manual=False, confidence=0.91,
+                                    content=PrintedText())
+        assert not dets[0].isprocessed()
+        assert collection['0003'].annotations.detections[0].is_manual
+        assert collection['0003'].path == str(yolo_dir / 'ardennes' / 'images' / '0003.jpg')
+
+    def test_merge(self, yolo_dir, class_names, tmp_path_factory):
+        """test that re-ingesting is idempotent and that new detections complete existing postcards"""
+        collection = CardCollection()
+        ingest_yolo_dir(collection, yolo_dir, class_names, workers=0)
+        collection.mark_clean()
+        report = ingest_yolo_dir(collection, yolo_dir, class_names, workers=0)
+        assert len(collection['0001'].annotations) == 2
+        assert report.n_detections == 0
+        assert collection.changes() == {}  # cartes inchangées : rien à sauvegarder
+        other_dir = tmp_path_factory.mktemp('other')
+        (other_dir / '0001.txt').write_text("0 0.5 0.1 0.4 0.05 0.91\n"  # déjà présente
+                                            "1 0.3 0.7 0.2 0.1 0.55\n")
+        report = ingest_yolo_dir(collection, other_dir, class_names, workers=0)
+        assert report.n_detections == 1
+        assert collection.changes() == {'0001': ChangeType.UPDATED}
+        assert [det.get_content_cls() for det in collection['0001'].annotations.detections] == \
+               ['PrintedText', 'DateStamp', 'HandwrittenText']
+        ingest_yolo_dir(collection, yolo_dir, class_names, workers=0, merge=False)
+        assert len(collection['0001'].annotations) == 2
+
+    def test_errors(self, yolo_dir, class_names):
+        """test strict and non-strict handling of invalid files"""
+        (yolo_dir / 'marne' / 'labels' / '0004.txt').write_text("7 0.5 0.5 0.1 0.1 0.9\n")  # classe inconnue
+        (yolo_dir / 'marne' / 'labels' / '0005.txt').write_text("0 0.5 0.5 0.1\n")  # ligne incomplète
+        with pytest.raises(ValueError):
+            ingest_yolo_dir(CardCollection(), yolo_dir, class_names, workers=0)
+        collection = CardCollection()
+        report = ingest_yolo_dir(collection, yolo_dir, class_names, workers=0, strict=False)
+        assert len(report.errors) == 2
+        assert len(collection) == 3
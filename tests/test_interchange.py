@@ -0,0 +1,128 @@
+import pytest
+import io
+from t2ia_collection.interchange import *
+
+
+# ======================================================================================================================
+# FIXTURES
+# ======================================================================================================================
+
+@pytest.fixture
+def collection():
+    return CardCollection({
+        '0001': Postcard('scans/0001.jpg', img_size=(1000, 600), annotations=Annotations(detections=[
+            Detection(BoundingBox(0.5, 0.1, 0.4, 0.05),
+                      content=PrintedText(True, ocr_result='Brest - <Le port> & "la rade"', keywords=['port'])),
+            Detection(BoundingBox(0.8, 0.2, 0.15, 0.2), is_manual=False, confidence=0.88,
+                      content=DateStamp(True, postal_agency='BREST', date='1905-07-30TXX:XX', quality='good')),
+            Detection(BoundingBox(0.1, 0.9, 0.1, 0.1), content=PostageStamp()),
+        ])),
+        '0002': Postcard('scans/0002.jpg', img_size=(800, 800)),
+    })
+
+@pytest.fixture
+def coco_dict():
+    """fichier COCO avec les annotations avant les catégories et un attribut ajouté par l'outil d'annotation"""
+    return {'info': {'description': 'test'},
+            'images': [{'id': 7, 'file_name': 'a.jpg', 'width': 200, 'height': 100}],
+            'annotations': [{'id': 1, 'image_id': 7, 'category_id': 3, 'bbox': [10, 10, 100, 50],
+                             'attributes': {'occluded': False, 'ocr_result': 'Reims'}},
+                            {'id': 2, 'image_id': 7, 'category_id': 3, 'bbox': [150, 60, 60, 50], 'score': 0.5}],
+            'categories': [{'id': 3, 'name': 'text'}]}
+
+
+# ======================================================================================================================
+# TESTS JsonStream
+# ======================================================================================================================
+
+class TestClassJsonStream:
+    """tests for JsonStream Class"""
+
+    @pytest.mark.parametrize("chunk_size", [1, 3, 7, 1 << 16])
+    def test_iter_items(self, coco_dict, chunk_size):
+        """test incremental parsing with any chunk size"""
+        stream = JsonStream(io.StringIO(json.dumps(coco_dict, indent=2)), chunk_size=chunk_size)
+        items = list(stream.iter_items(['images', 'annotations']))
+        assert items[0] == ('info', {'description': 'test'})
+        assert [key for key, _ in items] == ['info', 'images', 'annotations', 'annotations', 'categories']
+        assert items[3][1] == coco_dict['annotations'][1]
+        assert items[4][1] == coco_dict['categories']
+
+    @pytest.mark.parametrize("text", ['{"a": [1, 2', '{"a" 1}', '[1, 2]'])
+    def test_invalid(self, text):
+        """test that malformed documents raise a ValueError"""
+        with pytest.raises(ValueError):
+            list(JsonStream(io.StringIO(text), chunk_size=2).iter_items(['a']))
+
+    def test_empty(self):
+        """test empty objects and arrays"""
+        assert list(JsonStream(io.StringIO('{}')).iter_items([])) == []
+        assert list(JsonStream(io.StringIO('{"a": [], "b": 1}')).iter_items(['a'])) == [('b', 1)]
+
+
+# ======================================================================================================================
+# TESTS COCO
+# ======================================================================================================================
+
+class TestCoco:
+    """tests for COCO import/export"""
+
+    def test_iter_coco(self, coco_dict, tmp_path):
+        """test streaming import, with a second pass when categories come last"""
+        file_path = tmp_path / 'coco.json'
+        file_path.write_text(json.dumps(coco_dict))
+        res = list(iter_coco(file_path, category_map={'text': 'PrintedText'}, chunk_size=16))
+        assert len(res) == 2
+        image, det = res[0]
+        assert image['file_name'] == 'a.jpg'
+        assert det.bbox == BoundingBox.from_coords([10, 10, 110, 60], 'xyxy', (200, 100))
+        assert det.content == PrintedText(ocr_result='Reims')
+        assert det.is_manual
+        # la bbox débordant de l'image est ramenée dans l'image
+        assert res[1][1].bbox == BoundingBox.from_coords([150, 60, 200, 100], 'xyxy', (200, 100))
+        assert (res[1][1].is_manual, res[1][1].confidence) == (False, 0.5)
+
+    def test_round_trip(self, collection, tmp_path):
+        """test export then import of a collection"""
+        file_path = tmp_path / 'coco.json'
+        export_coco(collection, file_path)
+        imported = CardCollection()
+        assert import_coco(imported, file_path, image_root='scans') == 3
+        assert imported['0001'] == collection['0001']
+        assert '0002' not in imported  # pas d'annotation
+        with open(file_path) as f:
+            assert [category['name'] for category in json.load(f)['categories']] == [
+                'PrintedText', 'DateStamp', 'PostageStamp']
+
+
+# ======================================================================================================================
+# TESTS CVAT
+# ======================================================================================================================
+
+class TestCvat:
+    """tests for CVAT XML import/export"""
+
+    def test_round_trip(self, collection, tmp_path):
+        """test export then import of a collection"""
+        file_path = tmp_path / 'cvat.xml'
+        export_cvat(collection, file_path)
+        res = list(iter_cvat(file_path))
+        assert [image['name'] for image, _ in res] == ['0001.jpg', '0002.jpg']
+        assert res[0][1] == collection['0001'].annotations.detections
+        imported = CardCollection()
+        assert import_cvat(imported, file_path, image_root='scans') == 3
+        assert imported['0001'] == collection['0001']
+        assert imported['0002'] == collection['0002']
+
+    def test_manual_attributes(self, tmp_path):
+        """test plain-text attribute values typed in CVAT and class filtering"""
+        file_path = tmp_path / 'cvat.xml'
+        file_path.write_text('<annotations><version>1.1</version>'
+                             '<image id="0" name="b.jpg" width="100" height="100">'
+                             '<box label="HandwrittenText" source="manual" xtl="0" ytl="0" xbr="50" ybr="50">'
+                             '<attribute name="ocr_result">Bons baisers</attribute>'
+                             '<attribute name="orientation">90</attribute></box>'
+                             '</image></annotations>')
+        (_, detections), = iter_cvat(file_path)
+        assert detections[0].content == HandwrittenText(ocr_result='Bons baisers', orientation=90)
+        assert detections[0].bbox == BoundingBox(0.25, 0.25, 0.5, 0.5)
@@ -0,0 +1,83 @@
+import pytest
+import json
+from t2ia_collection.interchange import *
+
+
+# ======================================================================================================================
+# FIXTURES
+# ======================================================================================================================
+
+@pytest.fixture
+def collection_dict():
+    collection = CardCollection()
+    for i in range(3):
+        collection.add(Postcard(f"{i:04d}.jpg", annotations=Annotations(
+            location=Location(town='Attigny', department='Ardennes'),
+            tags=['église'],
+            detections=[
+                Detection(BoundingBox(0.5, 0.1, 0.4, 0.05),
+                          content=PrintedText(True, ocr_result="Attigny - L'église", keywords={'église', 'attigny'})),
+                Detection(BoundingBox(0.8, 0.2, 0.2, 0.2),
+                          content=DateStamp(True, postal_agency='ATTIGNY', department='ARDENNES', collection='3E')),
+                Detection(BoundingBox(0.9, 0.1, 0.1, 0.1), content=PostageStamp(True, country='France', color='rouge')),
+            ])))
+    return json.loads(json.dumps(collection.to_dict()))  # comme après un chargement : chaînes toutes distinctes
+
+
+# ======================================================================================================================
+# TESTS StringPool
+# ======================================================================================================================
+
+class TestClassStringPool:
+    """tests for StringPool Class"""
+
+    def test_intern(self):
+        """test that equal strings are shared"""
+        pool = StringPool(['Reims'])
+        value = ''.join(['Re', 'ims'])
+        assert value is not pool.values[0]
+        assert pool.intern(value) is pool.values[0]
+        assert pool.intern(None) is None and pool.intern(3) == 3
+        assert 'Reims' in pool and len(pool) == 1
+
+    def test_codes(self):
+        """test categorical encoding and decoding"""
+        pool = StringPool()
+        codes = pool.encode(['Brest', None, 'Reims', 'Brest'])
+        assert list(codes) == [0, -1, 1, 0]
+        assert pool.decode(codes) == ['Brest', None, 'Reims', 'Brest']
+
+
+# ======================================================================================================================
+# TESTS loaders
+# ======================================================================================================================
+
+class TestInterning:
+    """tests for shared strings after loading"""
+
+    @staticmethod
+    def check_shared(collection):
+        first, *others = list(collection)
+        for postcard in others:
+            assert postcard.annotations.location.town is first.annotations.location.town
+            assert postcard.annotations.tags[0] is first.annotations.tags[0]
+            for det, first_det in zip(postcard.annotations.detections, first.annotations.detections):
+                for name in interned_fields(type(det.content)):
+                    if name == 'keywords':
+                        ids = {id(keyword) for keyword in det.content.keywords}
+                        assert ids == {id(keyword) for keyword in first_det.content.keywords}
+                    else:
+                        assert getattr(det.content, name) is getattr(first_det.content, name)
+
+    def test_from_dict(self, collection_dict):
+        """test that CardCollection.from_dict shares repeated strings"""
+        collection = CardCollection.from_dict(collection_dict)
+        self.check_shared(collection)
+        assert list(collection.filter_by_town('attigny').postcards) == ['0000', '0001', '0002']
+
+    def test_intern_collection(self, collection_dict):
+        """test interning of an already built collection"""
+        collection = CardCollection({name: Postcard.from_dict(d) for name, d in collection_dict.items()})
+        pool = intern_collection(collection)
+        self.check_shared(collection)
+        assert {'ATTIGNY', 'France', 'église'} <= set(pool.values)
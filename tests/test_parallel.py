@@ -0,0 +1,28 @@
+import pytest
+from t2ia_collection.parallel import *
+
+
+# ======================================================================================================================
+# FUNCTIONS
+# ======================================================================================================================
+
+def total(chunk: list, offset: int) -> int:
+    return sum(chunk) + offset
+
+
+# ======================================================================================================================
+# TESTS
+# ======================================================================================================================
+
+def test_chunks():
+    """test lazy chunking with a shorter last chunk"""
+    assert list(chunks(range(7), 3)) == [[0, 1, 2], [3, 4, 5], [6]]
+    assert list(chunks([], 3)) == []
+
+
+@pytest.mark.parametrize("workers", [0, 2])
+def test_bounded_map(workers):
+    """test that results come back in order, in process or in a pool"""
+    assert list(bounded_map(total, chunks(range(100), 10), 1, workers=workers, max_pending=1)) == \
+           [sum(range(i, i + 10)) + 1 for i in range(0, 100, 10)]
+    assert list(bounded_map(total, [], 0, workers=workers)) == []
@@ -0,0 +1,149 @@
+import pytest
+from t2ia_collection.postcard import *
+
+
+# ======================================================================================================================
+# FIXTURES
+# ======================================================================================================================
+
+@pytest.fixture
+def dict_text_det():
+    return {'bbox': {'x': 0.239518, 'y': 0.038474, 'w': 0.23065, 'h': 0.033355},
+            'is_manual': True,
+            'confidence': None,
+            'content': {'PrintedText': {'is_manual': True,
+                                        'confidence': None,
+                                        'ocr_result': "ALLAND'HUY. - L’Eglise.",
+                                        'keywords': ['église'],
+                                        'orientation': 0,
+                                        'is_editor': False}}}
+
+@pytest.fixture
+def location():
+    return Location(town='Alland\'Huy', department='Ardennes', region='Grand Est', gps=(49.52, 4.56))
+
+@pytest.fixture
+def annotations(location, dict_text_det):
+    return Annotations(location=location,
+                       tags=['église'],
+                       keywords=['village'],
+                       detections=[Detection.from_dict(dict_text_det)])
+
+@pytest.fixture
+def postcard(annotations):
+    return Postcard('scans/ardennes/0001.jpg', annotations=annotations)
+
+
+# ======================================================================================================================
+# TESTS Location
+# ======================================================================================================================
+
+class TestClassLocation:
+    """tests for Location Class"""
+
+    def test_instantiation(self, location):
+        """test instantiation of Location Class"""
+        assert Location().isempty()
+        assert not location.isempty()
+        assert Location(gps=[49.52, 4.56]).gps == (49.52, 4.56)
+        with pytest.raises(ValueError):
+            Location(gps=(49.52,))
+
+    def test_dict(self, location):
+        """test Location transformation to and from dict"""
+        assert location.to_dict()['gps'] == [49.52, 4.56]
+        assert Location.from_dict(location.to_dict()) == location
+        assert Location.from_dict(None) == Location()
+
+    def test_distance(self, location):
+        """test great-circle distances between locations"""
+        assert haversine((48.8566, 2.3522), (45.7640, 4.8357)) == pytest.approx(391.5, abs=1)  # Paris - Lyon
+        assert haversine((0., 179.5), (0., -179.5)) == pytest.approx(111.2, abs=0.1)
+        assert location.distance(location) == 0.
+        assert location.distance((49.52, 5.56)) == pytest.approx(haversine((49.52, 4.56), (49.52, 5.56)))
+        assert location.distance(Location()) is None
+        assert in_area((0., 179.5), -1, 179, 1, -179) and not in_area((0., 0.), -1, 179, 1, -179)
+
+
+# ======================================================================================================================
+# TESTS Annotations
+# ======================================================================================================================
+
+class TestClassAnnotations:
+    """tests for Annotations Class"""
+
+    def test_instantiation(self, annotations):
+        """test instantiation of Annotations Class"""
+        assert len(Annotations()) == 0
+        assert len(annotations) == 1
+        assert Annotations(rotation='90').rotation == Orientation.NINETY
+        with pytest.raises(ValueError):
+            Annotations(rotation=45)
+
+    def test_get_keywords(self, annotations):
+        """test keywords retrieval from the postcard and its texts"""
+        assert annotations.get_keywords() == {'village', 'église'}
+
+    def test_setters(self, annotations, location):
+        """test set_* methods"""
+        assert annotations.set_tags(['mairie']).tags == ['mairie']
+        assert annotations.tags == ['église']
+        assert annotations.set_location().location == Location()
+        assert annotations.set_detections().detections == []
+        test_annotations = annotations.copy()
+        test_annotations.set_keywords(['rue'], inplace=True)
+        assert test_annotations.keywords == ['rue']
+        assert test_annotations != annotations
+
+    def test_dict(self, annotations):
+        """test Annotations transformation to and from dict"""
+        assert Annotations.from_dict(annotations.to_dict()) == annotations
+        assert Annotations.from_dict(None) == Annotations()
+
+
+# ======================================================================================================================
+# TESTS Postcard
+# ======================================================================================================================
+
+class TestClassPostcard:
+    """tests for Postcard Class"""
+
+    def test_instantiation(self, postcard):
+        """test instantiation of Postcard Class"""
+        assert postcard.name == '0001'
+        assert Postcard('0001.jpg', name='carte').name == 'carte'
+        assert postcard.annotations_path() == Path('scans/ardennes/0001.json')
+
+    def test_set_annotations(self, postcard, annotations):
+        """test annotations setter"""
+        assert postcard.set_annotations().get_annotations() == Annotations()
+        assert postcard.get_annotations() == annotations
+
+    def test_save_load_annotations(self, postcard, tmp_path):
+        """test saving and loading annotations as json"""
+        file_path = tmp_path / 'annotations.json'
+        postcard.save_annotations(file_path)
+        assert Postcard(postcard.path).load_annotations(file_path) == postcard
+
+    def test_dict(self, postcard):
+        """test Postcard transformation to and from dict"""
+        assert Postcard.from_dict(postcard.to_dict()) == postcard
+
+    def test_bbox_style(self, postcard):
+        """test class colors and bbox labels"""
+        det = postcard.annotations.detections[0]
+        assert class_color('PrintedText') == CLASS_COLORS['PrintedText']
+        assert class_color('Inconnue') == class_color('Inconnue') != class_color('Inconnu')
+        assert bbox_label(det) == 'PrintedText'
+        prediction = Detection(det.bbox, is_manual=False, confidence=0.876, content=DateStamp())
+        assert bbox_label(prediction) == 'DateStamp 0.88'
+
+    def test_draw_bboxes(self, postcard):
+        """test drawing detections on an image"""
+        image_module = pytest.importorskip("PIL.Image")
+        image = image_module.new("L", (400, 300), 0)
+        res = postcard.draw_bboxes(image, labels=False)
+        assert res.mode == 'RGB' and res.size == (400, 300) and image.getpixel((0, 0)) == 0
+        x_min, y_min, x_max, y_max = postcard.annotations.detections[0].bbox.xyxy(res.size)
+        assert res.getpixel((x_min, (y_min + y_max) // 2)) == class_color('PrintedText')
+        assert res.getpixel((200, 200)) == (0, 0, 0)
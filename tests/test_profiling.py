@@ -0,0 +1,67 @@
+import pytest
+from t2ia_collection.profiling import *
+
+
+# ======================================================================================================================
+# FIXTURES
+# ======================================================================================================================
+
+@pytest.fixture
+def text():
+    return PrintedText(False, 0.8, ocr_result="Attigny - L'église et la mairie", orientation=90)
+
+
+# ======================================================================================================================
+# TESTS Profiler
+# ======================================================================================================================
+
+class TestClassProfiler:
+    """tests for Profiler Class"""
+
+    def test_enable_disable(self, text):
+        """test that entry points are only wrapped while enabled"""
+        original = Text.__dict__['word_list']
+        with profile() as profiler:
+            assert profiler.enabled
+            assert Text.__dict__['word_list'] is not original
+            with pytest.raises(RuntimeError):
+                Profiler().enable()
+            text.set_keywords({'église', 'gare'}, warn=False)
+            Detection.from_dict(Detection(BoundingBox(0.5, 0.5, 0.2, 0.2), content=text).to_dict())
+        assert not profiler.enabled
+        assert Text.__dict__['word_list'] is original
+        report = profiler.report()
+        for name in ['Text.word_list', 'Text.lemmatize', 'Text.set_keywords', 'Detection.to_dict',
+                     'Detection.from_dict', 'BoundingBox.from_dict', 'Content.from_json_object']:
+            assert report[name]['calls'] == 1
+        # désactivé : plus de mesures
+        text.word_list()
+        assert profiler.timings['Text.word_list'].calls == 1
+
+    def test_errors_and_stages(self, text):
+        """test error counting, custom stages and instrumented callables"""
+        profiler = Profiler()
+        with profiler:
+            with pytest.raises(ValueError):
+                text.rotate(45)
+            with profiler.stage('ocr'):
+                text.process_content(ocr_result='Reims', confidence=0.9)
+            lemmatizer = profiler.instrument(lambda words: [word.upper() for word in words], 'lemmatizer')
+            text.lemmatize(lemmatizer, warn=False)
+        assert 'PrintedText.rotate' not in profiler.timings  # non redéfinie par PrintedText
+        assert (profiler.timings['Text.rotate'].calls, profiler.timings['Text.rotate'].errors) == (1, 1)
+        assert profiler.timings['ocr'].calls == 1
+        assert profiler.timings['ocr'].total >= profiler.timings['Text.process_content'].total
+        assert profiler.timings['lemmatizer'].calls == 1
+
+    def test_prometheus(self, text):
+        """test Prometheus text exposition format"""
+        with profile(methods=['rotate']) as profiler:
+            for _ in range(3):
+                text.rotate(90)
+        exposition = profiler.to_prometheus()
+        assert '# TYPE t2ia_duration_seconds histogram' in exposition
+        assert 't2ia_calls_total{method="Text.rotate"} 3' in exposition
+        assert 't2ia_duration_seconds_bucket{method="Text.rotate",le="+Inf"} 3' in exposition
+        assert 't2ia_duration_seconds_count{method="Text.rotate"} 3' in exposition
+        assert 'to_dict' not in exposition
@@ -0,0 +1,72 @@
+import pytest
+from t2ia_collection.reading import *
+
+
+# ======================================================================================================================
+# FUNCTIONS
+# ======================================================================================================================
+
+def text_det(x_min, y_min, x_max, y_max, ocr_result, content_class='HandwrittenText', orientation=0):
+    """détection de texte à partir de coordonnées xyxyn"""
+    content = Content.create_instance(content_class, {'is_manual': True, 'ocr_result': ocr_result,
+                                                      'orientation': orientation})
+    return Detection(BoundingBox.from_coords([x_min, y_min, x_max, y_max], 'xyxyn'), content=content)
+
+
+# ======================================================================================================================
+# FIXTURES
+# ======================================================================================================================
+
+@pytest.fixture
+def postcard():
+    """dos de carte : message manuscrit à gauche (2 lignes), adresse à droite, légende imprimée en haut"""
+    return Postcard('0001.jpg', annotations=Annotations(detections=[
+        text_det(0.30, 0.30, 0.45, 0.35, 'baisers'),
+        text_det(0.52, 0.41, 0.70, 0.46, 'Monsieur'),
+        text_det(0.05, 0.30, 0.25, 0.35, 'Bons'),
+        text_det(0.05, 0.36, 0.40, 0.415, 'de Brest'),
+        text_det(0.72, 0.40, 0.90, 0.455, 'Durand'),
+        text_det(0.52, 0.50, 0.85, 0.55, 'Reims'),
+        text_det(0.05, 0.02, 0.60, 0.06, 'BREST. - Le port', content_class='PrintedText'),
+        Detection(BoundingBox(0.85, 0.15, 0.1, 0.1), content=DateStamp()),
+    ]))
+
+
+# ======================================================================================================================
+# TESTS ReadingOrder
+# ======================================================================================================================
+
+class TestClassReadingOrder:
+    """tests for ReadingOrder Class"""
+
+    def test_group(self, postcard):
+        """test grouping into lines and blocks, in reading order"""
+        blocks = ReadingOrder().group_postcard(postcard)
+        assert [block.content_cls for block in blocks] == ['PrintedText', 'HandwrittenText', 'HandwrittenText']
+        assert [str(block) for block in blocks] == ['BREST. - Le port', 'Bons baisers\nde Brest',
+                                                    'Monsieur Durand\nReims']
+        assert [len(line.detections) for line in blocks[2].lines] == [2, 1]
+
+    def test_by_class(self, postcard):
+        """test that printed and handwritten texts may share a block when by_class is False"""
+        postcard.annotations.detections.append(text_det(0.05, 0.42, 0.30, 0.47, 'Éditeur', 'PrintedText'))
+        assert ReadingOrder().texts(postcard)[1] == 'Bons baisers\nde Brest'
+        assert ReadingOrder(by_class=False).texts(postcard)[1] == 'Bons baisers\nde Brest\nÉditeur'
+
+    def test_orientation(self):
+        """test that rotated texts are grouped in their upright frame"""
+        # texte écrit de bas en haut : l'image doit être tournée de 270° pour le lire
+        dets = [text_det(0.10, 0.60, 0.15, 0.90, 'Souvenir', orientation=270),
+                text_det(0.10, 0.20, 0.15, 0.55, 'de Reims', orientation=270),
+                text_det(0.16, 0.60, 0.21, 0.90, 'ligne 2', orientation=270)]
+        blocks = ReadingOrder().group(dets)
+        assert len(blocks) == 1
+        assert blocks[0].orientation == Orientation.TWO_SEVENTY
+        assert blocks[0].text() == 'Souvenir de Reims\nligne 2'
+        assert blocks[0].bbox() == BoundingBox.from_coords([0.10, 0.20, 0.21, 0.90], 'xyxyn')
+
+    def test_processed_only(self):
+        """test that unprocessed texts are ignored when requested"""
+        dets = [text_det(0.1, 0.1, 0.2, 0.2, 'a'), Detection(BoundingBox(0.35, 0.15, 0.1, 0.1), content=HandwrittenText())]
+        assert len(ReadingOrder().group(dets)[0].detections) == 2
+        assert len(ReadingOrder().group(dets, processed_only=True)[0].detections) == 1
@@ -0,0 +1,59 @@
+import pytest
+from t2ia_collection.rendering import *
+
+
+# ======================================================================================================================
+# FIXTURES
+# ======================================================================================================================
+
+@pytest.fixture
+def collection(tmp_path):
+    """cartes avec de vraies images de 800 x 500 pixels"""
+    image_module = pytest.importorskip("PIL.Image")
+    res = CardCollection()
+    for i in range(5):
+        image_path = tmp_path / "scans" / f"{i:04d}.jpg"
+        image_path.parent.mkdir(exist_ok=True)
+        image_module.new("RGB", (800, 500), (255, 255, 255)).save(image_path)
+        res.add(Postcard(image_path, annotations=Annotations(detections=[
+            Detection(BoundingBox(0.5, 0.5, 0.4, 0.4), content=PrintedText()),
+            Detection(BoundingBox(0.8, 0.2, 0.2, 0.2), is_manual=False, confidence=0.7, content=DateStamp()),
+        ])))
+    return res
+
+
+# ======================================================================================================================
+# TESTS
+# ======================================================================================================================
+
+class TestRendering:
+    """tests for render_postcard() and render_collection()"""
+
+    def test_preview_path(self, tmp_path):
+        """test the preview file names"""
+        assert preview_path(Postcard('scans/0001.jpg'), tmp_path) == tmp_path / "0001.jpg"
+        assert preview_path(Postcard('scans/0001.jpg'), tmp_path, 'png') == tmp_path / "0001.png"
+
+    def test_render_postcard(self, tmp_path, collection):
+        """test that previews are downscaled and not recomputed"""
+        from PIL import Image
+        file_path = render_postcard(collection['0000'], tmp_path, max_size=400)
+        with Image.open(file_path) as preview:
+            assert preview.size == (400, 250)
+        mtime = file_path.stat().st_mtime_ns
+        assert render_postcard(collection['0000'], tmp_path, max_size=200) == file_path
+        assert file_path.stat().st_mtime_ns == mtime
+        render_postcard(collection['0000'], tmp_path, max_size=200, overwrite=True)
+        with Image.open(file_path) as preview:
+            assert preview.size == (200, 125)
+
+    @pytest.mark.parametrize("workers", [0, 2])
+    def test_render_collection(self, tmp_path, collection, workers):
+        """test rendering a whole collection, sequentially and with a process pool"""
+        paths = render_collection(collection, tmp_path / "previews", max_size=None, image_format='PNG',
+                                  workers=workers, chunk_size=2, labels=False)
+        assert paths == [tmp_path / "previews" / f"{name}.png" for name in collection.postcards]
+        from PIL import Image
+        with Image.open(paths[0]) as preview:
+            assert preview.size == (800, 500)
+            assert preview.getpixel((240, 250)) == class_color('PrintedText')
@@ -0,0 +1,105 @@
+import pytest
+from collections import Counter
+from t2ia_collection.sharding import *
+from t2ia_collection.synthetic import CollectionGenerator
+
+
+# ======================================================================================================================
+# FIXTURES
+# ======================================================================================================================
+
+@pytest.fixture
+def collection():
+    return CollectionGenerator(seed=7).collection(60)
+
+
+def is_in_marne(postcard: Postcard) -> bool:
+    return postcard.annotations.location.department == 'Marne'
+
+
+def get_name(postcard: Postcard) -> str:
+    return postcard.name
+
+
+# ======================================================================================================================
+# TESTS ShardedCollection
+# ======================================================================================================================
+
+class TestClassShardedCollection:
+    """tests for ShardedCollection Class"""
+
+    def test_hash_partition(self, collection, tmp_path):
+        """test that postcards are spread over at most n_shards shards and can be read back"""
+        sharded = ShardedCollection.from_collection(collection, tmp_path, n_shards=4, workers=0)
+        assert 1 < len(sharded.shards()) <= 4
+        assert len(sharded) == len(collection)
+        assert {p.name: p for p in sharded} == collection.postcards
+        # le schéma de partitionnement est relu dans le manifeste
+        reopened = ShardedCollection(tmp_path, partition=Partition.DEPARTMENT)
+        assert reopened.partition is Partition.HASH and reopened.n_shards == 4
+
+    def test_department_partition(self, collection, tmp_path):
+        """test that each shard holds a single department"""
+        sharded = ShardedCollection.from_collection(collection, tmp_path, partition='department', workers=0)
+        assert 'marne' in sharded.shards()
+        for key in sharded.shards():
+            assert len({p.annotations.location.department for p in sharded.load_shard(key)}) == 1
+
+    def test_add_replace(self, collection, tmp_path):
+        """test that re-added postcards replace older versions, before and after compaction"""
+        sharded = ShardedCollection.from_collection(collection, tmp_path, n_shards=3, workers=0)
+        postcard = collection.postcards['00000000']
+        postcard.annotations.set_tags(['nouveau'], inplace=True)
+        assert sharded.add([postcard]) == 1
+        assert len(sharded) == len(collection)
+        size = sum(sharded.shard_path(key).stat().st_size for key in sharded.shards())
+        sharded.compact()
+        assert sum(sharded.shard_path(key).stat().st_size for key in sharded.shards()) < size
+        key = sharded.shard_key(postcard)
+        assert sharded.load_shard(key).postcards['00000000'].annotations.tags == ['nouveau']
+
+    def test_move(self, collection, tmp_path):
+        """test that a postcard whose department changes leaves its old shard"""
+        sharded = ShardedCollection.from_collection(collection, tmp_path, partition='department', workers=0)
+        postcard = next(p for p in collection if p.annotations.location.department != 'Marne')
+        old_key = sharded.shard_key(postcard)
+        postcard.annotations.location.department = 'Marne'
+        sharded.add([postcard])
+        assert len(sharded) == len(collection)
+        assert [p.name for p in sharded].count(postcard.name) == 1
+        assert postcard.name not in ShardedCollection(tmp_path).load_shard(old_key).postcards  # nouvelle instance
+        assert sharded.load_shard('marne').postcards[postcard.name].annotations.location.department == 'Marne'
+        sharded.compact()
+        old_path = sharded.shard_path(old_key)  # pierre tombale retirée, shard supprimé s'il est vide
+        assert not old_path.exists() or postcard.name not in old_path.read_text()
+
+    def test_compact_duplicates(self, collection, tmp_path):
+        """test that compact() keeps a single copy of a postcard found in several shards"""
+        sharded = ShardedCollection.from_collection(collection, tmp_path, partition='department', workers=0)
+        postcard = next(p for p in collection if p.annotations.location.department != 'Marne')
+        with open(sharded.shard_path('marne'), 'a', encoding='utf-8') as f:  # copie obsolète dans un autre shard
+            f.write(json.dumps(postcard.to_dict()) + "\n")
+        assert len(sharded) == len(collection) + 1
+        sharded.compact()
+        assert len(sharded) == len(collection)
+        assert postcard.name in sharded.load_shard(sharded.shard_key(postcard)).postcards
+
+    @pytest.mark.parametrize("workers", [0, 2])
+    def test_reduce(self, collection, tmp_path, workers):
+        """test that partial counts of each shard are combined as for the whole collection"""
+        sharded = ShardedCollection.from_collection(collection, tmp_path, n_shards=5, workers=workers)
+        classes = Counter(det.get_content_cls() for p in collection for det in p.annotations.detections)
+        assert sharded.reduce(count_classes, Counter()) == classes
+        keywords = Counter(kw for p in collection for kw in p.annotations.get_keywords())
+        assert sharded.reduce(count_keywords, Counter()) == keywords
+        years = sharded.reduce(count_years, Counter())
+        assert all(1895 <= year <= 1960 for year in years)
+        assert years == sum((count_years(Counter(), p) for p in collection), Counter())
+
+    @pytest.mark.parametrize("workers", [0, 2])
+    def test_map_filter(self, collection, tmp_path, workers):
+        """test map and filter over shards"""
+        sharded = ShardedCollection.from_collection(collection, tmp_path, n_shards=5, workers=workers)
+        assert sorted(sharded.map(get_name)) == sorted(collection.postcards)
+        assert {p.name for p in sharded.filter(is_in_marne)} == \
+               {name for name, p in collection.postcards.items() if is_in_marne(p)}
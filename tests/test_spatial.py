@@ -0,0 +1,148 @@
+import pytest
+import random
+from t2ia_collection.spatial import *
+
+
+# ======================================================================================================================
+# FIXTURES
+# ======================================================================================================================
+
+@pytest.fixture
+def detections():
+    return [Detection(BoundingBox(0.8, 0.2, 0.15, 0.2), content=DateStamp()),  # zone du timbre
+            Detection(BoundingBox(0.9, 0.1, 0.1, 0.1), content=PostageStamp()),
+            Detection(BoundingBox(0.5, 0.1, 0.4, 0.05), content=PrintedText()),
+            Detection(BoundingBox(0.25, 0.7, 0.3, 0.4), content=HandwrittenText())]
+
+@pytest.fixture
+def random_bboxes():
+    rng = random.Random(0)
+    res = BoundingBoxArray()
+    for _ in range(500):
+        w, h = rng.uniform(0.01, 0.2), rng.uniform(0.01, 0.2)
+        res.append(BoundingBox(rng.uniform(w / 2, 1 - w / 2), rng.uniform(h / 2, 1 - h / 2), w, h))
+    return res
+
+
+# ======================================================================================================================
+# TESTS SpatialIndex
+# ======================================================================================================================
+
+class TestClassSpatialIndex:
+    """tests for SpatialIndex Class"""
+
+    def test_query(self, detections):
+        """test range queries with the different predicates"""
+        index = SpatialIndex.from_detections(detections)
+        assert index.query(QUADRANTS['top_right']) == [0, 1, 2]
+        assert index.query(QUADRANTS['top_right'], 'within') == [0, 1]
+        assert index.query(QUADRANTS['bottom_left'], SpatialPredicate.WITHIN) == []
+        assert index.query((0.2, 0.6, 0.3, 0.7), 'contains') == [3]
+        assert index.containing(0.9, 0.1) == [1]
+        assert index.query(detections[0].bbox) == [0, 1]
+        with pytest.raises(ValueError):
+            index.query((0.5, 0.5, 0.6))
+        with pytest.raises(ValueError):
+            index.query((0.5, 0.5), 'overlaps')
+
+    def test_nearest(self, detections):
+        """test nearest neighbour queries"""
+        index = SpatialIndex.from_detections(detections, grid_size=8)
+        assert [key for _, key in index.nearest(detections[0].bbox, k=2, exclude=[0])] == [1, 2]
+        distance, key = index.nearest((0.05, 0.05))[0]
+        assert key == 2
+        assert distance == pytest.approx(math.hypot(0.25, 0.075 - 0.05))
+        assert len(index.nearest((0.5, 0.5), k=10)) == 4
+        assert index.nearest((0.5, 0.5), k=0) == []
+
+    @pytest.mark.parametrize("grid_size", [None, 1, 7, 32])
+    def test_against_brute_force(self, random_bboxes, grid_size):
+        """test that queries match an exhaustive scan"""
+        index = SpatialIndex(random_bboxes, grid_size=grid_size)
+        region = (0.3, 0.2, 0.6, 0.45)
+        x_min, y_min, x_max, y_max = random_bboxes.xyxyn()
+        expected = [i for i in range(len(random_bboxes))
+                    if x_min[i] <= 0.6 and 0.3 <= x_max[i] and y_min[i] <= 0.45 and 0.2 <= y_max[i]]
+        assert index.query(region) == expected
+        point = (0.12, 0.93)
+        distances = sorted((index._distance(i, point * 2), i) for i in range(len(random_bboxes)))
+        assert [key for _, key in index.nearest(point, k=5)] == [i for _, i in distances[:5]]
+
+    def test_insert(self, detections):
+        """test incremental insertion"""
+        index = SpatialIndex(grid_size=4)
+        for i, det in enumerate(detections):
+            index.insert(det.bbox, key=f"det_{i}")
+        assert len(index) == 4
+        assert index.query(QUADRANTS['top_right'], 'within') == ['det_0', 'det_1']
+
+    def test_from_collection(self, detections):
+        """test bulk loading of a whole collection"""
+        collection = CardCollection()
+        collection.add(Postcard('0001.jpg', annotations=Annotations(detections=detections[:2])))
+        collection.add(Postcard('0002.jpg', annotations=Annotations(detections=detections[2:])))
+        index = SpatialIndex.from_collection(collection)
+        assert index.query(QUADRANTS['top_right'], 'within') == [('0001', 0), ('0001', 1)]
+        assert SpatialIndex.from_postcard(collection['0002']).query(QUADRANTS['bottom_left']) == [1]
+
+
+# ======================================================================================================================
+# TESTS GeoIndex
+# ======================================================================================================================
+
+@pytest.fixture
+def points():
+    rng = random.Random(1)
+    res = {f"{i:04d}": (rng.uniform(-85, 85), rng.uniform(-180, 180)) for i in range(300)}
+    res.update({'brest': (48.39, -4.49), 'quimper': (47.996, -4.10), 'reims': (49.26, 4.03),
+                'fidji': (-17.7, 179.9), 'samoa': (-13.8, -172.1)})
+    return res
+
+
+class TestClassGeoIndex:
+    """tests for GeoIndex Class"""
+
+    @pytest.mark.parametrize("cell_size", [0.1, 1., 30.])
+    def test_against_brute_force(self, points, cell_size):
+        """test that radius, area and nearest queries match an exhaustive scan"""
+        index = GeoIndex(cell_size)
+        for key, gps in points.items():
+            index.insert(key, gps)
+        for center, radius in (((48.4, -4.4), 60.), ((-15., 179.), 1000.), ((89., 0.), 500.), ((0., 0.), 15000.)):
+            expected = sorted((haversine(center, gps), key) for key, gps in points.items()
+                              if haversine(center, gps) <= radius)
+            assert index.within_radius(center, radius) == expected
+            assert index.nearest(center, k=3) == sorted((haversine(center, gps), key)
+                                                        for key, gps in points.items())[:3]
+        for area in ((40, -10, 50, 5), (-20, 170, -10, -170)):
+            assert index.within_area(*area) == [key for key, gps in points.items() if in_area(gps, *area)]
+
+    def test_queries(self, points):
+        """test radius queries around Brest, incremental insertion and removal"""
+        index = GeoIndex()
+        for key in ('brest', 'quimper', 'reims'):
+            index.insert(key, points[key])
+        assert [key for _, key in index.within_radius(points['brest'], 70)] == ['brest', 'quimper']
+        assert [key for _, key in index.nearest(points['brest'], k=1, exclude=['brest'])] == ['quimper']
+        index.insert('quimper', points['reims'])  # déplacement
+        index.remove('reims')
+        assert len(index) == 2
+        assert [key for _, key in index.within_radius(points['brest'], 70)] == ['brest']
+        assert [key for _, key in index.nearest(points['brest'], k=5)] == ['brest', 'quimper']
+        assert index.nearest(points['brest'], k=0) == []
+        with pytest.raises(ValueError):
+            index.insert('pôle', (91., 0.))
+
+    def test_collection_filters(self):
+        """test CardCollection geographic filters using the index"""
+        collection = CardCollection()
+        collection.add(Postcard('0001.jpg', annotations=Annotations(location=Location(gps=(48.39, -4.49)))))
+        collection.add(Postcard('0002.jpg', annotations=Annotations(location=Location(gps=(49.26, 4.03)))))
+        collection.add(Postcard('0003.jpg'))
+        index = GeoIndex.from_collection(collection)
+        assert len(index) == 2
+        for gps, radius in (((48.45, -4.42), 20), ((48.85, 2.35), 200), ((48.85, 2.35), 600)):
+            assert collection.filter_by_distance(gps, radius, index=index) == \
+                   collection.filter_by_distance(gps, radius)
+        assert collection.filter_by_area(49, 0, 50, 5, index=index) == collection.filter_by_area(49, 0, 50, 5)
+
@@ -0,0 +1,59 @@
+import pytest
+from t2ia_collection.synthetic import *
+
+
+# ======================================================================================================================
+# FIXTURES
+# ======================================================================================================================
+
+@pytest.fixture
+def generator():
+    return CollectionGenerator(seed=42)
+
+
+# ======================================================================================================================
+# TESTS CollectionGenerator
+# ======================================================================================================================
+
+class TestClassCollectionGenerator:
+    """tests for CollectionGenerator Class"""
+
+    def test_reproducible(self, generator):
+        """test that postcards only depend on the seed and their index"""
+        assert list(generator.iter_dicts(5)) == list(CollectionGenerator(seed=42).iter_dicts(5))
+        assert list(generator.iter_dicts(2, start=3)) == list(generator.iter_dicts(5))[3:]
+        assert generator.postcard_dict(0) != CollectionGenerator(seed=43).postcard_dict(0)
+        # pas de recouvrement entre les suites de graines voisines
+        assert CollectionGenerator(seed=1).rng(0).random() != CollectionGenerator(seed=0).rng(1_000_003).random()
+
+    def test_objects(self, generator):
+        """test that generated postcards are valid objects of the data model"""
+        data = {d['name']: d for d in generator.iter_dicts(200)}
+        collection = generator.collection(200)
+        assert list(collection.postcards) == list(data)
+        assert collection == CardCollection({name: Postcard.from_dict(d) for name, d in data.items()})
+        classes = {det.get_content_cls() for postcard in collection for det in postcard.annotations.detections}
+        assert classes == {'PrintedText', 'HandwrittenText', 'DateStamp', 'PostageStamp', 'OtherMark'}
+        n_detections = sum(len(postcard.annotations) for postcard in collection)
+        assert 5 < n_detections / len(collection) < 7
+        assert all(det.bbox.isvalid() for postcard in collection for det in postcard.annotations.detections)
+
+    def test_write(self, generator, tmp_path):
+        """test streaming writes in the serialized formats"""
+        n_detections = generator.write_collection(tmp_path / 'collection.json', 50)
+        collection = CardCollection.load(tmp_path / 'collection.json')
+        assert collection == generator.collection(50)
+        assert n_detections == sum(len(postcard.annotations) for postcard in collection)
+        assert generator.write_annotations(tmp_path / 'annotations', 3, start=10) == \
+               sum(len(postcard.annotations) for postcard in generator.iter_postcards(3, start=10))
+        postcard = Postcard(tmp_path / 'annotations' / '00000011.jpg').load_annotations()
+        assert postcard.annotations == collection['00000011'].annotations
+
+    def test_config(self):
+        """test custom distributions"""
+        config = SyntheticConfig(mean_detections=2., class_weights={'DateStamp': 1.}, years=(1900, 1900))
+        collection = generate_collection(20, config=config)
+        dates = [str(det.content.date) for postcard in collection for det in postcard.annotations.detections
+                 if det.isprocessed()]
+        assert all(date.startswith(('1900', 'XXXX')) for date in dates)
+        assert CollectionGenerator(config=config).n_postcards_for(10_000_000) == 5_000_000
@@ -0,0 +1,123 @@
+import pytest
+import math
+from t2ia_collection.terms import *
+
+
+# ======================================================================================================================
+# FUNCTIONS
+# ======================================================================================================================
+
+def card(name: str, town: str | None, *texts: str, editor: str | None = None) -> Postcard:
+    detections = [Detection(BoundingBox(0.5, 0.5, 0.2, 0.1), content=PrintedText(ocr_result=text)) for text in texts]
+    if editor is not None:
+        detections.append(Detection(BoundingBox(0.1, 0.9, 0.2, 0.05),
+                                    content=PrintedText(ocr_result=editor, is_editor=True)))
+    return Postcard(f"{name}.jpg", annotations=Annotations(location=Location(town=town), detections=detections))
+
+
+# ======================================================================================================================
+# FIXTURES
+# ======================================================================================================================
+
+@pytest.fixture
+def collection():
+    return CardCollection({postcard.name: postcard for postcard in [
+        card('0001', 'Reims', "Reims - La Cathédrale", "La cathédrale, façade", editor="ND Phot"),
+        card('0002', 'Reims', "Reims - Le Port", editor="ND Phot"),
+        card('0003', 'Épernay', "Épernay - Caves de champagne", "Le champagne", editor="LL"),
+        card('0004', None, "Vue générale"),
+    ]})
+
+
+# ======================================================================================================================
+# TESTS
+# ======================================================================================================================
+
+class TestTextTerms:
+    """tests for text_terms()"""
+
+    def test_sources(self):
+        """test lemmas, word lists, raw OCR and keywords"""
+        text = PrintedText(ocr_result="Reims - La Cathédrale", keywords={'reims'})
+        assert text_terms(text) == ['reims', 'la', 'cathédrale']
+        assert text_terms(text, KEYWORDS) == ['reims']
+        text = text.lemmatize(lambda words: ['lemme' for _ in words], warn=False)
+        assert text_terms(text) == ['lemme'] * 3
+
+    def test_groups(self, collection):
+        """test the usual groupings"""
+        assert group_by_town(collection['0003']) == 'Épernay'
+        assert group_by_editor(collection['0001']) == 'ND Phot'
+        assert group_by_editor(collection['0004']) is None
+
+
+class TestTermMatrix:
+    """tests for TermMatrix"""
+
+    def test_csr(self, collection):
+        """test the CSR layout and document frequencies"""
+        matrix = TermMatrix.from_collection(collection, stopwords={'la', 'le'})
+        assert len(matrix) == 4 and len(matrix.indptr) == 5
+        assert matrix.row('0001') == {'reims': 1, 'cathédrale': 2, 'façade': 1, 'nd': 1, 'phot': 1}
+        for row in range(len(matrix)):
+            assert list(matrix.indices[matrix.indptr[row]:matrix.indptr[row + 1]]) == \
+                   sorted(matrix.indices[matrix.indptr[row]:matrix.indptr[row + 1]])
+        df = dict(zip(matrix.vocabulary.values, matrix.document_frequency))
+        assert df['reims'] == 2 and df['champagne'] == 1 and 'la' not in df
+        assert matrix.term_counts()[matrix.vocabulary.code('champagne')] == 2
+
+    def test_incremental(self, collection):
+        """test that adding, replacing and removing cards keeps the statistics up to date"""
+        matrix = TermMatrix.from_collection(collection)
+        matrix.add(card('0005', 'Reims', "Reims - Le Palais"))
+        assert dict(zip(matrix.vocabulary.values, matrix.document_frequency))['reims'] == 3
+        matrix.add(card('0001', 'Reims', "Carte sans nom de ville"))  # remplacée
+        matrix.remove('0002')
+        df = dict(zip(matrix.vocabulary.values, matrix.document_frequency))
+        assert df['reims'] == 1 and df['cathédrale'] == 0 and df['carte'] == 1
+        assert len(matrix) == 4 and '0002' not in matrix
+        assert matrix.row('0001')['carte'] == 1
+        assert matrix.term_counts()[matrix.vocabulary.code('cathédrale')] == 0
+
+    def test_compact(self, collection):
+        """test that replaced rows are dropped, explicitly or once they outnumber active rows"""
+        matrix = TermMatrix.from_collection(collection, group_by=group_by_town)
+        rows = {name: matrix.row(name) for name in collection.postcards}
+        for _ in range(1000):
+            matrix.add(collection['0001'])
+        assert len(matrix.names) <= 2 * len(matrix) + 1
+        assert len(matrix.indices) <= 2 * sum(len(row) for row in rows.values()) + len(rows['0001'])
+        matrix.compact()
+        assert len(matrix.names) == len(matrix) == 4 and all(matrix.active)
+        assert {name: matrix.row(name) for name in collection.postcards} == rows
+        assert dict(zip(matrix.vocabulary.values, matrix.document_frequency))['reims'] == 2
+        assert set(matrix.top_terms(k=1)) == {'Reims', 'Épernay'}
+
+    def test_tfidf(self, collection):
+        """test TF-IDF weights of a card"""
+        matrix = TermMatrix.from_collection(collection)
+        weights = matrix.tfidf('0002')
+        assert math.sqrt(sum(weight ** 2 for weight in weights.values())) == pytest.approx(1.)
+        assert weights['port'] > weights['reims']  # terme plus rare
+
+    def test_top_terms(self, collection):
+        """test the characteristic terms per group"""
+        matrix = TermMatrix.from_collection(collection, group_by=group_by_town, stopwords={'la', 'le', 'de'})
+        top = matrix.top_terms(k=2)
+        assert set(top) == {'Reims', 'Épernay'}
+        assert [term for term, _ in top['Épernay']] == ['champagne', 'épernay']
+        assert top['Reims'][0][0] == 'cathédrale'  # aussi fréquent que « reims » dans le groupe, mais plus rare
+        top = TermMatrix.from_collection(collection, group_by=group_by_editor).top_terms(k=1)
+        assert set(top) == {'ND Phot', 'LL'}
+
+    def test_cooccurrences(self, collection):
+        """test co-occurrence counts of terms"""
+        matrix = TermMatrix.from_collection(collection, source=KEYWORDS)
+        assert matrix.cooccurrences() == {}
+        matrix = TermMatrix.from_collection(collection, stopwords={'la', 'le', 'de'})
+        pairs = matrix.cooccurrences(min_count=2)
+        assert pairs == {('nd', 'phot'): 2, ('nd', 'reims'): 2, ('phot', 'reims'): 2}
+        assert set(matrix.cooccurrences(terms=['caves'])) == {('caves', 'champagne'), ('caves', 'll'),
+                                                              ('caves', 'épernay')}
+        with pytest.raises(ValueError):
+            TermMatrix(source='words')
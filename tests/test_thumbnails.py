@@ -0,0 +1,108 @@
+import pytest
+from t2ia_collection.thumbnails import *
+
+
+# ======================================================================================================================
+# FIXTURES
+# ======================================================================================================================
+
+@pytest.fixture
+def postcard(tmp_path):
+    """carte dont l'image, factice, fait 1000 x 600 pixels"""
+    image_path = tmp_path / "0001.jpg"
+    image_path.write_bytes(b"image")  # octets factices : seul leur hash compte pour les clés
+    return Postcard(image_path, img_size=(1000, 600), annotations=Annotations(detections=[
+        Detection(BoundingBox(0.5, 0.5, 0.2, 0.1), content=PrintedText()),
+        Detection(BoundingBox(0.1, 0.1, 0.2, 0.2), content=DateStamp()),
+    ]))
+
+
+@pytest.fixture
+def image_postcard(tmp_path):
+    """carte avec une vraie image de 600 x 300 pixels"""
+    image_module = pytest.importorskip("PIL.Image")
+    image_path = tmp_path / "0002.png"
+    image_module.new("RGB", (600, 300), (200, 100, 50)).save(image_path)
+    return Postcard(image_path, annotations=Annotations(detections=[
+        Detection(BoundingBox(0.25, 0.5, 0.5, 1.), content=PrintedText()),
+    ]))
+
+
+# ======================================================================================================================
+# TESTS
+# ======================================================================================================================
+
+class TestPyramid:
+    """tests for the pyramid geometry"""
+
+    def test_levels(self):
+        """test level sizes down to a single tile"""
+        assert pyramid_levels((1000, 600)) == [(1000, 600), (500, 300), (250, 150)]
+        assert pyramid_levels((100, 50)) == [(100, 50)]
+        assert level_size((1001, 3), 1) == (501, 2)
+        assert tile_grid((1000, 600)) == (4, 3)
+
+    def test_bbox_mapping(self, postcard):
+        """test that bboxes map to any level from xyxyn()"""
+        bbox = postcard.annotations.detections[0].bbox
+        assert bbox_to_level(bbox, (1000, 600)) == pytest.approx((400, 270, 600, 330))
+        assert bbox_to_level(bbox, (250, 150)) == pytest.approx((100, 67.5, 150, 82.5))
+        assert bbox_tiles(bbox, (1000, 600)) == [(1, 1), (2, 1)]
+        assert bbox_tiles(BoundingBox(0.5, 0.5, 1., 1.), (250, 150)) == [(0, 0)]
+
+
+class TestTileCache:
+    """tests for TileCache"""
+
+    def test_keys(self, tmp_path, postcard):
+        """test that pyramids are keyed by image hash and rotation"""
+        cache = TileCache(tmp_path / "tiles")
+        path = cache.pyramid_path(postcard)
+        assert path.parent.parent == tmp_path / "tiles"
+        assert cache.tile_path(postcard, 2, 0, 1) == path / "2" / "0_1.jpg"
+        rotated = Postcard(postcard.path, annotations=Annotations(rotation=90))
+        assert cache.key(rotated) != cache.key(postcard)
+        assert postcard not in cache and cache.metadata(postcard) is None
+
+    def test_overlay(self, tmp_path, postcard):
+        """test overlays without decoding the image, with rotated annotations"""
+        cache = TileCache(tmp_path / "tiles")
+        overlay = cache.overlay(postcard, level=1)
+        assert overlay[0][0] == 'PrintedText'
+        assert overlay[0][1] == pytest.approx((200, 135, 300, 165))
+        rotated = Postcard(postcard.path, img_size=(1000, 600),
+                           annotations=Annotations(detections=postcard.annotations.detections, rotation=90))
+        cls, (x_min, y_min, x_max, y_max) = cache.overlay(rotated)[0]
+        assert (x_max - x_min, y_max - y_min) == pytest.approx((60, 200))  # image de 600 x 1000 une fois tournée
+
+    def test_generate(self, tmp_path, image_postcard):
+        """test pyramid generation, tiles and thumbnail"""
+        cache = TileCache(tmp_path / "tiles", tile_size=256)
+        metadata = cache.generate(image_postcard)
+        assert metadata['levels'] == [[600, 300], [300, 150], [150, 75]]
+        assert image_postcard in cache
+        assert cache.tile(image_postcard, 0, 2, 1).exists()
+        with pytest.raises(IndexError):
+            cache.tile(image_postcard, 0, 3, 0)
+        from PIL import Image
+        with Image.open(cache.thumbnail(image_postcard)) as thumbnail:
+            assert thumbnail.size == (150, 75)
+        assert cache.overlay(image_postcard, level=2)[0][1] == pytest.approx((0, 0, 75, 75))
+        cache.remove(image_postcard)
+        assert image_postcard not in cache
+
+    def test_regenerate(self, tmp_path, image_postcard):
+        """test that a pyramid is regenerated, without stale tiles, when the tile size or format changes"""
+        TileCache(tmp_path / "tiles", tile_size=128).generate(image_postcard)
+        cache = TileCache(tmp_path / "tiles", tile_size=256, image_format="PNG")
+        assert cache.generate(image_postcard)['image_format'] == "PNG"
+        assert cache.thumbnail(image_postcard).suffix == ".png" and cache.thumbnail(image_postcard).exists()
+        directory = cache.pyramid_path(image_postcard)
+        assert not list(directory.rglob("*.jpg"))
+        assert len(list((directory / "0").iterdir())) == 6  # 3 x 2 tuiles de 256, et non 5 x 3 de 128
+
+    def test_generate_pyramids(self, tmp_path, image_postcard):
+        """test generation over a collection"""
+        cache = TileCache(tmp_path / "tiles")
+        assert generate_pyramids(cache, CardCollection({image_postcard.name: image_postcard}), workers=0) == 1
+        assert image_postcard in cache
@@ -0,0 +1,72 @@
+import pytest
+from t2ia_collection.collection import *
+
+
+# ======================================================================================================================
+# FIXTURES
+# ======================================================================================================================
+
+@pytest.fixture
+def rows():
+    return [
+        {'bbox': {'x': 0.5, 'y': 0.5, 'w': 0.2, 'h': 0.1}, 'is_manual': False, 'confidence': 0.75, 'content': None},
+        {'bbox': {'x': 0.239518, 'y': 0.038474, 'w': 0.23065, 'h': 0.033355},
+         'is_manual': True,
+         'confidence': None,
+         'content': {'PrintedText': {'is_manual': False, 'confidence': 0.9, 'ocr_result': "ALLAND'HUY. - L’Eglise.",
+                                     'keywords': ['église'], 'orientation': '-90', 'is_editor': False}}},
+        {'bbox': {'x': 0.694804, 'y': 0.164404, 'w': 0.183935, 'h': 0.275776},
+         'is_manual': True,
+         'confidence': None,
+         'content': {'DateStamp': {'is_manual': True, 'postal_agency': 'ATTIGNY', 'date': 'XXXX-07-30TXX:XX',
+                                   'mark_type': 'post office', 'quality': 'mediocre'}}},
+        {'bbox': {'x': 0.5, 'y': 0.5, 'w': 0.2, 'h': 0.1}, 'is_manual': True, 'confidence': None,
+         'content': {'HandwrittenText': {'is_manual': True, 'confidence': 0.5, 'ocr_result': "Bons baisers"}}},
+    ]
+
+
+# ======================================================================================================================
+# TESTS BatchValidator
+# ======================================================================================================================
+
+class TestClassBatchValidator:
+    """tests for BatchValidator Class"""
+
+    def test_build_detections(self, rows):
+        """test that bulk built detections are identical to per-object built ones"""
+        detections = BatchValidator().build_detections(rows)
+        assert detections == [Detection.from_dict(row) for row in rows]
+        assert detections[1].content.orientation is Orientation.TWO_SEVENTY
+        assert detections[1].content.keywords == {'église'}
+        assert detections[2].content.quality is DateStampQuality.MEDIOCRE
+        assert detections[3].content.confidence is None  # contenu manuel : pas de confiance
+        assert rows[1]['content']['PrintedText']['orientation'] == '-90'  # données brutes non modifiées
+
+    def test_errors(self, rows):
+        """test that every error of the batch is reported at once"""
+        rows[0]['confidence'] = None
+        rows[1]['content']['PrintedText']['orientation'] = 45
+        rows[2]['content']['DateStamp']['quality'] = 'excellent'
+        rows[3]['bbox']['x'] = 0.95
+        rows.append({'bbox': {'x': 0.5, 'y': 0.5, 'w': 0.2, 'h': 0.1}, 'content': {'Unknown': {}}})
+        report = BatchValidator().validate_detections(rows)
+        assert not report.isvalid()
+        assert report.invalid_rows() == [4, 3, 0, 1, 2]
+        assert [field_name for _, field_name, _ in report.errors] == [
+            'content', 'bbox', 'confidence', 'content.orientation', 'content.quality']
+        assert len(BatchValidator(check_bboxes=False).validate_detections(rows)) == 4
+        with pytest.raises(ValueError, match="5 invalid values in 5 of 5 rows"):
+            BatchValidator().build_detections(rows)
+
+    def test_build_postcards(self, rows):
+        """test bulk loading of postcards, with errors located by (postcard name, detection index)"""
+        data = {'0001': Postcard('0001.jpg', annotations=Annotations(
+                    detections=[Detection.from_dict(row) for row in rows], rotation=180)).to_dict(),
+                '0002': Postcard('0002.jpg').to_dict()}
+        assert BatchValidator().build_postcards(data) == {name: Postcard.from_dict(d) for name, d in data.items()}
+        data['0001']['annotations']['detections'][2]['content']['DateStamp']['mark_type'] = 'boat'
+        report = BatchValidator().validate_detections(data['0001']['annotations']['detections'],
+                                                      keys=[('0001', i) for i in range(len(rows))])
+        assert report.invalid_rows() == [('0001', 2)]
+        with pytest.raises(ValueError, match=r"\('0001', 2\) content.mark_type"):
+            CardCollection.from_dict(data)